@@ -9,6 +9,7 @@ import struct
 import sys
 import time
 import uuid
+from collections import namedtuple
 
 from appscale.common import appscale_info
 from appscale.common.async_retrying import retry_coroutine
@@ -19,7 +20,6 @@ from cassandra.cluster import Cluster
 from cassandra.query import BatchStatement
 from cassandra.query import ConsistencyLevel
 from cassandra.query import SimpleStatement
-from cassandra.query import ValueSequence
 from tornado import gen
 
 from appscale.datastore import dbconstants
@@ -78,6 +78,10 @@ LARGE_BATCH_THRESHOLD = 5 << 10
 
 logger = logging.getLogger(__name__)
 
+# Identifies where a range scan stopped. The columns read for the last key of
+# a page are held back in case the rest of its columns are in the next page.
+RangeScanToken = namedtuple('RangeScanToken', ['paging_state', 'pending'])
+
 
 def batch_size(batch):
   """ Calculates the size of a batch.
@@ -149,6 +153,8 @@ class DatastoreProxy(AppDBInterface):
         time.sleep(3)
 
     self.session.default_consistency_level = ConsistencyLevel.QUORUM
+
+    # Maps (table, operation, ttl) tuples to prepared statements.
     self.prepared_statements = {}
 
     # Provide synchronous version of some async methods
@@ -157,6 +163,7 @@ class DatastoreProxy(AppDBInterface):
     self.batch_delete_sync = tornado_synchronous(self.batch_delete)
     self.valid_data_version_sync = tornado_synchronous(self.valid_data_version)
     self.range_query_sync = tornado_synchronous(self.range_query)
+    self.range_scan_sync = tornado_synchronous(self.range_scan)
     self.get_metadata_sync = tornado_synchronous(self.get_metadata)
     self.set_metadata_sync = tornado_synchronous(self.set_metadata)
     self.get_indices_sync = tornado_synchronous(self.get_indices)
@@ -187,26 +194,30 @@ class DatastoreProxy(AppDBInterface):
     if not isinstance(column_names, list): raise TypeError("Expected a list")
     if not isinstance(row_keys, list): raise TypeError("Expected a list")
 
-    row_keys_bytes = [bytearray(row_key) for row_key in row_keys]
-
-    statement = 'SELECT * FROM "{table}" '\
-                'WHERE {key} IN %s and {column} IN %s'.format(
-                  table=table_name,
-                  key=ThriftColumn.KEY,
-                  column=ThriftColumn.COLUMN_NAME,
-                )
-    query = SimpleStatement(statement, retry_policy=BASIC_RETRIES)
-    parameters = (ValueSequence(row_keys_bytes), ValueSequence(column_names))
+    statement = (
+      'SELECT * FROM "{table}" '
+      'WHERE {key} = ? AND {column} IN ?'
+    ).format(table=table_name,
+             key=ThriftColumn.KEY,
+             column=ThriftColumn.COLUMN_NAME)
+    select = self.prepare_statement(table_name, 'select', statement)
 
+    # Querying each partition separately allows the driver to send each
+    # request directly to a replica instead of using a single coordinator.
+    unique_keys = list(set(row_keys))
     try:
-      results = yield self.tornado_cassandra.execute(
-        query, parameters=parameters)
+      results = yield [
+        self.tornado_cassandra.execute(
+          select, parameters=(bytearray(row_key), column_names))
+        for row_key in unique_keys
+      ]
 
       results_dict = {row_key: {} for row_key in row_keys}
-      for (key, column, value) in results:
-        if key not in results_dict:
-          results_dict[key] = {}
-        results_dict[key][column] = value
+      for rows in results:
+        for (key, column, value) in rows:
+          if key not in results_dict:
+            results_dict[key] = {}
+          results_dict[key][column] = value
 
       raise gen.Return(results_dict)
     except dbconstants.TRANSIENT_CASSANDRA_ERRORS:
@@ -250,10 +261,7 @@ class DatastoreProxy(AppDBInterface):
                column=ThriftColumn.COLUMN_NAME,
                value=ThriftColumn.VALUE)
 
-    if ttl is not None:
-      insert_str += 'USING TTL {}'.format(ttl)
-
-    statement = self.session.prepare(insert_str)
+    statement = self.prepare_statement(table_name, 'insert', insert_str, ttl)
 
     statements_and_params = []
     for row_key in row_keys:
@@ -272,6 +280,26 @@ class DatastoreProxy(AppDBInterface):
       logger.exception(message)
       raise AppScaleDBConnectionError(message)
 
+  def prepare_statement(self, table, operation, statement, ttl=None):
+    """ Prepare a statement or retrieve one that was prepared earlier.
+
+    Args:
+      table: A string containing the table name.
+      operation: A string identifying the statement within the table.
+      statement: A string containing the CQL statement without a TTL.
+      ttl: An integer specifying the number of seconds to keep written rows.
+    Returns:
+      A PreparedStatement object.
+    """
+    cache_key = (table, operation, ttl)
+    if cache_key not in self.prepared_statements:
+      if ttl is not None:
+        statement += ' USING TTL {}'.format(ttl)
+
+      self.prepared_statements[cache_key] = self.session.prepare(statement)
+
+    return self.prepared_statements[cache_key]
+
   def prepare_insert(self, table):
     """ Prepare an insert statement.
 
@@ -289,10 +317,7 @@ class DatastoreProxy(AppDBInterface):
                column=ThriftColumn.COLUMN_NAME,
                value=ThriftColumn.VALUE)
 
-    if statement not in self.prepared_statements:
-      self.prepared_statements[statement] = self.session.prepare(statement)
-
-    return self.prepared_statements[statement]
+    return self.prepare_statement(table, 'insert_at', statement)
 
   def prepare_delete(self, table):
     """ Prepare a delete statement.
@@ -308,10 +333,20 @@ class DatastoreProxy(AppDBInterface):
       'WHERE {key} = ?'
     ).format(table=table, key=ThriftColumn.KEY)
 
-    if statement not in self.prepared_statements:
-      self.prepared_statements[statement] = self.session.prepare(statement)
+    return self.prepare_statement(table, 'delete_at', statement)
 
-    return self.prepared_statements[statement]
+  def prepare_group_update(self):
+    """ Prepare a statement that records the last update to a group.
+
+    Returns:
+      A PreparedStatement object.
+    """
+    statement = (
+      'INSERT INTO group_updates (group, last_update) '
+      'VALUES (?, ?) '
+      'USING TIMESTAMP ?'
+    )
+    return self.prepare_statement('group_updates', 'insert_at', statement)
 
   @gen.coroutine
   def normal_batch(self, mutations, txid):
@@ -329,15 +364,9 @@ class DatastoreProxy(AppDBInterface):
       table = mutation['table']
 
       if table == 'group_updates':
-        key = mutation['key']
-        insert = (
-          'INSERT INTO group_updates (group, last_update) '
-          'VALUES (%(group)s, %(last_update)s) '
-          'USING TIMESTAMP %(timestamp)s'
-        )
-        parameters = {'group': key, 'last_update': mutation['last_update'],
-                      'timestamp': get_write_time(txid)}
-        batch.add(insert, parameters)
+        parameters = (mutation['key'], mutation['last_update'],
+                      get_write_time(txid))
+        batch.add(self.prepare_group_update(), parameters)
         continue
 
       if mutation['operation'] == Operations.PUT:
@@ -380,15 +409,10 @@ class DatastoreProxy(AppDBInterface):
       table = mutation['table']
 
       if table == 'group_updates':
-        key = mutation['key']
-        insert = (
-          'INSERT INTO group_updates (group, last_update) '
-          'VALUES (%(group)s, %(last_update)s) '
-          'USING TIMESTAMP %(timestamp)s'
-        )
-        parameters = {'group': key, 'last_update': mutation['last_update'],
-                      'timestamp': get_write_time(txid)}
-        statements_and_params.append((SimpleStatement(insert), parameters))
+        parameters = (mutation['key'], mutation['last_update'],
+                      get_write_time(txid))
+        statements_and_params.append(
+          (self.prepare_group_update(), parameters))
         continue
 
       if mutation['operation'] == Operations.PUT:
@@ -449,7 +473,8 @@ class DatastoreProxy(AppDBInterface):
       '                     path, old_value, new_value) '
       'VALUES (?, ?, ?, ?, ?, ?)'
     )
-    insert_statement = self.session.prepare(insert_item)
+    insert_statement = self.prepare_statement('batches', 'insert',
+                                              insert_item)
 
     statements_and_params = []
     for entity_change in entity_changes:
@@ -528,18 +553,18 @@ class DatastoreProxy(AppDBInterface):
     if not isinstance(table_name, str): raise TypeError("Expected a str")
     if not isinstance(row_keys, list): raise TypeError("Expected a list")
 
-    row_keys_bytes = [bytearray(row_key) for row_key in row_keys]
-
-    statement = 'DELETE FROM "{table}" WHERE {key} IN %s'.\
+    statement = 'DELETE FROM "{table}" WHERE {key} = ?'.\
       format(
         table=table_name,
         key=ThriftColumn.KEY
       )
-    query = SimpleStatement(statement, retry_policy=BASIC_RETRIES)
-    parameters = (ValueSequence(row_keys_bytes),)
+    delete = self.prepare_statement(table_name, 'delete', statement)
 
     try:
-      yield self.tornado_cassandra.execute(query, parameters=parameters)
+      yield [
+        self.tornado_cassandra.execute(delete, parameters=(bytearray(row_key),))
+        for row_key in set(row_keys)
+      ]
     except dbconstants.TRANSIENT_CASSANDRA_ERRORS:
       message = 'Exception during batch_delete'
       logger.exception(message)
@@ -670,16 +695,18 @@ class DatastoreProxy(AppDBInterface):
     else:
       lt_compare = '<'
 
+    parameters = [bytearray(start_key), bytearray(end_key), column_names]
     query_limit = ''
     if limit is not None:
-      query_limit = 'LIMIT {}'.format(len(column_names) * limit)
+      query_limit = 'LIMIT ? '
+      parameters.append(len(column_names) * limit)
 
     statement = (
       'SELECT * FROM "{table}" WHERE '
-      'token({key}) {gt_compare} %s AND '
-      'token({key}) {lt_compare} %s AND '
-      '{column} IN %s '
-      '{limit} '
+      'token({key}) {gt_compare} ? AND '
+      'token({key}) {lt_compare} ? AND '
+      '{column} IN ? '
+      '{limit}'
       'ALLOW FILTERING'
     ).format(table=table_name,
              key=ThriftColumn.KEY,
@@ -688,13 +715,13 @@ class DatastoreProxy(AppDBInterface):
              column=ThriftColumn.COLUMN_NAME,
              limit=query_limit)
 
-    query = SimpleStatement(statement, retry_policy=BASIC_RETRIES)
-    parameters = (bytearray(start_key), bytearray(end_key),
-                  ValueSequence(column_names))
+    operation = 'range {} {} {}'.format(gt_compare, lt_compare,
+                                        limit is not None)
+    query = self.prepare_statement(table_name, operation, statement)
 
     try:
       results = yield self.tornado_cassandra.execute(
-        query, parameters=parameters)
+        query, parameters=tuple(parameters))
 
       results_list = []
       current_item = {}
@@ -719,6 +746,126 @@ class DatastoreProxy(AppDBInterface):
       logger.exception(message)
       raise AppScaleDBConnectionError(message)
 
+  @gen.coroutine
+  def range_scan(self, table_name, column_names, start_key, end_key,
+                 page_size, start_inclusive=True, end_inclusive=True,
+                 keys_only=False, token=None):
+    """ Fetches a page of rows from a range ordered by keys.
+
+    Unlike range_query, the position within the range is kept by the driver's
+    paging state, so consecutive pages do not re-read earlier rows. Every
+    page of a scan must be requested with the same range arguments.
+
+    Args:
+      table_name: Name of table to access
+      column_names: Columns which get returned within the key range
+      start_key: String for which the query starts at
+      end_key: String for which the query ends at
+      page_size: The number of keys to fetch at a time
+      start_inclusive: Boolean if results should include the start_key
+      end_inclusive: Boolean if results should include the end_key
+      keys_only: Boolean if to only keys and not values
+      token: A RangeScanToken returned with the previous page
+    Raises:
+      TypeError: If an argument passed in was not of the expected type.
+      AppScaleDBConnectionError: If the range_scan could not be performed due
+        to an error with Cassandra.
+    Returns:
+      A tuple containing a generator and a RangeScanToken. The generator
+      yields the rows in the same format as range_query. The token is None
+      when there are no more pages.
+    """
+    if not isinstance(table_name, str):
+      raise TypeError('table_name must be a string')
+    if not isinstance(column_names, list):
+      raise TypeError('column_names must be a list')
+    if not isinstance(start_key, str):
+      raise TypeError('start_key must be a string')
+    if not isinstance(end_key, str):
+      raise TypeError('end_key must be a string')
+    if not isinstance(page_size, (int, long)):
+      raise TypeError('page_size must be int or long')
+
+    gt_compare = '>=' if start_inclusive else '>'
+    lt_compare = '<=' if end_inclusive else '<'
+    statement = (
+      'SELECT * FROM "{table}" WHERE '
+      'token({key}) {gt_compare} ? AND '
+      'token({key}) {lt_compare} ? AND '
+      '{column} IN ? '
+      'ALLOW FILTERING'
+    ).format(table=table_name,
+             key=ThriftColumn.KEY,
+             gt_compare=gt_compare,
+             lt_compare=lt_compare,
+             column=ThriftColumn.COLUMN_NAME)
+    operation = 'scan {} {}'.format(gt_compare, lt_compare)
+    query = self.prepare_statement(table_name, operation, statement).bind(
+      (bytearray(start_key), bytearray(end_key), column_names))
+    query.fetch_size = page_size * len(column_names)
+
+    paging_state = None
+    pending = None
+    if token is not None:
+      paging_state, pending = token
+
+    try:
+      results = yield self.tornado_cassandra.execute_page(
+        query, paging_state=paging_state)
+    except dbconstants.TRANSIENT_CASSANDRA_ERRORS:
+      message = 'Exception during range_scan'
+      logger.exception(message)
+      raise AppScaleDBConnectionError(message)
+
+    rows = results.current_rows
+    next_token = None
+    complete = len(rows)
+    if results.paging_state is not None:
+      # The next page may contain more columns for the last key.
+      next_pending = None
+      if rows:
+        last_key = rows[-1][0]
+        while complete > 0 and rows[complete - 1][0] == last_key:
+          complete -= 1
+
+        columns = {}
+        if complete == 0 and pending is not None and pending[0] == last_key:
+          columns.update(pending[1])
+          pending = None
+
+        columns.update({column: value for _, column, value in rows[complete:]})
+        next_pending = (last_key, columns)
+
+      next_token = RangeScanToken(results.paging_state, next_pending)
+
+    raise gen.Return(
+      (self._group_rows(rows[:complete], pending, keys_only), next_token))
+
+  @staticmethod
+  def _group_rows(rows, pending, keys_only):
+    """ Combines the columns for each key.
+
+    Args:
+      rows: A list of (key, column, value) rows.
+      pending: A tuple containing a key and a dictionary of columns that were
+        read before the rows.
+      keys_only: Boolean if to only yield keys
+    Yields:
+      Keys or dictionaries mapping keys to columns.
+    """
+    current_key, current_item = pending or (None, {})
+    for key, column, value in rows:
+      if key != current_key:
+        if current_item:
+          yield current_key if keys_only else {current_key: current_item}
+        current_item = {}
+        current_key = key
+
+      current_item[column] = value
+
+    if current_item:
+      yield current_key if keys_only else {current_key: current_item}
+
   @gen.coroutine
   def get_metadata(self, key):
     """ Retrieve a value from the datastore metadata table.
@@ -842,7 +989,8 @@ class DatastoreProxy(AppDBInterface):
     Returns:
       A set of integers specifying transaction IDs.
     """
-    query = 'SELECT * FROM group_updates WHERE group=%s'
+    query = self.prepare_statement(
+      'group_updates', 'select', 'SELECT * FROM group_updates WHERE group = ?')
     results = yield [
       self.tornado_cassandra.execute(query, [bytearray(group)])
       for group in groups
@@ -866,20 +1014,15 @@ class DatastoreProxy(AppDBInterface):
     else:
       in_progress_bin = None
 
-    insert = (
-      'INSERT INTO transactions (txid_hash, operation, namespace, path,'
-      '                          start_time, is_xg, in_progress)'
-      'VALUES (%(txid_hash)s, %(operation)s, %(namespace)s, %(path)s,'
-      '        %(start_time)s, %(is_xg)s, %(in_progress)s)'
-      'USING TTL {ttl}'
-    ).format(ttl=dbconstants.MAX_TX_DURATION * 2)
-    parameters = {'txid_hash': tx_partition(app, txid),
-                  'operation': TxnActions.START,
-                  'namespace': '',
-                  'path': bytearray(''),
-                  'start_time': datetime.datetime.utcnow(),
-                  'is_xg': is_xg,
-                  'in_progress': in_progress_bin}
+    insert = self.prepare_statement(
+      'transactions', 'start',
+      'INSERT INTO transactions (txid_hash, operation, namespace, path, '
+      '                          start_time, is_xg, in_progress) '
+      'VALUES (?, ?, ?, ?, ?, ?, ?)',
+      ttl=dbconstants.MAX_TX_DURATION * 2)
+    parameters = (tx_partition(app, txid), TxnActions.START, '',
+                  bytearray(''), datetime.datetime.utcnow(), is_xg,
+                  in_progress_bin)
 
     try:
       yield self.tornado_cassandra.execute(insert, parameters)
@@ -888,6 +1031,19 @@ class DatastoreProxy(AppDBInterface):
       logger.exception(message)
       raise AppScaleDBConnectionError(message)
 
+  def prepare_mutate_tx(self):
+    """ Prepare a statement that records a mutation within a transaction.
+
+    Returns:
+      A PreparedStatement object.
+    """
+    return self.prepare_statement(
+      'transactions', 'mutate',
+      'INSERT INTO transactions (txid_hash, operation, namespace, path, '
+      '                          entity) '
+      'VALUES (?, ?, ?, ?, ?)',
+      ttl=dbconstants.MAX_TX_DURATION * 2)
+
   @gen.coroutine
   def put_entities_tx(self, app, txid, entities):
     """ Update transaction metadata with new put operations.
@@ -899,11 +1055,7 @@ class DatastoreProxy(AppDBInterface):
     """
     batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM,
                            retry_policy=BASIC_RETRIES)
-    insert = self.session.prepare("""
-      INSERT INTO transactions (txid_hash, operation, namespace, path, entity)
-      VALUES (?, ?, ?, ?, ?)
-      USING TTL {ttl}
-    """.format(ttl=dbconstants.MAX_TX_DURATION * 2))
+    insert = self.prepare_mutate_tx()
 
     for entity in entities:
       args = (tx_partition(app, txid),
@@ -931,11 +1083,7 @@ class DatastoreProxy(AppDBInterface):
     """
     batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM,
                            retry_policy=BASIC_RETRIES)
-    insert = self.session.prepare("""
-      INSERT INTO transactions (txid_hash, operation, namespace, path, entity)
-      VALUES (?, ?, ?, ?, ?)
-      USING TTL {ttl}
-    """.format(ttl=dbconstants.MAX_TX_DURATION * 2))
+    insert = self.prepare_mutate_tx()
 
     for key in entity_keys:
       # The None value overwrites previous puts.
@@ -963,13 +1111,11 @@ class DatastoreProxy(AppDBInterface):
     Returns:
       An integer specifying the number of existing tasks.
     """
-    select = (
+    select = self.prepare_statement(
+      'transactions', 'count',
       'SELECT count(*) FROM transactions '
-      'WHERE txid_hash = %(txid_hash)s '
-      'AND operation = %(operation)s'
-    )
-    parameters = {'txid_hash': tx_partition(app, txid),
-                  'operation': TxnActions.ENQUEUE_TASK}
+      'WHERE txid_hash = ? AND operation = ?')
+    parameters = (tx_partition(app, txid), TxnActions.ENQUEUE_TASK)
     try:
       result = yield self.tornado_cassandra.execute(select, parameters)
       raise gen.Return(result[0].count)
@@ -991,12 +1137,11 @@ class DatastoreProxy(AppDBInterface):
     """
     batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM,
                            retry_policy=BASIC_RETRIES)
-    query_str = (
+    insert = self.prepare_statement(
+      'transactions', 'enqueue_task',
       'INSERT INTO transactions (txid_hash, operation, namespace, path, task) '
-      'VALUES (?, ?, ?, ?, ?) '
-      'USING TTL {ttl}'
-    ).format(ttl=dbconstants.MAX_TX_DURATION * 2)
-    insert = self.session.prepare(query_str)
+      'VALUES (?, ?, ?, ?, ?)',
+      ttl=dbconstants.MAX_TX_DURATION * 2)
 
     for task in tasks:
       task.clear_transaction()
@@ -1030,11 +1175,11 @@ class DatastoreProxy(AppDBInterface):
     """
     batch = BatchStatement(consistency_level=ConsistencyLevel.QUORUM,
                            retry_policy=BASIC_RETRIES)
-    insert = self.session.prepare("""
-      INSERT INTO transactions (txid_hash, operation, namespace, path)
-      VALUES (?, ?, ?, ?)
-      USING TTL {ttl}
-    """.format(ttl=dbconstants.MAX_TX_DURATION * 2))
+    insert = self.prepare_statement(
+      'transactions', 'get',
+      'INSERT INTO transactions (txid_hash, operation, namespace, path) '
+      'VALUES (?, ?, ?, ?)',
+      ttl=dbconstants.MAX_TX_DURATION * 2)
 
     for group_key in group_keys:
       if not isinstance(group_key, entity_pb.Reference):
@@ -1063,13 +1208,13 @@ class DatastoreProxy(AppDBInterface):
     Returns:
       A dictionary containing transaction state.
     """
-    select = (
+    select = self.prepare_statement(
+      'transactions', 'select',
       'SELECT namespace, operation, path, start_time, is_xg, in_progress, '
       '       entity, task '
       'FROM transactions '
-      'WHERE txid_hash = %(txid_hash)s '
-    )
-    parameters = {'txid_hash': tx_partition(app, txid)}
+      'WHERE txid_hash = ?')
+    parameters = (tx_partition(app, txid),)
     try:
       results = yield self.tornado_cassandra.execute(select, parameters)
     except dbconstants.TRANSIENT_CASSANDRA_ERRORS:
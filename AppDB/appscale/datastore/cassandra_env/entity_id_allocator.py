@@ -7,6 +7,7 @@ from cassandra.query import (
   SimpleStatement
 )
 from tornado import gen
+from tornado.ioloop import IOLoop
 
 from appscale.datastore.cassandra_env.retry_policies import NO_RETRIES
 from appscale.datastore.cassandra_env.tornado_cassandra import TornadoCassandra
@@ -27,6 +28,10 @@ from google.appengine.datastore.datastore_stub_util import (
 # The number of scattered IDs the datastore should reserve at a time.
 DEFAULT_RESERVATION_SIZE = 10000
 
+# By default, the next block is reserved once fewer than 1/LOW_WATER_RATIO
+# of the IDs in a block remain.
+LOW_WATER_RATIO = 10
+
 
 class ReservationFailed(Exception):
   """ Indicates that a block of IDs could not be reserved. """
@@ -251,20 +256,38 @@ class EntityIDAllocator(object):
 
 class ScatteredAllocator(EntityIDAllocator):
   """ An iterator that generates evenly-distributed entity IDs. """
-  def __init__(self, session, project):
+  def __init__(self, session, project,
+               reservation_size=DEFAULT_RESERVATION_SIZE, low_water_mark=None):
     """ Creates a new ScatteredAllocator instance. Each project should just
     have one instance since it reserves a large block of IDs at a time.
 
     Args:
       session: A cassandra-driver session.
       project: A string specifying a project ID.
+      reservation_size: An integer specifying the number of IDs to reserve
+        at a time.
+      low_water_mark: An integer specifying the number of remaining IDs in
+        the current block that triggers the reservation of the next block.
     """
     super(ScatteredAllocator, self).__init__(session, project, scattered=True)
+    self.reservation_size = reservation_size
+    if low_water_mark is None:
+      low_water_mark = reservation_size // LOW_WATER_RATIO
+    self.low_water_mark = low_water_mark
 
     # The range that this datastore has already reserved for scattered IDs.
     self.start_id = None
     self.end_id = None
 
+    # A block that has been reserved ahead of time as a (start, end) tuple.
+    self._spare = None
+
+    # A future for the reservation of the spare block that is in progress.
+    self._refill = None
+
+    # IDs that are less than or equal to this value must not be used.
+    self._min_counter = 0
+
   def __iter__(self):
     """ Returns a new iterator object. """
     return self
@@ -276,14 +299,35 @@ class ScatteredAllocator(EntityIDAllocator):
     Returns:
       An integer specifying an entity ID.
     """
-    # This function will require a tornado lock when made asynchronous.
-    if self.start_id is None or self.start_id > self.end_id:
-      size = DEFAULT_RESERVATION_SIZE
-      self.start_id, self.end_id = yield self.allocate_size(size)
+    ids = yield self.next_ids(1)
+    raise gen.Return(ids[0])
+
+  @gen.coroutine
+  def next_ids(self, count):
+    """ Generates a list of new entity IDs.
+
+    Args:
+      count: An integer specifying the number of IDs to generate.
+    Returns:
+      A list of integers specifying entity IDs.
+    """
+    ids = []
+    while len(ids) < count:
+      if self.start_id is None or self.start_id > self.end_id:
+        yield self._next_block()
+        continue
+
+      # Handing out IDs does not yield, so concurrent callers never receive
+      # the same ID.
+      last_id = min(self.end_id, self.start_id + count - len(ids) - 1)
+      ids.extend(ToScatteredId(counter)
+                 for counter in xrange(self.start_id, last_id + 1))
+      self.start_id = last_id + 1
 
-    next_id = ToScatteredId(self.start_id)
-    self.start_id += 1
-    raise gen.Return(next_id)
+    if self.end_id - self.start_id + 1 < self.low_water_mark:
+      self._refill_in_background()
+
+    raise gen.Return(ids)
 
   @gen.coroutine
   def set_min_counter(self, counter):
@@ -292,26 +336,102 @@ class ScatteredAllocator(EntityIDAllocator):
     Args:
       counter: An integer specifying the minimum counter value.
     """
-    # If there's no chance the ID could be allocated, do nothing.
-    if self.start_id is not None and self.start_id >= counter:
+    if counter <= self._min_counter:
+      return
+
+    self._min_counter = counter
+
+    # Skip any IDs in the local blocks that could have been used.
+    if self.start_id is not None:
+      self.start_id = max(self.start_id, counter + 1)
+
+    self._spare = self._trim_block(self._spare)
+
+    # If the local blocks contain the counter, other servers cannot use it.
+    reserved_end = self.end_id
+    if self._spare is not None:
+      reserved_end = self._spare[1]
+
+    if reserved_end is not None and reserved_end >= counter:
+      return
+
+    if (self._last_reserved_cache is not None and
+        self._last_reserved_cache >= counter):
       return
 
-    # If the ID is in the allocated block, adjust the block.
-    if self.end_id is not None and self.end_id > counter:
-      self.start_id = counter
+    yield self.allocate_max(counter)
 
-    # If this server has never allocated a block, adjust the minimum for
-    # future blocks.
-    if self.start_id is None:
-      if (self._last_reserved_cache is not None and
-          self._last_reserved_cache >= counter):
+  @gen.coroutine
+  def _next_block(self):
+    """ Replaces the current block with the spare block, reserving one first
+    if necessary. """
+    if self._spare is None:
+      yield self._start_refill()
+
+      # Another caller may have already moved the spare block into place.
+      if self._spare is None:
         return
 
-      yield self.allocate_max(counter)
+    self.start_id, self.end_id = self._spare
+    self._spare = None
+
+  def _start_refill(self):
+    """ Starts reserving the spare block unless that is already in progress.
+
+    Returns:
+      A future that resolves when the spare block is reserved.
+    """
+    if self._refill is None or self._refill.done():
+      self._refill = self._reserve_spare()
+
+    return self._refill
+
+  def _refill_in_background(self):
+    """ Reserves the spare block without waiting for it. """
+    if self._spare is not None:
       return
 
-    # If this server has allocated a block, but the relevant ID is greater than
-    # the end ID, get a new block that starts at least as high as the ID.
-    self.start_id, self.end_id = yield self.allocate_size(
-      DEFAULT_RESERVATION_SIZE, min_counter=counter
-    )
+    if self._refill is not None and not self._refill.done():
+      return
+
+    IOLoop.current().add_future(self._start_refill(), self._check_refill)
+
+  @gen.coroutine
+  def _reserve_spare(self):
+    """ Reserves a block of IDs that can be used after the current block. """
+    while self._spare is None:
+      block = yield self.allocate_size(self.reservation_size,
+                                       min_counter=self._min_counter)
+      # The minimum counter can change during the reservation.
+      self._spare = self._trim_block(block)
+
+  def _trim_block(self, block):
+    """ Removes the IDs from a block that are not greater than the minimum
+    counter.
+
+    Args:
+      block: A tuple of integers specifying the start and end ID or None.
+    Returns:
+      A tuple of integers specifying the start and end ID or None if every
+      ID was removed.
+    """
+    if block is None:
+      return None
+
+    start_id = max(block[0], self._min_counter + 1)
+    if start_id > block[1]:
+      return None
+
+    return start_id, block[1]
+
+  def _check_refill(self, future):
+    """ Logs any error from a background reservation.
+
+    Args:
+      future: A future for the reservation.
+    """
+    error = future.exception()
+    if error is not None:
+      logger.warning(
+        'Unable to reserve scattered IDs for {}: {}'.format(self.project,
+                                                             error))
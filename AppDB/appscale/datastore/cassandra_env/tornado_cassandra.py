@@ -34,6 +34,41 @@ class TornadoCassandra(object):
     )
     return tornado_future
 
+  def execute_page(self, query, parameters=None, paging_state=None):
+    """ Fetches a single page of a Cassandra query asynchronously.
+
+    Args:
+      query: An instance of Cassandra query.
+      parameters: The parameters for the query.
+      paging_state: The paging state returned with the previous page.
+    Returns:
+      A Tornado future that resolves to a ResultSet. Its current_rows contain
+      the page, and its paging_state is None after the last page.
+    """
+    tornado_future = TornadoFuture()
+    io_loop = IOLoop.current()
+    cassandra_future = self._session.execute_async(
+      query, parameters, paging_state=paging_state)
+    cassandra_future.add_callbacks(
+      self._handle_single_page, self._handle_failure,
+      callback_args=(io_loop, tornado_future, cassandra_future),
+      errback_args=(io_loop, tornado_future, query)
+    )
+    return tornado_future
+
+  @staticmethod
+  def _handle_single_page(results, io_loop, tornado_future, cassandra_future):
+    """ Assigns the first page of a Cassandra result to the Tornado future.
+
+    Args:
+      results: A list of result rows (limited version of ResultSet).
+      io_loop: An instance of tornado IOLoop where execute was initially called.
+      tornado_future: A Tornado future.
+      cassandra_future: A Cassandra future containing ResultSet.
+    """
+    result = cassandra_future.result()
+    io_loop.add_callback(tornado_future.set_result, result)
+
   @staticmethod
   def _handle_page(results, io_loop, tornado_future, cassandra_future):
     """ Assigns the Cassandra result to the Tornado future.
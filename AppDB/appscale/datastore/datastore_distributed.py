@@ -7,13 +7,14 @@ import random
 import sys
 import time
 
-from tornado import gen
+from tornado import gen, locks
 from tornado.ioloop import IOLoop
 
 from appscale.datastore import dbconstants, helper_functions
 
 from appscale.common.unpackaged import APPSCALE_PYTHON_APPSERVER
 from kazoo.client import KazooState
+from kazoo.exceptions import KazooException, NoNodeError
 from appscale.datastore.dbconstants import (
   APP_ENTITY_SCHEMA, BadRequest, ID_KEY_LENGTH, InternalError, MAX_TX_DURATION,
   Timeout
@@ -21,7 +22,8 @@ from appscale.datastore.dbconstants import (
 from appscale.datastore.cassandra_env.cassandra_interface import (
   batch_size, LARGE_BATCH_THRESHOLD)
 from appscale.datastore.cassandra_env.entity_id_allocator import EntityIDAllocator
-from appscale.datastore.cassandra_env.entity_id_allocator import ScatteredAllocator
+from appscale.datastore.cassandra_env.entity_id_allocator import (
+  DEFAULT_RESERVATION_SIZE, ScatteredAllocator)
 from appscale.datastore.cassandra_env.large_batch import BatchNotApplied
 from appscale.datastore.cassandra_env.utils import deletions_for_entity
 from appscale.datastore.cassandra_env.utils import mutations_for_entity
@@ -40,9 +42,14 @@ from appscale.datastore.utils import group_for_key
 from appscale.datastore.utils import kind_from_encoded_key
 from appscale.datastore.utils import reference_property_to_reference
 from appscale.datastore.utils import UnprocessedQueryCursor
-from appscale.datastore.range_iterator import RangeExhausted, RangeIterator
+from appscale.datastore.query_iterator import (
+  CursorTable, entity_row_key, IndexSource, MergeJoinSource, QueryIterator,
+  QueryPage)
+from appscale.datastore.range_iterator import (
+  RangeExhausted, RangeIterator, RangeReader)
 from appscale.datastore.zkappscale import entity_lock
 from appscale.datastore.zkappscale import zktransaction
+from appscale.datastore.zkappscale.tornado_kazoo import TornadoKazoo
 
 sys.path.append(APPSCALE_PYTHON_APPSERVER)
 from google.appengine.api import datastore_errors
@@ -61,6 +68,9 @@ from google.net.proto.ProtocolBuffer import ProtocolBufferDecodeError
 
 logger = logging.getLogger(__name__)
 
+# The ZooKeeper node that changes whenever a project's composite indexes do.
+INDEX_VERSION_NODE = '/appscale/apps/{project}/composite_index_version'
+
 
 class DatastoreDistributed():
   """ AppScale persistent layer for the datastore API. It is the
@@ -116,13 +126,19 @@ class DatastoreDistributed():
   BATCH_SIZE = 100
 
   def __init__(self, datastore_batch, transaction_manager, zookeeper=None,
-               log_level=logging.INFO, taskqueue_locations=()):
+               log_level=logging.INFO, taskqueue_locations=(),
+               max_concurrent_groups=dbconstants.MAX_GROUPS_FOR_XG,
+               id_reservation_size=DEFAULT_RESERVATION_SIZE):
     """
        Constructor.
 
      Args:
        datastore_batch: A reference to the batch datastore interface.
        zookeeper: A reference to the zookeeper interface.
+       max_concurrent_groups: The maximum number of entity groups that a
+         non-transactional put writes at the same time.
+       id_reservation_size: The number of scattered IDs that this server
+         reserves for a project at a time.
     """
     class_name = self.__class__.__name__
     self.logger = logging.getLogger(class_name)
@@ -144,6 +160,21 @@ class DatastoreDistributed():
     # Maintain a sequential allocator for each project.
     self.sequential_allocators = {}
 
+    # Live query iterators that can be resumed by Next requests.
+    self.query_cursors = CursorTable()
+
+    self.max_concurrent_groups = max_concurrent_groups
+    self.id_reservation_size = id_reservation_size
+
+    # Maps project IDs to lists of CompositeIndex objects.
+    self.composite_index_cache = {}
+
+    # Counts the invalidations for each project's cached indexes.
+    self._index_cache_generations = {}
+
+    # Projects that have a watch on their index version node.
+    self._index_watches = set()
+
     self.taskqueue_client = TaskQueueClient(taskqueue_locations)
     self.transaction_manager = transaction_manager
     self.zookeeper.handle.add_listener(self._zk_state_listener)
@@ -170,6 +201,17 @@ class DatastoreDistributed():
       limit = 1
     return limit
 
+  def page_bounds(self, query):
+    """ Returns the number of results to skip and to return for a query.
+
+    Args:
+      query: A datastore_pb.Query.
+    Returns:
+      A tuple containing the offset and the page size.
+    """
+    offset = min(query.offset(), self._MAXIMUM_RESULTS)
+    return offset, self.get_limit(query) - offset
+
   @staticmethod
   def __decode_index_str(value, prop_value):
     """ Takes an encoded string and converts it to a PropertyValue.
@@ -386,6 +428,79 @@ class DatastoreDistributed():
       dbconstants.COMPOSITE_TABLE, row_keys,
       dbconstants.COMPOSITE_SCHEMA, row_values)
 
+  @gen.coroutine
+  def get_composite_indexes(self, app_id):
+    """ Retrieves the composite indexes for a project.
+
+    The indexes are cached until any datastore server changes them.
+
+    Args:
+      app_id: A string specifying the project ID.
+    Returns:
+      A list of entity_pb.CompositeIndex objects.
+    """
+    if app_id in self.composite_index_cache:
+      raise gen.Return(self.composite_index_cache[app_id])
+
+    self._watch_composite_indexes(app_id)
+    generation = self._index_cache_generations.get(app_id, 0)
+    encoded_indexes = yield self.datastore_batch.get_indices(app_id)
+    indexes = [entity_pb.CompositeIndex(index) for index in encoded_indexes]
+
+    # Don't cache indexes that were changed during the fetch.
+    if self._index_cache_generations.get(app_id, 0) == generation:
+      self.composite_index_cache[app_id] = indexes
+
+    raise gen.Return(indexes)
+
+  def _watch_composite_indexes(self, app_id):
+    """ Invalidates the cached indexes when the project's version changes.
+
+    Args:
+      app_id: A string specifying the project ID.
+    """
+    if app_id in self._index_watches:
+      return
+
+    io_loop = IOLoop.current()
+
+    def invalidate(data, stat):
+      io_loop.add_callback(self._invalidate_composite_indexes, app_id)
+
+    self._index_watches.add(app_id)
+    self.zookeeper.handle.DataWatch(
+      INDEX_VERSION_NODE.format(project=app_id), invalidate)
+
+  def _invalidate_composite_indexes(self, app_id):
+    """ Removes a project's indexes from the cache.
+
+    Args:
+      app_id: A string specifying the project ID.
+    """
+    self._index_cache_generations[app_id] = \
+      self._index_cache_generations.get(app_id, 0) + 1
+    self.composite_index_cache.pop(app_id, None)
+
+  @gen.coroutine
+  def _notify_index_change(self, app_id):
+    """ Tells every datastore server that a project's indexes changed.
+
+    Args:
+      app_id: A string specifying the project ID.
+    """
+    self._invalidate_composite_indexes(app_id)
+    node = INDEX_VERSION_NODE.format(project=app_id)
+    version = str(time.time())
+    tornado_zk = TornadoKazoo(self.zookeeper.handle)
+    try:
+      try:
+        yield tornado_zk.set(node, version)
+      except NoNodeError:
+        yield tornado_zk.create(node, version, makepath=True)
+    except KazooException:
+      self.logger.exception(
+        'Unable to notify servers of index change for {}'.format(app_id))
+
   @gen.coroutine
   def delete_composite_index_metadata(self, app_id, index):
     """ Deletes a index for the given application identifier.
@@ -401,6 +516,7 @@ class DatastoreDistributed():
     yield self.datastore_batch.batch_delete(
       dbconstants.METADATA_TABLE, index_keys,
       column_names=dbconstants.METADATA_TABLE)
+    yield self._notify_index_change(app_id)
 
   @gen.coroutine
   def create_composite_index(self, app_id, index):
@@ -423,6 +539,7 @@ class DatastoreDistributed():
     yield self.datastore_batch.batch_put_entity(
       dbconstants.METADATA_TABLE, row_keys,
       dbconstants.METADATA_SCHEMA, row_values)
+    yield self._notify_index_change(app_id)
     raise gen.Return(rand)
 
   @gen.coroutine
@@ -447,17 +564,17 @@ class DatastoreDistributed():
     start_row = prefix
     end_row = prefix + self._TERM_STRING
     start_inclusive = True
+    reader = RangeReader(self.datastore_batch)
 
     while True:
       # Fetch references from the kind table since entity keys can have a
       # parent prefix.
-      references = yield self.datastore_batch.range_query(
+      references = yield reader.read(
         table_name=dbconstants.APP_KIND_TABLE,
         column_names=dbconstants.APP_KIND_SCHEMA,
         start_key=start_row,
         end_key=end_row,
-        limit=self.BATCH_SIZE,
-        offset=0,
+        count=self.BATCH_SIZE,
         start_inclusive=start_inclusive,
       )
 
@@ -475,6 +592,7 @@ class DatastoreDistributed():
       start_inclusive = self._DISABLE_INCLUSIVITY
 
     self.logger.info('Updated {} index entries.'.format(entries_updated))
+    yield self._notify_index_change(app_id)
 
   @gen.coroutine
   def allocate_size(self, project, size):
@@ -556,7 +674,27 @@ class DatastoreDistributed():
         by_group[group_key] = []
       by_group[group_key].append(entity)
 
-    for encoded_group_key, entity_list in by_group.iteritems():
+    # Each group is locked and written independently so that a slow or
+    # contended group does not hold up the others.
+    semaphore = locks.Semaphore(self.max_concurrent_groups)
+    yield [self._put_group(app, encoded_group_key, entity_list,
+                           composite_indexes, semaphore)
+           for encoded_group_key, entity_list in by_group.iteritems()]
+
+  @gen.coroutine
+  def _put_group(self, app, encoded_group_key, entity_list, composite_indexes,
+                 semaphore):
+    """ Stores entities from a single entity group.
+
+    Args:
+      app: A string containing the application ID.
+      encoded_group_key: A string containing an encoded group Reference.
+      entity_list: A list of entities that belong to the group.
+      composite_indexes: A list or tuple of CompositeIndex objects.
+      semaphore: A tornado Semaphore that limits how many groups are written
+        at the same time.
+    """
+    with (yield semaphore.acquire()):
       group_key = entity_pb.Reference(encoded_group_key)
 
       txid = self.transaction_manager.create_transaction_id(app, xg=False)
@@ -569,66 +707,59 @@ class DatastoreDistributed():
       except entity_lock.LockTimeout:
         raise Timeout('Unable to acquire entity group lock')
 
+      entity_keys = [
+        get_entity_key(self.get_table_prefix(entity), entity.key().path())
+        for entity in entity_list]
       try:
-        entity_keys = [
-          get_entity_key(self.get_table_prefix(entity), entity.key().path())
-          for entity in entity_list]
+        current_values = yield self.datastore_batch.batch_get_entity(
+          dbconstants.APP_ENTITY_TABLE, entity_keys, APP_ENTITY_SCHEMA)
+      except dbconstants.AppScaleDBConnectionError:
+        yield lock.release()
+        self.transaction_manager.delete_transaction_id(app, txid)
+        raise
+
+      batch = []
+      entity_changes = []
+      for entity in entity_list:
+        prefix = self.get_table_prefix(entity)
+        entity_key = get_entity_key(prefix, entity.key().path())
+
+        current_value = None
+        if current_values[entity_key]:
+          current_value = entity_pb.EntityProto(
+            current_values[entity_key][APP_ENTITY_SCHEMA[0]])
+
+        batch.extend(mutations_for_entity(entity, txid, current_value,
+                                          composite_indexes))
+
+        entity_changes.append(
+          {'key': entity.key(), 'old': current_value, 'new': entity})
+
+      batch.append({'table': 'group_updates',
+                    'key': bytearray(encoded_group_key),
+                    'last_update': txid})
+
+      if batch_size(batch) > LARGE_BATCH_THRESHOLD:
+        try:
+          yield self.datastore_batch.large_batch(app, batch, entity_changes,
+                                                 txid)
+        except BatchNotApplied as error:
+          # If the "applied" switch has not been flipped, the lock can be
+          # released. The transaction ID is kept so that the groomer can
+          # clean up the batch tables.
+          yield lock.release()
+          raise dbconstants.AppScaleDBConnectionError(str(error))
+      else:
         try:
-          current_values = yield self.datastore_batch.batch_get_entity(
-            dbconstants.APP_ENTITY_TABLE, entity_keys, APP_ENTITY_SCHEMA)
+          yield self.datastore_batch.normal_batch(batch, txid)
         except dbconstants.AppScaleDBConnectionError:
-          lock.release()
+          # Since normal batches are guaranteed to be atomic, the lock can be
+          # released.
+          yield lock.release()
           self.transaction_manager.delete_transaction_id(app, txid)
           raise
 
-        batch = []
-        entity_changes = []
-        for entity in entity_list:
-          prefix = self.get_table_prefix(entity)
-          entity_key = get_entity_key(prefix, entity.key().path())
-
-          current_value = None
-          if current_values[entity_key]:
-            current_value = entity_pb.EntityProto(
-              current_values[entity_key][APP_ENTITY_SCHEMA[0]])
-
-          batch.extend(mutations_for_entity(entity, txid, current_value,
-                                            composite_indexes))
-
-          batch.append({'table': 'group_updates',
-                        'key': bytearray(encoded_group_key),
-                        'last_update': txid})
-
-          entity_changes.append(
-            {'key': entity.key(), 'old': current_value, 'new': entity})
-
-        if batch_size(batch) > LARGE_BATCH_THRESHOLD:
-          try:
-            yield self.datastore_batch.large_batch(app, batch, entity_changes,
-                                                   txid)
-          except BatchNotApplied as error:
-            # If the "applied" switch has not been flipped, the lock can be
-            # released. The transaction ID is kept so that the groomer can
-            # clean up the batch tables.
-            lock.release()
-            raise dbconstants.AppScaleDBConnectionError(str(error))
-        else:
-          try:
-            yield self.datastore_batch.normal_batch(batch, txid)
-          except dbconstants.AppScaleDBConnectionError:
-            # Since normal batches are guaranteed to be atomic, the lock can
-            # be released.
-            lock.release()
-            self.transaction_manager.delete_transaction_id(app, txid)
-            raise
-
-        lock.release()
-
-      finally:
-        # In case of failure entity group lock should stay acquired
-        # as transaction groomer will handle it later.
-        # But tornado lock must be released.
-        lock.ensure_release_tornado_lock()
+      yield lock.release()
 
       self.transaction_manager.delete_transaction_id(app, txid)
 
@@ -678,10 +809,12 @@ class DatastoreDistributed():
     """
     if app_id not in self.scattered_allocators:
       self.scattered_allocators[app_id] = ScatteredAllocator(
-        self.datastore_batch.session, app_id)
+        self.datastore_batch.session, app_id,
+        reservation_size=self.id_reservation_size)
     allocator = self.scattered_allocators[app_id]
 
     entities = put_request.entity_list()
+    incomplete_entities = []
 
     for entity in entities:
       self.validate_key(entity.key())
@@ -695,8 +828,13 @@ class DatastoreDistributed():
 
       last_path = entity.key().path().element_list()[-1]
       if last_path.id() == 0 and not last_path.has_name():
-        allocated_id = yield allocator.next()
-        last_path.set_id(allocated_id)
+        incomplete_entities.append(entity)
+
+    # Allocate the IDs for every new entity at once.
+    if incomplete_entities:
+      allocated_ids = yield allocator.next_ids(len(incomplete_entities))
+      for entity, allocated_id in zip(incomplete_entities, allocated_ids):
+        entity.key().path().element_list()[-1].set_id(allocated_id)
         group = entity.mutable_entity_group()
         root = entity.key().path().element(0)
         group.add_element().CopyFrom(root)
@@ -918,11 +1056,7 @@ class DatastoreDistributed():
     composite_indexes = []
     filtered_indexes = []
     if delete_request.has_mark_changes():
-      all_composite_indexes = yield self.datastore_batch.get_indices(app_id)
-      for index in all_composite_indexes:
-        new_index = entity_pb.CompositeIndex()
-        new_index.ParseFromString(index)
-        composite_indexes.append(new_index)
+      composite_indexes = yield self.get_composite_indexes(app_id)
       # Only get composites of the correct kinds.
       for index in composite_indexes:
         if index.definition().entity_type() in ent_kinds:
@@ -952,19 +1086,13 @@ class DatastoreDistributed():
         except entity_lock.LockTimeout:
           raise Timeout('Unable to acquire entity group lock')
 
-        try:
-          yield self.delete_entities(
-            group_key,
-            txid,
-            key_list,
-            composite_indexes=filtered_indexes
-          )
-          lock.release()
-        finally:
-          # In case of failure entity group lock should stay acquired
-          # as transaction groomer will handle it later.
-          # But tornado lock must be released.
-          lock.ensure_release_tornado_lock()
+        yield self.delete_entities(
+          group_key,
+          txid,
+          key_list,
+          composite_indexes=filtered_indexes
+        )
+        yield lock.release()
 
         self.logger.debug('Removed {} entities'.format(len(key_list)))
         self.transaction_manager.delete_transaction_id(app_id, txid)
@@ -1180,6 +1308,18 @@ class DatastoreDistributed():
 
     raise gen.Return(clean_results)
 
+  @gen.coroutine
+  def __fetch_entity(self, rowkey):
+    """ Given a rowkey, fetch a single entity from the entity table.
+
+    Args:
+      rowkey: A string which is a key to the entity table.
+    Returns:
+      An encoded entity or None if it does not exist.
+    """
+    results = yield self.__fetch_entities_dict_from_row_list([rowkey])
+    raise gen.Return(results.get(rowkey))
+
   @gen.coroutine
   def __fetch_and_validate_entity_set(self, index_dict, limit, app_id,
     direction):
@@ -1269,7 +1409,7 @@ class DatastoreDistributed():
       query: The query to run.
       filter_info: Tuple with filter operators and values.
     Returns:
-      A list of entities.
+      A QueryPage containing the entities after the offset.
     Raises:
       ZKTransactionException: If a lock could not be acquired.
     """
@@ -1312,101 +1452,69 @@ class DatastoreDistributed():
         start_inclusive = self._ENABLE_INCLUSIVITY
 
     if startrow > endrow:
-      raise gen.Return([])
+      raise gen.Return(QueryPage([]))
 
-    limit = self.get_limit(query)
+    def reference(row):
+      key = entity_row_key(row)
+      if query.has_kind() and kind_from_encoded_key(key) != query.kind():
+        return None
 
-    entities = []
-    while True:
-      results = yield self.datastore_batch.range_query(
-        dbconstants.APP_ENTITY_TABLE,
-        APP_ENTITY_SCHEMA,
-        startrow,
-        endrow,
-        limit,
-        start_inclusive=start_inclusive,
-        end_inclusive=end_inclusive)
-
-      if query.has_kind():
-        entities.extend([
-          result.values()[0]['entity'] for result in results
-          if kind_from_encoded_key(result.keys()[0]) == query.kind()])
-      else:
-        entities.extend([result.values()[0]['entity'] for result in results])
+      return key
 
-      if len(results) < limit:
-        break
-
-      if len(entities) >= limit:
-        break
+    @gen.coroutine
+    def resolve(rows):
+      raise gen.Return([row.values()[0]['entity'] for row in rows
+                        if reference(row) is not None])
 
-      # TODO: This can be made more efficient by skipping ahead to the next
-      # possible match.
-      startrow = results[-1].keys()[0]
-      start_inclusive = False
+    source = IndexSource(
+      self.__entity_range(startrow, endrow, start_inclusive, end_inclusive),
+      resolve, reference)
+    offset, page_size = self.page_bounds(query)
+    iterator = QueryIterator(source, offset, page_size, self.__fetch_entity)
+    page = yield iterator.fetch_page()
 
     if query.has_transaction():
       yield self.datastore_batch.record_reads(
         query.app(), query.transaction().handle(), [group_for_key(ancestor)])
 
-    raise gen.Return(entities[:limit])
+    raise gen.Return(page)
 
-  @gen.coroutine
-  def fetch_from_entity_table(self,
-                              startrow,
-                              endrow,
-                              limit,
-                              offset,
-                              start_inclusive,
-                              end_inclusive,
-                              query,
-                              txn_id):
-    """
-    Fetches entities from the entity table given a query and a set of parameters.
-    It will validate the results and remove tombstoned items.
-
-    Args:
-       startrow: The key from which we start a range query.
-       endrow: The end key that terminates a range query.
-       limit: The maximum number of items to return from a query.
-       offset: The number of entities we want removed from the front of the result.
-       start_inclusive: Boolean if we should include the start key in the result.
-       end_inclusive: Boolean if we should include the end key in the result.
-       query: The query we are currently running.
-       txn_id: The current transaction ID if there is one, it is 0 if there is not.
+  def __entity_range(self, startrow, endrow, start_inclusive, end_inclusive):
+    """ Creates a function that reads rows from a range of the entity table.
+
+    Args:
+      startrow: The key from which we start a range query.
+      endrow: The end key that terminates a range query.
+      start_inclusive: Boolean if we should include the start key in the result.
+      end_inclusive: Boolean if we should include the end key in the result.
     Returns:
-       A validated database result.
-    """
-    final_result = []
-    while 1:
-      result = yield self.datastore_batch.range_query(
-        dbconstants.APP_ENTITY_TABLE,
-        APP_ENTITY_SCHEMA,
-        startrow,
-        endrow,
-        limit,
-        offset=0,
-        start_inclusive=start_inclusive,
+      A coroutine suitable for an IndexSource.
+    """
+    # Skipped rows are read with different columns, so they use a separate
+    # scan.
+    readers = {True: RangeReader(self.datastore_batch),
+               False: RangeReader(self.datastore_batch)}
+
+    @gen.coroutine
+    def fetch_rows(start_key, count, keys_only):
+      # Skipped rows only need the key, so avoid reading the entity column.
+      column_names = APP_ENTITY_SCHEMA
+      if keys_only:
+        column_names = [APP_ENTITY_SCHEMA[1]]
+
+      range_start = startrow
+      range_start_inclusive = start_inclusive
+      if start_key is not None:
+        range_start = start_key
+        range_start_inclusive = self._DISABLE_INCLUSIVITY
+
+      rows = yield readers[keys_only].read(
+        dbconstants.APP_ENTITY_TABLE, column_names, range_start, endrow,
+        count, start_inclusive=range_start_inclusive,
         end_inclusive=end_inclusive)
+      raise gen.Return(rows)
 
-      prev_len = len(result)
-      last_result = None
-      if result:
-        last_result = result[-1].keys()[0]
-      else:
-        break
-
-      final_result += result
-
-      if len(result) != prev_len:
-        startrow = last_result
-        start_inclusive = self._DISABLE_INCLUSIVITY
-        limit = limit - len(result)
-        continue
-      else:
-        break
-
-    raise gen.Return(self.__extract_entities(final_result))
+    return fetch_rows
 
   @gen.coroutine
   def kindless_query(self, query, filter_info):
@@ -1417,7 +1525,7 @@ class DatastoreDistributed():
       query: The query to run.
       filter_info: Tuple with filter operators and values.
     Returns:
-      Entities that match the query.
+      A QueryPage of entities that match the query.
     """
     prefix = self.get_table_prefix(query)
 
@@ -1457,11 +1565,17 @@ class DatastoreDistributed():
       if query.compiled_cursor().position_list()[0].start_inclusive() == 1:
         start_inclusive = self._ENABLE_INCLUSIVITY
 
-    limit = self.get_limit(query)
-    result = yield self.fetch_from_entity_table(
-      startrow, endrow, limit, offset=0, start_inclusive=start_inclusive,
-      end_inclusive=end_inclusive, query=query, txn_id=0)
-    raise gen.Return(result)
+    @gen.coroutine
+    def resolve(rows):
+      raise gen.Return(self.__extract_entities(rows))
+
+    source = IndexSource(
+      self.__entity_range(startrow, endrow, start_inclusive, end_inclusive),
+      resolve, entity_row_key)
+    offset, page_size = self.page_bounds(query)
+    iterator = QueryIterator(source, offset, page_size, self.__fetch_entity)
+    page = yield iterator.fetch_page()
+    raise gen.Return(page)
 
   def reverse_path(self, key):
     """ Use this function for reversing the key ancestry order.
@@ -1554,7 +1668,7 @@ class DatastoreDistributed():
       filter_info: tuple with filter operators and values.
       order_info: tuple with property name and the sort order.
     Returns:
-      An ordered list of entities matching the query.
+      A QueryPage containing an ordered list of entities matching the query.
     Raises:
       AppScaleDBError: An infinite loop is detected when fetching references.
     """
@@ -1594,71 +1708,56 @@ class DatastoreDistributed():
       if query.compiled_cursor().position_list()[0].start_inclusive() == 1:
         start_inclusive = self._ENABLE_INCLUSIVITY
 
-    limit = self.get_limit(query)
     if startrow > endrow:
-      raise gen.Return([])
+      raise gen.Return(QueryPage([]))
 
-    # Since the validity of each reference is not checked until after the
-    # range query has been performed, we may need to fetch additional
-    # references in order to satisfy the query.
-    entities = []
-    current_limit = limit
-    while True:
-      references = yield self.datastore_batch.range_query(
-        dbconstants.APP_KIND_TABLE,
-        dbconstants.APP_KIND_SCHEMA,
-        startrow,
-        endrow,
-        current_limit,
-        offset=0,
-        start_inclusive=start_inclusive,
-        end_inclusive=end_inclusive
-      )
+    reader = RangeReader(self.datastore_batch)
 
-      new_entities = yield self.__fetch_entities(references)
-      entities.extend(new_entities)
+    @gen.coroutine
+    def fetch_rows(start_key, count, keys_only):
+      range_start = startrow
+      range_start_inclusive = start_inclusive
+      if start_key is not None:
+        range_start = start_key
+        range_start_inclusive = self._DISABLE_INCLUSIVITY
 
-      # If we have enough valid entities to satisfy the query, we're done.
-      if len(entities) >= limit:
-        break
-
-      # If we received fewer references than we asked for, they are exhausted.
-      if len(references) < current_limit:
-        break
-
-      # If all of the references that we fetched were valid, we're done.
-      if len(new_entities) == len(references):
-        break
-
-      invalid_refs = len(references) - len(new_entities)
-
-      # Pad the limit to increase the likelihood of fetching all the valid
-      # references that we need.
-      current_limit = invalid_refs + dbconstants.MAX_GROUPS_FOR_XG
-
-      self.logger.debug('{} references invalid. Fetching {} more references.'
-        .format(invalid_refs, current_limit))
-
-      # Start from the last reference fetched.
-      last_startrow = startrow
-      startrow = references[-1].keys()[0]
-      start_inclusive = self._DISABLE_INCLUSIVITY
-
-      if startrow == last_startrow:
-        raise dbconstants.AppScaleDBError(
-          'An infinite loop was detected while fetching references.')
+      references = yield reader.read(
+        dbconstants.APP_KIND_TABLE, dbconstants.APP_KIND_SCHEMA, range_start,
+        endrow, count, start_inclusive=range_start_inclusive,
+        end_inclusive=end_inclusive)
+      raise gen.Return(references)
 
-    if query.kind() == "__namespace__":
-      entities = [self.default_namespace()] + entities
+    offset, page_size = self.page_bounds(query)
 
-    results = entities[:limit]
+    # The default namespace is not stored, so it is always the first result.
+    is_namespace_query = query.kind() == '__namespace__'
+    if is_namespace_query and offset > 0:
+      offset -= 1
+    elif is_namespace_query:
+      page_size -= 1
 
+    # Since the validity of each reference is not checked until the entities
+    # are fetched, the iterator may need to fetch additional references in
+    # order to satisfy the query.
     # Handle projection queries.
+    transform = None
     if query.property_name_size() > 0:
-      results = self.remove_extra_props(query, results)
+      transform = lambda entities: self.remove_extra_props(query, entities)
+
+    source = IndexSource(fetch_rows, self.__fetch_entities)
+    iterator = QueryIterator(source, offset, page_size, self.__fetch_entity,
+                             skip_by_keys=False, transform=transform)
+    page = yield iterator.fetch_page()
+
+    if is_namespace_query and query.offset() > 0:
+      page.skipped += 1
+      if page.skipped == 1 and not page.entities:
+        page.last_skipped = self.default_namespace()
+    elif is_namespace_query:
+      page.entities.insert(0, self.default_namespace())
 
-    self.logger.debug('Returning {} entities'.format(len(results)))
-    raise gen.Return(results)
+    self.logger.debug('Returning {} entities'.format(len(page.entities)))
+    raise gen.Return(page)
 
   def remove_exists_filters(self, filter_info):
     """ Remove any filters that have EXISTS filters.
@@ -1707,7 +1806,7 @@ class DatastoreDistributed():
       filter_info: tuple with filter operators and values.
       order_info: tuple with property name and the sort order.
     Returns:
-      List of entities retrieved from the given query.
+      A QueryPage of entities retrieved from the given query.
     """
     self.logger.debug('Single Property Query:\n{}'.format(query))
     if query.kind().startswith("__") and \
@@ -1755,8 +1854,6 @@ class DatastoreDistributed():
 
     prefix = self.get_table_prefix(query)
 
-    limit = self.get_limit(query)
-
     if query.has_compiled_cursor() and query.compiled_cursor().position_size():
       cursor = appscale_stub_util.ListCursor(query)
       last_result = cursor._GetLastResult()
@@ -1769,17 +1866,21 @@ class DatastoreDistributed():
     if query.has_end_compiled_cursor():
       end_compiled_cursor = query.end_compiled_cursor()
 
-    # Since the validity of each reference is not checked until after the
-    # range query has been performed, we may need to fetch additional
-    # references in order to satisfy the query.
-    entities = []
-    current_limit = limit
-    while True:
+    reader = RangeReader(self.datastore_batch)
+
+    @gen.coroutine
+    def fetch_rows(start_key, count, keys_only):
+      if start_key is None:
+        start_key = startrow
+
       references = yield self.__apply_filters(
         filter_ops, order_info, property_name, query.kind(), prefix,
-        current_limit, startrow, ancestor=ancestor, query=query,
-        end_compiled_cursor=end_compiled_cursor)
+        count, start_key, ancestor=ancestor, query=query,
+        end_compiled_cursor=end_compiled_cursor, reader=reader)
+      raise gen.Return(references)
 
+    @gen.coroutine
+    def resolve(references):
       potential_entities = yield self.__fetch_entities_dict(references)
 
       # Since the entities may be out of order due to invalid references,
@@ -1798,46 +1899,24 @@ class DatastoreDistributed():
         new_entities = self.__apply_multiple_equality_filters(
           new_entities, multiple_equality_filters)
 
-      entities.extend(new_entities)
-
-      # If we have enough valid entities to satisfy the query, we're done.
-      if len(entities) >= limit:
-        break
-
-      # If we received fewer references than we asked for, they are exhausted.
-      if len(references) < current_limit:
-        break
-
-      # If all of the references that we fetched were valid, we're done.
-      if len(new_entities) == len(references):
-        break
-
-      invalid_refs = len(references) - len(new_entities)
-
-      # Pad the limit to increase the likelihood of fetching all the valid
-      # references that we need.
-      current_limit = invalid_refs + dbconstants.MAX_GROUPS_FOR_XG
-
-      self.logger.debug('{} references invalid. Fetching {} more references.'
-        .format(invalid_refs, current_limit))
-
-      last_startrow = startrow
-      # Start from the last reference fetched.
-      startrow = references[-1].keys()[0]
-
-      if startrow == last_startrow:
-        raise dbconstants.AppScaleDBError(
-          'An infinite loop was detected while fetching references.')
-
-    results = entities[:limit]
+      raise gen.Return(new_entities)
 
     # Handle projection queries.
     # TODO: When the index has been confirmed clean, use those values directly.
+    transform = None
     if query.property_name_size() > 0:
-      results = self.remove_extra_props(query, results)
+      transform = lambda entities: self.remove_extra_props(query, entities)
+
+    offset, page_size = self.page_bounds(query)
+    source = IndexSource(fetch_rows, resolve)
+    # Index entries may refer to entities that were deleted or changed, so
+    # skipped entries are validated as well.
+    iterator = QueryIterator(source, offset, page_size, self.__fetch_entity,
+                             skip_by_keys=False, transform=transform)
+    page = yield iterator.fetch_page()
 
-    self.logger.debug('Returning {} results'.format(len(results)))
-    raise gen.Return(results)
+    self.logger.debug('Returning {} results'.format(len(page.entities)))
+    raise gen.Return(page)
 
   @gen.coroutine
   def __apply_filters(self,
@@ -1851,7 +1930,8 @@ class DatastoreDistributed():
                      force_start_key_exclusive=False,
                      ancestor=None,
                      query=None,
-                     end_compiled_cursor=None):
+                     end_compiled_cursor=None,
+                     reader=None):
     """ Applies property filters in the query.
 
     Args:
@@ -1865,12 +1945,16 @@ class DatastoreDistributed():
       ancestor: Optional query ancestor.
       query: Query object for debugging.
       end_compiled_cursor: A compiled cursor to resume a query.
+      reader: A RangeReader that continues the scan from earlier calls.
     Results:
       Returns a list of entity keys.
     Raises:
       NotImplementedError: For unsupported queries.
       AppScaleMisconfiguredQuery: Bad filters or orderings.
     """
+    if reader is None:
+      reader = RangeReader(self.datastore_batch)
+
     ancestor_filter = None
     if ancestor:
       ancestor_filter = str(encode_index_pb(ancestor.path()))
@@ -1913,9 +1997,9 @@ class DatastoreDistributed():
         endrow = get_index_key_from_params(params)
       if force_start_key_exclusive:
         start_inclusive = False
-      result = yield self.datastore_batch.range_query(
+      result = yield reader.read(
         table_name, column_names, startrow, endrow, limit,
-        offset=0, start_inclusive=start_inclusive, end_inclusive=end_inclusive)
+        start_inclusive=start_inclusive, end_inclusive=end_inclusive)
       raise gen.Return(result)
 
     # This query has a value it bases the query on for a property name
@@ -1996,9 +2080,9 @@ class DatastoreDistributed():
           format([startrow], [endrow]))
         raise gen.Return([])
 
-      ret = yield self.datastore_batch.range_query(
+      ret = yield reader.read(
         table_name, column_names, startrow, endrow, limit,
-        offset=0, start_inclusive=start_inclusive, end_inclusive=end_inclusive)
+        start_inclusive=start_inclusive, end_inclusive=end_inclusive)
       raise gen.Return(ret)
 
     # Here we have two filters and so we set the start and end key to
@@ -2042,9 +2126,9 @@ class DatastoreDistributed():
             self._SEPARATOR + self._TERM_STRING]
           endrow = get_index_key_from_params(params)
 
-        ret = yield self.datastore_batch.range_query(
+        ret = yield reader.read(
           table_name, column_names, startrow, endrow, limit,
-          offset=0, start_inclusive=start_inclusive,
+          start_inclusive=start_inclusive,
           end_inclusive=end_inclusive)
         raise gen.Return(ret)
       if filter_ops[0][0] == datastore_pb.Query_Filter.GREATER_THAN or \
@@ -2121,9 +2205,9 @@ class DatastoreDistributed():
       if startrow > endrow:
         raise gen.Return([])
 
-      result = yield self.datastore_batch.range_query(
+      result = yield reader.read(
         table_name, column_names, startrow, endrow, limit,
-        offset=0, start_inclusive=start_inclusive, end_inclusive=end_inclusive)
+        start_inclusive=start_inclusive, end_inclusive=end_inclusive)
       raise gen.Return(result)
 
     raise gen.Return([])
@@ -2203,13 +2287,12 @@ class DatastoreDistributed():
         operators and values.
       order_info: tuple with property name and the sort order.
     Returns:
-      List of entities retrieved from the given query.
+      A QueryPage of entities retrieved from the given query.
     """
     self.logger.debug('ZigZag Merge Join Query:\n{}'.format(query))
     if not self.is_zigzag_merge_join(query, filter_info, order_info):
       return
     kind = query.kind()
-    limit = self.get_limit(query)
     app_id = clean_app_id(query.app())
 
     # We only use references from the ascending property table.
@@ -2229,25 +2312,18 @@ class DatastoreDistributed():
       for range_ in ranges:
         range_.set_cursor(cursor_path, inclusive=False)
 
-    entities = []
-    while True:
-      reference_hash = yield self._common_refs_from_ranges(ranges, limit)
-      new_entities = yield self.__fetch_and_validate_entity_set(
-        reference_hash, limit, app_id, direction)
-      entities.extend(new_entities)
-
-      # If there are enough entities to satisfy the query, stop fetching.
-      if len(entities) >= limit:
-        break
-
-      # If there weren't enough common references to fulfill the limit, the
-      # references are exhausted.
-      if len(reference_hash) < limit:
-        break
+    @gen.coroutine
+    def validate(reference_hash, count):
+      entities = yield self.__fetch_and_validate_entity_set(
+        reference_hash, count, app_id, direction)
+      raise gen.Return(entities)
 
-    results = entities[:limit]
-    self.logger.debug('Returning {} results'.format(len(results)))
-    raise gen.Return(results)
+    offset, page_size = self.page_bounds(query)
+    source = MergeJoinSource(ranges, self._common_refs_from_ranges, validate)
+    iterator = QueryIterator(source, offset, page_size, self.__fetch_entity)
+    page = yield iterator.fetch_page()
+    self.logger.debug('Returning {} results'.format(len(page.entities)))
+    raise gen.Return(page)
 
   def does_composite_index_exist(self, query):
     """ Checks to see if the query has a composite index that can implement
@@ -2475,7 +2551,7 @@ class DatastoreDistributed():
       filter_info: dictionary mapping property names to tuples of
         filter operators and values.
     Returns:
-      List of entities retrieved from the given query.
+      A QueryPage of entities retrieved from the given query.
     """
     self.logger.debug('Composite Query:\n{}'.format(query))
     start_inclusive = True
@@ -2504,22 +2580,31 @@ class DatastoreDistributed():
 
     table_name = dbconstants.COMPOSITE_TABLE
     column_names = dbconstants.COMPOSITE_SCHEMA
-    limit = self.get_limit(query)
 
     if startrow > endrow:
-      raise gen.Return([])
+      raise gen.Return(QueryPage([]))
 
     # TODO: Check if we should do this for other comparisons.
     multiple_equality_filters = self.__get_multiple_equality_filters(
       query.filter_list())
 
-    entities = []
-    current_limit = limit
-    while True:
-      references = yield self.datastore_batch.range_query(
-        table_name, column_names, startrow, endrow, current_limit,
-        offset=0, start_inclusive=start_inclusive, end_inclusive=True)
+    reader = RangeReader(self.datastore_batch)
+
+    @gen.coroutine
+    def fetch_rows(start_key, count, keys_only):
+      range_start = startrow
+      range_start_inclusive = start_inclusive
+      if start_key is not None:
+        range_start = start_key
+        range_start_inclusive = False
 
+      references = yield reader.read(
+        table_name, column_names, range_start, endrow, count,
+        start_inclusive=range_start_inclusive, end_inclusive=True)
+      raise gen.Return(references)
+
+    @gen.coroutine
+    def resolve(references):
       # This is a projection query.
       if query.property_name_size() > 0:
         potential_entities = self._extract_entities_from_composite_indexes(
@@ -2533,40 +2618,17 @@ class DatastoreDistributed():
         potential_entities = self.__apply_multiple_equality_filters(
           potential_entities, multiple_equality_filters)
 
-      entities.extend(potential_entities)
-
-      # If we have enough valid entities to satisfy the query, we're done.
-      if len(entities) >= limit:
-        break
-
-      # If we received fewer references than we asked for, they are exhausted.
-      if len(references) < current_limit:
-        break
-
-      # If all of the references that we fetched were valid, we're done.
-      if len(potential_entities) == len(references):
-        break
+      raise gen.Return(potential_entities)
 
-      invalid_refs = len(references) - len(potential_entities)
-
-      # Pad the limit to increase the likelihood of fetching all the valid
-      # references that we need.
-      current_limit = invalid_refs + dbconstants.MAX_GROUPS_FOR_XG
-
-      self.logger.debug('{} entities do not match query. '
-        'Fetching {} more references.'.format(invalid_refs, current_limit))
-
-      last_startrow = startrow
-      # Start from the last reference fetched.
-      startrow = references[-1].keys()[0]
-
-      if startrow == last_startrow:
-        raise dbconstants.AppScaleDBError(
-          'An infinite loop was detected while fetching references.')
-
-    results = entities[:limit]
-    self.logger.debug('Returning {} results'.format(len(results)))
-    raise gen.Return(results)
+    # Index entries may refer to entities that were deleted or changed, so
+    # skipped entries are resolved as well.
+    offset, page_size = self.page_bounds(query)
+    source = IndexSource(fetch_rows, resolve)
+    iterator = QueryIterator(source, offset, page_size, self.__fetch_entity,
+                             skip_by_keys=False)
+    page = yield iterator.fetch_page()
+    self.logger.debug('Returning {} results'.format(len(page.entities)))
+    raise gen.Return(page)
 
   def __get_multiple_equality_filters(self, filter_list):
     """ Returns filters from the query that contain multiple equality
@@ -2860,7 +2922,7 @@ class DatastoreDistributed():
       filter_info: dictionary mapping property names to tuples of
         filter operators and values.
     Returns:
-      List of entities retrieved from the given query.
+      A QueryPage of entities retrieved from the given query.
     """
     if self.does_composite_index_exist(query):
       result = yield self.composite_v2(query, filter_info)
@@ -2888,7 +2950,7 @@ class DatastoreDistributed():
     Args:
       query: A datastore_pb.Query protocol buffer.
     Returns:
-      Result set.
+      A QueryPage.
     """
     if query.has_transaction() and not query.has_ancestor():
       raise apiproxy_errors.ApplicationError(
@@ -2924,11 +2986,11 @@ class DatastoreDistributed():
       raise gen.Return(result)
 
     for strategy in DatastoreDistributed._QUERY_STRATEGIES:
-      results = yield strategy(self, query, filter_info, order_info)
-      if results or results == []:
-        raise gen.Return(results)
+      page = yield strategy(self, query, filter_info, order_info)
+      if page is not None:
+        raise gen.Return(page)
 
-    raise gen.Return([])
+    raise gen.Return(QueryPage([]))
 
   @gen.coroutine
   def _dynamic_run_query(self, query, query_result):
@@ -2939,28 +3001,29 @@ class DatastoreDistributed():
       query: The query to run.
       query_result: The response given to the application server.
     """
-    result = yield self.__get_query_results(query)
-    last_entity = None
-    count = 0
-    offset = query.offset()
-    if result:
-      query_result.set_skipped_results(len(result) - offset)
-      # Last entity is used for the cursor. It needs to be set before
-      # applying the offset.
-      last_entity = result[-1]
-      count = len(result)
-      result = result[offset:]
-      if query.has_limit():
-        result = result[:query.limit()]
-
-    cur = UnprocessedQueryCursor(query, result, last_entity)
-    cur.PopulateQueryResult(count, query.offset(), query_result)
+    page = yield self.__get_query_results(query)
+    result = page.entities
+    if query.has_limit():
+      result = result[:query.limit()]
+
+    # The cursor is built from the last result consumed, even if it was
+    # skipped in order to satisfy the offset.
+    cur = UnprocessedQueryCursor(query, result, page.last_entity)
+    cur.PopulateQueryResult(page.count, query.offset(), query_result)
 
     # If we have less than the amount of entities we request there are no
     # more results for this query.
-    if count < self.get_limit(query):
+    if page.count < self.get_limit(query):
       query_result.set_more_results(False)
 
+    # Keep the iterator so that the next batch can resume from its position.
+    # Reads within transactions are recorded per query, so they are not kept.
+    if (query_result.more_results() and page.iterator is not None and
+        not page.iterator.exhausted and not query.has_transaction()):
+      cursor_id = self.query_cursors.add(query.app(), query, page.iterator)
+      query_result.mutable_cursor().set_app(query.app())
+      query_result.mutable_cursor().set_cursor(cursor_id)
+
     # If there were no results then we copy the last cursor so future queries
     # can start off from the same place.
     if query.has_compiled_cursor() and not query_result.has_compiled_cursor():
@@ -2969,6 +3032,34 @@ class DatastoreDistributed():
       query_result.mutable_compiled_cursor().\
         CopyFrom(datastore_pb.CompiledCursor())
 
+  @gen.coroutine
+  def _dynamic_next(self, next_request, query_result):
+    """ Resumes a query from a live iterator and populates the next batch.
+
+    Args:
+      next_request: A datastore_pb.NextRequest.
+      query_result: The response given to the application server.
+    Raises:
+      CursorNotFound if the cursor is not kept by this server.
+    """
+    cursor = next_request.cursor()
+    query, iterator = self.query_cursors.claim(cursor.app(), cursor.cursor())
+
+    count = self._MAXIMUM_RESULTS
+    if next_request.has_count():
+      count = min(max(next_request.count(), 1), self._MAXIMUM_RESULTS)
+
+    page = yield iterator.fetch_page(count)
+    cur = UnprocessedQueryCursor(query, page.entities, page.last_entity)
+    cur.PopulateQueryResult(page.count, 0, query_result)
+
+    if page.count < count or iterator.exhausted:
+      query_result.set_more_results(False)
+    else:
+      self.query_cursors.release(cursor.cursor(), cursor.app(), query,
+                                 iterator)
+      query_result.mutable_cursor().CopyFrom(cursor)
+
   @gen.coroutine
   def dynamic_add_actions(self, app_id, request, service_id, version_id):
     """ Adds tasks to enqueue upon committing the transaction.
@@ -3068,8 +3159,7 @@ class DatastoreDistributed():
       raise dbconstants.TooManyGroupsException(
         'Too many groups in transaction')
 
-    indices = yield self.datastore_batch.get_indices(app)
-    composite_indices = [entity_pb.CompositeIndex(index) for index in indices]
+    composite_indices = yield self.get_composite_indexes(app)
 
     decoded_groups = [entity_pb.Reference(group) for group in tx_groups]
     self.transaction_manager.set_groups(app, txn, decoded_groups)
@@ -3082,98 +3172,91 @@ class DatastoreDistributed():
       raise Timeout('Unable to acquire entity group locks')
 
     try:
-      try:
-        group_txids = yield self.datastore_batch.group_updates(
-          metadata['reads'])
-      except dbconstants.TRANSIENT_CASSANDRA_ERRORS:
-        lock.release()
+      group_txids = yield self.datastore_batch.group_updates(
+        metadata['reads'])
+    except dbconstants.TRANSIENT_CASSANDRA_ERRORS:
+      yield lock.release()
+      self.transaction_manager.delete_transaction_id(app, txn)
+      raise dbconstants.AppScaleDBConnectionError(
+        'Unable to fetch group updates')
+
+    for group_txid in group_txids:
+      if group_txid in metadata['in_progress'] or group_txid > txn:
+        yield lock.release()
         self.transaction_manager.delete_transaction_id(app, txn)
-        raise dbconstants.AppScaleDBConnectionError(
-          'Unable to fetch group updates')
-
-      for group_txid in group_txids:
-        if group_txid in metadata['in_progress'] or group_txid > txn:
-          lock.release()
-          self.transaction_manager.delete_transaction_id(app, txn)
-          raise dbconstants.ConcurrentModificationException(
-            'A group was modified after this transaction was started.')
-
-      # Fetch current values so we can remove old indices.
-      entity_table_keys = [encode_entity_table_key(key)
-                           for key, _ in metadata['puts'].iteritems()]
-      entity_table_keys.extend([encode_entity_table_key(key)
-                                for key in metadata['deletes']])
-      try:
-        current_values = yield self.datastore_batch.batch_get_entity(
-          dbconstants.APP_ENTITY_TABLE, entity_table_keys, APP_ENTITY_SCHEMA)
-      except dbconstants.AppScaleDBConnectionError:
-        lock.release()
-        self.transaction_manager.delete_transaction_id(app, txn)
-        raise
-
-      batch = []
-      entity_changes = []
-      for encoded_key, encoded_entity in metadata['puts'].iteritems():
-        key = entity_pb.Reference(encoded_key)
-        entity_table_key = encode_entity_table_key(key)
-        current_value = None
-        if current_values[entity_table_key]:
-          current_value = entity_pb.EntityProto(
-            current_values[entity_table_key][APP_ENTITY_SCHEMA[0]])
-
-        entity = entity_pb.EntityProto(encoded_entity)
-        mutations = mutations_for_entity(entity, txn, current_value,
-                                         composite_indices)
-        batch.extend(mutations)
+        raise dbconstants.ConcurrentModificationException(
+          'A group was modified after this transaction was started.')
+
+    # Fetch current values so we can remove old indices.
+    entity_table_keys = [encode_entity_table_key(key)
+                         for key, _ in metadata['puts'].iteritems()]
+    entity_table_keys.extend([encode_entity_table_key(key)
+                              for key in metadata['deletes']])
+    try:
+      current_values = yield self.datastore_batch.batch_get_entity(
+        dbconstants.APP_ENTITY_TABLE, entity_table_keys, APP_ENTITY_SCHEMA)
+    except dbconstants.AppScaleDBConnectionError:
+      yield lock.release()
+      self.transaction_manager.delete_transaction_id(app, txn)
+      raise
+
+    batch = []
+    entity_changes = []
+    for encoded_key, encoded_entity in metadata['puts'].iteritems():
+      key = entity_pb.Reference(encoded_key)
+      entity_table_key = encode_entity_table_key(key)
+      current_value = None
+      if current_values[entity_table_key]:
+        current_value = entity_pb.EntityProto(
+          current_values[entity_table_key][APP_ENTITY_SCHEMA[0]])
 
-        entity_changes.append({'key': key, 'old': current_value,
-                               'new': entity})
+      entity = entity_pb.EntityProto(encoded_entity)
+      mutations = mutations_for_entity(entity, txn, current_value,
+                                       composite_indices)
+      batch.extend(mutations)
 
-      for key in metadata['deletes']:
-        entity_table_key = encode_entity_table_key(key)
-        if not current_values[entity_table_key]:
-          continue
+      entity_changes.append({'key': key, 'old': current_value,
+                             'new': entity})
 
-        current_value = entity_pb.EntityProto(
-          current_values[entity_table_key][APP_ENTITY_SCHEMA[0]])
+    for key in metadata['deletes']:
+      entity_table_key = encode_entity_table_key(key)
+      if not current_values[entity_table_key]:
+        continue
 
-        deletions = deletions_for_entity(current_value, composite_indices)
-        batch.extend(deletions)
+      current_value = entity_pb.EntityProto(
+        current_values[entity_table_key][APP_ENTITY_SCHEMA[0]])
 
-        entity_changes.append({'key': key, 'old': current_value, 'new': None})
+      deletions = deletions_for_entity(current_value, composite_indices)
+      batch.extend(deletions)
 
-      for group in groups_mutated:
-        batch.append(
-          {'table': 'group_updates', 'key': bytearray(group),
-           'last_update': txn})
+      entity_changes.append({'key': key, 'old': current_value, 'new': None})
 
-      if batch_size(batch) > LARGE_BATCH_THRESHOLD:
-        try:
-          yield self.datastore_batch.large_batch(app, batch, entity_changes,
-                                                 txn)
-        except BatchNotApplied as error:
-          # If the "applied" switch has not been flipped, the lock can be
-          # released. The transaction ID is kept so that the groomer can
-          # clean up the batch tables.
-          lock.release()
-          raise dbconstants.AppScaleDBConnectionError(str(error))
-      else:
-        try:
-          yield self.datastore_batch.normal_batch(batch, txn)
-        except dbconstants.AppScaleDBConnectionError:
-          # Since normal batches are guaranteed to be atomic, the lock can
-          # be released.
-          lock.release()
-          self.transaction_manager.delete_transaction_id(app, txn)
-          raise
+    for group in groups_mutated:
+      batch.append(
+        {'table': 'group_updates', 'key': bytearray(group),
+         'last_update': txn})
 
-      lock.release()
+    if batch_size(batch) > LARGE_BATCH_THRESHOLD:
+      try:
+        yield self.datastore_batch.large_batch(app, batch, entity_changes,
+                                               txn)
+      except BatchNotApplied as error:
+        # If the "applied" switch has not been flipped, the lock can be
+        # released. The transaction ID is kept so that the groomer can
+        # clean up the batch tables.
+        yield lock.release()
+        raise dbconstants.AppScaleDBConnectionError(str(error))
+    else:
+      try:
+        yield self.datastore_batch.normal_batch(batch, txn)
+      except dbconstants.AppScaleDBConnectionError:
+        # Since normal batches are guaranteed to be atomic, the lock can
+        # be released.
+        yield lock.release()
+        self.transaction_manager.delete_transaction_id(app, txn)
+        raise
 
-    finally:
-      # In case of failure entity group lock should stay acquired
-      # as transaction groomer will handle it later.
-      # But tornado lock must be released.
-      lock.ensure_release_tornado_lock()
+    yield lock.release()
 
     self.transaction_manager.delete_transaction_id(app, txn)
 
@@ -3239,3 +3322,7 @@ class DatastoreDistributed():
     # Discard any allocated blocks if disconnected from ZooKeeper.
     if state in [KazooState.LOST, KazooState.SUSPENDED]:
       self.scattered_allocators.clear()
+
+    # Index changes may be missed while disconnected.
+    if state == KazooState.LOST:
+      self.composite_index_cache.clear()
@@ -23,6 +23,7 @@ from appscale.taskqueue.distributed_tq import TaskName
 from . import helper_functions
 from .cassandra_env import cassandra_interface
 from .datastore_distributed import DatastoreDistributed
+from .range_iterator import RangeReader
 from .utils import get_composite_indexes_rows
 from .zkappscale import zktransaction as zk
 from .zkappscale.entity_lock import EntityLock
@@ -123,6 +124,7 @@ class DatastoreGroomer(threading.Thread):
     self.table_name = table_name
     self.db_access = None
     self.ds_access = None
+    self.range_reader = None
     self.datastore_path = ds_path
     self.stats = {}
     self.namespace_info = {}
@@ -171,6 +173,27 @@ class DatastoreGroomer(threading.Thread):
     """
     return self.zoo_keeper.get_lock_with_path(zk.DS_GROOM_LOCK_PATH)
 
+  def read_range(self, table_name, column_names, start_key, end_key):
+    """ Reads the batch of rows that follows a key.
+
+    When the start key is the last key of the previous batch, the read
+    continues the same database scan.
+
+    Args:
+      table_name: A string specifying the table to read.
+      column_names: A list of columns to read.
+      start_key: A string specifying the (exclusive) start of the range.
+      end_key: A string specifying the end of the range.
+    Returns:
+      A list of rows.
+    """
+    if self.range_reader is None:
+      self.range_reader = RangeReader(self.db_access)
+
+    read_sync = tornado_synchronous(self.range_reader.read)
+    return read_sync(table_name, column_names, start_key, end_key,
+                     self.BATCH_SIZE, start_inclusive=False)
+
   def get_entity_batch(self, last_key):
     """ Gets a batch of entites to operate on.
 
@@ -179,9 +202,8 @@ class DatastoreGroomer(threading.Thread):
     Returns:
       A list of entities.
     """
-    return self.db_access.range_query_sync(
-      dbconstants.APP_ENTITY_TABLE, dbconstants.APP_ENTITY_SCHEMA,
-      last_key, "", self.BATCH_SIZE, start_inclusive=False)
+    return self.read_range(dbconstants.APP_ENTITY_TABLE,
+                           dbconstants.APP_ENTITY_SCHEMA, last_key, "")
 
   def reset_statistics(self):
     """ Reinitializes statistics. """
@@ -334,7 +356,8 @@ class DatastoreGroomer(threading.Thread):
 
     group_key = self.guess_group_from_table_key(entity_key)
     entity_lock = EntityLock(self.zoo_keeper.handle, [group_key])
-    with entity_lock:
+    yield entity_lock.acquire()
+    try:
       entities = self.fetch_entity_dict_for_references(references)
 
       refs_to_delete = []
@@ -354,6 +377,8 @@ class DatastoreGroomer(threading.Thread):
       except Exception:
         logger.exception('Unable to delete indexes')
         self.index_entries_delete_failures += 1
+    finally:
+      yield entity_lock.release()
 
   @tornado_synchronous
   @gen.coroutine
@@ -373,7 +398,8 @@ class DatastoreGroomer(threading.Thread):
 
     group_key = self.guess_group_from_table_key(entity_key)
     entity_lock = EntityLock(self.zoo_keeper.handle, [group_key])
-    with entity_lock:
+    yield entity_lock.acquire()
+    try:
       entities = self.fetch_entity_dict_for_references([reference])
       if entity_key not in entities:
         index_to_delete = reference.keys()[0]
@@ -386,6 +412,8 @@ class DatastoreGroomer(threading.Thread):
         except dbconstants.AppScaleDBConnectionError:
           logger.exception('Unable to delete index.')
           self.index_entries_delete_failures += 1
+    finally:
+      yield entity_lock.release()
 
   def insert_scatter_indexes(self, entity_key, path, scatter_prop):
     """ Writes scatter property references to the index tables.
@@ -517,14 +545,8 @@ class DatastoreGroomer(threading.Thread):
         cassandra_interface.IndexStates.SCRUB_IN_PROGRESS)
 
     while True:
-      references = self.db_access.range_query_sync(
-        table_name=table_name,
-        column_names=dbconstants.PROPERTY_SCHEMA,
-        start_key=start_key,
-        end_key=end_key,
-        limit=self.BATCH_SIZE,
-        start_inclusive=False,
-      )
+      references = self.read_range(table_name, dbconstants.PROPERTY_SCHEMA,
+                                   start_key, end_key)
       if len(references) == 0:
         break
 
@@ -575,14 +597,8 @@ class DatastoreGroomer(threading.Thread):
       start_key = self.groomer_state[1]
 
     while True:
-      references = self.db_access.range_query_sync(
-        table_name=table_name,
-        column_names=dbconstants.APP_KIND_SCHEMA,
-        start_key=start_key,
-        end_key=end_key,
-        limit=self.BATCH_SIZE,
-        start_inclusive=False,
-      )
+      references = self.read_range(table_name, dbconstants.APP_KIND_SCHEMA,
+                                   start_key, end_key)
       if len(references) == 0:
         break
 
@@ -1076,6 +1092,7 @@ class DatastoreGroomer(threading.Thread):
     """
     self.db_access = appscale_datastore_batch.DatastoreFactory.getDatastore(
       self.table_name)
+    self.range_reader = RangeReader(self.db_access)
     transaction_manager = TransactionManager(self.zoo_keeper.handle)
     self.ds_access = DatastoreDistributed(
       self.db_access, transaction_manager, zookeeper=self.zoo_keeper)
@@ -0,0 +1,408 @@
+""" Streams query results in pages without materializing skipped results. """
+
+import random
+import time
+from collections import OrderedDict
+
+from tornado import gen
+
+from appscale.datastore.dbconstants import AppScaleDBError, MAX_GROUPS_FOR_XG
+
+
+class QueryPage(object):
+  """ The results of fetching a single page for a query. """
+  __slots__ = ['entities', 'skipped', 'last_skipped', 'iterator']
+
+  def __init__(self, entities, skipped=0, last_skipped=None):
+    """ Creates a new QueryPage.
+
+    Args:
+      entities: A list of encoded entities that belong in the page.
+      skipped: An integer specifying the number of results that were skipped
+        in order to satisfy the query's offset.
+      last_skipped: An encoded entity or None. It is the last result that was
+        skipped, and it is only defined when the page is empty.
+    """
+    self.entities = entities
+    self.skipped = skipped
+    self.last_skipped = last_skipped
+
+    # The iterator that produced the page. It can be used to fetch the
+    # following page.
+    self.iterator = None
+
+  @property
+  def count(self):
+    """ The number of results that were consumed by this page. """
+    return self.skipped + len(self.entities)
+
+  @property
+  def last_entity(self):
+    """ The last result consumed. It is used to build the query cursor. """
+    if self.entities:
+      return self.entities[-1]
+
+    return self.last_skipped
+
+
+def index_reference(row):
+  """ Extracts the entity key that an index row references.
+
+  Args:
+    row: A dictionary mapping an index key to a reference value.
+  Returns:
+    A string specifying an entity table key.
+  """
+  return row.values()[0]['reference']
+
+
+def entity_row_key(row):
+  """ Extracts the entity key from an entity table row.
+
+  Args:
+    row: A dictionary mapping an entity key to its columns.
+  Returns:
+    A string specifying an entity table key.
+  """
+  return row.keys()[0]
+
+
+class IndexSource(object):
+  """ Pages through a range of rows that reference entities. """
+  def __init__(self, fetch_rows, resolve, reference=index_reference):
+    """ Creates a new IndexSource.
+
+    Args:
+      fetch_rows: A coroutine that accepts a start key (None for the initial
+        position), a row count, and a keys_only flag. Start keys that are
+        defined should be treated as exclusive. It returns a list of rows.
+      resolve: A coroutine that accepts a list of rows and returns the
+        encoded entities that are valid for the query.
+      reference: A function that accepts a row and returns the entity key it
+        refers to, or None if the row does not match the query.
+    """
+    self.exhausted = False
+    self._fetch_rows = fetch_rows
+    self._resolve = resolve
+    self._reference = reference
+    self._last_key = None
+
+  @gen.coroutine
+  def next_references(self, count):
+    """ Retrieves entity keys without fetching the entities.
+
+    Args:
+      count: An integer specifying the number of rows to read.
+    Returns:
+      A list of entity keys.
+    """
+    rows = yield self._next_rows(count, keys_only=True)
+    references = [self._reference(row) for row in rows]
+    raise gen.Return([reference for reference in references
+                      if reference is not None])
+
+  @gen.coroutine
+  def next_entities(self, count):
+    """ Retrieves valid entities.
+
+    Args:
+      count: An integer specifying the number of rows to read.
+    Returns:
+      A list of encoded entities.
+    """
+    rows = yield self._next_rows(count, keys_only=False)
+    entities = yield self._resolve(rows)
+    raise gen.Return(entities)
+
+  @gen.coroutine
+  def _next_rows(self, count, keys_only):
+    """ Reads the next set of rows and advances the position in the range.
+
+    Args:
+      count: An integer specifying the number of rows to read.
+      keys_only: A boolean indicating that only row keys are needed.
+    Returns:
+      A list of rows.
+    Raises:
+      AppScaleDBError if the position does not advance.
+    """
+    rows = yield self._fetch_rows(self._last_key, count, keys_only)
+    if len(rows) < count:
+      self.exhausted = True
+
+    if rows:
+      last_key = rows[-1].keys()[0]
+      if last_key == self._last_key:
+        raise AppScaleDBError(
+          'An infinite loop was detected while fetching references.')
+
+      self._last_key = last_key
+
+    raise gen.Return(rows)
+
+
+class MergeJoinSource(object):
+  """ Pages through the references that are common to multiple ranges. """
+  def __init__(self, ranges, common_refs, validate):
+    """ Creates a new MergeJoinSource.
+
+    Args:
+      ranges: A list of RangeIterator objects.
+      common_refs: A coroutine that accepts the ranges and a limit and returns
+        a dictionary mapping entity keys to index entries.
+      validate: A coroutine that accepts a dictionary of references and a
+        limit and returns a list of valid encoded entities.
+    """
+    self.exhausted = False
+    self._ranges = ranges
+    self._common_refs = common_refs
+    self._validate = validate
+
+  @gen.coroutine
+  def next_references(self, count):
+    """ Retrieves entity keys without fetching the entities.
+
+    Args:
+      count: An integer specifying the number of references to find.
+    Returns:
+      A list of entity keys.
+    """
+    reference_hash = yield self._next_hash(count)
+    raise gen.Return(sorted(reference_hash.keys()))
+
+  @gen.coroutine
+  def next_entities(self, count):
+    """ Retrieves valid entities.
+
+    Args:
+      count: An integer specifying the number of references to find.
+    Returns:
+      A list of encoded entities.
+    """
+    reference_hash = yield self._next_hash(count)
+    entities = yield self._validate(reference_hash, count)
+    raise gen.Return(entities)
+
+  @gen.coroutine
+  def _next_hash(self, count):
+    """ Finds the next set of common references.
+
+    Args:
+      count: An integer specifying the number of references to find.
+    Returns:
+      A dictionary mapping entity keys to index entries.
+    """
+    reference_hash = yield self._common_refs(self._ranges, count)
+    if len(reference_hash) < count:
+      self.exhausted = True
+
+    raise gen.Return(reference_hash)
+
+
+class QueryIterator(object):
+  """ Fetches pages of results from a source.
+
+  The offset is skipped using entity keys wherever possible, and entities are
+  only fetched until the page is full. Entities that were fetched but did not
+  fit in a page are kept so that later pages resume from the same position.
+  """
+  # The maximum number of keys to read at a time when skipping results.
+  SKIP_BATCH_SIZE = 1000
+
+  def __init__(self, source, offset, page_size, fetch_entity,
+               skip_by_keys=True, transform=None):
+    """ Creates a new QueryIterator.
+
+    Args:
+      source: An IndexSource or MergeJoinSource.
+      offset: An integer specifying the number of results to skip.
+      page_size: An integer specifying the maximum number of results to
+        return after the offset.
+      fetch_entity: A coroutine that accepts an entity key and returns the
+        encoded entity or None.
+      skip_by_keys: A boolean indicating that every reference returned by the
+        source is a result. When references can be stale or the query filters
+        results after fetching them, entities are fetched for skipped results
+        as well.
+      transform: A function that accepts a list of encoded entities for a
+        page and returns the list that should be given to the client.
+    """
+    self._source = source
+    self._offset = offset
+    self._page_size = page_size
+    self._fetch_entity = fetch_entity
+    self._skip_by_keys = skip_by_keys
+    self._transform = transform
+    self._buffer = []
+
+  @property
+  def exhausted(self):
+    """ Indicates that there are no more results to fetch. """
+    return self._source.exhausted and not self._buffer
+
+  @gen.coroutine
+  def fetch_page(self, page_size=None):
+    """ Skips any remaining offset and fetches the results that fill a page.
+
+    Args:
+      page_size: An integer that overrides the initial page size.
+    Returns:
+      A QueryPage.
+    """
+    if page_size is None:
+      page_size = self._page_size
+
+    skipped, last_skipped, last_skipped_key = yield self._skip()
+
+    entities = self._buffer[:page_size]
+    self._buffer = self._buffer[page_size:]
+    to_fetch = page_size - len(entities)
+    while len(entities) < page_size and not self._source.exhausted:
+      new_entities = yield self._source.next_entities(to_fetch)
+      entities.extend(new_entities)
+      invalid_refs = len(new_entities) < to_fetch
+
+      # Pad the number of references to fetch to increase the likelihood of
+      # fetching all the valid references that are needed.
+      to_fetch = page_size - len(entities)
+      if invalid_refs:
+        to_fetch += MAX_GROUPS_FOR_XG
+
+    self._buffer.extend(entities[page_size:])
+    entities = entities[:page_size]
+
+    # The cursor is built from the last result consumed, so the last skipped
+    # entity is only needed when the offset consumes every result.
+    if not entities and last_skipped_key is not None:
+      last_skipped = yield self._fetch_entity(last_skipped_key)
+
+    if self._transform is not None:
+      entities = self._transform(entities)
+
+    page = QueryPage(entities, skipped, last_skipped)
+    page.iterator = self
+    raise gen.Return(page)
+
+  @gen.coroutine
+  def _skip(self):
+    """ Skips the results that remain in the offset.
+
+    Returns:
+      A tuple containing the number of results skipped, the last skipped
+      entity, and the key of the last skipped entity.
+    """
+    skipped = 0
+    last_skipped = None
+    last_skipped_key = None
+    while skipped < self._offset and not self._source.exhausted:
+      batch_size = min(self._offset - skipped, self.SKIP_BATCH_SIZE)
+      if self._skip_by_keys:
+        references = yield self._source.next_references(batch_size)
+        if references:
+          last_skipped_key = references[-1]
+        skipped += len(references)
+      else:
+        entities = yield self._source.next_entities(batch_size)
+        if entities:
+          last_skipped = entities[-1]
+        skipped += len(entities)
+
+    self._offset = 0
+    raise gen.Return((skipped, last_skipped, last_skipped_key))
+
+
+class CursorNotFound(Exception):
+  """ Indicates that a query cursor has expired or belongs to another server.
+  """
+  pass
+
+
+class CursorTable(object):
+  """ Keeps live query iterators so that later batches can resume them. """
+  # The maximum number of cursors to keep.
+  MAX_CURSORS = 1000
+
+  # The number of seconds a cursor can remain unused before it is discarded.
+  CURSOR_TTL = 60
+
+  def __init__(self, max_cursors=MAX_CURSORS, ttl=CURSOR_TTL):
+    """ Creates a new CursorTable.
+
+    Args:
+      max_cursors: An integer specifying the maximum number of cursors.
+      ttl: An integer specifying how long unused cursors are kept.
+    """
+    self._max_cursors = max_cursors
+    self._ttl = ttl
+
+    # Maps cursor IDs to (project_id, query, iterator, last_used) tuples in
+    # the order they were last used.
+    self._cursors = OrderedDict()
+
+  def __len__(self):
+    """ The number of live cursors. """
+    return len(self._cursors)
+
+  def add(self, project_id, query, iterator):
+    """ Stores an iterator so that it can be resumed.
+
+    Args:
+      project_id: A string specifying a project ID.
+      query: A datastore_pb.Query.
+      iterator: A QueryIterator.
+    Returns:
+      An integer specifying the cursor ID.
+    """
+    self._evict()
+
+    # IDs are random so that they are unlikely to refer to a cursor on a
+    # different datastore server.
+    cursor_id = random.getrandbits(63)
+    while cursor_id in self._cursors:
+      cursor_id = random.getrandbits(63)
+
+    self.release(cursor_id, project_id, query, iterator)
+    return cursor_id
+
+  def claim(self, project_id, cursor_id):
+    """ Removes a cursor from the table so that it can be resumed.
+
+    Args:
+      project_id: A string specifying a project ID.
+      cursor_id: An integer specifying the cursor ID.
+    Returns:
+      A tuple containing the query and the QueryIterator.
+    Raises:
+      CursorNotFound if the table does not contain the cursor.
+    """
+    self._evict()
+    # Requests for other projects must not remove the cursor.
+    entry = self._cursors.get(cursor_id)
+    if entry is None or entry[0] != project_id:
+      raise CursorNotFound('Cursor {} not found'.format(cursor_id))
+
+    _, query, iterator, _ = self._cursors.pop(cursor_id)
+    return query, iterator
+
+  def release(self, cursor_id, project_id, query, iterator):
+    """ Returns a claimed cursor to the table.
+
+    Args:
+      cursor_id: An integer specifying the cursor ID.
+      project_id: A string specifying a project ID.
+      query: A datastore_pb.Query.
+      iterator: A QueryIterator.
+    """
+    self._cursors[cursor_id] = (project_id, query, iterator, time.time())
+    while len(self._cursors) > self._max_cursors:
+      self._cursors.popitem(last=False)
+
+  def _evict(self):
+    """ Removes cursors that have not been used recently. """
+    oldest_allowed = time.time() - self._ttl
+    while self._cursors:
+      cursor_id = next(iter(self._cursors))
+      if self._cursors[cursor_id][-1] >= oldest_allowed:
+        break
+
+      del self._cursors[cursor_id]
@@ -240,3 +240,83 @@ class RangeIterator(object):
         raise ValueError
 
     return entry
+
+
+class RangeReader(object):
+  """ Reads consecutive pages of key ranges.
+
+  Reads that continue from the last key of the previous read resume the
+  database's range scan instead of starting a new query at that key.
+  """
+  def __init__(self, db):
+    """ Creates a new RangeReader.
+
+    Args:
+      db: A database interface object.
+    """
+    self._db = db
+
+    # The arguments that started the current scan.
+    self._scan = None
+
+    # The position within the current scan.
+    self._token = None
+    self._last_key = None
+    self._exhausted = False
+
+  @gen.coroutine
+  def read(self, table_name, column_names, start_key, end_key, count,
+           start_inclusive=True, end_inclusive=True):
+    """ Retrieves rows from a range.
+
+    Args:
+      table_name: A string specifying the table to read.
+      column_names: A list of columns to read.
+      start_key: A string specifying the start of the range.
+      end_key: A string specifying the end of the range.
+      count: An integer specifying the maximum number of rows to read.
+      start_inclusive: A boolean indicating that the start key can be read.
+      end_inclusive: A boolean indicating that the end key can be read.
+    Returns:
+      A list of rows in the same format as range_query.
+    """
+    resuming = (self._scan is not None and
+                self._scan[:2] == (table_name, column_names) and
+                self._scan[3] == end_key and
+                self._scan[5] == end_inclusive and
+                start_key == self._last_key and not start_inclusive)
+    if resuming and self._exhausted:
+      raise gen.Return([])
+
+    if not resuming:
+      self._scan = (table_name, column_names, start_key, end_key,
+                    start_inclusive, end_inclusive)
+      self._token = None
+      self._last_key = None
+
+    table_name, column_names, scan_start, end_key, scan_start_inclusive, \
+      end_inclusive = self._scan
+
+    rows = []
+    token = self._token
+    while len(rows) < count:
+      page, token = yield self._db.range_scan(
+        table_name, column_names, scan_start, end_key, count - len(rows),
+        start_inclusive=scan_start_inclusive, end_inclusive=end_inclusive,
+        token=token)
+      rows.extend(page)
+      if token is None:
+        break
+
+    # A page can include more keys than requested when some keys do not have
+    # every column. Those reads cannot be resumed.
+    if len(rows) > count:
+      rows = rows[:count]
+      self._scan = None
+
+    self._token = token
+    self._exhausted = token is None
+    if rows:
+      self._last_key = rows[-1].keys()[0]
+
+    raise gen.Return(rows)
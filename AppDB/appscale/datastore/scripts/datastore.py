@@ -23,10 +23,14 @@ from kazoo.exceptions import NodeExistsError
 from tornado import gen
 from tornado.httpclient import AsyncHTTPClient
 from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
 from tornado.options import options
+from tornado.process import fork_processes
 from .. import dbconstants
 from ..appscale_datastore_batch import DatastoreFactory
+from ..cassandra_env.entity_id_allocator import DEFAULT_RESERVATION_SIZE
 from ..datastore_distributed import DatastoreDistributed
+from ..query_iterator import CursorNotFound
 from ..utils import (clean_app_id,
                      logger,
                      UnprocessedQueryResult)
@@ -223,6 +227,8 @@ class MainHandler(tornado.web.RequestHandler):
         app_id, http_request_data)
     elif method == "RunQuery":
       response, errcode, errdetail = yield self.run_query(http_request_data)
+    elif method == "Next":
+      response, errcode, errdetail = yield self.next_request(http_request_data)
     elif method == "BeginTransaction":
       response, errcode, errdetail = yield self.begin_transaction_request(
         app_id, http_request_data)
@@ -407,6 +413,29 @@ class MainHandler(tornado.web.RequestHandler):
       raise gen.Return(('', datastore_pb.Error.INTERNAL_ERROR, str(error)))
     raise gen.Return((clone_qr_pb.Encode(), 0, ''))
 
+  @gen.coroutine
+  def next_request(self, http_request_data):
+    """ Fetches the next batch of results for a query kept by this server.
+
+    Args:
+      http_request_data: Stores the protocol buffer request from the AppServer.
+    Returns:
+      Returns an encoded query response.
+    """
+    global datastore_access
+    next_request = datastore_pb.NextRequest(http_request_data)
+    clone_qr_pb = UnprocessedQueryResult()
+    try:
+      yield datastore_access._dynamic_next(next_request, clone_qr_pb)
+    except CursorNotFound as error:
+      raise gen.Return(('', datastore_pb.Error.BAD_REQUEST, str(error)))
+    except dbconstants.BadRequest as error:
+      raise gen.Return(('', datastore_pb.Error.BAD_REQUEST, str(error)))
+    except dbconstants.AppScaleDBConnectionError as error:
+      logger.exception('DB connection error during query')
+      raise gen.Return(('', datastore_pb.Error.INTERNAL_ERROR, str(error)))
+    raise gen.Return((clone_qr_pb.Encode(), 0, ''))
+
   @gen.coroutine
   def create_index_request(self, app_id, http_request_data):
     """ High level function for creating composite indexes.
@@ -850,13 +879,40 @@ def main():
                       help='Datastore server port')
   parser.add_argument('-v', '--verbose', action='store_true',
                       help='Output debug-level logging')
+  parser.add_argument('--max-concurrent-groups', type=int,
+                      default=dbconstants.MAX_GROUPS_FOR_XG,
+                      help='The number of entity groups a put writes at once')
+  parser.add_argument('--id-reservation-size', type=int,
+                      default=DEFAULT_RESERVATION_SIZE,
+                      help='The number of scattered IDs to reserve at a time')
+  parser.add_argument('--workers', type=int, default=1,
+                      help='The number of processes that serve the port')
   args = parser.parse_args()
 
   if args.verbose:
     logging.getLogger('appscale').setLevel(logging.DEBUG)
 
   options.define('private_ip', appscale_info.get_private_ip())
-  options.define('port', args.port)
+
+  if args.workers > 1:
+    # Each worker needs its own database session and ZooKeeper client, so the
+    # processes are forked before any connections are made.
+    fork_processes(args.workers)
+
+    # Every worker binds the port so that the kernel balances connections
+    # between them.
+    sockets = bind_sockets(args.port, reuse_port=True)
+
+    # Other servers need to reach each worker individually (e.g. to adjust
+    # the IDs it has reserved), so each one also listens on its own port and
+    # registers that location.
+    worker_sockets = bind_sockets(0, address=options.private_ip)
+    sockets.extend(worker_sockets)
+    options.define('port', worker_sockets[0].getsockname()[1])
+  else:
+    sockets = bind_sockets(args.port)
+    options.define('port', args.port)
+
   taskqueue_locations = get_load_balancer_ips()
 
   server_node = '{}/{}:{}'.format(DATASTORE_SERVERS_NODE, options.private_ip,
@@ -879,9 +935,11 @@ def main():
   datastore_access = DatastoreDistributed(
     datastore_batch, transaction_manager, zookeeper=zookeeper,
     log_level=logger.getEffectiveLevel(),
-    taskqueue_locations=taskqueue_locations)
+    taskqueue_locations=taskqueue_locations,
+    max_concurrent_groups=args.max_concurrent_groups,
+    id_reservation_size=args.id_reservation_size)
 
   server = tornado.httpserver.HTTPServer(pb_application)
-  server.listen(args.port)
+  server.add_sockets(sockets)
 
   IOLoop.current().start()
@@ -8,13 +8,11 @@ from kazoo.exceptions import (
   NoNodeError,
   NotEmptyError
 )
-from kazoo.retry import (
-  ForceRetryError,
-  KazooRetry,
-  RetryFailedError
-)
+from kazoo.retry import ForceRetryError
 from tornado import gen, ioloop
-from tornado.locks import Lock as TornadoLock
+from tornado.concurrent import Future as TornadoFuture
+
+from appscale.datastore.zkappscale.tornado_kazoo import TornadoKazoo
 
 # The ZooKeeper node that contains lock entries for an entity group.
 LOCK_PATH_TEMPLATE = u'/appscale/apps/{project}/locks/{namespace}/{group}'
@@ -22,6 +20,11 @@ LOCK_PATH_TEMPLATE = u'/appscale/apps/{project}/locks/{namespace}/{group}'
 # The number of seconds to wait for a lock before raising a timeout error.
 LOCK_TIMEOUT = 10
 
+# The initial and maximum number of seconds to wait before trying to create
+# contender nodes again.
+RETRY_DELAY = .1
+MAX_RETRY_DELAY = 1
+
 
 def zk_group_path(key):
   """ Retrieve the ZooKeeper lock path for a given entity key.
@@ -57,15 +60,12 @@ class EntityLock(object):
   """ A ZooKeeper-based entity lock that allows test-and-set operations.
 
   This is based on kazoo's lock recipe, and has been modified to lock multiple
-  entity groups. This lock is not re-entrant. Repeated calls after already
-  acquired will block.
+  entity groups. Every ZooKeeper operation is asynchronous, so a process can
+  wait for locks on unrelated groups at the same time. This lock is not
+  re-entrant. Repeated calls after already acquired will block.
   """
   _NODE_NAME = '__lock__'
 
-  # Tornado lock which allows tornado to switch to different coroutine
-  # if current one is waiting for entity group lock
-  _tornado_lock = TornadoLock()
-
   def __init__(self, client, keys, txid=None):
     """ Create an entity lock.
 
@@ -75,102 +75,73 @@ class EntityLock(object):
       txid: An integer specifying the transaction ID.
     """
     self.client = client
+    self.tornado_zk = TornadoKazoo(client)
     self.paths = [zk_group_path(key) for key in keys]
 
     # The txid is written to the contender nodes for deadlock resolution.
     self.data = str(txid or '')
 
-    self.wake_event = client.handler.event_object()
-
     # Give the contender nodes a uniquely identifiable prefix in case its
     # existence is in question.
     self.prefix = uuid.uuid4().hex + self._NODE_NAME
 
     self.create_paths = [path + '/' + self.prefix for path in self.paths]
 
+    self.nodes = [None for _ in self.paths]
     self.create_tried = False
     self.is_acquired = False
     self.cancelled = False
-    self._retry = KazooRetry(max_tries=None,
-                             sleep_func=client.handler.sleep_func)
-    self._lock = client.handler.lock_object()
 
-  def _ensure_path(self):
-    """ Make sure the ZooKeeper lock paths have been created. """
-    for path in self.paths:
-      self.client.ensure_path(path)
+    # Resolves when a predecessor or the connection state changes.
+    self._wake_future = None
 
   def cancel(self):
     """ Cancel a pending lock acquire. """
     self.cancelled = True
-    self.wake_event.set()
+    if self._wake_future is not None:
+      self._wake(self._wake_future)
 
   @gen.coroutine
   def acquire(self):
-    now = ioloop.IOLoop.current().time()
-    yield EntityLock._tornado_lock.acquire(now + LOCK_TIMEOUT)
-    try:
-      locked = self.unsafe_acquire()
-      raise gen.Return(locked)
-    finally:
-      if not self.is_acquired:
-        EntityLock._tornado_lock.release()
-
-  def unsafe_acquire(self):
-    """ Acquire the lock. By default blocks and waits forever.
+    """ Acquire the lock.
 
-    Returns:
-      A boolean indicating whether or not the lock was acquired.
+    Raises:
+      LockTimeout if the lock is not acquired within LOCK_TIMEOUT seconds.
+      CancelledError if the acquisition is cancelled.
     """
+    io_loop = ioloop.IOLoop.current()
+    deadline = io_loop.time() + LOCK_TIMEOUT
+    retry_delay = RETRY_DELAY
+    try:
+      while True:
+        try:
+          yield self._inner_acquire(deadline)
+          break
+        except ForceRetryError:
+          if io_loop.time() + retry_delay > deadline:
+            raise LockTimeout('Failed to acquire lock on {} after {} '
+                              'seconds'.format(self.paths, LOCK_TIMEOUT))
 
-    def _acquire_lock():
-      """ Acquire a kazoo thread lock. """
-      got_it = self._lock.acquire(False)
-      if not got_it:
-        raise ForceRetryError()
-      return True
-
-    retry = self._retry.copy()
-    retry.deadline = LOCK_TIMEOUT
-
-    # Prevent other threads from acquiring the lock at the same time.
-    locked = self._lock.acquire(False)
-    if not locked:
-      try:
-        retry(_acquire_lock)
-      except RetryFailedError:
-        return False
+          yield gen.sleep(retry_delay)
+          retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+    except Exception as error:
+      yield self._best_effort_cleanup()
+      self.cancelled = False
+      raise error
 
-    already_acquired = self.is_acquired
-    try:
-      gotten = False
-      try:
-        gotten = retry(self._inner_acquire)
-      except RetryFailedError:
-        if not already_acquired:
-          self._best_effort_cleanup()
-      except KazooException:
-        if not already_acquired:
-          self._best_effort_cleanup()
-          self.cancelled = False
-        raise
-      if gotten:
-        self.is_acquired = gotten
-      if not gotten and not already_acquired:
-        self._delete_nodes(self.nodes)
-      return gotten
-    finally:
-      self._lock.release()
+    self.is_acquired = True
 
-  def _watch_session(self, state):
-    """ A callback function for handling connection state changes.
+  @staticmethod
+  def _wake(future):
+    """ Resolves a future that a waiting acquisition is blocked on.
 
     Args:
-      state: The new connection state.
+      future: A Tornado Future.
     """
-    self.wake_event.set()
-    return True
+    if not future.done():
+      future.set_result(None)
 
+  @gen.coroutine
   def _resolve_deadlocks(self, children_list):
     """ Check if there are any concurrent cross-group locks.
 
@@ -186,13 +157,11 @@ class EntityLock(object):
         continue
 
       # Get transaction IDs for earlier contenders.
-      for child in children[:our_index - 1]:
-        try:
-          data, _ = self.client.get(
-            self.paths[index] + '/' + child)
-        except NoNodeError:
-          continue
-
+      contenders = [self.paths[index] + '/' + child
+                    for child in children[:our_index - 1]]
+      contender_data = yield [self._get_data(contender)
+                              for contender in contenders]
+      for data in contender_data:
         # If data is not set, it doesn't belong to a cross-group
         # transaction.
         if not data:
@@ -203,57 +172,47 @@ class EntityLock(object):
         # resolve deadlocks.
         if current_txid > child_txid:
           # TODO: Implement a more graceful deadlock detection.
-          self.client.retry(self._delete_nodes(self.nodes))
+          yield self._delete_nodes(self.nodes)
+          self.nodes = [None for _ in self.paths]
           raise ForceRetryError()
 
-  def _inner_acquire(self):
-    """ Create contender node(s) and wait until the lock is acquired. """
-
-    # Make sure the group lock node exists.
-    self._ensure_path()
+  @gen.coroutine
+  def _inner_acquire(self, deadline):
+    """ Create contender node(s) and wait until the lock is acquired.
 
-    nodes = [None for _ in self.paths]
+    Args:
+      deadline: A float specifying the IOLoop time to stop waiting at.
+    Raises:
+      ForceRetryError if the contender nodes need to be created again.
+      LockTimeout if the deadline passes.
+    """
     if self.create_tried:
-      nodes = self._find_nodes()
+      self.nodes = yield self._find_nodes()
     else:
       self.create_tried = True
 
-    for index, node in enumerate(nodes):
-      if node is not None:
-        continue
-
-      # The entity group lock root may have been deleted, so try a few times.
-      try_num = 0
-      while True:
-        try:
-          node = self.client.create(
-            self.create_paths[index], self.data, sequence=True)
-          break
-        except NoNodeError:
-          self.client.ensure_path(self.paths[index])
-          if try_num > 3:
-            raise ForceRetryError()
-        try_num += 1
-
+    # The group lock nodes are created along with the contender nodes if
+    # they do not exist.
+    missing = [index for index, node in enumerate(self.nodes) if node is None]
+    created = yield [
+      self.tornado_zk.create(self.create_paths[index], self.data,
+                             sequence=True, makepath=True)
+      for index in missing]
+    for index, node in zip(missing, created):
       # Strip off path to node.
-      node = node[len(self.paths[index]) + 1:]
-      nodes[index] = node
-
-    self.nodes = nodes
+      self.nodes[index] = node[len(self.paths[index]) + 1:]
 
     while True:
-      self.wake_event.clear()
-
       # Bail out with an exception if cancellation has been requested.
       if self.cancelled:
         raise CancelledError()
 
-      children_list = self._get_sorted_children()
+      children_list = yield self._get_sorted_children()
 
       predecessors = []
       for index, children in enumerate(children_list):
         try:
-          our_index = children.index(nodes[index])
+          our_index = children.index(self.nodes[index])
         except ValueError:
           raise ForceRetryError()
 
@@ -263,132 +222,165 @@ class EntityLock(object):
             self.paths[index] + "/" + children[our_index - 1])
 
       if not predecessors:
-        return True
+        return
 
-      if len(nodes) > 1:
-        self._resolve_deadlocks(children_list)
+      if len(self.nodes) > 1:
+        yield self._resolve_deadlocks(children_list)
 
-      # Wait for predecessor to be removed.
-      # TODO: Listen for all at the same time.
-      for index, predecessor in enumerate(predecessors):
-        self.client.add_listener(self._watch_session)
-        try:
-          if self.client.exists(predecessor, self._watch_predecessor):
-            self.wake_event.wait(LOCK_TIMEOUT)
-            if not self.wake_event.isSet():
-              error = 'Failed to acquire lock on {} after {} '\
-                'seconds'.format(self.paths, LOCK_TIMEOUT * (index + 1))
-              raise LockTimeout(error)
-        finally:
-          self.client.remove_listener(self._watch_session)
-
-  def _watch_predecessor(self, event):
-    """ A callback function for handling contender deletions.
+      yield self._wait_for_predecessors(predecessors, deadline)
+
+  @gen.coroutine
+  def _wait_for_predecessors(self, predecessors, deadline):
+    """ Waits until any of the predecessors are removed.
+
+    Args:
+      predecessors: A list of contender paths.
+      deadline: A float specifying the IOLoop time to stop waiting at.
+    Raises:
+      LockTimeout if the deadline passes.
+    """
+    io_loop = ioloop.IOLoop.current()
+    wake_future = TornadoFuture()
+
+    def wake_up(*args):
+      """ Handles predecessor and connection state changes from the kazoo
+      thread. """
+      io_loop.add_callback(self._wake, wake_future)
+      return True
+
+    self._wake_future = wake_future
+    self.client.add_listener(wake_up)
+    try:
+      stats = yield [self.tornado_zk.exists(predecessor, wake_up)
+                     for predecessor in predecessors]
+
+      # If a predecessor is already gone, check the contenders again.
+      if any(stat is None for stat in stats):
+        return
+
+      try:
+        yield gen.with_timeout(deadline, wake_future)
+      except gen.TimeoutError:
+        raise LockTimeout('Failed to acquire lock on {} after {} '
+                          'seconds'.format(self.paths, LOCK_TIMEOUT))
+    finally:
+      self.client.remove_listener(wake_up)
+      self._wake_future = None
+
+  @gen.coroutine
+  def _get_data(self, path):
+    """ Retrieve the contents of a node.
 
     Args:
-      event: A ZooKeeper event.
+      path: A string specifying a ZooKeeper path.
+    Returns:
+      A string containing the node's data or None if it does not exist.
     """
-    self.wake_event.set()
+    try:
+      data, _ = yield self.tornado_zk.get(path)
+    except NoNodeError:
+      raise gen.Return(None)
 
+    raise gen.Return(data)
+
+  @gen.coroutine
+  def _get_children(self, path):
+    """ Retrieve the contenders for a group.
+
+    Args:
+      path: A string specifying a group lock path.
+    Returns:
+      A list of contender nodes.
+    """
+    try:
+      children = yield self.tornado_zk.get_children(path)
+    except NoNodeError:
+      children = []
+
+    raise gen.Return(children)
+
+  @gen.coroutine
   def _get_sorted_children(self):
     """ Retrieve a list of sorted contenders for each group.
 
     Returns:
       A list of contenders for each group.
     """
-    children = []
-    for path in self.paths:
-      try:
-        children.append(self.client.get_children(path))
-      except NoNodeError:
-        children.append([])
+    children = yield [self._get_children(path) for path in self.paths]
 
     # Ignore lock path prefix when sorting contenders.
     lockname = self._NODE_NAME
     for child_list in children:
       child_list.sort(key=lambda c: c[c.find(lockname) + len(lockname):])
-    return children
+    raise gen.Return(children)
 
+  @gen.coroutine
   def _find_nodes(self):
     """ Retrieve a list of paths this lock has created.
 
     Returns:
       A list of ZooKeeper paths.
     """
+    children_list = yield [self._get_children(path) for path in self.paths]
     nodes = []
-    for path in self.paths:
-      try:
-        children = self.client.get_children(path)
-      except NoNodeError:
-        children = []
-
+    for children in children_list:
       node = None
       for child in children:
         if child.startswith(self.prefix):
           node = child
       nodes.append(node)
-    return nodes
+    raise gen.Return(nodes)
 
+  @gen.coroutine
+  def _delete_node(self, path):
+    """ Remove a ZooKeeper node if it exists.
+
+    Args:
+      path: A string specifying a ZooKeeper path.
+    """
+    try:
+      yield self.tornado_zk.delete(path)
+    except NoNodeError:
+      pass
+
+  @gen.coroutine
   def _delete_nodes(self, nodes):
     """ Remove ZooKeeper nodes.
 
     Args:
       nodes: A list of nodes to delete.
     """
-    for index, node in enumerate(nodes):
-      if node is None:
-        continue
-      self.client.delete(self.paths[index] + "/" + node)
+    yield [self._delete_node(self.paths[index] + "/" + node)
+           for index, node in enumerate(nodes) if node is not None]
 
+  @gen.coroutine
   def _best_effort_cleanup(self):
     """ Attempt to delete nodes that this lock has created. """
     try:
-      nodes = self._find_nodes()
-      self._delete_nodes(nodes)
+      nodes = yield self._find_nodes()
+      yield self._delete_nodes(nodes)
     except KazooException:
       pass
 
+  @gen.coroutine
   def release(self):
     """ Release the lock immediately. """
-    try:
-      self.client.retry(self._inner_release)
-
-      # Try to clean up the group lock path.
-      for path in self.paths:
-        try:
-          self.client.delete(path)
-        except (NotEmptyError, NoNodeError):
-          pass
-      return
-    finally:
-      if not self.is_acquired:
-        EntityLock._tornado_lock.release()
-
-  def ensure_release_tornado_lock(self):
-    """ Ensures that tornado lock (which is global for datastore server)
-    is released.
-    It MUST BE CALLED any time when lock is acquired
-    even if entity group lock in zookeeper left acquired after failure.
-    """
     if self.is_acquired:
-      EntityLock._tornado_lock.release()
+      yield self._delete_nodes(self.nodes)
+      self.is_acquired = False
+      self.nodes = [None for _ in self.paths]
+
+    # Try to clean up the group lock paths.
+    yield [self._delete_group_path(path) for path in self.paths]
 
-  def _inner_release(self):
-    """ Release the lock by removing created nodes. """
-    if not self.is_acquired:
-      return False
+  @gen.coroutine
+  def _delete_group_path(self, path):
+    """ Remove a group lock path if there are no other contenders.
 
+    Args:
+      path: A string specifying a group lock path.
+    """
     try:
-      self._delete_nodes(self.nodes)
-    except NoNodeError:
+      yield self.tornado_zk.delete(path)
+    except (NotEmptyError, NoNodeError):
       pass
-
-    self.is_acquired = False
-    self.nodes = [None for _ in self.paths]
-    return True
-
-  def __enter__(self):
-    self.unsafe_acquire()
-
-  def __exit__(self, exc_type, exc_value, traceback):
-    self.release()
@@ -10,13 +10,19 @@ class IncompleteOperation(Exception):
 
 class TornadoKazooFuture(TornadoFuture):
   """ A TornadoFuture that handles Kazoo results. """
+  def __init__(self):
+    """ Creates a new TornadoKazooFuture that completes on the current
+    IOLoop. """
+    super(TornadoKazooFuture, self).__init__()
+    self._io_loop = IOLoop.current()
+
   def handle_zk_result(self, async_result):
     """ Completes the TornadoFuture.
 
     Args:
       async_result: An IAsyncResult.
     """
-    io_loop = IOLoop.instance()
+    io_loop = self._io_loop
 
     # This method should not be called if the result is not ready.
     if not async_result.ready():
@@ -70,6 +76,21 @@ class TornadoKazoo(object):
     zk_future.rawlink(tornado_future.handle_zk_result)
     return tornado_future
 
+  def set(self, path, value, version=-1):
+    """ Sets the value of a node.
+
+    Args:
+      path: A string specifying the path of the node.
+      value: A byte string specifying the node contents.
+      version: An integer specifying the expected version of the node.
+    Returns:
+      A TornadoKazooFuture.
+    """
+    tornado_future = TornadoKazooFuture()
+    zk_future = self._zk_client.set_async(path, value, version=version)
+    zk_future.rawlink(tornado_future.handle_zk_result)
+    return tornado_future
+
   def delete(self, path, version=-1):
     """ Deletes a node.
 
@@ -83,3 +104,52 @@ class TornadoKazoo(object):
     zk_future = self._zk_client.delete_async(path, version=version)
     zk_future.rawlink(tornado_future.handle_zk_result)
     return tornado_future
+
+  def create(self, path, value='', ephemeral=False, sequence=False,
+             makepath=False):
+    """ Creates a node.
+
+    Args:
+      path: A string specifying the path of the node.
+      value: A byte string specifying the node contents.
+      ephemeral: A boolean specifying that the node should be removed when
+        the session ends.
+      sequence: A boolean specifying that the path should be suffixed with a
+        unique index.
+      makepath: A boolean specifying that the parent nodes should be created
+        if they do not exist.
+    Returns:
+      A TornadoKazooFuture.
+    """
+    tornado_future = TornadoKazooFuture()
+    zk_future = self._zk_client.create_async(
+      path, value, ephemeral=ephemeral, sequence=sequence, makepath=makepath)
+    zk_future.rawlink(tornado_future.handle_zk_result)
+    return tornado_future
+
+  def ensure_path(self, path):
+    """ Creates a node and its parents if they do not exist.
+
+    Args:
+      path: A string specifying the path of the node.
+    Returns:
+      A TornadoKazooFuture.
+    """
+    tornado_future = TornadoKazooFuture()
+    zk_future = self._zk_client.ensure_path_async(path)
+    zk_future.rawlink(tornado_future.handle_zk_result)
+    return tornado_future
+
+  def exists(self, path, watch=None):
+    """ Checks if a node exists.
+
+    Args:
+      path: A string specifying the path of the node.
+      watch: A function that is called when the node changes.
+    Returns:
+      A TornadoKazooFuture.
+    """
+    tornado_future = TornadoKazooFuture()
+    zk_future = self._zk_client.exists_async(path, watch)
+    zk_future.rawlink(tornado_future.handle_zk_result)
+    return tornado_future
@@ -30,6 +30,8 @@ class TestCassandra(testing.AsyncTestCase):
     self.connect_mock = mock.MagicMock(return_value=self.session_mock)
     self.cluster_mock = mock.MagicMock(connect=self.connect_mock)
     self.cluster_class_mock.return_value = self.cluster_mock
+    self.session_mock.prepare = mock.MagicMock(
+      side_effect=lambda query_str: mock.MagicMock(argument=query_str))
 
     # Instantiate Datastore proxy
     self.db = cassandra_interface.DatastoreProxy()
@@ -42,27 +44,40 @@ class TestCassandra(testing.AsyncTestCase):
 
   @testing.gen_test
   def test_get(self):
-    # Mock cassandra response
-    async_response = Future()
-    async_response.set_result([
-      ('a', 'c1', '1'), ('a', 'c2', '2'), ('a', 'c3', '3'),
-      ('b', 'c1', '4'), ('b', 'c2', '5'), ('b', 'c3', '6'),
-      ('c', 'c1', '7'), ('c', 'c2', '8'), ('c', 'c3', '9'),
-    ])
-    self.execute_mock.return_value = async_response
+    # Mock cassandra responses for each partition
+    rows = {
+      'a': [('a', 'c1', '1'), ('a', 'c2', '2'), ('a', 'c3', '3')],
+      'b': [('b', 'c1', '4'), ('b', 'c2', '5'), ('b', 'c3', '6')],
+      'c': [('c', 'c1', '7'), ('c', 'c2', '8'), ('c', 'c3', '9')]
+    }
+
+    def execute(query, parameters):
+      async_response = Future()
+      async_response.set_result(rows[str(parameters[0])])
+      return async_response
+
+    self.execute_mock.side_effect = execute
 
     # Call function under test
     keys = ['a', 'b', 'c']
     columns = ['c1', 'c2', 'c3']
     result = yield self.db.batch_get_entity('table', keys, columns)
 
-    # Make sure cassandra interface prepared good query
-    query = self.execute_mock.call_args[0][0]
-    parameters = self.execute_mock.call_args[1]["parameters"]
-    self.assertEqual(
-      query.query_string,
-      'SELECT * FROM "table" WHERE key IN %s and column1 IN %s')
-    self.assertEqual(parameters, ([b'a', b'b', b'c'], ['c1', 'c2', 'c3']) )
+    # Make sure cassandra interface prepared good queries
+    self.assertEqual(len(self.execute_mock.call_args_list), 3)
+    for call in self.execute_mock.call_args_list:
+      query = call[0][0]
+      parameters = call[1]["parameters"]
+      self.assertEqual(
+        query.argument,
+        'SELECT * FROM "table" WHERE key = ? AND column1 IN ?')
+      self.assertEqual(parameters[1], ['c1', 'c2', 'c3'])
+
+    # The statement should only be prepared once.
+    self.assertEqual(self.session_mock.prepare.call_count, 1)
+    yield self.db.batch_get_entity('table', keys, columns)
+    self.assertEqual(self.session_mock.prepare.call_count, 1)
+
     # And result matches expectation
     self.assertEqual(result, {
       'a': {'c1': '1', 'c2': '2', 'c3': '3'},
@@ -76,9 +91,6 @@ class TestCassandra(testing.AsyncTestCase):
     async_response = Future()
     async_response.set_result(None)
     self.execute_mock.return_value = async_response
-    # Mock prepare method of session
-    self.session_mock.prepare = mock.MagicMock(
-      side_effect=lambda query_str: mock.MagicMock(argument=query_str))
 
     # Call function under test
     keys = ['a', 'b', 'c']
@@ -147,14 +159,15 @@ class TestCassandra(testing.AsyncTestCase):
     query = self.execute_mock.call_args[0][0]
     parameters = self.execute_mock.call_args[1]["parameters"]
     self.assertEqual(
-      query.query_string,
+      query.argument,
       'SELECT * FROM "tableZ" WHERE '
-      'token(key) >= %s AND '
-      'token(key) <= %s AND '
-      'column1 IN %s '
-      'LIMIT 10 '    # 5 * number of columns
+      'token(key) >= ? AND '
+      'token(key) <= ? AND '
+      'column1 IN ? '
+      'LIMIT ? '
       'ALLOW FILTERING')
-    self.assertEqual(parameters, (b'keyA', b'keyC', ['c1', 'c2']) )
+    # The limit is 5 * number of columns.
+    self.assertEqual(parameters, (b'keyA', b'keyC', ['c1', 'c2'], 10))
     # And result matches expectation
     self.assertEqual(result, [
       {'keyA': {'c1': '1', 'c2': '2'}},
@@ -162,6 +175,45 @@ class TestCassandra(testing.AsyncTestCase):
       {'keyC': {'c1': '7', 'c2': '8'}}
     ])
 
+  @testing.gen_test
+  def test_range_scan(self):
+    # The first page ends in the middle of keyB's columns.
+    pages = [
+      mock.MagicMock(current_rows=[('keyA', 'c1', '1'), ('keyA', 'c2', '2'),
+                                   ('keyB', 'c1', '4')],
+                     paging_state='page2'),
+      mock.MagicMock(current_rows=[('keyB', 'c2', '5'), ('keyC', 'c1', '7'),
+                                   ('keyC', 'c2', '8')],
+                     paging_state=None)
+    ]
+
+    def execute_page(query, paging_state=None):
+      async_response = Future()
+      async_response.set_result(pages.pop(0))
+      return async_response
+
+    columns = ['c1', 'c2']
+    with mock.patch.object(cassandra_interface.TornadoCassandra,
+                           'execute_page') as execute_page_mock:
+      execute_page_mock.side_effect = execute_page
+      rows, token = yield self.db.range_scan(
+        'tableZ', columns, 'keyA', 'keyC', 2)
+      self.assertEqual(list(rows), [{'keyA': {'c1': '1', 'c2': '2'}}])
+      self.assertEqual(token.paging_state, 'page2')
+
+      rows, token = yield self.db.range_scan(
+        'tableZ', columns, 'keyA', 'keyC', 2, token=token)
+      self.assertEqual(list(rows), [{'keyB': {'c1': '4', 'c2': '5'}},
+                                    {'keyC': {'c1': '7', 'c2': '8'}}])
+      self.assertIsNone(token)
+
+      # The second page should resume from the driver's paging state.
+      self.assertEqual(execute_page_mock.call_args[1]['paging_state'],
+                       'page2')
+
+    # Both pages should share a prepared statement.
+    self.assertEqual(self.session_mock.prepare.call_count, 1)
+
 
 if __name__ == "__main__":
   unittest.main()
@@ -54,6 +54,21 @@ ASYNC_NONE = gen.Future()
 ASYNC_NONE.set_result(None)
 
 
+class CompletedZKResult(object):
+  """ A Kazoo async result that has already succeeded. """
+  value = None
+  exception = None
+
+  def ready(self):
+    return True
+
+  def successful(self):
+    return True
+
+  def rawlink(self, callback):
+    callback(self)
+
+
 class TestDatastoreServer(testing.AsyncTestCase):
   """
   A set of test cases for the datastore server (datastore server v2)
@@ -70,6 +85,8 @@ class TestDatastoreServer(testing.AsyncTestCase):
                                           sleep_func=lambda: None,
                                           lock_object=lambda: None))
     zk_handle.should_receive('add_listener')
+    zk_handle.should_receive('DataWatch')
+    zk_handle.should_receive('set_async').and_return(CompletedZKResult())
     zookeeper = flexmock(handle=zk_handle)
     zookeeper.should_receive("acquire_lock").and_return(True)
     zookeeper.should_receive("release_lock").and_return(True)
@@ -392,8 +409,10 @@ class TestDatastoreServer(testing.AsyncTestCase):
     entity_lock.should_receive('acquire').and_return(async_true)
     entity_lock.should_receive('release')
 
-    flexmock(ScatteredAllocator).should_receive('next').\
-      and_return(random.randint(1, 500))
+    allocated_ids = gen.Future()
+    allocated_ids.set_result([random.randint(1, 500)])
+    flexmock(ScatteredAllocator).should_receive('next_ids').\
+      and_return(allocated_ids)
 
     yield dd.dynamic_put('test', putreq_pb, putresp_pb)
     self.assertEquals(len(putresp_pb.key_list()), 2)
@@ -431,6 +450,41 @@ class TestDatastoreServer(testing.AsyncTestCase):
 
     yield dd.put_entities(app_id, entity_list)
 
+  @testing.gen_test
+  def test_put_entities_fan_out(self):
+    app_id = 'test'
+    db_batch = flexmock()
+    db_batch.should_receive('valid_data_version_sync').and_return(True)
+
+    entity_list = []
+    current_values = {}
+    for name in ['bob', 'nancy', 'sue']:
+      entity_list.append(self.get_new_entity_proto(
+        app_id, "test_kind", name, "prop1name", "prop1val", ns="blah"))
+      current_values['test\x00blah\x00test_kind:{}\x01'.format(name)] = {}
+
+    async_result = gen.Future()
+    async_result.set_result(current_values)
+
+    # Each group should be read and locked independently.
+    db_batch.should_receive('batch_get_entity').and_return(async_result).\
+      times(3)
+    db_batch.should_receive('normal_batch').and_return(ASYNC_NONE).times(3)
+    transaction_manager = flexmock(
+      create_transaction_id=lambda project, xg: 1,
+      delete_transaction_id=lambda project, txid: None,
+      set_groups=lambda project, txid, groups: None)
+    dd = DatastoreDistributed(db_batch, transaction_manager,
+                              self.get_zookeeper(), max_concurrent_groups=2)
+
+    async_true = gen.Future()
+    async_true.set_result(True)
+    entity_lock = flexmock(EntityLock)
+    entity_lock.should_receive('acquire').and_return(async_true).times(3)
+    entity_lock.should_receive('release').and_return(ASYNC_NONE)
+
+    yield dd.put_entities(app_id, entity_list)
+
   def test_acquire_locks_for_trans(self):
     zk_client = flexmock()
     zk_client.should_receive('add_listener')
@@ -628,11 +682,11 @@ class TestDatastoreServer(testing.AsyncTestCase):
       }
     }
     async_result_1 = gen.Future()
-    async_result_1.set_result([entity_proto1, tombstone1])
+    async_result_1.set_result(([entity_proto1, tombstone1], None))
     async_result_2 = gen.Future()
-    async_result_2.set_result([])
+    async_result_2.set_result(([], None))
 
-    db_batch.should_receive("range_query").\
+    db_batch.should_receive("range_scan").\
       and_return(async_result_1).\
       and_return(async_result_2)
 
@@ -681,10 +735,10 @@ class TestDatastoreServer(testing.AsyncTestCase):
       }
     }
     async_result_1 = gen.Future()
-    async_result_1.set_result([entity_proto1, tombstone1])
+    async_result_1.set_result(([entity_proto1, tombstone1], None))
     async_result_2 = gen.Future()
-    async_result_2.set_result([])
-    db_batch.should_receive("range_query").\
+    async_result_2.set_result(([], None))
+    db_batch.should_receive("range_scan").\
       and_return(async_result_1).\
       and_return(async_result_2)
 
@@ -1046,6 +1100,42 @@ class TestDatastoreServer(testing.AsyncTestCase):
 
     yield dd.apply_txn_changes(app, txn)
 
+  @testing.gen_test
+  def test_composite_index_cache(self):
+    app = 'guestbook'
+    index = entity_pb.CompositeIndex()
+    index.set_app_id(app)
+    index.set_id(1)
+    index.set_state(entity_pb.CompositeIndex.READ_WRITE)
+    index.mutable_definition().set_entity_type('Greeting')
+    index.mutable_definition().set_ancestor(False)
+
+    async_indexes = gen.Future()
+    async_indexes.set_result([index.Encode()])
+    db_batch = flexmock()
+    db_batch.should_receive('valid_data_version_sync').and_return(True)
+    db_batch.should_receive('get_indices').and_return(async_indexes).twice()
+
+    zookeeper = self.get_zookeeper()
+    watches = []
+    zookeeper.handle.should_receive('DataWatch').replace_with(
+      lambda path, func: watches.append((path, func))).once()
+    dd = DatastoreDistributed(db_batch, flexmock(), zookeeper)
+
+    indexes = yield dd.get_composite_indexes(app)
+    self.assertEqual(indexes[0].id(), 1)
+
+    # Subsequent calls should not read the metadata table.
+    indexes = yield dd.get_composite_indexes(app)
+    self.assertEqual(indexes[0].id(), 1)
+
+    # A change to the version node should invalidate the cached indexes.
+    path, invalidate = watches[0]
+    self.assertEqual(path, '/appscale/apps/guestbook/composite_index_version')
+    invalidate('1', None)
+    yield gen.moment
+    yield dd.get_composite_indexes(app)
+
   def test_extract_entities_from_composite_indexes(self):
     project_id = 'guestbook'
     props = ['prop1', 'prop2']
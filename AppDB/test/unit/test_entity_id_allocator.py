@@ -0,0 +1,61 @@
+import unittest
+
+from mock import MagicMock
+from tornado import gen, testing
+
+from appscale.datastore.cassandra_env.entity_id_allocator import (
+  ScatteredAllocator)
+
+from google.appengine.datastore.datastore_stub_util import ToScatteredId
+
+
+class FakeReservations(object):
+  """ Reserves consecutive blocks and records each reservation. """
+  def __init__(self):
+    self.last_reserved = 0
+    self.reservations = []
+
+  @gen.coroutine
+  def allocate_size(self, size, retries=5, min_counter=None):
+    start_id = max(self.last_reserved, min_counter or 0) + 1
+    self.last_reserved = start_id + size - 1
+    self.reservations.append((start_id, self.last_reserved))
+    raise gen.Return((start_id, self.last_reserved))
+
+
+class TestScatteredAllocator(testing.AsyncTestCase):
+  def setUp(self):
+    super(TestScatteredAllocator, self).setUp()
+    self.reservations = FakeReservations()
+    self.allocator = ScatteredAllocator(MagicMock(), 'guestbook',
+                                        reservation_size=100)
+    self.allocator.allocate_size = self.reservations.allocate_size
+
+  @testing.gen_test
+  def test_next_ids(self):
+    ids = yield self.allocator.next_ids(195)
+    self.assertEqual(ids, [ToScatteredId(counter)
+                           for counter in range(1, 196)])
+
+    # The next block should already be reserved once the low-water mark is
+    # reached.
+    yield gen.moment
+    self.assertEqual(self.reservations.reservations,
+                     [(1, 100), (101, 200), (201, 300)])
+
+    ids = yield self.allocator.next_ids(100)
+    self.assertEqual(ids[0], ToScatteredId(196))
+    self.assertEqual(len(set(ids)), 100)
+
+  @testing.gen_test
+  def test_set_min_counter(self):
+    yield self.allocator.next_ids(10)
+    yield self.allocator.set_min_counter(50)
+
+    # IDs up to the counter should be skipped.
+    next_id = yield self.allocator.next()
+    self.assertEqual(next_id, ToScatteredId(51))
+
+
+if __name__ == "__main__":
+  unittest.main()
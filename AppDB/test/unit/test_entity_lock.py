@@ -0,0 +1,176 @@
+import unittest
+
+from kazoo.exceptions import NoNodeError, NodeExistsError, NotEmptyError
+from tornado import gen, testing
+
+from appscale.datastore.zkappscale import entity_lock
+from appscale.datastore.zkappscale.entity_lock import EntityLock
+
+from google.appengine.datastore import entity_pb
+
+
+class FakeResult(object):
+  """ An IAsyncResult that is already complete. """
+  def __init__(self, value=None, exception=None):
+    self.value = value
+    self.exception = exception
+
+  def ready(self):
+    return True
+
+  def successful(self):
+    return self.exception is None
+
+  def rawlink(self, callback):
+    callback(self)
+
+
+class FakeZooKeeper(object):
+  """ Keeps ZooKeeper nodes in memory. """
+  def __init__(self):
+    self.nodes = {}
+    self.watches = {}
+    self.sequence = 0
+
+  def _run(self, function, *args, **kwargs):
+    try:
+      return FakeResult(function(*args, **kwargs))
+    except Exception as error:
+      return FakeResult(exception=error)
+
+  def _create(self, path, value, sequence, makepath):
+    parent = path.rsplit('/', 1)[0]
+    if parent not in self.nodes:
+      if not makepath:
+        raise NoNodeError()
+      self.nodes[parent] = ''
+
+    if sequence:
+      path += '{:010d}'.format(self.sequence)
+      self.sequence += 1
+
+    if path in self.nodes:
+      raise NodeExistsError()
+
+    self.nodes[path] = value
+    return path
+
+  def _children(self, path):
+    if path not in self.nodes:
+      raise NoNodeError()
+
+    return [node[len(path) + 1:] for node in self.nodes
+            if node.rsplit('/', 1)[0] == path]
+
+  def _delete(self, path):
+    if path not in self.nodes:
+      raise NoNodeError()
+
+    if self._children(path):
+      raise NotEmptyError()
+
+    del self.nodes[path]
+    for watch in self.watches.pop(path, []):
+      watch(None)
+
+  def _get(self, path):
+    if path not in self.nodes:
+      raise NoNodeError()
+
+    return self.nodes[path], None
+
+  def _exists(self, path, watch):
+    if path not in self.nodes:
+      return None
+
+    if watch is not None:
+      self.watches.setdefault(path, []).append(watch)
+
+    return True
+
+  def create_async(self, path, value='', acl=None, ephemeral=False,
+                   sequence=False, makepath=False):
+    return self._run(self._create, path, value, sequence, makepath)
+
+  def get_children_async(self, path, watch=None, include_data=False):
+    return self._run(self._children, path)
+
+  def delete_async(self, path, version=-1):
+    return self._run(self._delete, path)
+
+  def get_async(self, path, watch=None):
+    return self._run(self._get, path)
+
+  def exists_async(self, path, watch=None):
+    return self._run(self._exists, path, watch)
+
+  def add_listener(self, listener):
+    pass
+
+  def remove_listener(self, listener):
+    pass
+
+
+def group_key(name):
+  key = entity_pb.Reference()
+  key.set_app('guestbook')
+  element = key.mutable_path().add_element()
+  element.set_type('Greeting')
+  element.set_name(name)
+  return key
+
+
+class TestEntityLock(testing.AsyncTestCase):
+  @testing.gen_test
+  def test_same_group(self):
+    client = FakeZooKeeper()
+    first = EntityLock(client, [group_key('a')])
+    second = EntityLock(client, [group_key('a')])
+    yield first.acquire()
+
+    # The second lock should wait for the first one without blocking the
+    # IOLoop.
+    second_acquired = second.acquire()
+    yield gen.moment
+    self.assertFalse(second_acquired.done())
+
+    yield first.release()
+    yield second_acquired
+    self.assertTrue(second.is_acquired)
+
+    yield second.release()
+    self.assertDictEqual(
+      {path: value for path, value in client.nodes.items()
+       if path.endswith('Greeting::YQ')}, {})
+
+  @testing.gen_test
+  def test_unrelated_groups(self):
+    client = FakeZooKeeper()
+    first = EntityLock(client, [group_key('a')])
+    second = EntityLock(client, [group_key('b')])
+    yield [first.acquire(), second.acquire()]
+    self.assertTrue(first.is_acquired)
+    self.assertTrue(second.is_acquired)
+
+  @testing.gen_test
+  def test_timeout(self):
+    client = FakeZooKeeper()
+    first = EntityLock(client, [group_key('a')])
+    second = EntityLock(client, [group_key('a')])
+    yield first.acquire()
+
+    original_timeout = entity_lock.LOCK_TIMEOUT
+    entity_lock.LOCK_TIMEOUT = .1
+    try:
+      with self.assertRaises(entity_lock.LockTimeout):
+        yield second.acquire()
+    finally:
+      entity_lock.LOCK_TIMEOUT = original_timeout
+
+    # The contender node for the failed attempt should be removed.
+    group_path = entity_lock.zk_group_path(group_key('a'))
+    self.assertEqual(len(client._children(group_path)), 1)
+
+
+if __name__ == "__main__":
+  unittest.main()
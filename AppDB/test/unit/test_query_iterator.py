@@ -0,0 +1,186 @@
+import unittest
+
+from tornado import gen, testing
+
+from appscale.datastore.query_iterator import (
+  CursorNotFound, CursorTable, IndexSource, QueryIterator)
+
+
+def index_rows(count):
+  """ Creates index rows that reference entities named after their position.
+
+  Args:
+    count: An integer specifying the number of rows.
+  Returns:
+    A list of index rows.
+  """
+  return [{'index{:04d}'.format(i): {'reference': 'entity{:04d}'.format(i)}}
+          for i in range(count)]
+
+
+class FakeIndex(object):
+  """ Serves pages of index rows and records what was requested. """
+  def __init__(self, rows):
+    self.rows = rows
+    self.requests = []
+    self.resolved = []
+
+  @gen.coroutine
+  def fetch_rows(self, start_key, count, keys_only):
+    self.requests.append((start_key, count, keys_only))
+    remaining = [row for row in self.rows
+                 if start_key is None or row.keys()[0] > start_key]
+    raise gen.Return(remaining[:count])
+
+  @gen.coroutine
+  def resolve(self, rows):
+    references = [row.values()[0]['reference'] for row in rows]
+    self.resolved.extend(references)
+    raise gen.Return(references)
+
+  @gen.coroutine
+  def fetch_entity(self, key):
+    raise gen.Return(key)
+
+
+class TestQueryIterator(testing.AsyncTestCase):
+  @testing.gen_test
+  def test_offset_skipped_by_keys(self):
+    index = FakeIndex(index_rows(100))
+    source = IndexSource(index.fetch_rows, index.resolve)
+    page = yield QueryIterator(source, 50, 10, index.fetch_entity).fetch_page()
+
+    self.assertEqual(page.skipped, 50)
+    self.assertEqual(page.count, 60)
+    self.assertListEqual(page.entities,
+                         ['entity{:04d}'.format(i) for i in range(50, 60)])
+
+    # Only the entities in the page should be resolved.
+    self.assertListEqual(index.resolved, page.entities)
+    self.assertTrue(index.requests[0][2])
+    self.assertFalse(index.requests[-1][2])
+
+  @testing.gen_test
+  def test_offset_exceeds_results(self):
+    index = FakeIndex(index_rows(5))
+    source = IndexSource(index.fetch_rows, index.resolve)
+    page = yield QueryIterator(source, 10, 10, index.fetch_entity).fetch_page()
+
+    self.assertEqual(page.skipped, 5)
+    self.assertListEqual(page.entities, [])
+    self.assertEqual(page.last_entity, 'entity0004')
+    self.assertListEqual(index.resolved, [])
+
+  @testing.gen_test
+  def test_invalid_references(self):
+    index = FakeIndex(index_rows(100))
+
+    @gen.coroutine
+    def resolve(rows):
+      # Treat every other reference as invalid.
+      entities = yield index.resolve(rows)
+      raise gen.Return([entity for entity in entities
+                        if int(entity[-4:]) % 2 == 0])
+
+    source = IndexSource(index.fetch_rows, resolve)
+    iterator = QueryIterator(source, 0, 10, index.fetch_entity)
+    page = yield iterator.fetch_page()
+
+    self.assertListEqual(page.entities,
+                         ['entity{:04d}'.format(i) for i in range(0, 20, 2)])
+
+  @testing.gen_test
+  def test_skip_by_entities(self):
+    index = FakeIndex(index_rows(20))
+
+    @gen.coroutine
+    def resolve(rows):
+      # Only entities divisible by three match the query.
+      entities = yield index.resolve(rows)
+      raise gen.Return([entity for entity in entities
+                        if int(entity[-4:]) % 3 == 0])
+
+    source = IndexSource(index.fetch_rows, resolve)
+    iterator = QueryIterator(source, 2, 10, index.fetch_entity,
+                             skip_by_keys=False)
+    page = yield iterator.fetch_page()
+
+    self.assertEqual(page.skipped, 2)
+    self.assertListEqual(page.entities,
+                         ['entity0006', 'entity0009', 'entity0012',
+                          'entity0015', 'entity0018'])
+
+  @testing.gen_test
+  def test_stale_entry_in_offset(self):
+    index = FakeIndex(index_rows(20))
+
+    @gen.coroutine
+    def resolve(rows):
+      # The entity for the third entry has been deleted.
+      entities = yield index.resolve(rows)
+      raise gen.Return([entity for entity in entities
+                        if entity != 'entity0002'])
+
+    source = IndexSource(index.fetch_rows, resolve)
+    iterator = QueryIterator(source, 5, 3, index.fetch_entity,
+                             skip_by_keys=False)
+    page = yield iterator.fetch_page()
+
+    # The stale entry should not count toward the offset.
+    self.assertEqual(page.skipped, 5)
+    self.assertListEqual(page.entities,
+                         ['entity0006', 'entity0007', 'entity0008'])
+
+  @testing.gen_test
+  def test_resume(self):
+    index = FakeIndex(index_rows(30))
+    source = IndexSource(index.fetch_rows, index.resolve)
+    iterator = QueryIterator(source, 5, 10, index.fetch_entity)
+    page = yield iterator.fetch_page()
+    self.assertEqual(page.last_entity, 'entity0014')
+
+    # Later pages should continue from the previous page without an offset.
+    page = yield iterator.fetch_page(10)
+    self.assertEqual(page.skipped, 0)
+    self.assertListEqual(page.entities,
+                         ['entity{:04d}'.format(i) for i in range(15, 25)])
+
+    page = yield iterator.fetch_page(10)
+    self.assertEqual(len(page.entities), 5)
+    self.assertTrue(iterator.exhausted)
+
+
+class TestCursorTable(unittest.TestCase):
+  def test_claim(self):
+    table = CursorTable()
+    cursor_id = table.add('guestbook', 'query', 'iterator')
+    self.assertEqual(len(table), 1)
+
+    # Cursors should not be shared across projects.
+    with self.assertRaises(CursorNotFound):
+      table.claim('other', cursor_id)
+
+    # A claim with the wrong project should leave the cursor in place.
+    self.assertEqual(len(table), 1)
+    self.assertTupleEqual(table.claim('guestbook', cursor_id),
+                          ('query', 'iterator'))
+
+    cursor_id = table.add('guestbook', 'query', 'iterator')
+    self.assertTupleEqual(table.claim('guestbook', cursor_id),
+                          ('query', 'iterator'))
+    with self.assertRaises(CursorNotFound):
+      table.claim('guestbook', cursor_id)
+
+  def test_eviction(self):
+    table = CursorTable(max_cursors=2)
+    first = table.add('guestbook', 'query1', 'iterator1')
+    table.add('guestbook', 'query2', 'iterator2')
+    table.add('guestbook', 'query3', 'iterator3')
+    self.assertEqual(len(table), 2)
+    with self.assertRaises(CursorNotFound):
+      table.claim('guestbook', first)
+
+    table = CursorTable(ttl=-1)
+    cursor_id = table.add('guestbook', 'query', 'iterator')
+    with self.assertRaises(CursorNotFound):
+      table.claim('guestbook', cursor_id)
@@ -0,0 +1,72 @@
+import unittest
+
+from tornado import gen, testing
+
+from appscale.datastore.range_iterator import RangeReader
+
+
+class FakeScanDB(object):
+  """ Serves rows from range scans and records each request. """
+  def __init__(self, keys):
+    self.keys = keys
+    self.scans = []
+
+  @gen.coroutine
+  def range_scan(self, table_name, column_names, start_key, end_key,
+                 page_size, start_inclusive=True, end_inclusive=True,
+                 token=None):
+    self.scans.append((start_key, token))
+    position = token or 0
+    if token is None:
+      keys = [key for key in self.keys
+              if key > start_key or (start_inclusive and key == start_key)]
+      position = self.keys.index(keys[0]) if keys else len(self.keys)
+
+    page = self.keys[position:position + page_size]
+    next_token = position + page_size
+    if next_token >= len(self.keys):
+      next_token = None
+
+    raise gen.Return(([{key: {'reference': key}} for key in page],
+                      next_token))
+
+
+class TestRangeReader(testing.AsyncTestCase):
+  @testing.gen_test
+  def test_resume(self):
+    db = FakeScanDB(['key{:02d}'.format(i) for i in range(25)])
+    reader = RangeReader(db)
+
+    rows = yield reader.read('table', ['reference'], 'key00', 'key99', 10)
+    self.assertEqual(rows[-1].keys()[0], 'key09')
+
+    # Reading from the last key should continue the same scan.
+    rows = yield reader.read('table', ['reference'], 'key09', 'key99', 10,
+                             start_inclusive=False)
+    self.assertEqual(rows[0].keys()[0], 'key10')
+    self.assertEqual(db.scans[-1], ('key00', 10))
+
+    rows = yield reader.read('table', ['reference'], 'key19', 'key99', 10,
+                             start_inclusive=False)
+    self.assertEqual(len(rows), 5)
+
+    rows = yield reader.read('table', ['reference'], 'key24', 'key99', 10,
+                             start_inclusive=False)
+    self.assertEqual(rows, [])
+    self.assertEqual(len(db.scans), 3)
+
+  @testing.gen_test
+  def test_restart(self):
+    db = FakeScanDB(['key{:02d}'.format(i) for i in range(25)])
+    reader = RangeReader(db)
+    yield reader.read('table', ['reference'], 'key00', 'key99', 10)
+
+    # A different start key should start a new scan.
+    rows = yield reader.read('table', ['reference'], 'key14', 'key99', 5,
+                             start_inclusive=False)
+    self.assertEqual(rows[0].keys()[0], 'key15')
+    self.assertEqual(db.scans[-1], ('key14', None))
+
+
+if __name__ == "__main__":
+  unittest.main()
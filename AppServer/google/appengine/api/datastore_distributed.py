@@ -106,13 +106,15 @@ class InternalCursor():
   """ Keeps track of where we are in a query. Used for when queries are done
   in batches.
   """
-  def __init__(self, query, last_cursor, offset):
+  def __init__(self, query, last_cursor, offset, server_cursor=None):
     """ Constructor.
 
     Args:
       query: Starting query, a datastore_pb.Query.
       last_cursor: A compiled cursor, the last from a result list.
       offset: The number of entities we've seen so far.
+      server_cursor: A datastore_pb.Cursor that the datastore server can use
+        to resume the query, or None.
     """
     # Count is the limit we want to hit so we know we're done.
     self.__count = _MAX_INT_32
@@ -126,6 +128,7 @@ class InternalCursor():
     # Lets us know how many results we've seen so far. When
     # this hits the count we know we're done.
     self.__offset = offset
+    self.__server_cursor = server_cursor
 
   def get_query(self):
     return self.__query
@@ -148,6 +151,12 @@ class InternalCursor():
   def set_offset(self, offset):
     self.__offset = offset
 
+  def get_server_cursor(self):
+    return self.__server_cursor
+
+  def set_server_cursor(self, server_cursor):
+    self.__server_cursor = server_cursor
+
 class DatastoreDistributed(apiproxy_stub.APIProxyStub):
   """ A central server hooks up to a db and communicates via protocol 
       buffers.
@@ -504,6 +513,7 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
       new_index.MergeFrom(index_to_use)
 
     self._RemoteSend(query, query_result, "RunQuery", request_id)
+    server_cursor = self.__PopServerCursor(query_result)
     results = query_result.result_list()
     for result in results:
       old_datastore_stub_util.PrepareSpecialPropertiesForLoad(result)
@@ -513,7 +523,8 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
       last_cursor = query_result.compiled_cursor()
 
     if query_result.more_results():
-      new_cursor = InternalCursor(query, last_cursor, len(results))
+      new_cursor = InternalCursor(query, last_cursor, len(results),
+                                  server_cursor)
       cursor_id = self.__getCursorID()
       cursor = query_result.mutable_cursor()
       cursor.set_app(self.project_id)
@@ -571,9 +582,12 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
     # Remove any offset since first RunQuery deals with it.
     query.clear_offset()
 
-    query.mutable_compiled_cursor().CopyFrom(last_cursor)
+    if not self.__ResumeQuery(internal_cursor, count, query_result,
+                              request_id):
+      query.mutable_compiled_cursor().CopyFrom(last_cursor)
+      self._RemoteSend(query, query_result, "RunQuery", request_id)
 
-    self._RemoteSend(query, query_result, "RunQuery", request_id)
+    internal_cursor.set_server_cursor(self.__PopServerCursor(query_result))
     results = query_result.result_list()
     for result in results:
       old_datastore_stub_util.PrepareSpecialPropertiesForLoad(result)
@@ -602,6 +616,54 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
       cursor.set_app(self.project_id)
       cursor.set_cursor(cursor_handle)
 
+  def __ResumeQuery(self, internal_cursor, count, query_result, request_id):
+    """ Fetches the next batch from the datastore server that kept the query.
+
+    Args:
+      internal_cursor: The InternalCursor for the query.
+      count: The number of results to fetch.
+      query_result: A datastore_pb.QueryResult to populate.
+      request_id: A string specifying the request ID.
+    Returns:
+      A boolean indicating whether or not the query was resumed.
+    """
+    server_cursor = internal_cursor.get_server_cursor()
+    if server_cursor is None:
+      return False
+
+    next_request = datastore_pb.NextRequest()
+    next_request.mutable_cursor().CopyFrom(server_cursor)
+    next_request.set_count(count)
+    try:
+      self._RemoteSend(next_request, query_result, "Next", request_id)
+    except apiproxy_errors.ApplicationError as error:
+      # The cursor expired or the request reached a different datastore
+      # server, so the query needs to be run again from the compiled cursor.
+      if error.application_error != datastore_pb.Error.BAD_REQUEST:
+        raise
+
+      query_result.Clear()
+      return False
+
+    return True
+
+  @staticmethod
+  def __PopServerCursor(query_result):
+    """ Removes the datastore server's cursor from a query result.
+
+    Args:
+      query_result: A datastore_pb.QueryResult.
+    Returns:
+      A datastore_pb.Cursor or None.
+    """
+    if not query_result.has_cursor():
+      return None
+
+    server_cursor = datastore_pb.Cursor()
+    server_cursor.CopyFrom(query_result.cursor())
+    query_result.clear_cursor()
+    return server_cursor
+
   def _Dynamic_Count(self, query, integer64proto, request_id=None):
     """Get the number of entities for a query. """
     query_result = datastore_pb.QueryResult()
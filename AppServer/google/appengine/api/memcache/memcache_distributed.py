@@ -19,11 +19,12 @@
 Uses the python-memcached library to interface with memcached.
 """
 import base64
-import cPickle
 import logging
 import hashlib
 import memcache
 import os
+import random
+import struct
 import time
 
 from google.appengine.api import apiproxy_stub
@@ -56,6 +57,14 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
   # down).
   UPDATE_WINDOW = 60  # seconds
 
+  # Stored values are prefixed with a header containing a format version, the
+  # item's flags, and its CAS ID.
+  ENTRY_HEADER = struct.Struct('<BIQ')
+
+  # The header version for the current entry format. Entries with a different
+  # version are treated as missing.
+  ENTRY_VERSION = 1
+
   def __init__(self, gettime=time.time, service_name='memcache'):
     """Initializer.
 
@@ -81,6 +90,46 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
     memcaches.sort()    
     self._memcache = memcache.Client(memcaches, debug=0)
 
+  def _EncodeEntry(self, flags, cas_id, value):
+    """ Packs an item into the format that is stored in memcached.
+
+    Args:
+      flags: An integer containing the item's flags.
+      cas_id: An integer specifying the item's CAS ID.
+      value: A string containing the item's value.
+    Returns:
+      A string containing the entry.
+    """
+    return self.ENTRY_HEADER.pack(self.ENTRY_VERSION, flags, cas_id) + value
+
+  def _DecodeEntry(self, entry):
+    """ Unpacks an entry that was stored in memcached.
+
+    Args:
+      entry: A string containing the entry or None.
+    Returns:
+      A tuple containing the flags, CAS ID, and value or None if the entry
+      is not valid.
+    """
+    if entry is None or len(entry) < self.ENTRY_HEADER.size:
+      return None
+
+    version, flags, cas_id = self.ENTRY_HEADER.unpack_from(entry)
+    if version != self.ENTRY_VERSION:
+      return None
+
+    return flags, cas_id, entry[self.ENTRY_HEADER.size:]
+
+  def _NewCasId(self):
+    """ Generates a CAS ID for a new version of an item.
+
+    IDs are random so that writes do not need to read the previous version.
+
+    Returns:
+      An integer specifying a CAS ID.
+    """
+    return random.getrandbits(63)
+
   def _Dynamic_Get(self, request, response):
     """Implementation of gets for memcache.
      
@@ -88,18 +137,19 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
       request: A MemcacheGetRequest protocol buffer.
       response: A MemcacheGetResponse protocol buffer.
     """
-    for key in set(request.key_list()):
-      internal_key = self._GetKey(request.name_space(), key)
-      value = self._memcache.get(internal_key)
-      if value is None:
+    internal_keys = {self._GetKey(request.name_space(), key): key
+                     for key in set(request.key_list())}
+    entries = self._memcache.get_multi(internal_keys.keys())
+    for internal_key, entry in entries.iteritems():
+      decoded = self._DecodeEntry(entry)
+      if decoded is None:
         continue
-      flags = 0
-      stored_flags, cas_id, stored_value = cPickle.loads(value)
-      flags |= stored_flags
+
+      stored_flags, cas_id, stored_value = decoded
       item = response.add_item()
-      item.set_key(key)
+      item.set_key(internal_keys[internal_key])
       item.set_value(stored_value)
-      item.set_flags(flags)
+      item.set_flags(stored_flags)
       if request.for_cas():
         item.set_cas_id(cas_id)
 
@@ -110,42 +160,53 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
       request: A MemcacheSetRequest.
       response: A MemcacheSetResponse.
     """
-    for item in request.item_list():
-      key = self._GetKey(request.name_space(), item.key())
+    keys = [self._GetKey(request.name_space(), item.key())
+            for item in request.item_list()]
+
+    # Only ADD and CAS depend on the current entry. Memcached checks that the
+    # entry exists for REPLACE.
+    conditional_policies = (MemcacheSetRequest.ADD, MemcacheSetRequest.CAS)
+    to_read = [key for key, item in zip(keys, request.item_list())
+               if item.set_policy() in conditional_policies]
+    old_entries = {}
+    if to_read:
+      old_entries = self._memcache.get_multi(to_read)
+
+    statuses = []
+    # Maps expiration times to the entries that should be stored with them.
+    to_store = {}
+    for key, item in zip(keys, request.item_list()):
       set_policy = item.set_policy()
-      old_entry = self._memcache.get(key)
-      cas_id = 0
-      if old_entry:
-        _, cas_id, _ = cPickle.loads(old_entry)
+      old_entry = self._DecodeEntry(old_entries.get(key))
       set_status = MemcacheSetResponse.NOT_STORED
 
-      if ((set_policy == MemcacheSetRequest.SET) or
-        (set_policy == MemcacheSetRequest.ADD and old_entry is None) or
-        (set_policy == MemcacheSetRequest.REPLACE and
-        old_entry is not None)):
-
-        if (old_entry is None or set_policy == MemcacheSetRequest.SET):
-          set_status = MemcacheSetResponse.STORED
-
+      if (set_policy == MemcacheSetRequest.SET or
+          (set_policy == MemcacheSetRequest.ADD and old_entry is None)):
+        set_status = MemcacheSetResponse.STORED
       elif (set_policy == MemcacheSetRequest.CAS and item.for_cas() and
-        item.has_cas_id()):
-        if old_entry is None:
-          set_status = MemcacheSetResponse.NOT_STORED
-        elif cas_id != item.cas_id():
+            item.has_cas_id() and old_entry is not None):
+        if old_entry[1] != item.cas_id():
           set_status = MemcacheSetResponse.EXISTS
         else:
           set_status = MemcacheSetResponse.STORED
 
-      if (set_status == MemcacheSetResponse.STORED
-        or set_policy == MemcacheSetRequest.REPLACE):
+      set_value = self._EncodeEntry(item.flags(), self._NewCasId(),
+                                    item.value())
+      if set_policy == MemcacheSetRequest.REPLACE:
+        if self._memcache.replace(key, set_value, item.expiration_time()):
+          set_status = MemcacheSetResponse.STORED
+      elif set_status == MemcacheSetResponse.STORED:
+        to_store.setdefault(item.expiration_time(), {})[key] = set_value
 
-        set_value = cPickle.dumps(
-          [item.flags(), cas_id + 1, item.value()])
-        if set_policy == MemcacheSetRequest.REPLACE:
-          self._memcache.replace(key, set_value)
-        else:
-          self._memcache.set(key, set_value, item.expiration_time())
+      statuses.append(set_status)
+
+    not_stored = set()
+    for expiration_time, entries in to_store.iteritems():
+      not_stored.update(self._memcache.set_multi(entries, expiration_time))
 
+    for key, set_status in zip(keys, statuses):
+      if key in not_stored:
+        set_status = MemcacheSetResponse.NOT_STORED
       response.add_set_status(set_status)
 
   def _Dynamic_Delete(self, request, response):
@@ -181,17 +242,14 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
     if not request.delta():
       return None
 
-    cas_id = 0
-
     key = self._GetKey(namespace, request.key())
-    value = self._memcache.get(key)
-    if value is None:
+    entry = self._DecodeEntry(self._memcache.get(key))
+    if entry is None:
       if not request.has_initial_value():
         return None
-      flags, cas_id, stored_value = (
-        TYPE_INT, cas_id, str(request.initial_value()))
+      flags, stored_value = TYPE_INT, str(request.initial_value())
     else:
-      flags, cas_id, stored_value = cPickle.loads(value)
+      flags, _, stored_value = entry
 
     if flags == TYPE_INT:
       new_value = int(stored_value)
@@ -203,7 +261,8 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
     elif request.direction() == MemcacheIncrementRequest.DECREMENT:
       new_value = max(new_value-request.delta(), 0)
 
-    new_stored_value = cPickle.dumps([flags, cas_id + 1, str(new_value)])
+    new_stored_value = self._EncodeEntry(flags, self._NewCasId(),
+                                         str(new_value))
     try:
       self._memcache.cas(key, new_stored_value)
     except Exception, e:
@@ -19,10 +19,15 @@
 
 
 import array
+import errno
 import httplib
 import os
 import re
+import select
+import socket
 import struct
+import threading
+import time
 
 __all__ = ['ProtocolMessage', 'Encoder', 'Decoder',
            'ExtendableProtocolMessage',
@@ -33,6 +38,137 @@ __all__ = ['ProtocolMessage', 'Encoder', 'Decoder',
 
 URL_RE = re.compile('^(https?)://([^/]+)(/.*)$')
 
+
+# AppScale: Keep connections to API servers open between requests.
+class ConnectionPool(object):
+  """ A thread-safe pool of keep-alive connections to API servers. """
+
+  # The maximum number of idle connections to keep for each server.
+  MAX_IDLE_PER_HOST = 10
+
+  # The number of seconds an idle connection can be kept before it is closed.
+  MAX_IDLE_TIME = 30
+
+  def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST,
+               max_idle_time=MAX_IDLE_TIME):
+    """ Creates a new ConnectionPool.
+
+    Args:
+      max_idle_per_host: An integer specifying how many idle connections to
+        keep for each server.
+      max_idle_time: An integer specifying how long idle connections are kept.
+    """
+    self.max_idle_per_host = max_idle_per_host
+    self.max_idle_time = max_idle_time
+    self.reuses = 0
+    self.misses = 0
+    self.discards = 0
+    self._lock = threading.Lock()
+
+    # Maps connection keys to lists of (connection, last_used) tuples.
+    self._idle = {}
+
+  def acquire(self, server, secure=0, keyfile=None, certfile=None):
+    """ Retrieves a healthy idle connection or creates a new one.
+
+    Args:
+      server: A string specifying the server's host and port.
+      secure: A boolean indicating that HTTPS should be used.
+      keyfile: A string specifying the location of a private key.
+      certfile: A string specifying the location of a certificate.
+    Returns:
+      A tuple containing an httplib connection, a key for releasing it, and a
+      boolean indicating that it was reused.
+    """
+    key = (server, bool(secure), keyfile, certfile)
+    with self._lock:
+      idle = self._idle.get(key, [])
+      while idle:
+        conn, last_used = idle.pop()
+        if self._is_healthy(conn, last_used):
+          self.reuses += 1
+          return conn, key, True
+
+        self.discards += 1
+        conn.close()
+
+      self.misses += 1
+
+    if secure:
+      if keyfile and certfile:
+        conn = httplib.HTTPSConnection(server, key_file=keyfile,
+                                       cert_file=certfile)
+      else:
+        conn = httplib.HTTPSConnection(server)
+    else:
+      conn = httplib.HTTPConnection(server)
+
+    return conn, key, False
+
+  def release(self, conn, key):
+    """ Returns a connection to the pool after its response has been read.
+
+    Args:
+      conn: An httplib connection.
+      key: The key returned when the connection was acquired.
+    """
+    with self._lock:
+      idle = self._idle.setdefault(key, [])
+      if len(idle) < self.max_idle_per_host:
+        idle.append((conn, time.time()))
+        return
+
+    conn.close()
+
+  def stats(self):
+    """ Reports how often connections have been reused.
+
+    Returns:
+      A dictionary containing connection counters.
+    """
+    with self._lock:
+      idle = sum(len(connections) for connections in self._idle.values())
+      return {'reuses': self.reuses, 'misses': self.misses,
+              'discards': self.discards, 'idle': idle}
+
+  def _is_healthy(self, conn, last_used):
+    """ Checks if an idle connection can be used for another request.
+
+    Args:
+      conn: An httplib connection.
+      last_used: A timestamp specifying when the connection was released.
+    Returns:
+      A boolean indicating whether or not the connection can be reused.
+    """
+    if conn.sock is None or time.time() - last_used > self.max_idle_time:
+      return False
+
+    # An idle connection should have nothing to read. If the socket is
+    # readable, the server closed it or sent something unexpected.
+    try:
+      readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (select.error, socket.error, ValueError):
+      return False
+
+    return not readable
+
+
+_CONNECTION_POOL = ConnectionPool()
+
+# Errors that indicate a pooled connection was closed by the server before a
+# request could be written to it.
+_STALE_CONNECTION_ERRNOS = (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+
+def connection_pool_stats():
+  """ Reports how often API server connections have been reused.
+
+  Returns:
+    A dictionary containing connection counters.
+  """
+  return _CONNECTION_POOL.stats()
+
+
 class ProtocolMessage:
 
 
@@ -111,14 +247,58 @@ class ProtocolMessage:
                   secure=0, keyfile=None, certfile=None, service_id=None,
                   version_id=None):
     data = self.Encode()
-    if secure:
-      if keyfile and certfile:
-        conn = httplib.HTTPSConnection(server, key_file=keyfile,
-                                       cert_file=certfile)
-      else:
-        conn = httplib.HTTPSConnection(server)
+    # AppScale: Reuse connections from the pool. A reused connection may have
+    # been closed by the server after the health check. The request is only
+    # retried with a new connection when writing it failed, since the server
+    # may have already processed a request that was fully sent.
+    conn, key, reused = _CONNECTION_POOL.acquire(server, secure, keyfile,
+                                                 certfile)
+    try:
+      self._sendRequest(conn, data, url)
+    except socket.error as error:
+      conn.close()
+      if not (reused and error.errno in _STALE_CONNECTION_ERRNOS):
+        raise
+
+      conn, key, _ = _CONNECTION_POOL.acquire(server, secure, keyfile,
+                                              certfile)
+      try:
+        self._sendRequest(conn, data, url)
+      except Exception:
+        conn.close()
+        raise
+    except Exception:
+      conn.close()
+      raise
+
+    try:
+      resp = conn.getresponse()
+      body = resp.read()
+    except Exception:
+      conn.close()
+      raise
+
+    if resp.will_close:
+      conn.close()
     else:
-      conn = httplib.HTTPConnection(server)
+      _CONNECTION_POOL.release(conn, key)
+
+    if follow_redirects > 0 and resp.status == 302:
+      m = URL_RE.match(resp.getheader('Location'))
+      if m:
+        protocol, server, url = m.groups()
+        return self.sendCommand(server, url, response,
+                                follow_redirects=follow_redirects - 1,
+                                secure=(protocol == 'https'),
+                                keyfile=keyfile,
+                                certfile=certfile)
+    if resp.status != 200:
+      raise ProtocolBufferReturnError(resp.status)
+    if response is not None:
+      response.ParseFromString(body)
+    return response
+
+  def _sendRequest(self, conn, data, url):
     conn.putrequest("POST", '/')
     conn.putheader("Content-Length", "%d" %len(data))
     # AppScale:
@@ -139,23 +319,6 @@ class ProtocolMessage:
 
     conn.endheaders()
     conn.send(data)
-    resp = conn.getresponse()
-    if follow_redirects > 0 and resp.status == 302:
-      m = URL_RE.match(resp.getheader('Location'))
-      if m:
-        protocol, server, url = m.groups()
-        return self.sendCommand(server, url, response,
-                                follow_redirects=follow_redirects - 1,
-                                secure=(protocol == 'https'),
-                                keyfile=keyfile,
-                                certfile=certfile)
-    if resp.status != 200:
-      conn.close()
-      raise ProtocolBufferReturnError(resp.status)
-    if response is not None:
-      response.ParseFromString(resp.read())
-    conn.close()
-    return response
 
   def sendSecureCommand(self, server, keyfile, certfile, url, response,
                         follow_redirects=1):
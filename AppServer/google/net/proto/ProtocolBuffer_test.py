@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""Tests for connection reuse in google.net.proto.ProtocolBuffer."""
+
+
+import errno
+import httplib
+import socket
+import unittest
+
+from google.net.proto import ProtocolBuffer
+
+
+class FakeResponse(object):
+  def __init__(self, body='', status=200, will_close=False):
+    self.body = body
+    self.status = status
+    self.will_close = will_close
+
+  def read(self):
+    return self.body
+
+  def getheader(self, name):
+    return None
+
+
+class FakeConnection(object):
+  def __init__(self, send_error=None, response=None, response_error=None):
+    self.send_error = send_error
+    self.response = response or FakeResponse()
+    self.response_error = response_error
+    self.sent = []
+    self.closed = False
+
+  def putrequest(self, method, url):
+    pass
+
+  def putheader(self, header, value):
+    pass
+
+  def endheaders(self):
+    pass
+
+  def send(self, data):
+    if self.send_error is not None:
+      raise self.send_error
+    self.sent.append(data)
+
+  def getresponse(self):
+    if self.response_error is not None:
+      raise self.response_error
+    return self.response
+
+  def close(self):
+    self.closed = True
+
+
+class FakePool(object):
+  """Hands out a fixed sequence of (connection, reused) pairs."""
+
+  def __init__(self, connections):
+    self.connections = list(connections)
+    self.acquired = 0
+    self.released = []
+
+  def acquire(self, server, secure=0, keyfile=None, certfile=None):
+    conn, reused = self.connections.pop(0)
+    self.acquired += 1
+    return conn, server, reused
+
+  def release(self, conn, key):
+    self.released.append(conn)
+
+
+class FakeMessage(ProtocolBuffer.ProtocolMessage):
+  def __init__(self, contents=None):
+    self.contents = contents
+
+  def Encode(self):
+    return 'request'
+
+  def ParseFromString(self, s):
+    self.contents = s
+
+
+class SendCommandTest(unittest.TestCase):
+  def setUp(self):
+    self.original_pool = ProtocolBuffer._CONNECTION_POOL
+
+  def tearDown(self):
+    ProtocolBuffer._CONNECTION_POOL = self.original_pool
+
+  def _use_pool(self, connections):
+    pool = FakePool(connections)
+    ProtocolBuffer._CONNECTION_POOL = pool
+    return pool
+
+  def test_reuses_connection(self):
+    conn = FakeConnection(response=FakeResponse('ok'))
+    pool = self._use_pool([(conn, True)])
+
+    response = FakeMessage()
+    FakeMessage().sendCommand('localhost:8888', 'app', response)
+
+    self.assertEqual('ok', response.contents)
+    self.assertEqual([conn], pool.released)
+    self.assertFalse(conn.closed)
+
+  def test_retries_stale_connection_before_send(self):
+    stale = FakeConnection(send_error=socket.error(errno.ECONNRESET, 'reset'))
+    fresh = FakeConnection(response=FakeResponse('ok'))
+    pool = self._use_pool([(stale, True), (fresh, False)])
+
+    response = FakeMessage()
+    FakeMessage().sendCommand('localhost:8888', 'app', response)
+
+    self.assertEqual('ok', response.contents)
+    self.assertTrue(stale.closed)
+    self.assertEqual(['request'], fresh.sent)
+    self.assertEqual([fresh], pool.released)
+
+  def test_no_retry_on_new_connection(self):
+    conn = FakeConnection(send_error=socket.error(errno.ECONNRESET, 'reset'))
+    pool = self._use_pool([(conn, False)])
+
+    self.assertRaises(socket.error, FakeMessage().sendCommand,
+                      'localhost:8888', 'app', FakeMessage())
+    self.assertEqual(1, pool.acquired)
+    self.assertTrue(conn.closed)
+
+  def test_no_retry_after_send(self):
+    # The server may have already handled a request that was fully written.
+    conn = FakeConnection(response_error=httplib.BadStatusLine(''))
+    pool = self._use_pool([(conn, True)])
+
+    self.assertRaises(httplib.BadStatusLine, FakeMessage().sendCommand,
+                      'localhost:8888', 'app', FakeMessage())
+    self.assertEqual(1, pool.acquired)
+    self.assertEqual(['request'], conn.sent)
+    self.assertTrue(conn.closed)
+    self.assertEqual([], pool.released)
+
+    conn = FakeConnection(
+      response_error=socket.error(errno.ECONNRESET, 'reset'))
+    pool = self._use_pool([(conn, True)])
+
+    self.assertRaises(socket.error, FakeMessage().sendCommand,
+                      'localhost:8888', 'app', FakeMessage())
+    self.assertEqual(1, pool.acquired)
+    self.assertTrue(conn.closed)
+
+  def test_closes_connection_on_other_errors(self):
+    conn = FakeConnection(send_error=socket.timeout('timed out'))
+    pool = self._use_pool([(conn, True)])
+
+    self.assertRaises(socket.timeout, FakeMessage().sendCommand,
+                      'localhost:8888', 'app', FakeMessage())
+    self.assertTrue(conn.closed)
+    self.assertEqual(1, pool.acquired)
+
+    conn = FakeConnection(response_error=ValueError('bad response'))
+    pool = self._use_pool([(conn, False)])
+
+    self.assertRaises(ValueError, FakeMessage().sendCommand,
+                      'localhost:8888', 'app', FakeMessage())
+    self.assertTrue(conn.closed)
+    self.assertEqual([], pool.released)
+
+  def test_closes_connection_when_server_closes(self):
+    conn = FakeConnection(response=FakeResponse('ok', will_close=True))
+    pool = self._use_pool([(conn, False)])
+
+    FakeMessage().sendCommand('localhost:8888', 'app', FakeMessage())
+    self.assertTrue(conn.closed)
+    self.assertEqual([], pool.released)
+
+
+if __name__ == '__main__':
+  unittest.main()
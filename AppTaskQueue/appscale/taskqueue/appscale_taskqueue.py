@@ -19,11 +19,12 @@ from appscale.datastore.cassandra_env.cassandra_interface import DatastoreProxy
 
 from appscale.taskqueue import distributed_tq
 from appscale.taskqueue.constants import SHUTTING_DOWN_TIMEOUT
+from appscale.taskqueue.lease_coordinator import LeaseCoordinator
 from appscale.taskqueue.rest_api import (
   RESTLease, RESTQueue, RESTTask, RESTTasks
 )
 from appscale.taskqueue.statistics import (
-  PROTOBUFFER_API, service_stats, stats_lock
+  PROTOBUFFER_API, lease_stats, lease_stats_lock, service_stats, stats_lock
 )
 from appscale.taskqueue.utils import logger
 
@@ -199,10 +200,16 @@ class StatsHandler(RequestHandler):
     try:
       if cursor:
         recent_stats = service_stats.scroll_recent(int(cursor))
+        with lease_stats_lock:
+          recent_leases = lease_stats.scroll_recent(int(cursor))
       elif last_milliseconds:
         recent_stats = service_stats.get_recent(int(last_milliseconds))
+        with lease_stats_lock:
+          recent_leases = lease_stats.get_recent(int(last_milliseconds))
       else:
         recent_stats = service_stats.get_recent()
+        with lease_stats_lock:
+          recent_leases = lease_stats.get_recent()
     except ValueError:
       self.set_status(400, "cursor and last_milliseconds "
                            "arguments should be integers")
@@ -210,11 +217,17 @@ class StatsHandler(RequestHandler):
 
     with (yield stats_lock.acquire()):
       cumulative_counters = service_stats.get_cumulative_counters()
+    with lease_stats_lock:
+      lease_counters = lease_stats.get_cumulative_counters()
 
     tq_stats = {
       "current_requests": service_stats.current_requests,
       "cumulative_counters": cumulative_counters,
-      "recent_stats": recent_stats
+      "recent_stats": recent_stats,
+      "lease_stats": {
+        "cumulative_counters": lease_counters,
+        "recent_stats": recent_leases
+      }
     }
     self.write(json.dumps(tq_stats))
 
@@ -281,6 +294,9 @@ def main():
                       help='TaskQueue server port')
   parser.add_argument('--verbose', action='store_true',
                       help='Output debug-level logging')
+  parser.add_argument('--coordinate-leases', action='store_true',
+                      help='Prefer leasing pull queue tasks from a slice that '
+                           'is not shared with other TaskQueue servers')
   args = parser.parse_args()
   if args.verbose:
     logging.getLogger('appscale').setLevel(logging.DEBUG)
@@ -293,7 +309,12 @@ def main():
   db_access = DatastoreProxy()
 
   # Initialize tornado server
-  task_queue = distributed_tq.DistributedTaskQueue(db_access, zk_client)
+  lease_coordinator = None
+  if args.coordinate_leases:
+    lease_coordinator = LeaseCoordinator(zk_client)
+
+  task_queue = distributed_tq.DistributedTaskQueue(db_access, zk_client,
+                                                   lease_coordinator)
   tq_application = prepare_taskqueue_application(task_queue)
   # Automatically decompress incoming requests.
   server = httpserver.HTTPServer(tq_application, decompress_request=True)
@@ -27,6 +27,7 @@ from cassandra import (
 )
 from cassandra.cluster import SimpleStatement
 from cassandra.policies import FallthroughRetryPolicy
+from concurrent.futures import ThreadPoolExecutor
 from .constants import (
   InvalidTarget,
   QueueNotFound,
@@ -40,7 +41,9 @@ from .queue import (
   PushQueue,
   TransientError
 )
+from .task import InvalidTaskInfo
 from .task import Task
+from .task import TaskNameTaken
 from .task_name import TaskName
 from .tq_lib import TASK_STATES
 from .utils import (
@@ -266,12 +269,17 @@ class DistributedTaskQueue():
   # Kind used for storing task names.
   TASK_NAME_KIND = "__task_name__"
 
-  def __init__(self, db_access, zk_client):
+  # The number of threads that run blocking pull queue operations for the
+  # REST API.
+  REST_WORKERS = 16
+
+  def __init__(self, db_access, zk_client, lease_coordinator=None):
     """ DistributedTaskQueue Constructor.
 
     Args:
       db_access: A DatastoreProxy object.
       zk_client: A KazooClient.
+      lease_coordinator: A LeaseCoordinator or None.
     """
     setup_env()
 
@@ -284,8 +292,10 @@ class DistributedTaskQueue():
 
     self.db_access = db_access
     self.load_balancers = appscale_info.get_load_balancer_ips()
-    self.queue_manager = GlobalQueueManager(zk_client, db_access)
+    self.queue_manager = GlobalQueueManager(zk_client, db_access,
+                                            lease_coordinator)
     self.service_manager = GlobalServiceManager(zk_client)
+    self.thread_pool = ThreadPoolExecutor(self.REST_WORKERS)
 
   def get_queue(self, app, queue):
     """ Fetches a Queue object.
@@ -523,6 +533,7 @@ class DistributedTaskQueue():
 
     # Assign names if needed and validate tasks.
     error_found = False
+    pull_tasks = {}
     for add_request in request.add_request_list():
       task_result = response.add_taskresult()
 
@@ -542,10 +553,8 @@ class DistributedTaskQueue():
         if add_request.has_tag():
           task_info['tag'] = add_request.tag()
 
-        new_task = Task(task_info)
-        queue.add_task(new_task)
-        task_result.set_result(TaskQueueServiceError.OK)
-        task_result.set_chosen_task_name(new_task.id)
+        pull_tasks.setdefault(queue, []).append(
+          (Task(task_info), task_result))
         continue
 
       result = tq_lib.verify_task_queue_add_request(add_request.app_id(),
@@ -566,24 +575,31 @@ class DistributedTaskQueue():
       else:
         error_found = True
         task_result.set_result(result)
+
+    for queue, tasks in pull_tasks.iteritems():
+      errors = queue.add_tasks([task for task, _ in tasks])
+      for (task, task_result), error in zip(tasks, errors):
+        if isinstance(error, TaskNameTaken):
+          task_result.set_result(TaskQueueServiceError.TASK_ALREADY_EXISTS)
+        elif isinstance(error, InvalidTaskInfo):
+          task_result.set_result(TaskQueueServiceError.INVALID_REQUEST)
+        elif isinstance(error, TransientError):
+          task_result.set_result(TaskQueueServiceError.TRANSIENT_ERROR)
+        else:
+          task_result.set_result(TaskQueueServiceError.OK)
+          task_result.set_chosen_task_name(task.id)
+
     if error_found:
       return
 
-    for add_request, task_result in zip(request.add_request_list(),
-                                        response.taskresult_list()):
-      if (add_request.has_mode() and
-          add_request.mode() == taskqueue_service_pb.TaskQueueMode.PULL):
-        continue
-
-      try:
-        self.__enqueue_push_task(source_info, add_request)
-      except apiproxy_errors.ApplicationError as error:
-        task_result.set_result(error.application_error)
-      except InvalidTarget as e:
-        logger.error(e.message)
-        task_result.set_result(TaskQueueServiceError.INVALID_REQUEST)
-      else:
-        task_result.set_result(TaskQueueServiceError.OK)
+    push_tasks = [
+      (add_request, add_result)
+      for add_request, add_result in zip(request.add_request_list(),
+                                         response.taskresult_list())
+      if not (add_request.has_mode() and
+              add_request.mode() == taskqueue_service_pb.TaskQueueMode.PULL)]
+    if push_tasks:
+      self.__enqueue_push_tasks(source_info, push_tasks)
 
   def __method_mapping(self, method):
     """ Maps an int index to a string.
@@ -604,73 +620,161 @@ class DistributedTaskQueue():
     elif method == taskqueue_service_pb.TaskQueueQueryTasksResponse_Task.DELETE:
       return 'DELETE'
 
-  def __check_and_store_task_names(self, request):
-    """ Tries to fetch the taskqueue name, if it exists it will raise an
-    exception.
+  def __check_and_store_task_names(self, requests):
+    """ Checks that task names have not been used and stores receipts for the
+    ones that are new.
 
     We store a receipt of each enqueued task in the datastore. If we find that
-    task in the datastore, we will raise an exception. If the task is not
-    in the datastore, then it is assumed this is the first time seeing the
-    tasks and we create a receipt of the task in the datastore to prevent
-    a duplicate task from being enqueued.
+    task in the datastore, the task is rejected. If the task is not in the
+    datastore, then it is assumed this is the first time seeing the task and
+    we create a receipt of the task in the datastore to prevent a duplicate
+    task from being enqueued. All of the receipts are fetched and stored with
+    a single datastore request each.
 
     Args:
-      request: A taskqueue_service_pb.TaskQueueAddRequest.
-    Raises:
-      A apiproxy_errors.ApplicationError of TASK_ALREADY_EXISTS.
+      requests: A list of taskqueue_service_pb.TaskQueueAddRequest objects.
+    Returns:
+      A list containing an error code for each request or None if the task
+      name was stored.
     """
-    task_name = request.task_name()
-    item = TaskName.get_by_key_name(task_name)
-    logger.debug("Task name {0}".format(task_name))
-    if item:
-      if item.state == TASK_STATES.QUEUED:
+    task_names = [request.task_name() for request in requests]
+    try:
+      items = TaskName.get_by_key_name(task_names)
+    except datastore_errors.InternalError as internal_error:
+      logger.error(str(internal_error))
+      return [TaskQueueServiceError.DATASTORE_ERROR for _ in requests]
+
+    errors = []
+    new_names = []
+    seen = set()
+    for request, task_name, item in zip(requests, task_names, items):
+      logger.debug("Task name {0}".format(task_name))
+      if task_name in seen or (item and item.state == TASK_STATES.QUEUED):
         logger.warning("Task already exists")
-        raise apiproxy_errors.ApplicationError(
-          TaskQueueServiceError.TASK_ALREADY_EXISTS)
-      else:
+        errors.append(TaskQueueServiceError.TASK_ALREADY_EXISTS)
+        continue
+
+      if item:
         # If a task with the same name has already been processed, it should
         # be tombstoned for some time to prevent a duplicate task.
-        raise apiproxy_errors.ApplicationError(
-          TaskQueueServiceError.TOMBSTONED_TASK)
+        errors.append(TaskQueueServiceError.TOMBSTONED_TASK)
+        continue
+
+      seen.add(task_name)
+      errors.append(None)
+      new_names.append(
+        TaskName(key_name=task_name, state=tq_lib.TASK_STATES.QUEUED,
+                 queue=request.queue_name(), app_id=request.app_id()))
+
+    if not new_names:
+      return errors
 
-    new_name = TaskName(key_name=task_name, state=tq_lib.TASK_STATES.QUEUED,
-      queue=request.queue_name(), app_id=request.app_id())
-    logger.debug("Creating entity {0}".format(str(new_name)))
+    logger.debug("Creating {0} task name entities".format(len(new_names)))
     try:
-      db.put(new_name)
+      db.put(new_names)
     except datastore_errors.InternalError as internal_error:
       logger.error(str(internal_error))
-      raise apiproxy_errors.ApplicationError(
-        TaskQueueServiceError.DATASTORE_ERROR)
+      return [error or TaskQueueServiceError.DATASTORE_ERROR
+              for error in errors]
+
+    return errors
 
-  def __enqueue_push_task(self, source_info, request):
+  def __enqueue_push_tasks(self, source_info, push_tasks):
     """ Enqueues a batch of push tasks.
 
+    Each Celery application publishes its tasks through a single producer, so
+    the batch shares one broker channel.
+
     Args:
       source_info: A dictionary containing the application, module, and version
        ID that is sending this request.
-      request: A taskqueue_service_pb.TaskQueueAddRequest.
+      push_tasks: A list of tuples containing a
+        taskqueue_service_pb.TaskQueueAddRequest and the
+        taskqueue_service_pb.TaskQueueBulkAddResponse_TaskResult to fill in.
     """
-    self.__validate_push_task(request)
-    self.__check_and_store_task_names(request)
-    headers = self.get_task_headers(request)
-    args = self.get_task_args(source_info, headers, request)
-    countdown = int(headers['X-AppEngine-TaskETA']) - \
-                int(datetime.datetime.now().strftime("%s"))
-
-    push_queue = self.get_queue(request.app_id(), request.queue_name())
-    task_func = get_queue_function_name(push_queue.name)
-    celery_queue = get_celery_queue_name(request.app_id(), push_queue.name)
-
-    push_queue.celery.send_task(
-      task_func,
-      kwargs={'headers': headers, 'args': args},
-      expires=args['expires'],
-      acks_late=True,
-      countdown=countdown,
-      queue=celery_queue,
-      routing_key=celery_queue,
-    )
+    # Prepare the messages before storing any task names so that invalid
+    # tasks do not leave receipts behind.
+    prepared = []
+    for request, task_result in push_tasks:
+      try:
+        self.__validate_push_task(request)
+        headers = self.get_task_headers(request)
+        args = self.get_task_args(source_info, headers, request)
+      except apiproxy_errors.ApplicationError as error:
+        task_result.set_result(error.application_error)
+        continue
+      except InvalidTarget as e:
+        logger.error(e.message)
+        task_result.set_result(TaskQueueServiceError.INVALID_REQUEST)
+        continue
+
+      prepared.append((request, task_result, headers, args))
+
+    if not prepared:
+      return
+
+    errors = self.__check_and_store_task_names(
+      [request for request, _, _, _ in prepared])
+
+    by_celery = {}
+    for (request, task_result, headers, args), error in zip(prepared, errors):
+      if error is not None:
+        task_result.set_result(error)
+        continue
+
+      push_queue = self.get_queue(request.app_id(), request.queue_name())
+      by_celery.setdefault(push_queue.celery, []).append(
+        (request, push_queue, task_result, headers, args))
+
+    unsent = []
+    for celery, tasks in by_celery.iteritems():
+      # The position of the first task that has not been published.
+      index = 0
+      try:
+        with celery.producer_or_acquire() as producer:
+          for _, push_queue, task_result, headers, args in tasks:
+            countdown = int(headers['X-AppEngine-TaskETA']) - \
+                        int(datetime.datetime.now().strftime("%s"))
+            task_func = get_queue_function_name(push_queue.name)
+            celery_queue = get_celery_queue_name(push_queue.app,
+                                                 push_queue.name)
+            celery.send_task(
+              task_func,
+              kwargs={'headers': headers, 'args': args},
+              expires=args['expires'],
+              acks_late=True,
+              countdown=countdown,
+              queue=celery_queue,
+              routing_key=celery_queue,
+              producer=producer
+            )
+            task_result.set_result(TaskQueueServiceError.OK)
+            index += 1
+      except Exception:
+        logger.exception('Unable to publish {} push tasks'.format(
+          len(tasks) - index))
+        unsent.extend(tasks[index:])
+
+    if unsent:
+      self.__release_task_names(
+        [request.task_name() for request, _, _, _, _ in unsent])
+      for _, _, task_result, _, _ in unsent:
+        task_result.set_result(TaskQueueServiceError.TRANSIENT_ERROR)
+
+  def __release_task_names(self, task_names):
+    """ Deletes the receipts of tasks that were not enqueued so that clients
+    can retry them.
+
+    Args:
+      task_names: A list of strings specifying task names.
+    """
+    keys = [db.Key.from_path(TaskName.kind(), task_name)
+            for task_name in task_names]
+    try:
+      db.delete(keys)
+    except datastore_errors.Error as error:
+      logger.error('Unable to delete receipts of unsent tasks: {}'.format(
+        error))
 
   def get_task_args(self, source_info, headers, request):
     """ Gets the task args used when making a task web request.
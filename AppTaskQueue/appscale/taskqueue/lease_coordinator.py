@@ -0,0 +1,128 @@
+""" Divides pull queue tasks between registered TaskQueue servers. """
+
+import uuid
+import zlib
+
+from kazoo.client import KazooState
+from kazoo.exceptions import NoNodeError
+from kazoo.exceptions import ZookeeperError
+from tornado.ioloop import IOLoop
+
+from .utils import logger
+
+
+class LeaseCoordinator(object):
+  """ Assigns each TaskQueue server a disjoint slice of pull queue tasks.
+
+  Servers prefer to lease the tasks in their own slice so that concurrent
+  lease requests handled by different servers do not compete for the same
+  tasks.
+  """
+  # The ZooKeeper node that contains server registrations.
+  REGISTRATION_PATH = '/appscale/taskqueue/lease_workers'
+
+  def __init__(self, zk_client):
+    """ Creates a new LeaseCoordinator.
+
+    Args:
+      zk_client: A KazooClient.
+    """
+    self.index = 0
+    self.total_workers = 1
+
+    self._worker_id = uuid.uuid4().hex
+    self._zk_client = zk_client
+    self._node = None
+
+    self._zk_client.ensure_path(self.REGISTRATION_PATH)
+
+    # Make sure the ephemeral registration node is recreated upon reconnect.
+    self._zk_client.add_listener(self._state_listener)
+    self._register_worker()
+
+    # Make sure the assignment is updated whenever a server registers or
+    # disappears.
+    self._zk_client.ChildrenWatch(self.REGISTRATION_PATH,
+                                  self._update_assignment_watch)
+
+  def owns(self, task_id):
+    """ Checks if a task belongs to this server's slice.
+
+    Args:
+      task_id: A string specifying a task ID.
+    Returns:
+      A boolean indicating that this server should prefer leasing the task.
+    """
+    if self.total_workers < 2:
+      return True
+
+    slot = zlib.crc32(task_id) & 0xffffffff
+    return slot % self.total_workers == self.index
+
+  def _update_assignment(self, workers):
+    """ Updates the slice of tasks this server prefers to lease.
+
+    Args:
+      workers: A list of strings specifying registered servers.
+    """
+    workers.sort(key=lambda name: name.rsplit('-')[1])
+
+    self.total_workers = len(workers)
+    try:
+      self.index = workers.index(self._node)
+    except ValueError:
+      self._register_worker()
+      workers = self._zk_client.retry(self._zk_client.get_children,
+                                      self.REGISTRATION_PATH)
+      return self._update_assignment(workers)
+
+    logger.info('Leasing pull queue slice {}/{}'.format(self.index + 1,
+                                                        self.total_workers))
+
+  def _update_assignment_watch(self, children):
+    """ Watches for new or lost servers.
+
+    Args:
+      children: A list of strings specifying registered servers.
+    """
+    IOLoop.instance().add_callback(self._update_assignment, children)
+
+  def _clean_created_nodes(self):
+    """ Removes any registrations this server may have created. """
+    all_nodes = self._zk_client.retry(self._zk_client.get_children,
+                                      self.REGISTRATION_PATH)
+    to_delete = [node for node in all_nodes
+                 if node.startswith(self._worker_id)]
+    for node in to_delete:
+      full_path = '/'.join([self.REGISTRATION_PATH, node])
+      while True:
+        try:
+          self._zk_client.delete(full_path)
+          break
+        except NoNodeError:
+          break
+        except ZookeeperError:
+          continue
+
+  def _register_worker(self):
+    """ Creates a ZooKeeper entry that broadcasts this server's presence. """
+    logger.info('Registering lease worker with ZooKeeper')
+    node_prefix = '/'.join([self.REGISTRATION_PATH, self._worker_id]) + '-'
+
+    # Make sure an older node from this server did not remain.
+    self._clean_created_nodes()
+
+    while True:
+      try:
+        full_path = self._zk_client.create(node_prefix, ephemeral=True,
+                                           sequence=True)
+        self._node = full_path[len(self.REGISTRATION_PATH) + 1:]
+        break
+      except ZookeeperError:
+        self._clean_created_nodes()
+        continue
+
+  def _state_listener(self, state):
+    """ Watches for changes to the ZooKeeper connection state. """
+    if state == KazooState.CONNECTED:
+      IOLoop.instance().add_callback(self._register_worker)
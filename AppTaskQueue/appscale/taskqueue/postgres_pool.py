@@ -0,0 +1,121 @@
+""" Shares PostgreSQL connections between threads that run queue operations. """
+
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from .utils import logger
+
+
+class PostgresConnectionPool(object):
+  """ Lends PostgreSQL connections and keeps track of the statements that have
+  been prepared on each of them. """
+
+  # The maximum number of connections to keep open for a project.
+  DEFAULT_MAX_CONNECTIONS = 10
+
+  def __init__(self, dsn, max_connections=DEFAULT_MAX_CONNECTIONS):
+    """ Creates a new PostgresConnectionPool.
+
+    Args:
+      dsn: A string specifying how to connect to PostgreSQL.
+      max_connections: An integer specifying the maximum number of
+        connections to open.
+    """
+    # Import psycopg2 lazily
+    from psycopg2 import Error as DatabaseError
+    from psycopg2.pool import ThreadedConnectionPool
+    # ThreadedConnectionPool closes returned connections when it already
+    # holds minconn idle ones. Keeping every connection open preserves the
+    # statements prepared on it.
+    self._pool = ThreadedConnectionPool(max_connections, max_connections, dsn)
+
+    # Only database errors leave a connection in a state that needs cleaning.
+    self._database_error = DatabaseError
+
+    # ThreadedConnectionPool raises an error when all of its connections are
+    # in use, so callers wait for one to be returned instead.
+    self._available = threading.BoundedSemaphore(max_connections)
+
+    # Maps connection IDs to the names of statements prepared on them.
+    self._prepared = {}
+
+  @contextmanager
+  def transaction(self):
+    """ Lends a cursor for a single transaction. The transaction is committed
+    when the block completes and rolled back if the block raises an exception.
+    Prepared statements are only discarded after database errors, so callers
+    can raise their own exceptions without losing them.
+
+    Yields:
+      A psycopg2 cursor.
+    """
+    self._available.acquire()
+    try:
+      connection = self._pool.getconn()
+      try:
+        yield connection.cursor()
+        connection.commit()
+      except self._database_error as err:
+        logger.error('Rolling back transaction ({err})'.format(err=err))
+        self._rollback(connection)
+        raise
+      except Exception:
+        if not connection.closed:
+          connection.rollback()
+        raise
+      finally:
+        self._pool.putconn(connection, close=bool(connection.closed))
+        # The pool may close the connection as well. A new connection can
+        # get the same ID, so it must not inherit the prepared statements.
+        if connection.closed:
+          self._prepared.pop(id(connection), None)
+    finally:
+      self._available.release()
+
+  def execute_prepared(self, pg_cursor, statement, params=()):
+    """ Executes a statement after preparing it on the cursor's connection if
+    that has not been done yet.
+
+    Args:
+      pg_cursor: A cursor lent by the transaction method.
+      statement: A string containing a statement that uses positional
+        parameters ($1, $2, etc).
+      params: A tuple containing the values of the parameters.
+    """
+    name = 'tq_{}'.format(hashlib.md5(statement).hexdigest())
+    prepared = self._prepared.setdefault(id(pg_cursor.connection), set())
+    if name not in prepared:
+      pg_cursor.execute('PREPARE {name} AS {statement}'.format(
+        name=name, statement=statement))
+      prepared.add(name)
+
+    if not params:
+      pg_cursor.execute('EXECUTE {name}'.format(name=name))
+      return
+
+    placeholders = ', '.join(['%s'] * len(params))
+    pg_cursor.execute(
+      'EXECUTE {name} ({placeholders})'.format(name=name,
+                                               placeholders=placeholders),
+      params)
+
+  def closeall(self):
+    """ Closes all of the connections. """
+    self._pool.closeall()
+    self._prepared.clear()
+
+  def _rollback(self, connection):
+    """ Rolls back a failed transaction and discards the prepared statements
+    so that they are prepared again in a clean state.
+
+    Args:
+      connection: A psycopg2 connection.
+    """
+    if connection.closed:
+      return
+
+    connection.rollback()
+    if self._prepared.pop(id(connection), None):
+      connection.cursor().execute('DEALLOCATE ALL')
+      connection.commit()
@@ -15,8 +15,10 @@ from appscale.datastore.cassandra_env.retry_policies import (
 from appscale.datastore.dbconstants import TRANSIENT_CASSANDRA_ERRORS
 from cassandra import DriverException
 from cassandra.query import BatchStatement
+from cassandra.query import BatchType
 from cassandra.query import ConsistencyLevel
 from cassandra.query import SimpleStatement
+from collections import OrderedDict
 from collections import deque
 from threading import Lock
 from .constants import AGE_LIMIT_REGEX
@@ -24,7 +26,10 @@ from .constants import EmptyQueue
 from .constants import InvalidQueueConfiguration
 from .constants import RATE_REGEX
 from .constants import TaskNotFound
+from .statistics import lease_stats
+from .statistics import lease_stats_lock
 from .task import InvalidTaskInfo
+from .task import TaskNameTaken
 from .task import Task
 from .utils import logger
 
@@ -245,28 +250,40 @@ class PostgresPullQueue(Queue):
   Before using Postgres implementation, make sure that
   connection using appscale user can be created:
   /etc/postgresql/9.5/main/pg_hba.conf
+
+  Tasks are stored in child tables of the queue table, one for each day that
+  tasks were enqueued. Queries against the queue table include its
+  partitions, and old partitions are dropped instead of deleting their rows.
   """
 
-  TTL_INTERVAL_AFTER_DELETED = '7 days'
+  TTL_AFTER_DELETED = datetime.timedelta(days=7)
+
+  TTL_INTERVAL_AFTER_DELETED = '{} days'.format(TTL_AFTER_DELETED.days)
+
+  # The format of the day suffix in partition names.
+  PARTITION_DAY_FORMAT = '%Y%m%d'
 
-  def __init__(self, queue_info, app, pg_connection=None):
+  def __init__(self, queue_info, app, pg_pool=None):
     """ Create a PostgresPullQueue object.
 
     Args:
       queue_info: A dictionary containing queue info.
       app: A string containing the application ID.
-      pg_connection: A psycopg2 connection to PostgreSQL.
+      pg_pool: A PostgresConnectionPool.
     """
     from psycopg2 import IntegrityError  # Import psycopg2 lazily
     super(PostgresPullQueue, self).__init__(queue_info, app)
-    self.pg_connection = pg_connection
+    self.pg_pool = pg_pool
+
+    # Partitions that are known to exist.
+    self._partitions = set()
 
     # When multiple TQ servers are notified by ZK about new queue
     # they sometimes get IntegrityError despite 'IF NOT EXISTS'
     @retrying.retry(max_retries=5, retry_on_exception=IntegrityError)
     def ensure_tables_created():
-      try:
-        self.pg_connection.cursor().execute(
+      with self.pg_pool.transaction() as pg_cursor:
+        pg_cursor.execute(
           'CREATE TABLE IF NOT EXISTS "{table_name}" ('
           '  task_name varchar(500) NOT NULL,'
           '  time_deleted timestamp DEFAULT NULL,'
@@ -285,11 +302,6 @@ class PostgresPullQueue(Queue):
           '  WHERE time_deleted IS NULL;'
             .format(table_name=self.tasks_table_name)
         )
-        self.pg_connection.commit()
-      except Exception as err:
-        logger.error('Rolling back transaction ({err})'.format(err=err))
-        self.pg_connection.rollback()
-        raise
 
     ensure_tables_created()
 
@@ -297,68 +309,208 @@ class PostgresPullQueue(Queue):
   def tasks_table_name(self):
     return 'pullqueue-{}'.format(self.name)
 
+  def partition_name(self, day):
+    """ Gets the name of the table that holds tasks enqueued on a given day.
+
+    Args:
+      day: A date object.
+    Returns:
+      A string specifying a table name.
+    """
+    return '{}-{}'.format(self.tasks_table_name,
+                          day.strftime(self.PARTITION_DAY_FORMAT))
+
+  def ensure_partition(self, day):
+    """ Creates the partition for a given day if it does not exist.
+
+    Args:
+      day: A date object.
+    Returns:
+      A string specifying the partition's table name.
+    """
+    from psycopg2 import IntegrityError  # Import psycopg2 lazily
+    partition = self.partition_name(day)
+    if partition in self._partitions:
+      return partition
+
+    # Lease updates always change lease_expires, so each partition has a
+    # single partial index and is vacuumed as soon as a small fraction of
+    # its rows are dead.
+    @retrying.retry(max_retries=5, retry_on_exception=IntegrityError)
+    def create_partition():
+      with self.pg_pool.transaction() as pg_cursor:
+        pg_cursor.execute(
+          'CREATE TABLE IF NOT EXISTS "{partition}" ('
+          '  PRIMARY KEY (task_name)'
+          ') INHERITS ("{table_name}") '
+          'WITH (autovacuum_vacuum_scale_factor = 0.02, '
+          '      autovacuum_analyze_scale_factor = 0.05);'
+          'CREATE INDEX IF NOT EXISTS "{partition}-eta-retry-tag-index" '
+          '  ON "{partition}" USING BTREE (lease_expires, lease_count, tag) '
+          '  WHERE time_deleted IS NULL;'
+            .format(partition=partition, table_name=self.tasks_table_name)
+        )
+
+    create_partition()
+    self._partitions.add(partition)
+    return partition
+
+  def list_partitions(self):
+    """ Lists the partitions of the queue table.
+
+    Returns:
+      A dictionary mapping partition names to the days they hold.
+    """
+    with self.pg_pool.transaction() as pg_cursor:
+      pg_cursor.execute(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid '
+        'WHERE pg_inherits.inhparent = %(table)s::regclass',
+        vars={'table': '"{}"'.format(self.tasks_table_name)}
+      )
+      rows = pg_cursor.fetchall()
+
+    partitions = {}
+    prefix = self.tasks_table_name + '-'
+    for row in rows:
+      day_string = row[0][len(prefix):]
+      try:
+        day = datetime.datetime.strptime(day_string,
+                                         self.PARTITION_DAY_FORMAT).date()
+      except ValueError:
+        logger.warning('Unexpected partition: {}'.format(row[0]))
+        continue
+
+      partitions[row[0]] = day
+
+    return partitions
+
   def add_task(self, task):
     """ Adds a task to the queue.
 
     Args:
       task: A Task object.
     Raises:
-      InvalidTaskInfo if the task ID already exists in the queue
-        or it doesn't have payloadBase64 attribute.
+      TaskNameTaken if the task ID already exists in the queue.
+      InvalidTaskInfo if the task doesn't have payloadBase64 attribute.
     """
-    import psycopg2  # Import psycopg2 lazily
-    if not hasattr(task, 'payloadBase64'):
-      raise InvalidTaskInfo('{} is missing a payload.'.format(task))
+    error = self.add_tasks([task])[0]
+    if error is not None:
+      raise error
 
-    # TODO: remove decoding when task.payloadBase64
-    #       is replaced with task.payload
-    params = {
-      'task_name': task.id,
-      'payload': bytearray(base64.urlsafe_b64decode(task.payloadBase64)),
-      'lease_count': 0,
-      'tag': getattr(task, 'tag', None)
-    }
+  def add_tasks(self, tasks):
+    """ Adds multiple tasks to the queue with a single statement.
 
-    try:
-      lease_expires = '%(lease_expires_val)s'
-      params['lease_expires_val'] = task.leaseTimestamp
-    except AttributeError:
-      lease_expires = 'current_timestamp'
+    Args:
+      tasks: A list of Task objects.
+    Returns:
+      A list containing None for each task that was added or the
+      InvalidTaskInfo exception that prevented the task from being added.
+    """
+    errors = [None for _ in tasks]
+    to_insert = OrderedDict()
+    for task_num, task in enumerate(tasks):
+      if not hasattr(task, 'payloadBase64'):
+        errors[task_num] = InvalidTaskInfo(
+          '{} is missing a payload.'.format(task))
+        continue
 
-    pg_cursor = self.pg_connection.cursor()
-    try:
-      pg_cursor.execute(
-        'INSERT INTO "{table}" ( '
-        '  task_name, payload, time_enqueued, '
-        '  lease_expires, lease_count, tag '
-        ')'
-        'VALUES ( '
-        '  %(task_name)s, %(payload)s, current_timestamp, '
-        '  {lease_expires}, %(lease_count)s, %(tag)s '
-        ') '
-        'RETURNING time_enqueued, lease_expires'
-        .format(table=self.tasks_table_name, lease_expires=lease_expires),
-        vars=params
+      if task.id in to_insert:
+        errors[task_num] = TaskNameTaken(
+          'Task name already taken: {}'.format(task.id))
+        continue
+
+      to_insert[task.id] = task_num
+
+    if not to_insert:
+      return errors
+
+    params = []
+    for task_num in to_insert.itervalues():
+      task = tasks[task_num]
+      # TODO: remove decoding when task.payloadBase64
+      #       is replaced with task.payload
+      params.append((
+        task.id,
+        bytearray(base64.urlsafe_b64decode(task.payloadBase64)),
+        getattr(task, 'leaseTimestamp', None),
+        getattr(task, 'tag', None)
+      ))
+
+    # Task names are only unique within a partition, so names used by tasks
+    # in other partitions are skipped explicitly. Adds of the same name are
+    # serialized with advisory locks so that two transactions can't both
+    # pass that check and insert into different partitions. Names are locked
+    # in order to avoid deadlocks between batches.
+    partition = self.ensure_partition(datetime.datetime.utcnow().date())
+    with self.pg_pool.transaction() as pg_cursor:
+      self.pg_pool.execute_prepared(
+        pg_cursor,
+        'SELECT pg_advisory_xact_lock(hashtext($1), hashtext(task_name)) '
+        'FROM unnest($2::varchar[]) AS task_name',
+        (self.tasks_table_name, sorted(to_insert))
       )
-      row = pg_cursor.fetchone()
+      if len(params) == 1:
+        self.pg_pool.execute_prepared(
+          pg_cursor,
+          'INSERT INTO "{partition}" ( '
+          '  task_name, payload, time_enqueued, '
+          '  lease_expires, lease_count, tag '
+          ')'
+          'SELECT $1, $2::bytea, current_timestamp, '
+          '       COALESCE($3::timestamp, current_timestamp::timestamp), 0, '
+          '       $4::varchar '
+          'WHERE NOT EXISTS ( '
+          '  SELECT 1 FROM "{table}" WHERE task_name = $1 '
+          ') '
+          'ON CONFLICT (task_name) DO NOTHING '
+          'RETURNING task_name, time_enqueued, lease_expires'
+          .format(partition=partition, table=self.tasks_table_name),
+          params[0]
+        )
+      else:
+        rows = [
+          pg_cursor.mogrify(
+            '(%s, %s, current_timestamp, '
+            ' COALESCE(%s, current_timestamp::timestamp), 0, %s)', row_params)
+          for row_params in params
+        ]
+        pg_cursor.execute(
+          'INSERT INTO "{partition}" ( '
+          '  task_name, payload, time_enqueued, '
+          '  lease_expires, lease_count, tag '
+          ')'
+          'SELECT * FROM (VALUES {rows}) AS new_tasks ( '
+          '  task_name, payload, time_enqueued, '
+          '  lease_expires, lease_count, tag '
+          ') '
+          'WHERE NOT EXISTS ( '
+          '  SELECT 1 FROM "{table}" '
+          '  WHERE "{table}".task_name = new_tasks.task_name '
+          ') '
+          'ON CONFLICT (task_name) DO NOTHING '
+          'RETURNING task_name, time_enqueued, lease_expires'
+          .format(partition=partition, table=self.tasks_table_name,
+                  rows=', '.join(rows))
+        )
+      inserted = {row[0]: row for row in pg_cursor.fetchall()}
+
+    for task_name, task_num in to_insert.iteritems():
+      task = tasks[task_num]
+      try:
+        row = inserted[task_name]
+      except KeyError:
+        name_taken_msg = 'Task name already taken: {}'.format(task_name)
+        logger.warning(name_taken_msg)
+        errors[task_num] = TaskNameTaken(name_taken_msg)
+        continue
 
-      self.pg_connection.commit()
+      task.queueName = self.name
+      task.enqueueTimestamp = row[1]  # time_enqueued is generated on PG side
+      task.leaseTimestamp = row[2]    # lease_expires is generated on PG side
       logger.debug('Added task: {}'.format(task))
 
-    except psycopg2.IntegrityError as err:
-      name_taken_msg = 'Task name already taken: {}'.format(task.id)
-      logger.warning('{msg}. Rolling back transaction({err})'
-                     .format(msg=name_taken_msg, err=err))
-      self.pg_connection.rollback()
-      raise InvalidTaskInfo(name_taken_msg)
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
-
-    task.queueName = self.name
-    task.enqueueTimestamp = row[0]  # time_enqueued is generated on PG side
-    task.leaseTimestamp = row[1]    # lease_expires is generated on PG side
+    return errors
 
   def get_task(self, task, omit_payload=False):
     """ Gets a task from the queue.
@@ -376,8 +528,7 @@ class PostgresPullQueue(Queue):
     else:
       columns = ['payload', 'task_name', 'time_enqueued',
                  'lease_expires', 'lease_count', 'tag']
-    pg_cursor = self.pg_connection.cursor()
-    try:
+    with self.pg_pool.transaction() as pg_cursor:
       pg_cursor.execute(
         'SELECT {columns} FROM "{tasks_table}" '
         'WHERE task_name = %(task_name)s AND time_deleted IS NULL'
@@ -388,11 +539,6 @@ class PostgresPullQueue(Queue):
         }
       )
       row = pg_cursor.fetchone()
-      self.pg_connection.commit()
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
 
     if not row:
       return None
@@ -405,21 +551,15 @@ class PostgresPullQueue(Queue):
     Args:
       task: A Task object.
     """
-    try:
-      self.pg_connection.cursor().execute(
+    with self.pg_pool.transaction() as pg_cursor:
+      self.pg_pool.execute_prepared(
+        pg_cursor,
         'UPDATE "{tasks_table}" '
         'SET time_deleted = current_timestamp '
-        'WHERE "{tasks_table}".task_name = %(task_name)s'
+        'WHERE "{tasks_table}".task_name = $1'
         .format(tasks_table=self.tasks_table_name),
-        vars={
-          'task_name': task.id,
-        }
+        (task.id,)
       )
-      self.pg_connection.commit()
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
 
   def update_lease(self, task, new_lease_seconds):
     """ Updates the duration of a task lease.
@@ -431,36 +571,26 @@ class PostgresPullQueue(Queue):
     Returns:
       A Task object.
     """
-    pg_cursor = self.pg_connection.cursor()
-    try:
-      pg_cursor.execute(
+    with self.pg_pool.transaction() as pg_cursor:
+      self.pg_pool.execute_prepared(
+        pg_cursor,
         'UPDATE "{tasks_table}" '
         'SET lease_expires = '
-        '  current_timestamp + interval \'%(lease_seconds)s seconds\' '
-        'WHERE task_name = %(task_name)s '
+        '  current_timestamp + $1 * interval \'1 second\' '
+        'WHERE task_name = $2 '
         '  AND lease_expires > current_timestamp '
-        '  AND lease_expires = %(old_eta)s '
+        '  AND lease_expires = $3 '
         '  AND time_deleted IS NULL '
         'RETURNING lease_expires'
         .format(tasks_table=self.tasks_table_name),
-        vars={
-          'task_name': task.id,
-          'old_eta': task.get_eta(),
-          'lease_seconds': new_lease_seconds
-        }
+        (new_lease_seconds, task.id, task.get_eta())
       )
-      if pg_cursor.statusmessage != 'UPDATE 1':
-        logger.info('Expected to get status "UPDATE 1", got: "{}"'
-                    .format(pg_cursor.statusmessage))
+      if pg_cursor.rowcount != 1:
+        logger.info('Expected to update 1 task, updated: {}'
+                    .format(pg_cursor.rowcount))
         raise InvalidLeaseRequest('The task lease has expired')
 
       row = pg_cursor.fetchone()
-      self.pg_connection.commit()
-
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
 
     task.leaseTimestamp = row[0]
     return task
@@ -500,8 +630,7 @@ class PostgresPullQueue(Queue):
     else:
       old_eta_verification = ''
 
-    pg_cursor = self.pg_connection.cursor()
-    try:
+    with self.pg_pool.transaction() as pg_cursor:
       pg_cursor.execute(
         statement.format(tasks_table=self.tasks_table_name,
                          old_eta_verification=old_eta_verification),
@@ -513,12 +642,6 @@ class PostgresPullQueue(Queue):
         raise InvalidLeaseRequest('The task lease has expired')
 
       row = pg_cursor.fetchone()
-      self.pg_connection.commit()
-
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
 
     task.leaseTimestamp = row[0]
     return task
@@ -533,8 +656,7 @@ class PostgresPullQueue(Queue):
     """
     columns = ['task_name', 'time_enqueued',
                'lease_expires', 'lease_count', 'tag']
-    pg_cursor = self.pg_connection.cursor()
-    try:
+    with self.pg_pool.transaction() as pg_cursor:
       pg_cursor.execute(
         'SELECT {columns} FROM "{tasks_table}" '
         'WHERE time_deleted IS NULL '
@@ -544,11 +666,6 @@ class PostgresPullQueue(Queue):
       )
       rows = pg_cursor.fetchmany(size=limit)
       tasks = [self._task_from_row(columns, row) for row in rows]
-      self.pg_connection.commit()
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
 
     return tasks
 
@@ -582,15 +699,19 @@ class PostgresPullQueue(Queue):
       if tag is None:
         return []
 
-    # Determine tag condition for the query
-    tag_condition = ''
-    if group_by_tag:
-      tag_condition = ' AND tag = %(tag)s'
+    params = [lease_seconds, num_tasks]
 
     # Determine max retries condition for the query
     max_retries_condition = ''
     if self.task_retry_limit:
-      max_retries_condition = ' AND lease_count < %(max_retries)s'
+      params.append(self.task_retry_limit)
+      max_retries_condition = ' AND lease_count < ${}'.format(len(params))
+
+    # Determine tag condition for the query
+    tag_condition = ''
+    if group_by_tag:
+      params.append(tag)
+      tag_condition = ' AND tag = ${}'.format(len(params))
 
     columns = ['task_name', 'payload', 'time_enqueued',
                'lease_expires', 'lease_count', 'tag']
@@ -598,12 +719,12 @@ class PostgresPullQueue(Queue):
       '"{table}".{col}'.format(table=self.tasks_table_name, col=column)
       for column in columns
     ]
-    pg_cursor = self.pg_connection.cursor()
-    try:
-      pg_cursor.execute(
+    with self.pg_pool.transaction() as pg_cursor:
+      self.pg_pool.execute_prepared(
+        pg_cursor,
         'UPDATE "{tasks_table}" '
         'SET lease_expires = '
-        '      current_timestamp + interval \'%(lease_seconds)s seconds\', '
+        '      current_timestamp + $1 * interval \'1 second\', '
         '    lease_count = lease_count + 1 '
         'FROM ( '
         '  SELECT task_name FROM "{tasks_table}" '
@@ -613,26 +734,17 @@ class PostgresPullQueue(Queue):
         '        {tag_filter} '
         '  ORDER BY lease_expires '
         '  FOR UPDATE SKIP LOCKED '
-        '  LIMIT {num_tasks} '
+        '  LIMIT $2 '
         ') as tasks_to_update '
         'WHERE "{tasks_table}".task_name = tasks_to_update.task_name '
         'RETURNING {columns}'
         .format(columns=', '.join(full_column_names),
                 retry_limit=max_retries_condition, tag_filter=tag_condition,
-                num_tasks=num_tasks, tasks_table=self.tasks_table_name),
-        vars={
-          'lease_seconds': lease_seconds,
-          'max_retries': self.task_retry_limit,
-          'tag': tag
-        }
+                tasks_table=self.tasks_table_name),
+        tuple(params)
       )
       rows = pg_cursor.fetchall()
       leased = [self._task_from_row(columns, row) for row in rows]
-      self.pg_connection.commit()
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
 
     time_elapsed = datetime.datetime.utcnow() - start_time
     logger.debug('Leased {} tasks [time elapsed: {}]'
@@ -642,16 +754,11 @@ class PostgresPullQueue(Queue):
   def purge(self):
     """ Remove all tasks from queue.
     """
-    try:
-      self.pg_connection.cursor().execute(
+    with self.pg_pool.transaction() as pg_cursor:
+      pg_cursor.execute(
         'TRUNCATE TABLE "{tasks_table}"'
         .format(tasks_table=self.tasks_table_name)
       )
-      self.pg_connection.commit()
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
 
   def to_json(self, include_stats=False, fields=None):
     """ Generate a JSON representation of the queue.
@@ -692,18 +799,12 @@ class PostgresPullQueue(Queue):
     Returns:
       An integer specifying the number of tasks in the queue.
     """
-    pg_cursor = self.pg_connection.cursor()
-    try:
+    with self.pg_pool.transaction() as pg_cursor:
       pg_cursor.execute(
         'SELECT count(*) FROM "{tasks_table}" WHERE time_deleted IS NULL'
         .format(tasks_table=self.tasks_table_name)
       )
       tasks_count = pg_cursor.fetchone()[0]
-      self.pg_connection.commit()
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
     return tasks_count
 
   def oldest_eta(self):
@@ -713,39 +814,61 @@ class PostgresPullQueue(Queue):
       A datetime object specifying the oldest ETA or None if there are no
       tasks.
     """
-    pg_cursor = self.pg_connection.cursor()
-    try:
+    with self.pg_pool.transaction() as pg_cursor:
       pg_cursor.execute(
         'SELECT min(lease_expires) FROM "{tasks_table}" '
         'WHERE time_deleted IS NULL'
         .format(tasks_table=self.tasks_table_name)
       )
       oldest_eta = pg_cursor.fetchone()[0]
-      self.pg_connection.commit()
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
     return oldest_eta
 
   def flush_deleted(self):
     """ Removes all tasks which were deleted more than week ago.
+
+    Partitions that only hold tasks enqueued before the TTL are dropped after
+    moving any tasks that are still in use to the current partition.
     """
-    pg_cursor = self.pg_connection.cursor()
-    try:
+    with self.pg_pool.transaction() as pg_cursor:
       pg_cursor.execute(
-        'DELETE FROM "{tasks_table}" '
+        'DELETE FROM ONLY "{tasks_table}" '
         'WHERE time_deleted < current_timestamp - interval \'{ttl}\''
         .format(tasks_table=self.tasks_table_name,
                 ttl=self.TTL_INTERVAL_AFTER_DELETED)
       )
       logger.info('Flushed deleted tasks from {} with status: {}'
                   .format(self.tasks_table_name, pg_cursor.statusmessage))
-      self.pg_connection.commit()
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
+
+    today = datetime.datetime.utcnow().date()
+    expired = [partition for partition, day in self.list_partitions().items()
+               if day < today - self.TTL_AFTER_DELETED]
+    if not expired:
+      return
+
+    current_partition = self.ensure_partition(today)
+    columns = ', '.join(['task_name', 'time_deleted', 'time_enqueued',
+                         'lease_count', 'lease_expires', 'payload', 'tag'])
+    for partition in sorted(expired):
+      with self.pg_pool.transaction() as pg_cursor:
+        pg_cursor.execute(
+          'WITH remaining AS ( '
+          '  DELETE FROM "{partition}" '
+          '  WHERE time_deleted IS NULL '
+          '     OR time_deleted >= current_timestamp - interval \'{ttl}\' '
+          '  RETURNING {columns} '
+          ') '
+          'INSERT INTO "{current}" ({columns}) '
+          'SELECT {columns} FROM remaining '
+          'ON CONFLICT (task_name) DO NOTHING'
+          .format(partition=partition, current=current_partition,
+                  columns=columns, ttl=self.TTL_INTERVAL_AFTER_DELETED)
+        )
+        moved = pg_cursor.rowcount
+        pg_cursor.execute('DROP TABLE "{}"'.format(partition))
+
+      self._partitions.discard(partition)
+      logger.info('Dropped partition {} after moving {} tasks'
+                  .format(partition, moved))
 
   COLUMN_ATTR_MAPPING = {
     'task_name': 'id',
@@ -786,8 +909,7 @@ class PostgresPullQueue(Queue):
     Returns:
       A string containing a tag or None.
     """
-    pg_cursor = self.pg_connection.cursor()
-    try:
+    with self.pg_pool.transaction() as pg_cursor:
       pg_cursor.execute(
         'SELECT tag FROM "{tasks_table}" '
         'WHERE time_deleted IS NULL '
@@ -796,12 +918,7 @@ class PostgresPullQueue(Queue):
       )
       row = pg_cursor.fetchone()
       tag = row[0] if row else None
-      self.pg_connection.commit()
       return tag
-    except Exception as err:
-      logger.error('Rolling back transaction ({err})'.format(err=err))
-      self.pg_connection.rollback()
-      raise
 
   def _get_stats(self, fields):
     """ Fetch queue statistics.
@@ -859,15 +976,22 @@ class PullQueue(Queue):
   # The seconds to wait after fetching 0 index results before retrying.
   EMPTY_RESULTS_COOLDOWN = 5
 
-  def __init__(self, queue_info, app, db_access=None):
+  # The maximum number of index entries to read when only a slice of them
+  # belongs to this server.
+  MAX_COORDINATED_FETCH = 5000
+
+  def __init__(self, queue_info, app, db_access=None, lease_coordinator=None):
     """ Create a PullQueue object.
 
     Args:
       queue_info: A dictionary containing queue info.
       app: A string containing the application ID.
       db_access: A DatastoreProxy object.
+      lease_coordinator: A LeaseCoordinator or None. When defined, the index
+        cache prefers tasks in the slice assigned to this server.
     """
     self.db_access = db_access
+    self.lease_coordinator = lease_coordinator
     self.index_cache = {'global': {}, 'by_tag': {}}
     self.index_cache_lock = Lock()
     super(PullQueue, self).__init__(queue_info, app)
@@ -879,68 +1003,161 @@ class PullQueue(Queue):
       task: A Task object.
       retries: The number of times to retry adding the task.
     Raises:
-      InvalidTaskInfo if the task ID already exists in the queue.
+      TaskNameTaken if the task ID already exists in the queue.
+      InvalidTaskInfo if the task doesn't have payloadBase64 attribute.
+      TransientError if unable to add the task.
     """
-    if not hasattr(task, 'payloadBase64'):
-      raise InvalidTaskInfo('{} is missing a payload.'.format(task))
+    error = self.add_tasks([task], retries)[0]
+    if error is not None:
+      raise error
+
+  def add_tasks(self, tasks, retries=5):
+    """ Adds multiple tasks to the queue.
+
+    The task entries are inserted concurrently. Once a task's entry exists,
+    its index entries are written together in a batch. The task entry can't
+    be part of that batch because the payload can be up to 1MB, and Cassandra
+    does not approve of large batches.
 
+    Args:
+      tasks: A list of Task objects.
+      retries: The number of times to retry inserting each task.
+    Returns:
+      A list containing None for each task that was added or the exception
+      (InvalidTaskInfo or TransientError) that prevented the task from being
+      added.
+    """
+    session = self.db_access.session
     enqueue_time = datetime.datetime.utcnow()
-    try:
-      lease_expires = task.leaseTimestamp
-    except AttributeError:
-      lease_expires = datetime.datetime.utcfromtimestamp(0)
+    errors = [None for _ in tasks]
+    parameters = {}
+    for task_num, task in enumerate(tasks):
+      if not hasattr(task, 'payloadBase64'):
+        errors[task_num] = InvalidTaskInfo(
+          '{} is missing a payload.'.format(task))
+        continue
 
-    parameters = {
-      'app': self.app,
-      'queue': self.name,
-      'id': task.id,
-      'payload': task.payloadBase64,
-      'enqueued': enqueue_time,
-      'retry_count': 0,
-      'lease_expires': lease_expires,
-      'op_id': uuid.uuid4()
-    }
+      try:
+        lease_expires = task.leaseTimestamp
+      except AttributeError:
+        lease_expires = datetime.datetime.utcfromtimestamp(0)
 
-    try:
-      parameters['tag'] = task.tag
-    except AttributeError:
-      parameters['tag'] = None
+      parameters[task_num] = [
+        self.app, self.name, task.id, task.payloadBase64, enqueue_time,
+        lease_expires, 0, getattr(task, 'tag', None), uuid.uuid4()]
 
-    self._insert_task(parameters, retries)
+    statement = """
+      INSERT INTO pull_queue_tasks (
+        app, queue, id, payload,
+        enqueued, lease_expires, retry_count, tag, op_id
+      )
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+      IF NOT EXISTS
+    """
+    if statement not in self.prepared_statements:
+      self.prepared_statements[statement] = session.prepare(statement)
+    insert_task = self.prepared_statements[statement]
+
+    inserted = []
+    pending = list(parameters)
+    retries_left = retries
+    while pending:
+      futures = []
+      for task_num in pending:
+        bound_insert = insert_task.bind(parameters[task_num])
+        bound_insert.retry_policy = NO_RETRIES
+        futures.append((task_num, session.execute_async(bound_insert)))
+
+      pending = []
+      retries_left -= 1
+      for task_num, future in futures:
+        task_id = parameters[task_num][2]
+        op_id = parameters[task_num][-1]
+        try:
+          result = future.result()
+        except TRANSIENT_CASSANDRA_ERRORS as error:
+          if retries_left <= 0:
+            errors[task_num] = TransientError(
+              'Unable to insert task {}'.format(task_id))
+            continue
+
+          logger.warning(
+            'Encountered error while inserting task: {}. Retrying.'
+            .format(error))
+          pending.append(task_num)
+          continue
 
-    task.queueName = self.name
-    task.enqueueTimestamp = enqueue_time
-    task.leaseTimestamp = lease_expires
+        if result.was_applied:
+          inserted.append(task_num)
+          continue
 
-    # Create index entries so the task can be queried by ETA and (tag, ETA).
-    # This can't be done in a batch because the payload from the previous
-    # insert can be up to 1MB, and Cassandra does not approve of large batches.
-    try:
-      tag = task.tag
-    except AttributeError:
-      # The API does not differentiate between empty and unspecified tags.
-      tag = ''
+        # A previous attempt may have inserted the task.
+        try:
+          success = self._task_mutated_by_id(task_id, op_id)
+        except TaskNotFound:
+          errors[task_num] = TransientError('Unable to insert task')
+          continue
+
+        if not success:
+          errors[task_num] = TaskNameTaken(
+            'Task name already taken: {}'.format(task_id))
+          continue
+
+        inserted.append(task_num)
 
-    insert_eta_index = SimpleStatement("""
+    # Create index entries so the task can be queried by ETA and (tag, ETA).
+    statement = """
       INSERT INTO pull_queue_eta_index (app, queue, eta, id, tag)
-      VALUES (%(app)s, %(queue)s, %(eta)s, %(id)s, %(tag)s)
-    """, retry_policy=BASIC_RETRIES)
-    parameters = {
-      'app': self.app,
-      'queue': self.name,
-      'eta': task.get_eta(),
-      'id': task.id,
-      'tag': tag
-    }
-    self.db_access.session.execute(insert_eta_index, parameters)
+      VALUES (?, ?, ?, ?, ?)
+    """
+    if statement not in self.prepared_statements:
+      self.prepared_statements[statement] = session.prepare(statement)
+    insert_eta_index = self.prepared_statements[statement]
 
-    insert_tag_index = SimpleStatement("""
+    statement = """
       INSERT INTO pull_queue_tags_index (app, queue, tag, eta, id)
-      VALUES (%(app)s, %(queue)s, %(tag)s, %(eta)s, %(id)s)
-    """, retry_policy=BASIC_RETRIES)
-    self.db_access.session.execute(insert_tag_index, parameters)
+      VALUES (?, ?, ?, ?, ?)
+    """
+    if statement not in self.prepared_statements:
+      self.prepared_statements[statement] = session.prepare(statement)
+    insert_tag_index = self.prepared_statements[statement]
+
+    index_futures = []
+    for task_num in inserted:
+      task = tasks[task_num]
+      task.queueName = self.name
+      task.enqueueTimestamp = enqueue_time
+      task.leaseTimestamp = parameters[task_num][5]
+
+      try:
+        tag = task.tag
+      except AttributeError:
+        # The API does not differentiate between empty and unspecified tags.
+        tag = ''
+
+      eta = task.get_eta()
+      # The index entries are in different partitions and rewriting them is
+      # harmless, so the batch doesn't need to go through the batch log.
+      insert_index = BatchStatement(batch_type=BatchType.UNLOGGED,
+                                    retry_policy=BASIC_RETRIES)
+      insert_index.add(insert_eta_index,
+                       [self.app, self.name, eta, task.id, tag])
+      insert_index.add(insert_tag_index,
+                       [self.app, self.name, tag, eta, task.id])
+      index_futures.append((task_num, session.execute_async(insert_index)))
+
+    for task_num, future in index_futures:
+      task = tasks[task_num]
+      try:
+        future.result()
+      except TRANSIENT_CASSANDRA_ERRORS:
+        errors[task_num] = TransientError(
+          'Unable to index task {}'.format(task.id))
+        continue
 
-    logger.debug('Added task: {}'.format(task))
+      logger.debug('Added task: {}'.format(task))
+
+    return errors
 
   def get_task(self, task, omit_payload=False):
     """ Gets a task from the queue.
@@ -1129,61 +1346,76 @@ class PullQueue(Queue):
     start_time = datetime.datetime.utcnow()
     logger.debug('Leasing {} tasks for {} sec. group_by_tag={}, tag={}'.
                  format(num_tasks, lease_seconds, group_by_tag, tag))
-    # If not specified, the tag is assumed to be that of the oldest task.
-    if group_by_tag and tag is None:
-      try:
-        tag = self._get_earliest_tag()
-      except EmptyQueue:
-        return []
-
-    # Fetch available tasks and try to lease them until the requested number
-    # has been leased or until the index has been exhausted.
+    with lease_stats_lock:
+      stats_info = lease_stats.start_request(
+        app=self.app, queue=self.name, requested=num_tasks)
     leased = []
-    leased_ids = set()
-    indices_seen = set()
-    new_eta = None
-    while True:
-      tasks_needed = num_tasks - len(leased)
-      if tasks_needed < 1:
-        break
-
-      try:
-        index_results = self._query_available_tasks(
-          tasks_needed, group_by_tag, tag)
-      except TRANSIENT_CASSANDRA_ERRORS:
-        raise TransientError('Unable to query available tasks')
-
-      # The following prevents any task from being leased multiple times in the
-      # same request. If the lease time is very small, it's possible for the
-      # lease to expire while results are still being fetched.
-      index_results = [result for result in index_results
-                       if result.id not in leased_ids]
-
-      # If there are no more available tasks, return whatever has been leased.
-      if not index_results:
-        break
-
-      # Determine new_eta when the first index_results are received
-      if new_eta is None:
-        new_eta = current_time_ms() + datetime.timedelta(seconds=lease_seconds)
+    rounds = 0
+    contended = 0
+    try:
+      # If not specified, the tag is assumed to be that of the oldest task.
+      if group_by_tag and tag is None:
+        try:
+          tag = self._get_earliest_tag()
+        except EmptyQueue:
+          return []
+
+      # Fetch available tasks and try to lease them until the requested number
+      # has been leased or until the index has been exhausted.
+      leased_ids = set()
+      indices_seen = set()
+      new_eta = None
+      while True:
+        tasks_needed = num_tasks - len(leased)
+        if tasks_needed < 1:
+          break
 
-      lease_results = self._lease_batch(index_results, new_eta)
-      for index_num, index_result in enumerate(index_results):
-        task = lease_results[index_num]
-        if task is None:
-          # If this lease request has previously encountered this index, it's
-          # likely that either the index is invalid or that the task has
-          # exceeded its retry_count.
-          if index_result.id in indices_seen:
-            self._resolve_task(index_result)
-          indices_seen.add(index_result.id)
-          continue
+        try:
+          index_results = self._query_available_tasks(
+            tasks_needed, group_by_tag, tag)
+        except TRANSIENT_CASSANDRA_ERRORS:
+          raise TransientError('Unable to query available tasks')
+
+        # The following prevents any task from being leased multiple times in
+        # the same request. If the lease time is very small, it's possible for
+        # the lease to expire while results are still being fetched.
+        index_results = [result for result in index_results
+                         if result.id not in leased_ids]
+
+        # If there are no more available tasks, return whatever has been
+        # leased.
+        if not index_results:
+          break
 
-        leased.append(task)
-        leased_ids.add(task.id)
+        # Determine new_eta when the first index_results are received
+        if new_eta is None:
+          new_eta = current_time_ms() + datetime.timedelta(
+            seconds=lease_seconds)
+
+        rounds += 1
+        lease_results, lost_races = self._lease_batch(index_results, new_eta)
+        contended += lost_races
+        for index_num, index_result in enumerate(index_results):
+          task = lease_results[index_num]
+          if task is None:
+            # If this lease request has previously encountered this index,
+            # it's likely that either the index is invalid or that the task
+            # has exceeded its retry_count.
+            if index_result.id in indices_seen:
+              self._resolve_task(index_result)
+            indices_seen.add(index_result.id)
+            continue
+
+          leased.append(task)
+          leased_ids.add(task.id)
+    finally:
+      with lease_stats_lock:
+        stats_info.finalize(leased=len(leased), rounds=rounds,
+                            contended=contended)
 
     time_elapsed = datetime.datetime.utcnow() - start_time
-    logger.debug('Leased {} tasks [time elapsed: {}]'.format(len(leased), str(time_elapsed)))
+    logger.debug('Leased {} tasks in {} rounds [time elapsed: {}]'.format(
+      len(leased), rounds, str(time_elapsed)))
     logger.debug('IDs leased: {}'.format([task.id for task in leased]))
     return leased
 
@@ -1303,48 +1535,6 @@ class PullQueue(Queue):
 
     return result.op_id == op_id
 
-  def _insert_task(self, parameters, retries):
-    """ Insert task entry into pull_queue_tasks.
-
-    Args:
-      parameters: A dictionary specifying the task parameters.
-      retries: The number of times to try the insert.
-    Raises:
-      InvalidTaskInfo if the task ID already exists in the queue.
-    """
-    insert_statement = SimpleStatement("""
-      INSERT INTO pull_queue_tasks (
-        app, queue, id, payload,
-        enqueued, lease_expires, retry_count, tag, op_id
-      )
-      VALUES (
-        %(app)s, %(queue)s, %(id)s, %(payload)s,
-        %(enqueued)s, %(lease_expires)s, %(retry_count)s, %(tag)s, %(op_id)s
-      )
-      IF NOT EXISTS
-    """, retry_policy=NO_RETRIES)
-    try:
-      result = self.db_access.session.execute(insert_statement, parameters)
-    except TRANSIENT_CASSANDRA_ERRORS as error:
-      retries_left = retries - 1
-      if retries_left <= 0:
-        raise
-      logger.warning(
-        'Encountered error while inserting task: {}. Retrying.'.format(error))
-      return self._insert_task(parameters, retries_left)
-
-    if result.was_applied:
-      return
-
-    try:
-      success = self._task_mutated_by_id(parameters['id'], parameters['op_id'])
-    except TaskNotFound:
-      raise TransientError('Unable to insert task')
-
-    if not success:
-      raise InvalidTaskInfo(
-        'Task name already taken: {}'.format(parameters['id']))
-
   def _update_lease(self, parameters, retries, check_lease=True):
     """ Update lease expiration on a task entry.
 
@@ -1432,7 +1622,7 @@ class PullQueue(Queue):
     """
     # If the request is larger than the max cache size, don't use the cache.
     if num_tasks > self.MAX_CACHE_SIZE:
-      return self._query_index(num_tasks, group_by_tag, tag)
+      return list(self._fetch_index(num_tasks, group_by_tag, tag))
 
     with self.index_cache_lock:
       if group_by_tag:
@@ -1444,8 +1634,8 @@ class PullQueue(Queue):
 
       # If results have never been fetched, populate the cache.
       if not tag_cache:
-        results = self._query_index(self.MAX_CACHE_SIZE, group_by_tag, tag)
-        tag_cache['queue'] = deque(results)
+        tag_cache['queue'] = self._fetch_index(
+          self.MAX_CACHE_SIZE, group_by_tag, tag)
         tag_cache['last_fetch'] = datetime.datetime.now()
         tag_cache['last_results'] = len(tag_cache['queue'])
 
@@ -1461,8 +1651,8 @@ class PullQueue(Queue):
         seconds=self.MAX_CACHE_DURATION)
       if (num_tasks > len(tag_cache['queue']) or
           tag_cache['last_fetch'] < outdated):
-        results = self._query_index(self.MAX_CACHE_SIZE, group_by_tag, tag)
-        tag_cache['queue'] = deque(results)
+        tag_cache['queue'] = self._fetch_index(
+          self.MAX_CACHE_SIZE, group_by_tag, tag)
         tag_cache['last_fetch'] = datetime.datetime.now()
         tag_cache['last_results'] = len(tag_cache['queue'])
 
@@ -1476,6 +1666,43 @@ class PullQueue(Queue):
 
       return results
 
+  def _fetch_index(self, num_tasks, group_by_tag, tag):
+    """ Fetches available tasks from the index table in the order they should
+    be leased.
+
+    When leases are coordinated, a larger portion of the index is read so
+    that the results can be filled with tasks from this server's slice. Tasks
+    from other slices are only included when there are not enough tasks in
+    this server's slice.
+
+    Args:
+      num_tasks: An integer specifying the number of results to return.
+      group_by_tag: A boolean indicating that only tasks of one tag should
+        be leased.
+      tag: A string containing the tag for the task.
+    Returns:
+      A deque of index results.
+    """
+    if self.lease_coordinator is None:
+      return deque(self._query_index(num_tasks, group_by_tag, tag))
+
+    total_workers = self.lease_coordinator.total_workers
+    fetch_size = max(num_tasks,
+                     min(num_tasks * total_workers, self.MAX_COORDINATED_FETCH))
+    owned = deque()
+    unowned = []
+    for result in self._query_index(fetch_size, group_by_tag, tag):
+      if self.lease_coordinator.owns(result.id):
+        owned.append(result)
+      else:
+        unowned.append(result)
+
+      if len(owned) >= num_tasks:
+        return owned
+
+    owned.extend(unowned[:num_tasks - len(owned)])
+    return owned
+
   def _get_earliest_tag(self):
     """ Get the tag with the earliest ETA.
 
@@ -1496,117 +1723,124 @@ class PullQueue(Queue):
       raise EmptyQueue('No entries in queue index')
     return tag
 
-  def _increment_count_async(self, task):
-    """ Update retry count for a task.
-
-    Args:
-      task: A Task object.
-    """
-    session = self.db_access.session
-
-    statement = """
-      UPDATE pull_queue_tasks
-      SET retry_count=?
-      WHERE app=? AND queue=? AND id=?
-      IF retry_count=?
-    """
-    if statement not in self.prepared_statements:
-      self.prepared_statements[statement] = session.prepare(statement)
-    update_count = self.prepared_statements[statement]
-
-    old_count = task.retry_count
-    new_count = task.retry_count + 1
-    params = [new_count, self.app, self.name, task.id, old_count]
-    bound_update = update_count.bind(params)
-    bound_update.retry_policy = NO_RETRIES
-    self.db_access.session.execute_async(bound_update)
-
   def _lease_batch(self, indexes, new_eta):
     """ Acquires a lease on tasks in the queue.
 
+    Each task is its own partition, so every lease requires a conditional
+    update. The update also increments the retry count, which means each task
+    only costs one Paxos round. The reads, leases, and index updates for the
+    whole batch are kept in flight concurrently.
+
     Args:
       indexes: An iterable containing results from the index table.
       new_eta: A datetime object containing the new lease expiration.
 
     Returns:
-      A list of task objects or None if unable to acquire a lease.
+      A tuple containing a list of task objects (or None if unable to acquire
+      a lease) and the number of leases that lost a race with another request.
+    Raises:
+      TransientError if unable to read a task.
     """
     leased = [None for _ in indexes]
     session = self.db_access.session
     op_id = uuid.uuid4()
+    current_time = datetime.datetime.utcnow()
 
-    lease_statement = """
+    statement = """
+      SELECT payload, enqueued, lease_expires, retry_count, tag
+      FROM pull_queue_tasks
+      WHERE app=? AND queue=? AND id=?
+    """
+    if statement not in self.prepared_statements:
+      self.prepared_statements[statement] = session.prepare(statement)
+    select_task = self.prepared_statements[statement]
+
+    read_futures = [
+      session.execute_async(select_task, [self.app, self.name, index.id])
+      for index in indexes]
+
+    statement = """
       UPDATE pull_queue_tasks
-      SET lease_expires = ?, op_id = ?
+      SET lease_expires = ?, op_id = ?, retry_count = ?
       WHERE app = ? AND queue = ? AND id = ?
-      IF lease_expires < ?
+      IF lease_expires < ? AND retry_count = ?
     """
-    if self.task_retry_limit != 0:
-      lease_statement += 'AND retry_count < {}'.format(self.task_retry_limit)
-    lease_task = session.prepare(lease_statement)
-    lease_task.retry_policy = NO_RETRIES
-    current_time = datetime.datetime.utcnow()
+    if statement not in self.prepared_statements:
+      self.prepared_statements[statement] = session.prepare(statement)
+    lease_task = self.prepared_statements[statement]
+
+    # Only attempt leases on tasks that appear to be available.
+    lease_futures = []
+    for result_num, read_future in enumerate(read_futures):
+      index = indexes[result_num]
+      try:
+        task_entry = read_future.result()[0]
+      except IndexError:
+        # The index refers to a task that no longer exists.
+        continue
+      except TRANSIENT_CASSANDRA_ERRORS:
+        raise TransientError('Unable to read task {}'.format(index.id))
+
+      if task_entry.lease_expires >= current_time:
+        continue
+
+      if (self.task_retry_limit != 0 and
+          task_entry.retry_count >= self.task_retry_limit):
+        continue
 
-    update_futures = []
-    for index in indexes:
-      params = (new_eta, op_id, self.app, self.name, index.id, current_time)
-      update_futures.append(session.execute_async(lease_task, params))
+      params = [new_eta, op_id, task_entry.retry_count + 1, self.app,
+                self.name, index.id, current_time, task_entry.retry_count]
+      bound_lease = lease_task.bind(params)
+      bound_lease.retry_policy = NO_RETRIES
+      lease_futures.append(
+        (result_num, task_entry, session.execute_async(bound_lease)))
 
-    # Check which lease operations succeeded.
     statement = """
-      SELECT payload, enqueued, retry_count, tag, op_id
-      FROM pull_queue_tasks
+      SELECT op_id FROM pull_queue_tasks
       WHERE app=? AND queue=? AND id=?
     """
     if statement not in self.prepared_statements:
       self.prepared_statements[statement] = session.prepare(statement)
-    select = self.prepared_statements[statement]
+    select_op_id = self.prepared_statements[statement]
 
-    futures = {}
-    for result_num, update_future in enumerate(update_futures):
+    # Start index updates as soon as each lease is confirmed.
+    lost_races = 0
+    timed_out = []
+    index_update_futures = []
+    for result_num, task_entry, lease_future in lease_futures:
+      index = indexes[result_num]
       try:
-        result = update_future.result()
-        success = True
+        was_applied = lease_future.result().was_applied
       except DriverException:
-        result = None
-        success = False
+        # The outcome is unknown until the operation ID has been checked.
+        bound_select = select_op_id.bind([self.app, self.name, index.id])
+        bound_select.consistency_level = ConsistencyLevel.SERIAL
+        timed_out.append(
+          (result_num, task_entry, session.execute_async(bound_select)))
+        continue
 
-      if success and not result.was_applied:
-        # The lease operation failed, so keep this index as None.
+      if not was_applied:
+        lost_races += 1
         continue
 
-      index = indexes[result_num]
-      bound_select = select.bind([self.app, self.name, index.id])
-      bound_select.consistency_level = ConsistencyLevel.SERIAL
-      future = session.execute_async(bound_select)
-      futures[result_num] = (future, not success)
+      task = self._leased_task(index, task_entry, new_eta)
+      leased[result_num] = task
+      index_update_futures.append(self._update_index_async(index, task))
+      self._update_stats()
 
-    index_update_futures = []
-    for result_num, (future, lease_timed_out) in futures.iteritems():
+    for result_num, task_entry, select_future in timed_out:
       index = indexes[result_num]
       try:
-        read_result = future.result()[0]
+        read_result = select_future.result()[0]
       except (TRANSIENT_CASSANDRA_ERRORS, IndexError):
         raise TransientError('Unable to read task {}'.format(index.id))
 
       # If the operation IDs do not match, the lease was not successful.
-      if lease_timed_out and read_result.op_id != op_id:
+      if read_result.op_id != op_id:
         continue
 
-      task_info = {
-        'queueName': self.name,
-        'id': index.id,
-        'payloadBase64': read_result.payload,
-        'enqueueTimestamp': read_result.enqueued,
-        'leaseTimestamp': new_eta,
-        'retry_count': read_result.retry_count
-      }
-      if read_result.tag:
-        task_info['tag'] = read_result.tag
-      task = Task(task_info)
+      task = self._leased_task(index, task_entry, new_eta)
       leased[result_num] = task
-
-      self._increment_count_async(task)
       index_update_futures.append(self._update_index_async(index, task))
       self._update_stats()
 
@@ -1614,7 +1848,29 @@ class PullQueue(Queue):
     for index_update in index_update_futures:
       index_update.result()
 
-    return leased
+    return leased, lost_races
+
+  def _leased_task(self, index, task_entry, new_eta):
+    """ Creates a Task object for a task that was just leased.
+
+    Args:
+      index: The index result that referenced the task.
+      task_entry: The task row that was read before the lease.
+      new_eta: A datetime object containing the new lease expiration.
+    Returns:
+      A Task object.
+    """
+    task_info = {
+      'queueName': self.name,
+      'id': index.id,
+      'payloadBase64': task_entry.payload,
+      'enqueueTimestamp': task_entry.enqueued,
+      'leaseTimestamp': new_eta,
+      'retry_count': task_entry.retry_count
+    }
+    if task_entry.tag:
+      task_info['tag'] = task_entry.tag
+    return Task(task_info)
 
   def _update_index_async(self, old_index, task):
     """ Updates the index table after leasing a task.
@@ -8,6 +8,7 @@ from tornado.ioloop import IOLoop, PeriodicCallback
 from appscale.taskqueue.queue import PostgresPullQueue
 from appscale.taskqueue.utils import create_celery_for_app
 from .queue import PullQueue
+from .postgres_pool import PostgresConnectionPool
 from .queue import PushQueue
 from .utils import logger
 
@@ -17,31 +18,33 @@ class ProjectQueueManager(dict):
 
   FLUSH_DELETED_INTERVAL = 3 * 60 * 60  # 3h
 
-  def __init__(self, zk_client, db_access, project_id):
+  def __init__(self, zk_client, db_access, project_id,
+               lease_coordinator=None):
     """ Creates a new ProjectQueueManager.
 
     Args:
       zk_client: A KazooClient.
       db_access: A DatastoreProxy.
       project_id: A string specifying a project ID.
+      lease_coordinator: A LeaseCoordinator or None.
     """
     super(ProjectQueueManager, self).__init__()
     self.zk_client = zk_client
     self.project_id = project_id
     self.db_access = db_access
+    self.lease_coordinator = lease_coordinator
 
     pg_dns_node = '/appscale/projects/{}/postgres_dsn'.format(project_id)
     try:
       pg_dsn = self.zk_client.get(pg_dns_node)
       logger.info('Using PostgreSQL as a backend for Pull Queues of "{}"'
                   .format(project_id))
-      import psycopg2  # Import psycopg2 lazily
-      self.pg_connection = psycopg2.connect(pg_dsn[0])
+      self.pg_pool = PostgresConnectionPool(pg_dsn[0])
       self._configure_periodical_flush()
     except NoNodeError:
       logger.info('Using Cassandra as a backend for Pull Queues of "{}"'
                   .format(project_id))
-      self.pg_connection = None
+      self.pg_pool = None
     self.queues_node = '/appscale/projects/{}/queues'.format(project_id)
     self.watch = zk_client.DataWatch(self.queues_node,
                                      self._update_queues_watch)
@@ -75,12 +78,12 @@ class ProjectQueueManager(dict):
       queue_info['name'] = queue_name
       if 'mode' not in queue_info or queue_info['mode'] == 'push':
         self[queue_name] = PushQueue(queue_info, self.project_id)
-      elif self.pg_connection:
+      elif self.pg_pool:
         self[queue_name] = PostgresPullQueue(queue_info, self.project_id,
-                                             self.pg_connection)
+                                             self.pg_pool)
       else:
         self[queue_name] = PullQueue(queue_info, self.project_id,
-                                     self.db_access)
+                                     self.db_access, self.lease_coordinator)
 
     # Establish a new Celery connection based on the new queues, and close the
     # old one.
@@ -108,8 +111,8 @@ class ProjectQueueManager(dict):
     """ Close the Celery and Postgres connections if they still exist. """
     if self.celery is not None:
       self.celery.close()
-    if self.pg_connection is not None:
-      self.pg_connection.close()
+    if self.pg_pool is not None:
+      self.pg_pool.closeall()
 
   def _update_queues_watch(self, queue_config, _):
     """ Handles updates to a queue configuration node.
@@ -153,16 +156,18 @@ class ProjectQueueManager(dict):
 
 class GlobalQueueManager(dict):
   """ Keeps track of queue configuration details for all projects. """
-  def __init__(self, zk_client, db_access):
+  def __init__(self, zk_client, db_access, lease_coordinator=None):
     """ Creates a new GlobalQueueManager.
 
     Args:
       zk_client: A KazooClient.
       db_access: A DatastoreProxy.
+      lease_coordinator: A LeaseCoordinator or None.
     """
     super(GlobalQueueManager, self).__init__()
     self.zk_client = zk_client
     self.db_access = db_access
+    self.lease_coordinator = lease_coordinator
     zk_client.ensure_path('/appscale/projects')
     zk_client.ChildrenWatch('/appscale/projects', self._update_projects_watch)
 
@@ -180,8 +185,8 @@ class GlobalQueueManager(dict):
 
     for project_id in new_project_list:
       if project_id not in self:
-        self[project_id] = ProjectQueueManager(self.zk_client, self.db_access,
-                                               project_id)
+        self[project_id] = ProjectQueueManager(
+          self.zk_client, self.db_access, project_id, self.lease_coordinator)
 
       # Handle changes that happen between watches.
       self[project_id].ensure_watch()
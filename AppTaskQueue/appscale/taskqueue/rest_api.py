@@ -87,6 +87,7 @@ class RESTQueue(TrackedRequestHandler):
     """ Provide access to the queue handler. """
     self.queue_handler = queue_handler
 
+  @gen.coroutine
   def get(self, project, queue):
     """ Return info about an existing queue.
 
@@ -113,7 +114,9 @@ class RESTQueue(TrackedRequestHandler):
     else:
       fields = parse_fields(requested_fields)
 
-    self.write(queue.to_json(include_stats=get_stats, fields=fields))
+    queue_json = yield self.queue_handler.thread_pool.submit(
+      queue.to_json, include_stats=get_stats, fields=fields)
+    self.write(queue_json)
 
 
 class RESTTasks(TrackedRequestHandler):
@@ -124,6 +127,7 @@ class RESTTasks(TrackedRequestHandler):
     """ Provide access to the queue handler. """
     self.queue_handler = queue_handler
 
+  @gen.coroutine
   def get(self, project, queue):
     """ List all non-deleted tasks in a queue, whether or not they are
     currently leased, up to a maximum of 100.
@@ -143,7 +147,7 @@ class RESTTasks(TrackedRequestHandler):
       write_error(self, HTTPCodes.NOT_FOUND, 'Queue not found.')
       return
 
-    tasks = queue.list_tasks()
+    tasks = yield self.queue_handler.thread_pool.submit(queue.list_tasks)
     task_list = {}
     if 'kind' in fields:
       task_list['kind'] = 'taskqueues#tasks'
@@ -155,6 +159,7 @@ class RESTTasks(TrackedRequestHandler):
 
     self.write(json.dumps(task_list))
 
+  @gen.coroutine
   def post(self, project, queue):
     """ Insert a task into an existing queue.
 
@@ -196,13 +201,15 @@ class RESTTasks(TrackedRequestHandler):
       write_error(self, HTTPCodes.NOT_FOUND, 'Queue not found.')
       return
 
-    try:
-      queue.add_task(task)
-    except InvalidTaskInfo as insert_error:
+    insert_errors = yield self.queue_handler.thread_pool.submit(
+      queue.add_tasks, [task])
+    insert_error = insert_errors[0]
+    if isinstance(insert_error, InvalidTaskInfo):
       write_error(self, HTTPCodes.BAD_REQUEST, insert_error.message)
       return
-    except TransientError as error:
-      write_error(self, HTTPCodes.INTERNAL_ERROR, str(error))
+    elif isinstance(insert_error, TransientError):
+      write_error(self, HTTPCodes.INTERNAL_ERROR, str(insert_error))
+      return
 
     self.write(json.dumps(task.json_safe_dict(fields=fields)))
 
@@ -215,6 +222,7 @@ class RESTLease(TrackedRequestHandler):
     """ Provide access to the queue handler. """
     self.queue_handler = queue_handler
 
+  @gen.coroutine
   def post(self, project, queue):
     """ Acquire a lease on the topmost N unowned tasks in a queue.
 
@@ -262,7 +270,8 @@ class RESTLease(TrackedRequestHandler):
       return
 
     try:
-      tasks = queue.lease_tasks(num_tasks, lease_seconds, group_by_tag, tag)
+      tasks = yield self.queue_handler.thread_pool.submit(
+        queue.lease_tasks, num_tasks, lease_seconds, group_by_tag, tag)
     except InvalidLeaseRequest as lease_error:
       write_error(self, HTTPCodes.BAD_REQUEST, lease_error.message)
       return
@@ -295,6 +304,7 @@ class RESTTask(TrackedRequestHandler):
     """ Provide access to the queue handler. """
     self.queue_handler = queue_handler
 
+  @gen.coroutine
   def get(self, project, queue, task):
     """ Get the named task in a queue.
 
@@ -320,9 +330,11 @@ class RESTTask(TrackedRequestHandler):
       write_error(self, HTTPCodes.NOT_FOUND, 'Queue not found.')
       return
 
-    task = queue.get_task(task, omit_payload=omit_payload)
+    task = yield self.queue_handler.thread_pool.submit(
+      queue.get_task, task, omit_payload=omit_payload)
     self.write(json.dumps(task.json_safe_dict(fields=fields)))
 
+  @gen.coroutine
   def post(self, project, queue, task):
     """ Update the duration of a task lease.
 
@@ -371,7 +383,8 @@ class RESTTask(TrackedRequestHandler):
       return
 
     try:
-      task = queue.update_lease(provided_task, new_lease_seconds)
+      task = yield self.queue_handler.thread_pool.submit(
+        queue.update_lease, provided_task, new_lease_seconds)
     except InvalidLeaseRequest as lease_error:
       write_error(self, HTTPCodes.BAD_REQUEST, lease_error.message)
       return
@@ -381,6 +394,7 @@ class RESTTask(TrackedRequestHandler):
 
     self.write(json.dumps(task.json_safe_dict(fields=fields)))
 
+  @gen.coroutine
   def delete(self, project, queue, task):
     """ Delete a task from a queue.
 
@@ -396,8 +410,9 @@ class RESTTask(TrackedRequestHandler):
       write_error(self, HTTPCodes.NOT_FOUND, 'Queue not found.')
       return
 
-    queue.delete_task(task)
+    yield self.queue_handler.thread_pool.submit(queue.delete_task, task)
 
+  @gen.coroutine
   def patch(self, project, queue, task):
     """ Update tasks that are leased out of a queue.
 
@@ -455,7 +470,8 @@ class RESTTask(TrackedRequestHandler):
       return
 
     try:
-      task = queue.update_task(new_task, new_lease_seconds)
+      task = yield self.queue_handler.thread_pool.submit(
+        queue.update_task, new_task, new_lease_seconds)
     except InvalidLeaseRequest as lease_error:
       write_error(self, HTTPCodes.BAD_REQUEST, lease_error.message)
       return
@@ -1,3 +1,5 @@
+import threading
+
 from tornado import locks
 
 from appscale.common.service_stats import (
@@ -81,6 +83,7 @@ METRICS_CONFIG = {
   "all": metrics.CountOf(matchers.ANY),
   "failed": metrics.CountOf(FAILED_REQUEST),
   "avg_latency": metrics.Avg("latency"),
+  "latency_histogram": metrics.Histogram("latency"),
   "pb_reqs": metrics.CountOf(PROTOBUFF_REQUEST),
   "rest_reqs": metrics.CountOf(REST_REQUEST),
   PB_METHOD_CATEGORIZER: metrics.CountOf(matchers.ANY),
@@ -96,3 +99,52 @@ service_stats = stats_manager.ServiceStats(
 )
 # Create tornado lock for tracking concurrent requests
 stats_lock = locks.Lock()
+
+
+# Configure stats for pull queue leases. Each lease_tasks call is recorded as
+# a request so that lease latency can be tracked separately from the API
+# requests that contain it.
+class EmptyLeaseMatcher(matchers.RequestMatcher):
+  def matches(self, request_info):
+    return not request_info.leased
+
+
+class LeaseQueueCategorizer(categorizers.Categorizer):
+  def category_of(self, req_info):
+    return "{}.{}".format(req_info.app, req_info.queue)
+
+
+EMPTY_LEASE = EmptyLeaseMatcher()
+
+LEASE_QUEUE_CATEGORIZER = LeaseQueueCategorizer(categorizer_name="by_queue")
+
+LEASE_STATS_FIELDS = [
+  "app", "queue", "requested", "leased", "rounds", "contended"
+]
+LEASE_CUMULATIVE_COUNTERS = {
+  "all": matchers.ANY,
+  "empty": EMPTY_LEASE
+}
+LEASE_METRICS_CONFIG = {
+  "all": metrics.CountOf(matchers.ANY),
+  "empty": metrics.CountOf(EMPTY_LEASE),
+  "avg_latency": metrics.Avg("latency"),
+  "max_latency": metrics.Max("latency"),
+  "avg_leased": metrics.Avg("leased"),
+  "avg_rounds": metrics.Avg("rounds"),
+  "avg_contended": metrics.Avg("contended"),
+  LEASE_QUEUE_CATEGORIZER: {
+    "all": metrics.CountOf(matchers.ANY),
+    "avg_latency": metrics.Avg("latency"),
+    "avg_leased": metrics.Avg("leased")
+  }
+}
+# Instantiate singleton ServiceStats for leases
+lease_stats = stats_manager.ServiceStats(
+  "taskqueue_leases", request_fields=LEASE_STATS_FIELDS,
+  cumulative_counters=LEASE_CUMULATIVE_COUNTERS,
+  default_metrics_for_recent=LEASE_METRICS_CONFIG
+)
+# Leases are performed by REST API worker threads, so a thread lock is used
+# instead of a tornado lock
+lease_stats_lock = threading.Lock()
@@ -50,6 +50,11 @@ class InvalidTaskInfo(Exception):
   pass
 
 
+class TaskNameTaken(InvalidTaskInfo):
+  """ Indicates that a task with the same name already exists. """
+  pass
+
+
 class Task(object):
   """ Represents a task created by an App Engine application. """
 
@@ -15,6 +15,7 @@ setup(
     'cassandra-driver',
     'celery>=3.1,<4.0.0',
     'eventlet==0.22',
+    'futures',
     'kazoo',
     'mock',
     'psycopg2-binary',
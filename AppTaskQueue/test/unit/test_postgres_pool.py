@@ -0,0 +1,162 @@
+import threading
+import time
+import unittest
+
+import psycopg2
+from mock import MagicMock, patch
+
+from appscale.taskqueue.postgres_pool import PostgresConnectionPool
+
+
+class TestPostgresConnectionPool(unittest.TestCase):
+  def setUp(self):
+    self.connection = MagicMock(closed=0)
+    self.cursor = self.connection.cursor.return_value
+    self.cursor.connection = self.connection
+    patcher = patch('psycopg2.pool.ThreadedConnectionPool')
+    pool_class = patcher.start()
+    self.addCleanup(patcher.stop)
+    self.pg_pool = PostgresConnectionPool('dbname=appscale')
+    self.inner_pool = pool_class.return_value
+    self.inner_pool.getconn.return_value = self.connection
+
+  def test_transaction(self):
+    with self.pg_pool.transaction() as pg_cursor:
+      pg_cursor.execute('SELECT 1')
+
+    self.connection.commit.assert_called_once_with()
+    self.inner_pool.putconn.assert_called_once_with(self.connection,
+                                                    close=False)
+
+    with self.assertRaises(ValueError):
+      with self.pg_pool.transaction():
+        raise ValueError('Bad statement')
+
+    self.connection.rollback.assert_called_once_with()
+    self.assertEqual(self.inner_pool.putconn.call_count, 2)
+
+  def test_execute_prepared(self):
+    statement = 'SELECT * FROM "pullqueue-test" WHERE task_name = $1'
+    with self.pg_pool.transaction() as pg_cursor:
+      self.pg_pool.execute_prepared(pg_cursor, statement, ('task1',))
+      self.pg_pool.execute_prepared(pg_cursor, statement, ('task2',))
+
+    executed = [call[0][0] for call in self.cursor.execute.call_args_list]
+    self.assertEqual(len(executed), 3)
+    self.assertTrue(executed[0].startswith('PREPARE tq_'))
+    self.assertTrue(executed[1].startswith('EXECUTE tq_'))
+    self.assertEqual(executed[1], executed[2])
+
+    # Errors raised by callers should not discard prepared statements.
+    with self.assertRaises(ValueError):
+      with self.pg_pool.transaction() as pg_cursor:
+        raise ValueError('The task lease has expired')
+
+    self.cursor.execute.reset_mock()
+    with self.pg_pool.transaction() as pg_cursor:
+      self.pg_pool.execute_prepared(pg_cursor, statement, ('task1',))
+
+    executed = [call[0][0] for call in self.cursor.execute.call_args_list]
+    self.assertEqual(len(executed), 1)
+    self.assertTrue(executed[0].startswith('EXECUTE tq_'))
+
+    # Failed transactions should cause the statement to be prepared again.
+    with self.assertRaises(psycopg2.Error):
+      with self.pg_pool.transaction() as pg_cursor:
+        raise psycopg2.Error('Bad statement')
+
+    self.cursor.execute.reset_mock()
+    with self.pg_pool.transaction() as pg_cursor:
+      self.pg_pool.execute_prepared(pg_cursor, statement, ('task1',))
+
+    executed = [call[0][0] for call in self.cursor.execute.call_args_list]
+    self.assertTrue(executed[0].startswith('PREPARE tq_'))
+
+
+class FakeConnection(object):
+  """ Records the statements prepared in its session. """
+  def __init__(self):
+    self.closed = 0
+    self.prepared = set()
+
+  def cursor(self):
+    return FakeCursor(self)
+
+  def commit(self):
+    pass
+
+  def rollback(self):
+    pass
+
+  def close(self):
+    self.closed = 1
+
+
+class FakeCursor(object):
+  def __init__(self, connection):
+    self.connection = connection
+
+  def execute(self, statement, params=None):
+    if statement.startswith('PREPARE '):
+      self.connection.prepared.add(statement.split()[1])
+    elif statement.startswith('EXECUTE '):
+      name = statement.split()[1]
+      if name not in self.connection.prepared:
+        raise psycopg2.Error(
+          'prepared statement "{}" does not exist'.format(name))
+
+
+class FakeThreadedPool(object):
+  """ Follows psycopg2's rule for closing returned connections. """
+  def __init__(self, minconn, maxconn, dsn):
+    self.minconn = minconn
+    self.lock = threading.Lock()
+    self.idle = [FakeConnection() for _ in range(minconn)]
+    self.opened = minconn
+
+  def getconn(self):
+    with self.lock:
+      if self.idle:
+        return self.idle.pop()
+      self.opened += 1
+      return FakeConnection()
+
+  def putconn(self, connection, close=False):
+    with self.lock:
+      if not connection.closed and not close and \
+          len(self.idle) < self.minconn:
+        self.idle.append(connection)
+      else:
+        connection.close()
+
+
+class TestConcurrentPostgresConnectionPool(unittest.TestCase):
+  def test_concurrent_transactions(self):
+    with patch('psycopg2.pool.ThreadedConnectionPool', FakeThreadedPool):
+      pg_pool = PostgresConnectionPool('dbname=appscale', max_connections=4)
+
+    statement = 'SELECT * FROM "pullqueue-test" WHERE task_name = $1'
+    errors = []
+
+    def run_transactions():
+      try:
+        for _ in range(50):
+          with pg_pool.transaction() as pg_cursor:
+            pg_pool.execute_prepared(pg_cursor, statement, ('task1',))
+            # Hold the connection so that transactions overlap.
+            time.sleep(0.001)
+      except Exception as error:
+        errors.append(error)
+
+    threads = [threading.Thread(target=run_transactions) for _ in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    self.assertEqual(errors, [])
+    # Connections should stay open so their prepared statements are reused.
+    self.assertEqual(pg_pool._pool.opened, 4)
+    self.assertTrue(all(not connection.closed
+                        for connection in pg_pool._pool.idle))
+    self.assertLessEqual(len(pg_pool._prepared), 4)
@@ -0,0 +1,77 @@
+import datetime
+import unittest
+from contextlib import contextmanager
+
+from mock import MagicMock
+
+from appscale.taskqueue.queue import PostgresPullQueue
+
+
+class FakePool(object):
+  """ Records the statements executed in each transaction. """
+  def __init__(self, partitions=()):
+    self.cursor = MagicMock()
+    self.cursor.fetchall.return_value = [(name,) for name in partitions]
+    self.cursor.rowcount = 2
+    self.statements = []
+
+    def execute(statement, vars=None):
+      self.statements.append(statement)
+
+    self.cursor.execute.side_effect = execute
+
+  @contextmanager
+  def transaction(self):
+    yield self.cursor
+
+  def execute_prepared(self, pg_cursor, statement, params=()):
+    pg_cursor.execute(statement)
+
+
+class TestPostgresPullQueue(unittest.TestCase):
+  def test_flush_deleted(self):
+    today = datetime.datetime.utcnow().date()
+    old_day = today - datetime.timedelta(days=8)
+    recent_day = today - datetime.timedelta(days=2)
+    queue_info = {'name': 'queue1', 'mode': 'pull'}
+    queue = PostgresPullQueue(queue_info, 'app1', FakePool())
+    pg_pool = FakePool([queue.partition_name(old_day),
+                        queue.partition_name(recent_day),
+                        'pullqueue-queue1-unexpected'])
+    queue.pg_pool = pg_pool
+
+    queue.flush_deleted()
+
+    drops = [statement for statement in pg_pool.statements
+             if statement.startswith('DROP TABLE')]
+    self.assertListEqual(
+      drops, ['DROP TABLE "{}"'.format(queue.partition_name(old_day))])
+
+    # Tasks that are still in use should be moved to today's partition.
+    moves = [statement for statement in pg_pool.statements
+             if statement.startswith('WITH remaining')]
+    self.assertEqual(len(moves), 1)
+    self.assertIn('INSERT INTO "{}"'.format(queue.partition_name(today)),
+                  moves[0])
+
+  def test_add_tasks_partition(self):
+    queue_info = {'name': 'queue1', 'mode': 'pull'}
+    pg_pool = FakePool()
+    queue = PostgresPullQueue(queue_info, 'app1', pg_pool)
+    pg_pool.statements = []
+
+    task = MagicMock(id='task1', payloadBase64='dGVzdA==', tag=None)
+    pg_pool.cursor.fetchall.return_value = []
+    pg_pool.cursor.mogrify.return_value = "('task1')"
+    queue.add_tasks([task, MagicMock(id='task2', payloadBase64='dGVzdA==')])
+    queue.add_tasks([MagicMock(id='task3', payloadBase64='dGVzdA==')])
+
+    # The partition should only be created once.
+    partition = queue.partition_name(datetime.datetime.utcnow().date())
+    creates = [statement for statement in pg_pool.statements
+               if statement.startswith('CREATE TABLE')]
+    self.assertEqual(len(creates), 1)
+    self.assertIn('INSERT INTO "{}"'.format(partition), pg_pool.statements[2])
+
+    # Task names should be locked before checking other partitions for them.
+    self.assertIn('pg_advisory_xact_lock', pg_pool.statements[1])
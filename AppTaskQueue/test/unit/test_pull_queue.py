@@ -0,0 +1,181 @@
+import datetime
+import unittest
+import uuid
+
+from cassandra import OperationTimedOut
+from collections import namedtuple
+from mock import MagicMock
+
+from appscale.taskqueue.queue import PullQueue
+from appscale.taskqueue.statistics import lease_stats
+from appscale.taskqueue.task import InvalidTaskInfo, Task, TaskNameTaken
+
+IndexEntry = namedtuple('IndexEntry', ['eta', 'id', 'tag'])
+TaskEntry = namedtuple(
+  'TaskEntry', ['payload', 'enqueued', 'lease_expires', 'retry_count', 'tag'])
+OpEntry = namedtuple('OpEntry', ['op_id'])
+
+
+class FakeFuture(object):
+  def __init__(self, result=None, error=None):
+    self._result = result
+    self._error = error
+
+  def result(self):
+    if self._error is not None:
+      raise self._error
+    return self._result
+
+
+class FakeBoundStatement(object):
+  def __init__(self, statement, params):
+    self.statement = statement
+    self.params = params
+
+
+class FakeSession(object):
+  """ Responds to pull queue statements using an in-memory task table. """
+  def __init__(self, tasks):
+    self.tasks = tasks
+    self.lease_outcomes = {}
+    self.leases = []
+    self.inserts = []
+    self.batches = 0
+
+  def execute(self, statement, params=None):
+    # Existing tasks were last mutated by another operation.
+    return [OpEntry(uuid.uuid4())]
+
+  def prepare(self, statement):
+    prepared = MagicMock()
+    prepared.statement = statement
+    prepared.bind.side_effect = lambda params: FakeBoundStatement(
+      statement, params)
+    return prepared
+
+  def execute_async(self, statement, params=None):
+    if params is None:
+      if not isinstance(statement, FakeBoundStatement):
+        self.batches += 1
+        return FakeFuture()
+      params = statement.params
+
+    statement = statement.statement
+
+    if 'SELECT payload' in statement:
+      task_id = params[2]
+      return FakeFuture([self.tasks[task_id]] if task_id in self.tasks else [])
+
+    if 'SELECT op_id' in statement:
+      return FakeFuture([OpEntry(self.leases[-1][1])])
+
+    if 'INSERT INTO pull_queue_tasks' in statement:
+      task_id = params[2]
+      self.inserts.append(task_id)
+      return FakeFuture(MagicMock(was_applied=task_id not in self.tasks))
+
+    if 'UPDATE pull_queue_tasks' in statement:
+      task_id = params[5]
+      self.leases.append((task_id, params[1]))
+      outcome = self.lease_outcomes.get(task_id, True)
+      if isinstance(outcome, Exception):
+        return FakeFuture(error=outcome)
+      return FakeFuture(MagicMock(was_applied=outcome))
+
+    return FakeFuture()
+
+
+class TestPullQueueLeases(unittest.TestCase):
+  def setUp(self):
+    past = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+    future = datetime.datetime.utcnow() + datetime.timedelta(minutes=1)
+    self.tasks = {
+      'available': TaskEntry('payload', past, past, 0, None),
+      'leased': TaskEntry('payload', past, future, 1, None),
+      'exhausted': TaskEntry('payload', past, past, 3, None),
+      'contended': TaskEntry('payload', past, past, 0, 'tag1'),
+      'timed-out': TaskEntry('payload', past, past, 2, 'tag1')
+    }
+    self.session = FakeSession(self.tasks)
+    db_access = MagicMock(session=self.session)
+    queue_info = {'name': 'queue1', 'mode': 'pull',
+                  'retry_parameters': {'task_retry_limit': 3}}
+    self.queue = PullQueue(queue_info, 'app1', db_access)
+
+  def test_lease_batch(self):
+    self.session.lease_outcomes = {'contended': False,
+                                   'timed-out': OperationTimedOut()}
+    past = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+    task_ids = ['available', 'leased', 'missing', 'exhausted', 'contended',
+                'timed-out']
+    indexes = [IndexEntry(past, task_id, '') for task_id in task_ids]
+    new_eta = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+
+    leased, lost_races = self.queue._lease_batch(indexes, new_eta)
+
+    self.assertEqual(lost_races, 1)
+    self.assertListEqual([task.id if task else None for task in leased],
+                         ['available', None, None, None, None, 'timed-out'])
+    self.assertEqual(leased[-1].tag, 'tag1')
+
+    # Only tasks that appear to be available should be updated, and every
+    # lease should share an operation ID.
+    self.assertListEqual([task_id for task_id, _ in self.session.leases],
+                         ['available', 'contended', 'timed-out'])
+    self.assertEqual(len(set(op_id for _, op_id in self.session.leases)), 1)
+    self.assertIsInstance(self.session.leases[0][1], uuid.UUID)
+
+    # Each leased task should have its index rewritten.
+    self.assertEqual(self.session.batches, 2)
+
+  def test_lease_stats(self):
+    self.queue._query_available_tasks = MagicMock(side_effect=[
+      [IndexEntry(None, 'available', '')], []])
+    before = lease_stats.get_cumulative_counters()['all']
+
+    leased = self.queue.lease_tasks(10, 60)
+
+    self.assertEqual([task.id for task in leased], ['available'])
+    self.assertEqual(lease_stats.get_cumulative_counters()['all'], before + 1)
+    recent = lease_stats.get_recent()
+    self.assertEqual(recent['by_queue']['app1.queue1']['all'], 1)
+
+  def test_coordinated_index(self):
+    coordinator = MagicMock(total_workers=2)
+    coordinator.owns.side_effect = lambda task_id: task_id.startswith('own')
+    self.queue.lease_coordinator = coordinator
+    index = [IndexEntry(None, task_id, '')
+             for task_id in ['other1', 'own1', 'other2', 'own2', 'own3']]
+    self.queue._query_index = MagicMock(return_value=index)
+
+    # Tasks in this server's slice should be leased first.
+    results = self.queue._query_available_tasks(2, False, None)
+    self.assertListEqual([result.id for result in results], ['own1', 'own2'])
+    self.queue._query_index.assert_called_with(
+      PullQueue.MAX_CACHE_SIZE * 2, False, None)
+
+    # Other slices should only be used when this server's slice runs out.
+    results = self.queue._query_available_tasks(600, False, None)
+    self.assertListEqual([result.id for result in results],
+                         ['own1', 'own2', 'own3', 'other1', 'other2'])
+
+  def test_add_tasks(self):
+    tasks = [Task({'id': 'new1', 'payloadBase64': 'cGF5bG9hZA=='}),
+             Task({'id': 'available', 'payloadBase64': 'cGF5bG9hZA=='}),
+             Task({'id': 'no-payload'}),
+             Task({'id': 'new2', 'payloadBase64': 'cGF5bG9hZA==',
+                   'tag': 'tag1'})]
+
+    errors = self.queue.add_tasks(tasks)
+
+    self.assertIsNone(errors[0])
+    self.assertIsInstance(errors[1], TaskNameTaken)
+    self.assertIsInstance(errors[2], InvalidTaskInfo)
+    self.assertNotIsInstance(errors[2], TaskNameTaken)
+    self.assertIsNone(errors[3])
+    self.assertListEqual(sorted(self.session.inserts),
+                         ['available', 'new1', 'new2'])
+
+    # Each new task's index entries should be written in a single batch.
+    self.assertEqual(self.session.batches, 2)
+    self.assertEqual(tasks[3].queueName, 'queue1')
@@ -138,6 +138,14 @@ class TestServiceStatistics(AsyncHTTPTestCase):
     self.assertGreater(stats['recent_stats'].pop('from'), 0)
     self.assertGreater(stats['recent_stats'].pop('to'), 0)
     self.assertGreaterEqual(stats['recent_stats'].pop('avg_latency'), 0)
+    latency_histogram = stats['recent_stats'].pop('latency_histogram')
+    self.assertEqual(
+      sum(count for _, count in latency_histogram['counts']), 15)
+
+    # None of the requests leased tasks
+    lease_stats = stats.pop('lease_stats')
+    self.assertEqual(lease_stats['cumulative_counters']['all'], 0)
+    self.assertEqual(lease_stats['recent_stats']['all'], 0)
 
     # Verify other fields
     self.assertEqual(stats, {
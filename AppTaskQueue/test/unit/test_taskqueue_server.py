@@ -1,10 +1,14 @@
 #!/usr/bin/env python
+import socket
 import unittest
 
 from mock import MagicMock, patch
 from appscale.common import file_io
 
 from appscale.taskqueue import distributed_tq
+from appscale.taskqueue.distributed_tq import (
+  TaskQueueServiceError, taskqueue_service_pb)
+from appscale.taskqueue.tq_lib import TASK_STATES
 
 
 class TestDistributedTaskQueue(unittest.TestCase):
@@ -25,12 +29,105 @@ class TestDistributedTaskQueue(unittest.TestCase):
     zk_client = MagicMock()
     distributed_tq.DistributedTaskQueue(db_access, zk_client)
 
+  def test_bulk_add(self):
+    db_access = MagicMock()
+    zk_client = MagicMock()
+    tq = distributed_tq.DistributedTaskQueue(db_access, zk_client)
+    push_queue = MagicMock(app='app1')
+    push_queue.name = 'queue1'
+    tq.get_queue = MagicMock(return_value=push_queue)
+    tq.get_task_args = MagicMock(return_value={'expires': None})
+    producer = push_queue.celery.producer_or_acquire.return_value.__enter__()
+
+    request = taskqueue_service_pb.TaskQueueBulkAddRequest()
+    for task_name in ['task1', 'task2', 'task1', 'task3']:
+      add_request = request.add_add_request()
+      add_request.set_app_id('app1')
+      add_request.set_queue_name('queue1')
+      add_request.set_task_name(task_name)
+      add_request.set_eta_usec(0)
+      add_request.set_url('/worker')
+
+    # task2 has already run, so its name is tombstoned.
+    existing = MagicMock(state=TASK_STATES.SUCCESS)
+    source_info = {'app_id': 'app1', 'module_id': 'default',
+                   'version_id': 'v1'}
+    with patch.object(distributed_tq.TaskName, 'get_by_key_name',
+                      return_value=[None, existing, None, None]) as get, \
+         patch.object(distributed_tq.db, 'put') as put, \
+         patch.object(distributed_tq.appscale_info, 'get_secret',
+                      return_value='secret'):
+      encoded, error, _ = tq.bulk_add(source_info, request.Encode())
+
+    self.assertEqual(error, 0)
+    response = taskqueue_service_pb.TaskQueueBulkAddResponse(encoded)
+    self.assertListEqual(
+      [result.result() for result in response.taskresult_list()],
+      [TaskQueueServiceError.OK, TaskQueueServiceError.TOMBSTONED_TASK,
+       TaskQueueServiceError.TASK_ALREADY_EXISTS, TaskQueueServiceError.OK])
+
+    # Task names should be read and stored with one request each.
+    self.assertEqual(get.call_count, 1)
+    self.assertEqual(put.call_count, 1)
+    self.assertEqual(len(put.call_args[0][0]), 2)
+
+    # Every task should be published through the same producer.
+    self.assertEqual(push_queue.celery.send_task.call_count, 2)
+    for call in push_queue.celery.send_task.call_args_list:
+      self.assertIs(call[1]['producer'], producer)
+
+  def test_bulk_add_publish_failure(self):
+    db_access = MagicMock()
+    zk_client = MagicMock()
+    tq = distributed_tq.DistributedTaskQueue(db_access, zk_client)
+    push_queue = MagicMock(app='app1')
+    push_queue.name = 'queue1'
+    tq.get_queue = MagicMock(return_value=push_queue)
+    tq.get_task_args = MagicMock(return_value={'expires': None})
+
+    # The broker connection is lost while publishing the second task.
+    push_queue.celery.send_task.side_effect = [
+      None, socket.error('Connection closed'), None]
+
+    request = taskqueue_service_pb.TaskQueueBulkAddRequest()
+    for task_name in ['task1', 'task2', 'task3']:
+      add_request = request.add_add_request()
+      add_request.set_app_id('app1')
+      add_request.set_queue_name('queue1')
+      add_request.set_task_name(task_name)
+      add_request.set_eta_usec(0)
+      add_request.set_url('/worker')
+
+    source_info = {'app_id': 'app1', 'module_id': 'default',
+                   'version_id': 'v1'}
+    with patch.object(distributed_tq.TaskName, 'get_by_key_name',
+                      return_value=[None, None, None]), \
+         patch.object(distributed_tq.db, 'put') as put, \
+         patch.object(distributed_tq.db, 'delete') as delete, \
+         patch.object(distributed_tq.db.Key, 'from_path',
+                      side_effect=lambda kind, name: name), \
+         patch.object(distributed_tq.appscale_info, 'get_secret',
+                      return_value='secret'):
+      encoded, error, _ = tq.bulk_add(source_info, request.Encode())
+
+    self.assertEqual(error, 0)
+    response = taskqueue_service_pb.TaskQueueBulkAddResponse(encoded)
+    self.assertListEqual(
+      [result.result() for result in response.taskresult_list()],
+      [TaskQueueServiceError.OK, TaskQueueServiceError.TRANSIENT_ERROR,
+       TaskQueueServiceError.TRANSIENT_ERROR])
+
+    # Receipts of tasks that were not published should be removed so that
+    # clients can retry them.
+    self.assertEqual(len(put.call_args[0][0]), 3)
+    delete.assert_called_once_with(
+      ['task_app1_queue1_task2', 'task_app1_queue1_task3'])
+
   # TODO:
   # def test_fetch_queue_stats(self):
   # def test_delete(self):
   # def test_purge_queue(self):
   # def test_query_and_own_tasks(self):
-  # def test_bulk_add(self):
   # def test_modify_task_lease(self):
   # def test_update_queue(self):
   # def test_fetch_queue(self):
@@ -11,9 +11,20 @@ PROFILE_LOG_DIR = '/var/log/appscale/profile'
 # The amount of time to wait for local stats from a slave node.
 STATS_REQUEST_TIMEOUT = 60
 
+# The amount of time a group leader waits for local stats of group members.
+# It is shorter than STATS_REQUEST_TIMEOUT, so the leader can report
+# slow members before the requester gives up on the whole group.
+GROUP_MEMBER_REQUEST_TIMEOUT = 30
+
 # Stats which were produce less than X seconds ago is considered as current
 ACCEPTABLE_STATS_AGE = 10
 
+# The default number of seconds between samples of local processes stats
+PROCESSES_SAMPLING_INTERVAL = 5
+
+# The number of threads collecting stats of local processes
+PROCESSES_SAMPLING_WORKERS = 4
+
 # The ZooKeeper location for storing Hermes configurations
 NODES_STATS_CONFIGS_NODE = '/appscale/stats/profiling/nodes'
 PROCESSES_STATS_CONFIGS_NODE = '/appscale/stats/profiling/processes'
@@ -48,5 +59,6 @@ class HTTP_Codes(object):
   HTTP_OK = 200
   HTTP_BAD_REQUEST = 400
   HTTP_DENIED = 403
+  HTTP_NOT_FOUND = 404
   HTTP_INTERNAL_ERROR = 500
   HTTP_NOT_IMPLEMENTED = 501
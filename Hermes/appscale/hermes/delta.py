@@ -0,0 +1,140 @@
+"""
+This module allows Hermes nodes to send only changed fields of rendered
+stats to a master which has already seen a previous version of them.
+
+A delta of two JSON serializable values is either the new value itself
+or a dictionary marked with DELTA_KEY:
+  {DELTA_KEY: 'dict', 'set': {key: value or delta}, 'del': [keys]}
+  {DELTA_KEY: 'list', 'set': {'index': value or delta}}
+"""
+import collections
+import hashlib
+import json
+
+DELTA_KEY = '__delta__'
+
+
+class UnknownVersion(KeyError):
+  """ Is raised when a base version of delta is not known anymore. """
+  pass
+
+
+def stats_delta(old, new):
+  """ Renders changes needed to get new value from the old one.
+
+  Args:
+    old: A JSON serializable value previously seen by receiver.
+    new: A JSON serializable value.
+  Returns:
+    A JSON serializable delta.
+  """
+  if isinstance(old, dict) and isinstance(new, dict):
+    changed = {}
+    for key, value in new.iteritems():
+      if key not in old:
+        changed[key] = value
+      elif old[key] != value:
+        changed[key] = stats_delta(old[key], value)
+    removed = [key for key in old if key not in new]
+    return {DELTA_KEY: 'dict', 'set': changed, 'del': removed}
+
+  if (isinstance(old, list) and isinstance(new, list)
+      and len(old) == len(new)):
+    changed = {
+      str(index): stats_delta(old_value, new_value)
+      for index, (old_value, new_value) in enumerate(zip(old, new))
+      if old_value != new_value
+    }
+    return {DELTA_KEY: 'list', 'set': changed}
+
+  return new
+
+
+def apply_stats_delta(old, delta):
+  """ Builds new value from the old one and delta rendered by stats_delta.
+  The old value is not modified.
+
+  Args:
+    old: A JSON serializable value.
+    delta: A delta rendered by stats_delta.
+  Returns:
+    A JSON serializable value.
+  """
+  if not isinstance(delta, dict) or DELTA_KEY not in delta:
+    return delta
+
+  if delta[DELTA_KEY] == 'dict':
+    new = dict(old)
+    for key in delta['del']:
+      del new[key]
+    for key, value in delta['set'].iteritems():
+      new[key] = apply_stats_delta(old.get(key), value)
+    return new
+
+  new = list(old)
+  for index, value in delta['set'].iteritems():
+    index = int(index)
+    new[index] = apply_stats_delta(old[index], value)
+  return new
+
+
+def stats_version(rendered):
+  """ Computes version of rendered stats which doesn't depend on order
+  of dictionary keys.
+
+  Args:
+    rendered: A JSON serializable value.
+  Returns:
+    A string representing the version.
+  """
+  return hashlib.md5(json.dumps(rendered, sort_keys=True)).hexdigest()
+
+
+class RenderedVersions(object):
+  """ Keeps the latest versions of rendered stats, so deltas can be
+  computed against a version which was sent to the master.
+  """
+
+  # The number of versions to keep.
+  MAX_VERSIONS = 4
+
+  def __init__(self, max_versions=MAX_VERSIONS):
+    self._max_versions = max_versions
+    self._versions = collections.OrderedDict()  # {version: rendered}
+
+  @property
+  def latest(self):
+    """ The version which was added last or None. """
+    return next(reversed(self._versions), None)
+
+  def add(self, rendered, version=None):
+    """ Remembers rendered stats.
+
+    Args:
+      rendered: A JSON serializable value.
+      version: A string representing the version if it is already known.
+    Returns:
+      A string representing the version of rendered stats.
+    """
+    if version is None:
+      version = stats_version(rendered)
+    self._versions.pop(version, None)
+    self._versions[version] = rendered
+    while len(self._versions) > self._max_versions:
+      self._versions.popitem(last=False)
+    return version
+
+  def get(self, version):
+    """ Returns previously rendered stats.
+
+    Args:
+      version: A string representing the version.
+    Returns:
+      A JSON serializable value.
+    Raises:
+      UnknownVersion if the version is not kept anymore.
+    """
+    try:
+      return self._versions[version]
+    except KeyError:
+      raise UnknownVersion(version)
@@ -8,30 +8,64 @@ from tornado.options import options
 from tornado.web import RequestHandler
 
 from appscale.hermes.constants import (
-  SECRET_HEADER, HTTP_Codes, ACCEPTABLE_STATS_AGE
+  SECRET_HEADER, HTTP_Codes, ACCEPTABLE_STATS_AGE,
+  GROUP_MEMBER_REQUEST_TIMEOUT
 )
 from appscale.hermes.converter import (
   stats_to_dict, IncludeLists, WrongIncludeLists
 )
+from appscale.hermes.delta import UnknownVersion, stats_delta
+from appscale.hermes.timeseries import RAW, ROLLUP, UnknownSeries
 
 logger = logging.getLogger(__name__)
 
 
+def write_versioned(handler, rendered, payload, versions):
+  """ Writes rendered stats to response. If requester supports deltas,
+  only changed fields are sent when requester has seen the base version.
+
+  Args:
+    handler: an instance of RequestHandler.
+    rendered: a JSON serializable value to send.
+    payload: a dict - parsed request body.
+    versions: an instance of RenderedVersions or None.
+  """
+  if 'delta_base' not in payload or versions is None:
+    json.dump(rendered, handler)
+    return
+
+  version = versions.add(rendered)
+  try:
+    base = versions.get(payload['delta_base'])
+  except UnknownVersion:
+    json.dump({'version': version, 'stats': rendered}, handler)
+    return
+  json.dump({
+    'version': version,
+    'base': payload['delta_base'],
+    'delta': stats_delta(base, rendered)
+  }, handler)
+
+
 class CurrentStatsHandler(RequestHandler):
   """ Handler for getting current local stats of specific kind.
   """
 
-  def initialize(self, source, default_include_lists, cache_container):
+  def initialize(self, source, default_include_lists, cache_container,
+                 versions=None):
     """ Initializes RequestHandler for handling a single request.
 
     Args:
       source: an object with method get_current.
       default_include_lists: an instance of IncludeLists to use as default.
       cache_container: a list containing a single element - cached snapshot.
+      versions: an instance of RenderedVersions - recently sent stats
+        which can be used as a base for delta.
     """
     self._stats_source = source
     self._default_include_lists = default_include_lists
     self._cache_container = cache_container
+    self._versions = versions
 
   @property
   def _cached_snapshot(self):
@@ -84,7 +118,8 @@ class CurrentStatsHandler(RequestHandler):
         snapshot = yield snapshot
       self._cached_snapshot = snapshot
 
-    json.dump(stats_to_dict(snapshot, include_lists), self)
+    rendered = stats_to_dict(snapshot, include_lists)
+    write_versioned(self, rendered, payload, self._versions)
 
 
 class CurrentClusterStatsHandler(RequestHandler):
@@ -169,6 +204,136 @@ class CurrentClusterStatsHandler(RequestHandler):
     }, self)
 
 
+class GroupStatsHandler(RequestHandler):
+  """ Handler for collecting current stats of a group of nodes.
+  It is used when this node is a leader of a group.
+  """
+
+  def initialize(self, source, default_include_lists, versions=None):
+    """ Initializes RequestHandler for handling a single request.
+
+    Args:
+      source: an instance of ClusterStatsSource.
+      default_include_lists: an instance of IncludeLists to use as default.
+      versions: an instance of RenderedVersions - recently sent group stats
+        which can be used as a base for delta.
+    """
+    self._cluster_stats_source = source
+    self._default_include_lists = default_include_lists
+    self._versions = versions
+
+  @gen.coroutine
+  def get(self):
+    if self.request.headers.get(SECRET_HEADER) != options.secret:
+      logger.warn("Received bad secret from {client}"
+                   .format(client=self.request.remote_ip))
+      self.set_status(HTTP_Codes.HTTP_DENIED, "Bad secret")
+      return
+    try:
+      payload = json.loads(self.request.body)
+      members = payload['members']
+      if (not isinstance(members, list) or
+          not all(isinstance(member, basestring) for member in members)):
+        raise ValueError('members should be a list of node IPs')
+    except (ValueError, TypeError, KeyError) as err:
+      logger.warn("Bad group request from {client} ({error})"
+                   .format(client=self.request.remote_ip, error=err))
+      json.dump({'error': str(err)}, self)
+      self.set_status(HTTP_Codes.HTTP_BAD_REQUEST, 'Wrong group request')
+      return
+    include_lists = payload.get('include_lists')
+    max_age = payload.get('max_age', ACCEPTABLE_STATS_AGE)
+
+    if include_lists is not None:
+      try:
+        include_lists = IncludeLists(include_lists)
+      except WrongIncludeLists as err:
+        logger.warn("Bad request from {client} ({error})"
+                     .format(client=self.request.remote_ip, error=err))
+        json.dump({'error': str(err)}, self)
+        self.set_status(HTTP_Codes.HTTP_BAD_REQUEST, 'Wrong include_lists')
+        return
+    else:
+      include_lists = self._default_include_lists
+
+    snapshots_dict, failures = (
+      yield self._cluster_stats_source.get_from_nodes(
+        members, max_age=max_age, include_lists=include_lists,
+        timeout=GROUP_MEMBER_REQUEST_TIMEOUT
+      )
+    )
+
+    rendered_snapshots = {
+      node_ip: stats_to_dict(snapshot, include_lists)
+      for node_ip, snapshot in snapshots_dict.iteritems()
+    }
+
+    # The whole group response is versioned, so only stats of nodes
+    # which have changed are sent to the requester
+    write_versioned(self, {
+      "stats": rendered_snapshots,
+      "failures": failures
+    }, payload, self._versions)
+
+
+class ProfileQueryHandler(RequestHandler):
+  """ Handler for reading time ranges of stats profiling series.
+  """
+
+  def initialize(self, store):
+    """ Initializes RequestHandler for handling a single request.
+
+    Args:
+      store: an instance of TimeSeriesStore.
+    """
+    self._store = store
+
+  def get(self):
+    if self.request.headers.get(SECRET_HEADER) != options.secret:
+      logger.warn("Received bad secret from {client}"
+                   .format(client=self.request.remote_ip))
+      self.set_status(HTTP_Codes.HTTP_DENIED, "Bad secret")
+      return
+    if self.request.body:
+      payload = json.loads(self.request.body)
+    else:
+      payload = {}
+    series = payload.get('series')
+
+    if series is None:
+      json.dump({'series': self._store.list_series()}, self)
+      return
+
+    try:
+      start = payload.get('start')
+      start = float(start) if start is not None else None
+      end = payload.get('end')
+      end = float(end) if end is not None else None
+    except (TypeError, ValueError) as err:
+      json.dump({'error': str(err)}, self)
+      self.set_status(HTTP_Codes.HTTP_BAD_REQUEST, 'Wrong time range')
+      return
+    kind = ROLLUP if payload.get('rollup') else RAW
+
+    # Only names listed by the store are accepted so that series can't be
+    # used to read files outside of the profiling directory.
+    if series not in self._store.list_series():
+      self.set_status(HTTP_Codes.HTTP_NOT_FOUND, 'Unknown series')
+      return
+
+    try:
+      columns, rows = self._store.query(series, start, end, kind)
+    except UnknownSeries:
+      self.set_status(HTTP_Codes.HTTP_NOT_FOUND, 'Unknown series')
+      return
+
+    json.dump({
+      'series': series,
+      'columns': ['utc_timestamp'] + columns,
+      'rows': rows
+    }, self)
+
+
 class Respond404Handler(RequestHandler):
   """
   This class is aimed to stub unavailable route.
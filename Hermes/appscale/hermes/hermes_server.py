@@ -16,6 +16,9 @@ from tornado.options import options
 
 from appscale.hermes import constants
 from appscale.hermes import stats_app
+from appscale.hermes.producers import cluster_stats
+from appscale.hermes.producers.process_stats import processes_stats_source
+from appscale.hermes.timeseries import TimeSeriesStore
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +45,14 @@ def main():
   parser.add_argument(
     '-v', '--verbose', action='store_true',
     help='Output debug-level logging')
+  parser.add_argument(
+    '--processes-sampling-interval', type=float,
+    default=constants.PROCESSES_SAMPLING_INTERVAL,
+    help='The number of seconds between samples of local processes stats')
+  parser.add_argument(
+    '--stats-group-size', type=int, default=0,
+    help='Collect cluster stats via group leaders if there are more nodes '
+         'than this number (0 means every node is requested directly)')
   args = parser.parse_args()
 
   logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
@@ -59,6 +70,10 @@ def main():
   is_tq = (my_ip in appscale_info.get_taskqueue_nodes())
   is_db = (my_ip in appscale_info.get_db_ips())
 
+  if args.stats_group_size:
+    cluster_stats.enable_groups(args.stats_group_size)
+
+  profile_store = None
   if is_master:
     global zk_client
     zk_client = KazooClient(
@@ -66,15 +81,23 @@ def main():
       connection_retry=ZK_PERSISTENT_RECONNECTS)
     zk_client.start()
     # Start watching profiling configs in ZooKeeper
-    stats_app.ProfilingManager(zk_client)
+    profile_store = TimeSeriesStore(constants.PROFILE_LOG_DIR)
+    stats_app.ProfilingManager(zk_client, profile_store)
 
   app = tornado.web.Application(
     stats_app.get_local_stats_api_routes(is_lb, is_tq, is_db)
-    + stats_app.get_cluster_stats_api_routes(is_master),
+    + stats_app.get_cluster_stats_api_routes(is_master)
+    + stats_app.get_group_stats_api_routes()
+    + stats_app.get_profile_api_routes(profile_store),
+    # Responses are gzipped if client sends "Accept-Encoding: gzip"
+    compress_response=True,
     debug=False
   )
   app.listen(constants.HERMES_PORT)
 
+  # Collect processes stats in background, so requests are served right away
+  processes_stats_source.start(args.processes_sampling_interval)
+
   # Start loop for accepting http requests.
   IOLoop.instance().start()
 
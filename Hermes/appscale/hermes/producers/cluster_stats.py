@@ -15,7 +15,12 @@ from tornado.simple_httpclient import SimpleAsyncHTTPClient
 from appscale.hermes import constants
 from appscale.hermes.constants import SECRET_HEADER
 from appscale.hermes import converter
-from appscale.hermes.constants import STATS_REQUEST_TIMEOUT
+from appscale.hermes.delta import (
+  RenderedVersions, UnknownVersion, apply_stats_delta
+)
+from appscale.hermes.constants import (
+  GROUP_MEMBER_REQUEST_TIMEOUT, STATS_REQUEST_TIMEOUT
+)
 from appscale.hermes.producers import (
   proxy_stats, node_stats, process_stats, rabbitmq_stats,
   taskqueue_stats, cassandra_stats
@@ -42,12 +47,27 @@ class ClusterStatsSource(object):
     self.method_path = method_path
     self.stats_model = stats_model
     self.local_stats_source = local_stats_source
+    # Path of the handler which collects stats of a group of nodes
+    self.group_method_path = method_path.replace('stats/local/',
+                                                 'stats/group/')
+    # The maximum number of nodes to request directly,
+    # nodes are requested via group leaders if there are more of them
+    self.group_size = None
+    # Stats recently received from each node are kept,
+    # so nodes can send only changed fields
+    self._node_versions = {}  # {node_ip: RenderedVersions}
+    # The same is done for responses of group leaders
+    self._group_versions = {}  # {leader_ip: RenderedVersions}
+    # Stats received via group leaders are parsed only if they have changed
+    self._parsed_group_stats = {}  # {node_ip: (rendered, snapshot)}
 
   @gen.coroutine
   def get_current(self, max_age=None, include_lists=None,
                   exclude_nodes=None):
     """ Makes concurrent asynchronous http calls to cluster nodes
     and collects current stats. Local stats is got from local stats source.
+    If group_size is set and there are more nodes than that, nodes are
+    split into groups and only a leader of each group is requested.
 
     Args:
       max_age: UTC timestamp, allow to use cached snapshot if it's newer.
@@ -59,11 +79,40 @@ class ClusterStatsSource(object):
     """
     exclude_nodes = exclude_nodes or []
     start = time.time()
+    node_ips = [node_ip for node_ip in self.ips_getter()
+                if node_ip not in exclude_nodes]
+
+    if self.group_size and len(node_ips) > self.group_size:
+      stats_per_node, failures = yield self._get_from_groups(
+        node_ips, max_age, include_lists)
+    else:
+      stats_per_node, failures = yield self.get_from_nodes(
+        node_ips, max_age, include_lists)
+
+    logger.info("Fetched {stats} from {nodes} nodes in {elapsed:.1f}s."
+                 .format(stats=self.stats_model.__name__,
+                         nodes=len(stats_per_node),
+                         elapsed=time.time() - start))
+    raise gen.Return((stats_per_node, failures))
 
+  @gen.coroutine
+  def get_from_nodes(self, node_ips, max_age=None, include_lists=None,
+                     timeout=STATS_REQUEST_TIMEOUT):
+    """ Makes concurrent asynchronous http calls to the specified nodes.
+
+    Args:
+      node_ips: A list of node IPs to fetch stats from.
+      max_age: UTC timestamp, allow to use cached snapshot if it's newer.
+      include_lists: An instance of IncludeLists.
+      timeout: A number of seconds to wait for each node.
+    Returns:
+      A Future object which wraps a tuple (stats_per_node, failures).
+    """
     # Do multiple requests asynchronously and wait for all results
     stats_or_error_per_node = yield {
-      node_ip: self._stats_from_node_async(node_ip, max_age, include_lists)
-      for node_ip in self.ips_getter() if node_ip not in exclude_nodes
+      node_ip: self._stats_from_node_async(node_ip, max_age, include_lists,
+                                           timeout)
+      for node_ip in node_ips
     }
     stats_per_node = {
       ip: snapshot_or_err
@@ -75,14 +124,110 @@ class ClusterStatsSource(object):
       for ip, snapshot_or_err in stats_or_error_per_node.iteritems()
       if isinstance(snapshot_or_err, (str, unicode))
     }
-    logger.info("Fetched {stats} from {nodes} nodes in {elapsed:.1f}s."
-                 .format(stats=self.stats_model.__name__,
-                         nodes=len(stats_per_node),
-                         elapsed=time.time() - start))
     raise gen.Return((stats_per_node, failures))
 
   @gen.coroutine
-  def _stats_from_node_async(self, node_ip, max_age, include_lists):
+  def _get_from_groups(self, node_ips, max_age, include_lists):
+    """ Requests group leaders to collect stats of their members.
+    This node collects stats of its own group directly.
+
+    Args:
+      node_ips: A list of node IPs to fetch stats from.
+      max_age: UTC timestamp, allow to use cached snapshot if it's newer.
+      include_lists: An instance of IncludeLists.
+    Returns:
+      A Future object which wraps a tuple (stats_per_node, failures).
+    """
+    private_ip = appscale_info.get_private_ip()
+    groups = group_nodes(node_ips, self.group_size)
+    results = yield [
+      self.get_from_nodes(members, max_age, include_lists,
+                          GROUP_MEMBER_REQUEST_TIMEOUT)
+      if private_ip in members
+      else self._stats_from_group_async(members, max_age, include_lists)
+      for members in groups
+    ]
+    stats_per_node = {}
+    failures = {}
+    for group_stats, group_failures in results:
+      stats_per_node.update(group_stats)
+      failures.update(group_failures)
+    raise gen.Return((stats_per_node, failures))
+
+  @gen.coroutine
+  def _stats_from_group_async(self, members, max_age, include_lists):
+    """ Requests the first member of a group to collect stats of all members.
+    If the leader doesn't respond, members are requested directly.
+
+    Args:
+      members: A list of node IPs in the group.
+      max_age: UTC timestamp, allow to use cached snapshot if it's newer.
+      include_lists: An instance of IncludeLists.
+    Returns:
+      A Future object which wraps a tuple (stats_per_node, failures).
+    """
+    leader_ip = members[0]
+    # Security header
+    headers = {SECRET_HEADER: options.secret}
+    # Build query arguments
+    versions = self._group_versions.setdefault(leader_ip, RenderedVersions())
+    arguments = {'members': members, 'delta_base': versions.latest}
+    if include_lists is not None:
+      arguments['include_lists'] = include_lists.asdict()
+    if max_age is not None:
+      arguments['max_age'] = max_age
+
+    url = "http://{ip}:{port}/{path}".format(
+      ip=leader_ip, port=constants.HERMES_PORT, path=self.group_method_path)
+    request = httpclient.HTTPRequest(
+      url=url, method='GET', body=json.dumps(arguments), headers=headers,
+      request_timeout=STATS_REQUEST_TIMEOUT, allow_nonstandard_methods=True
+    )
+    async_client = httpclient.AsyncHTTPClient()
+
+    try:
+      response = yield async_client.fetch(request)
+    except (socket.error, httpclient.HTTPError) as err:
+      logger.error(u"Failed to get group stats from {url} ({err}), "
+                   u"requesting {members} nodes directly"
+                   .format(url=url, err=err, members=len(members)))
+      result = yield self.get_from_nodes(members, max_age, include_lists,
+                                         GROUP_MEMBER_REQUEST_TIMEOUT)
+      raise gen.Return(result)
+
+    try:
+      group_stats = self._read_versioned(versions, json.loads(response.body))
+    except UnknownVersion as err:
+      logger.error(u"Received delta to unknown stats version from {url} "
+                   u"({err}), requesting {members} nodes directly"
+                   .format(url=url, err=err, members=len(members)))
+      result = yield self.get_from_nodes(members, max_age, include_lists,
+                                         GROUP_MEMBER_REQUEST_TIMEOUT)
+      raise gen.Return(result)
+
+    stats_per_node = {}
+    # Rendered group stats are kept as a base for deltas, so they're not
+    # modified here
+    failures = dict(group_stats['failures'])
+    for node_ip, rendered in group_stats['stats'].iteritems():
+      # Applying a delta keeps unchanged values, so stats of a node which
+      # hasn't changed are the same object as in the previous response
+      parsed = self._parsed_group_stats.get(node_ip)
+      if parsed is not None and parsed[0] is rendered:
+        stats_per_node[node_ip] = parsed[1]
+        continue
+      try:
+        snapshot = converter.stats_from_dict(self.stats_model, rendered)
+      except TypeError as err:
+        failures[node_ip] = u"Can't parse stats snapshot ({})".format(err)
+        continue
+      self._parsed_group_stats[node_ip] = (rendered, snapshot)
+      stats_per_node[node_ip] = snapshot
+    raise gen.Return((stats_per_node, failures))
+
+  @gen.coroutine
+  def _stats_from_node_async(self, node_ip, max_age, include_lists,
+                             timeout=STATS_REQUEST_TIMEOUT):
     if node_ip == appscale_info.get_private_ip():
       try:
         snapshot = self.local_stats_source.get_current()
@@ -94,11 +239,12 @@ class ClusterStatsSource(object):
           u"Failed to prepare local stats: {err}".format(err=err))
     else:
       snapshot = yield self._fetch_remote_stats_async(
-        node_ip, max_age, include_lists)
+        node_ip, max_age, include_lists, timeout)
     raise gen.Return(snapshot)
 
   @gen.coroutine
-  def _fetch_remote_stats_async(self, node_ip, max_age, include_lists):
+  def _fetch_remote_stats_async(self, node_ip, max_age, include_lists,
+                                timeout=STATS_REQUEST_TIMEOUT):
     # Security header
     headers = {SECRET_HEADER: options.secret}
     # Build query arguments
@@ -107,12 +253,14 @@ class ClusterStatsSource(object):
       arguments['include_lists'] = include_lists.asdict()
     if max_age is not None:
       arguments['max_age'] = max_age
+    versions = self._node_versions.setdefault(node_ip, RenderedVersions())
+    arguments['delta_base'] = versions.latest
 
     url = "http://{ip}:{port}/{path}".format(
       ip=node_ip, port=constants.HERMES_PORT, path=self.method_path)
     request = httpclient.HTTPRequest(
       url=url, method='GET', body=json.dumps(arguments), headers=headers,
-      request_timeout=STATS_REQUEST_TIMEOUT, allow_nonstandard_methods=True
+      request_timeout=timeout, allow_nonstandard_methods=True
     )
     async_client = httpclient.AsyncHTTPClient()
 
@@ -127,12 +275,69 @@ class ClusterStatsSource(object):
       raise gen.Return(unicode(err))
 
     try:
-      snapshot = json.loads(response.body)
+      snapshot = self._read_versioned(versions, json.loads(response.body))
+    except UnknownVersion as err:
+      msg = u"Received delta to unknown stats version from {url} ({err})"\
+            .format(url=url, err=err)
+      logger.error(msg)
+      raise gen.Return(msg)
+
+    try:
       raise gen.Return(converter.stats_from_dict(self.stats_model, snapshot))
     except TypeError as err:
       msg = u"Can't parse stats snapshot ({})".format(err)
       raise BadStatsListFormat(msg), None, sys.exc_info()[2]
 
+  @staticmethod
+  def _read_versioned(versions, body):
+    """ Builds rendered stats from full stats or delta
+    and remembers them as the latest version received from the node.
+
+    Args:
+      versions: An instance of RenderedVersions for the node.
+      body: A dict - parsed response of the node.
+    Returns:
+      A dict representing rendered stats.
+    Raises:
+      UnknownVersion if delta is based on a version which isn't kept.
+    """
+    if 'version' not in body:
+      # Node doesn't support versioned stats
+      return body
+    if 'delta' in body:
+      rendered = apply_stats_delta(versions.get(body['base']), body['delta'])
+    else:
+      rendered = body['stats']
+    versions.add(rendered, body['version'])
+    return rendered
+
+
+def group_nodes(node_ips, group_size):
+  """ Splits nodes into groups. Groups don't depend on the order of IPs,
+  so every node agrees on who is a leader of a group.
+
+  Args:
+    node_ips: A list of node IPs.
+    group_size: An integer maximum number of nodes in a group.
+  Returns:
+    A list of lists of node IPs. The first IP of each list is a leader.
+  """
+  node_ips = sorted(node_ips)
+  return [node_ips[position:position + group_size]
+          for position in xrange(0, len(node_ips), group_size)]
+
+
+def enable_groups(group_size):
+  """ Makes cluster stats sources which request many nodes
+  collect stats via group leaders.
+
+  Args:
+    group_size: An integer maximum number of nodes in a group.
+  """
+  for source in (cluster_nodes_stats, cluster_processes_stats,
+                 cluster_proxies_stats, cluster_rabbitmq_stats):
+    source.group_size = group_size
+
 
 def get_random_lb_node():
   return [random.choice(appscale_info.get_load_balancer_ips())]
@@ -153,7 +358,7 @@ cluster_processes_stats = ClusterStatsSource(
   ips_getter=appscale_info.get_all_ips,
   method_path='stats/local/processes',
   stats_model=process_stats.ProcessesStatsSnapshot,
-  local_stats_source=process_stats.ProcessesStatsSource
+  local_stats_source=process_stats.processes_stats_source
 )
 
 cluster_proxies_stats = ClusterStatsSource(
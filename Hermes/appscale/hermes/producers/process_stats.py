@@ -8,7 +8,13 @@ import attr
 import psutil
 from appscale.admin.service_manager import ServiceManager
 from appscale.common import appscale_info
+from concurrent.futures import ThreadPoolExecutor
+from tornado import gen
+from tornado.ioloop import IOLoop, PeriodicCallback
 
+from appscale.hermes.constants import (
+  PROCESSES_SAMPLING_INTERVAL, PROCESSES_SAMPLING_WORKERS
+)
 from appscale.hermes.converter import Meta, include_list_name
 from appscale.hermes.unified_service_names import \
   find_service_by_monit_name
@@ -107,68 +113,181 @@ PROCESS_ATTRS = (
 
 
 class ProcessesStatsSource(object):
+  """ Samples stats of local processes in background and keeps
+  the latest snapshot, so it can be served without blocking the IOLoop.
+  psutil.Process handles are kept between samples, so CPU percent is
+  measured over the time since previous sample.
+  """
+
+  def __init__(self, workers=PROCESSES_SAMPLING_WORKERS):
+    """ Initializes an instance of ProcessesStatsSource.
+
+    Args:
+      workers: An integer number of threads collecting stats of processes.
+    """
+    self._thread_pool = ThreadPoolExecutor(workers)
+    self._processes = {}  # {pid: psutil.Process}
+    self._snapshot = None
+    self._sampling = None  # A Future which is resolved when sample is ready
+    self._sampling_task = None
+
+  def start(self, interval=PROCESSES_SAMPLING_INTERVAL):
+    """ Starts sampling processes stats periodically.
+
+    Args:
+      interval: A number of seconds between samples.
+    """
+    self._sampling_task = PeriodicCallback(self.sample, interval * 1000)
+    self._sampling_task.start()
+    IOLoop.current().add_callback(self.sample)
 
-  @staticmethod
-  def get_current():
-    """ Method for building a list of ProcessStats.
-    It parses output of `monit status` and generates ProcessStats object
-    for each monitored service.
+  def get_current(self):
+    """ Method for getting the latest ProcessesStatsSnapshot.
+    If periodical sampling is started, the latest snapshot is returned
+    right away, otherwise a new sample is collected.
+
+    Returns:
+      An instance of ProcessesStatsSnapshot or a Future which wraps it.
+    """
+    if self._sampling_task and self._snapshot:
+      return self._snapshot
+    return self.sample()
+
+  def sample(self):
+    """ Starts collecting of new ProcessesStatsSnapshot
+    unless it is already in progress.
+
+    Returns:
+      A Future which wraps an instance of ProcessesStatsSnapshot.
+    """
+    sampling = self._sampling
+    if sampling is None:
+      sampling = self._sampling = self._sample()
+      sampling.add_done_callback(self._sampling_done)
+    return sampling
+
+  def _sampling_done(self, future):
+    self._sampling = None
+    if future.exception():
+      logger.error(u"Failed to sample processes stats ({})"
+                   .format(future.exception()))
+
+  @gen.coroutine
+  def _sample(self):
+    """ Builds a list of ProcessStats. It parses output of `monit status`
+    and collects ProcessStats of each monitored service on the thread pool.
 
     Returns:
-      An instance ofProcessesStatsSnapshot.
+      A Future which wraps an instance of ProcessesStatsSnapshot.
     """
     start = time.time()
-    monit_status = subprocess.check_output('monit status', shell=True)
-    processes_stats = []
+    monitored = yield self._thread_pool.submit(_list_monitored_processes)
     private_ip = appscale_info.get_private_ip()
-    for match in MONIT_PROCESS_PATTERN.finditer(monit_status):
-      monit_name = match.group('name')
-      pid = int(match.group('pid'))
-      service = find_service_by_monit_name(monit_name)
-      try:
-        stats = _process_stats(pid, service, monit_name, private_ip)
-        processes_stats.append(stats)
-      except psutil.Error as err:
-        logger.warn(u"Unable to get process stats for {monit_name} ({err})"
-                     .format(monit_name=monit_name, err=err))
-
-    # Add processes managed by the ServiceManager.
-    for server in ServiceManager.get_state():
-      service = find_service_by_monit_name(server.monit_name)
-      try:
-        stats = _process_stats(server.process.pid, service, server.monit_name,
-                               private_ip)
-        processes_stats.append(stats)
-      except psutil.Error as error:
-        logger.warning(u'Unable to get process stats for '
-                        u'{} ({})'.format(server, error))
 
-    stats = ProcessesStatsSnapshot(
+    processes_stats = yield [
+      self._thread_pool.submit(self._process_stats_or_none, pid, monit_name,
+                               private_ip)
+      for monit_name, pid in monitored
+    ]
+    processes_stats = [stats for stats in processes_stats if stats]
+
+    # Forget handles of processes which are not monitored anymore
+    alive_pids = {stats.process_stats.pid for stats in processes_stats}
+    for stats in processes_stats:
+      alive_pids.update(stats.children_pids)
+    for pid in self._processes.keys():
+      if pid not in alive_pids:
+        del self._processes[pid]
+
+    snapshot = ProcessesStatsSnapshot(
       utc_timestamp=time.mktime(datetime.now().timetuple()),
-      processes_stats=processes_stats
+      processes_stats=[stats.process_stats for stats in processes_stats]
     )
+    self._snapshot = snapshot
     logger.info("Prepared stats about {proc} processes in {elapsed:.1f}s."
                  .format(proc=len(processes_stats), elapsed=time.time()-start))
-    return stats
+    raise gen.Return(snapshot)
+
+  def _process_stats_or_none(self, pid, monit_name, private_ip):
+    """ Collects stats of a process on the thread pool.
+
+    Args:
+      pid: An integer Process ID.
+      monit_name: A string, name of corresponding monit process.
+      private_ip: A string, IP of this node.
+    Returns:
+      An instance of _SampledProcess or None if process can't be described.
+    """
+    service = find_service_by_monit_name(monit_name)
+    try:
+      process = self._get_process(pid)
+      children = [self._get_process(child.pid)
+                  for child in process.children()]
+      stats = _process_stats(process, children, service, monit_name,
+                             private_ip)
+      return _SampledProcess(stats, [child.pid for child in children])
+    except psutil.Error as err:
+      logger.warn(u"Unable to get process stats for {monit_name} ({err})"
+                   .format(monit_name=monit_name, err=err))
+      return None
+
+  def _get_process(self, pid):
+    """ Returns the psutil.Process handle which was used during previous
+    samples, so CPU percent can be computed since then.
+    is_running also makes sure the PID was not reused by a new process.
+
+    Args:
+      pid: An integer Process ID.
+    Returns:
+      An instance of psutil.Process.
+    """
+    process = self._processes.get(pid)
+    if process is None or not process.is_running():
+      process = psutil.Process(pid)
+      self._processes[pid] = process
+    return process
 
 
-def _process_stats(pid, service, monit_name, private_ip):
+@attr.s(slots=True, frozen=True)
+class _SampledProcess(object):
+  process_stats = attr.ib()
+  children_pids = attr.ib()
+
+
+def _list_monitored_processes():
+  """ Lists processes started by monit and by the ServiceManager.
+
+  Returns:
+    A list of (monit_name, pid) tuples.
+  """
+  monit_status = subprocess.check_output('monit status', shell=True)
+  monitored = [
+    (match.group('name'), int(match.group('pid')))
+    for match in MONIT_PROCESS_PATTERN.finditer(monit_status)
+  ]
+  # Add processes managed by the ServiceManager.
+  monitored.extend((server.monit_name, server.process.pid)
+                   for server in ServiceManager.get_state())
+  return monitored
+
+
+def _process_stats(process, children, service, monit_name, private_ip):
   """ Static method for building an instance of ProcessStats.
   It summarize stats of the specified process and its children.
 
   Args:
-    pid: A string representing Process ID to describe.
+    process: An instance of psutil.Process to describe.
+    children: A list of psutil.Process - children of the process.
     service: An instance of unified_service_names.Service which corresponds to
       this process.
     monit_name: A string, name of corresponding monit process.
+    private_ip: A string, IP of this node.
   Returns:
     An object of ProcessStats with detailed explanation of resources used by
     the specified process and its children.
   """
   # Get information about processes hierarchy (the process and its children)
-  process = psutil.Process(pid)
-  children_info = [child.as_dict(PROCESS_ATTRS)
-                   for child in process.children()]
+  children_info = [child.as_dict(PROCESS_ATTRS) for child in children]
   process_info = process.as_dict(PROCESS_ATTRS)
 
   # CPU usage
@@ -221,10 +340,13 @@ def _process_stats(pid, service, monit_name, private_ip):
   )
 
   return ProcessStats(
-    pid=pid, monit_name=monit_name, unified_service_name=service.name,
+    pid=process.pid, monit_name=monit_name, unified_service_name=service.name,
     application_id=service.get_application_id_by_monit_name(monit_name),
     port=service.get_port_by_monit_name(monit_name), private_ip=private_ip,
     cmdline=process_info['cmdline'], cpu=cpu, memory=memory, disk_io=disk_io,
     network=network, threads_num=threads_num, children_stats_sum=children_sum,
     children_num=len(children_info)
   )
+
+
+processes_stats_source = ProcessesStatsSource()
@@ -12,6 +12,7 @@ import time
 import socket
 from tornado import gen, httpclient
 
+from appscale.common.service_stats import metrics
 from appscale.hermes.converter import include_list_name, Meta
 
 # The endpoint used for retrieving node stats.
@@ -49,6 +50,11 @@ class RecentStatsSnapshot(object):
   by_rest_method = attr.ib()
   by_pb_status = attr.ib()
   by_rest_status = attr.ib()
+  # Older TaskQueue servers don't report latency histograms
+  latency_histogram = attr.ib(default=None)
+  latency_p50 = attr.ib(default=None)
+  latency_p95 = attr.ib(default=None)
+  latency_p99 = attr.ib(default=None)
 
 
 @include_list_name('taskqueue.instance')
@@ -114,6 +120,7 @@ class TaskqueueStatsSource(object):
       stats_body = json.loads(response.body)
       cumulative_dict = stats_body["cumulative_counters"]
       recent_dict = stats_body["recent_stats"]
+      latency_histogram = recent_dict.get("latency_histogram")
       cumulative = CumulativeStatsSnapshot(
         total=cumulative_dict["all"],
         failed=cumulative_dict["failed"],
@@ -129,7 +136,11 @@ class TaskqueueStatsSource(object):
         by_pb_method=recent_dict["by_pb_method"],
         by_rest_method=recent_dict["by_rest_method"],
         by_pb_status=recent_dict["by_pb_status"],
-        by_rest_status=recent_dict["by_rest_status"]
+        by_rest_status=recent_dict["by_rest_status"],
+        latency_histogram=latency_histogram,
+        latency_p50=metrics.histogram_percentile(latency_histogram, 50),
+        latency_p95=metrics.histogram_percentile(latency_histogram, 95),
+        latency_p99=metrics.histogram_percentile(latency_histogram, 99)
       )
       instance_stats_snapshot = InstanceStatsSnapshot(
         ip_port=ip_port,
@@ -175,6 +186,13 @@ class TaskqueueStatsSource(object):
         by_pb_status_sum[pb_status] += calls
       for rest_status, calls in recent.by_rest_status.iteritems():
         by_rest_status_sum[rest_status] += calls
+    # Merge latency histograms to get cluster-wide percentiles
+    try:
+      latency_histogram = metrics.merge_histograms(
+        [recent.latency_histogram for recent in recent_stats])
+    except ValueError as err:
+      logger.warning(u"Can't merge latency histograms ({})".format(err))
+      latency_histogram = None
     # Return snapshot
     return RecentStatsSnapshot(
       total=total_recent_reqs,
@@ -186,7 +204,11 @@ class TaskqueueStatsSource(object):
       by_pb_method=by_pb_method_sum,
       by_rest_method=by_rest_method_sum,
       by_pb_status=by_pb_status_sum,
-      by_rest_status=by_rest_status_sum
+      by_rest_status=by_rest_status_sum,
+      latency_histogram=latency_histogram,
+      latency_p50=metrics.histogram_percentile(latency_histogram, 50),
+      latency_p95=metrics.histogram_percentile(latency_histogram, 95),
+      latency_p99=metrics.histogram_percentile(latency_histogram, 99)
     )
 
   @gen.coroutine
@@ -6,6 +6,7 @@ from tornado import testing, gen, httpclient
 
 from appscale.hermes import converter
 from appscale.hermes.converter import IncludeLists
+from appscale.hermes.delta import stats_delta
 from appscale.hermes.producers import (
   cluster_stats, node_stats, process_stats, proxy_stats
 )
@@ -59,7 +60,8 @@ class TestClusterNodeStatsProducer(testing.AsyncTestCase):
 
     # ASSERTING EXPECTATIONS
     request_to_slave = mock_fetch.call_args[0][0]
-    self.assertEqual(json.loads(request_to_slave.body), {})
+    self.assertEqual(json.loads(request_to_slave.body),
+                     {'delta_base': None})
     self.assertEqual(
       request_to_slave.url, 'http://192.168.33.11:4378/stats/local/node'
     )
@@ -106,7 +108,8 @@ class TestClusterNodeStatsProducer(testing.AsyncTestCase):
 
     # ASSERTING EXPECTATIONS
     request_to_slave = mock_fetch.call_args[0][0]
-    self.assertEqual(json.loads(request_to_slave.body), {})
+    self.assertEqual(json.loads(request_to_slave.body),
+                     {'delta_base': None})
     self.assertEqual(
       request_to_slave.url, 'http://192.168.33.11:4378/stats/local/node'
     )
@@ -187,6 +190,7 @@ class TestClusterNodeStatsProducer(testing.AsyncTestCase):
       {
         'max_age': 10,
         'include_lists': raw_include_lists,
+        'delta_base': None,
       })
     self.assertEqual(
       request_to_slave.url, 'http://192.168.33.11:4378/stats/local/node'
@@ -204,13 +208,200 @@ class TestClusterNodeStatsProducer(testing.AsyncTestCase):
     self.assertEqual(slave_stats.utc_timestamp, 1494248082.0)
 
 
+class TestClusterStatsDelta(testing.AsyncTestCase):
+
+  @patch.object(cluster_stats, 'options')
+  @patch.object(cluster_stats.appscale_info, 'get_private_ip')
+  @patch.object(cluster_stats.httpclient.AsyncHTTPClient, 'fetch')
+  @testing.gen_test
+  def test_delta_from_node(self, mock_fetch, mock_get_private_ip,
+                           mock_options):
+    mock_get_private_ip.return_value = '192.168.33.10'
+    mock_options.secret = 'secret'
+    raw_test_data = get_stats_from_file(
+      'node-stats.json', node_stats.NodeStatsSnapshot
+    )[0]
+    first_stats = raw_test_data['192.168.33.11']
+    second_stats = dict(first_stats, utc_timestamp=1494248092.0)
+    source = cluster_stats.ClusterStatsSource(
+      ips_getter=lambda: ['192.168.33.11'],
+      method_path='stats/local/node',
+      stats_model=node_stats.NodeStatsSnapshot,
+      local_stats_source=node_stats.NodeStatsSource
+    )
+
+    def respond(body):
+      response = MagicMock(body=json.dumps(body), code=200, reason='OK')
+      future_response = gen.Future()
+      future_response.set_result(response)
+      return future_response
+
+    # Node sends full stats when master doesn't have any version
+    mock_fetch.return_value = respond({'version': 'v1', 'stats': first_stats})
+    stats, failures = yield source.get_current()
+    request_to_slave = mock_fetch.call_args[0][0]
+    self.assertEqual(json.loads(request_to_slave.body), {'delta_base': None})
+    self.assertEqual(stats['192.168.33.11'].utc_timestamp, 1494248082.0)
+
+    # Only changed fields are sent when node knows the base version
+    delta = stats_delta(first_stats, second_stats)
+    self.assertEqual(delta['set'], {'utc_timestamp': 1494248092.0})
+    mock_fetch.return_value = respond(
+      {'version': 'v2', 'base': 'v1', 'delta': delta})
+    stats, failures = yield source.get_current()
+    request_to_slave = mock_fetch.call_args[0][0]
+    self.assertEqual(json.loads(request_to_slave.body), {'delta_base': 'v1'})
+    self.assertEqual(failures, {})
+    snapshot = stats['192.168.33.11']
+    self.assertEqual(snapshot.utc_timestamp, 1494248092.0)
+    self.assertEqual(
+      converter.stats_to_dict(snapshot),
+      converter.stats_to_dict(converter.stats_from_dict(
+        node_stats.NodeStatsSnapshot, second_stats))
+    )
+
+    # Delta to a forgotten version is reported as failure
+    mock_fetch.return_value = respond(
+      {'version': 'v3', 'base': 'v0', 'delta': delta})
+    stats, failures = yield source.get_current()
+    self.assertEqual(stats, {})
+    self.assertIn('unknown stats version', failures['192.168.33.11'])
+
+
+class TestGroupedClusterStats(testing.AsyncTestCase):
+
+  @patch.object(cluster_stats, 'options')
+  @patch.object(cluster_stats.appscale_info, 'get_private_ip')
+  @patch.object(cluster_stats.httpclient.AsyncHTTPClient, 'fetch')
+  @patch.object(node_stats.NodeStatsSource, 'get_current')
+  @testing.gen_test
+  def test_group_leaders(self, mock_get_current, mock_fetch,
+                         mock_get_private_ip, mock_options):
+    mock_get_private_ip.return_value = '192.168.33.10'
+    mock_options.secret = 'secret'
+    raw_test_data, stats_test_data = get_stats_from_file(
+      'node-stats.json', node_stats.NodeStatsSnapshot
+    )
+    mock_get_current.return_value = stats_test_data['192.168.33.10']
+    raw_stats = raw_test_data['192.168.33.11']
+    source = cluster_stats.ClusterStatsSource(
+      ips_getter=lambda: ['192.168.33.14', '192.168.33.13', '192.168.33.12',
+                          '192.168.33.11', '192.168.33.10'],
+      method_path='stats/local/node',
+      stats_model=node_stats.NodeStatsSnapshot,
+      local_stats_source=node_stats.NodeStatsSource
+    )
+    source.group_size = 2
+
+    def fetch(request):
+      future_response = gen.Future()
+      if request.url == 'http://192.168.33.12:4378/stats/group/node':
+        body = {'stats': {'192.168.33.12': raw_stats},
+                'failures': {'192.168.33.13': 'HTTP 599: Timeout'}}
+      elif request.url == 'http://192.168.33.14:4378/stats/group/node':
+        future_response.set_exception(
+          httpclient.HTTPError(500, "Internal error"))
+        return future_response
+      else:
+        body = raw_stats
+      response = MagicMock(body=json.dumps(body), code=200, reason='OK')
+      future_response.set_result(response)
+      return future_response
+
+    mock_fetch.side_effect = fetch
+
+    stats, failures = yield source.get_current()
+
+    requested = sorted(call[0][0].url for call in mock_fetch.call_args_list)
+    self.assertEqual(requested, [
+      'http://192.168.33.11:4378/stats/local/node',
+      'http://192.168.33.12:4378/stats/group/node',
+      'http://192.168.33.14:4378/stats/group/node',
+      # The leader failed, so the member is requested directly
+      'http://192.168.33.14:4378/stats/local/node',
+    ])
+    group_request = [call[0][0] for call in mock_fetch.call_args_list
+                     if call[0][0].url.endswith('.12:4378/stats/group/node')]
+    self.assertEqual(json.loads(group_request[0].body),
+                     {'members': ['192.168.33.12', '192.168.33.13'],
+                      'delta_base': None})
+    self.assertEqual(sorted(stats), ['192.168.33.10', '192.168.33.11',
+                                     '192.168.33.12', '192.168.33.14'])
+    self.assertIsInstance(stats['192.168.33.12'], node_stats.NodeStatsSnapshot)
+    self.assertEqual(failures, {'192.168.33.13': 'HTTP 599: Timeout'})
+
+  @patch.object(cluster_stats, 'options')
+  @patch.object(cluster_stats.appscale_info, 'get_private_ip')
+  @patch.object(cluster_stats.httpclient.AsyncHTTPClient, 'fetch')
+  @testing.gen_test
+  def test_delta_from_leader(self, mock_fetch, mock_get_private_ip,
+                             mock_options):
+    mock_get_private_ip.return_value = '192.168.33.10'
+    mock_options.secret = 'secret'
+    raw_test_data = get_stats_from_file(
+      'node-stats.json', node_stats.NodeStatsSnapshot
+    )[0]
+    raw_stats = raw_test_data['192.168.33.11']
+    source = cluster_stats.ClusterStatsSource(
+      ips_getter=lambda: ['192.168.33.12', '192.168.33.13'],
+      method_path='stats/local/node',
+      stats_model=node_stats.NodeStatsSnapshot,
+      local_stats_source=node_stats.NodeStatsSource
+    )
+    members = ['192.168.33.12', '192.168.33.13']
+
+    def respond(body):
+      response = MagicMock(body=json.dumps(body), code=200, reason='OK')
+      future_response = gen.Future()
+      future_response.set_result(response)
+      return future_response
+
+    # Leader sends full group stats when master doesn't have any version
+    first_stats = {
+      'stats': {'192.168.33.12': raw_stats, '192.168.33.13': raw_stats},
+      'failures': {}
+    }
+    mock_fetch.return_value = respond({'version': 'g1', 'stats': first_stats})
+    stats, failures = yield source._stats_from_group_async(
+      members, None, None)
+    request_to_leader = mock_fetch.call_args[0][0]
+    self.assertEqual(json.loads(request_to_leader.body),
+                     {'members': members, 'delta_base': None})
+    first_snapshot = stats['192.168.33.12']
+
+    # Only stats of changed nodes are sent and parsed
+    second_stats = {
+      'stats': {'192.168.33.12': raw_stats,
+                '192.168.33.13': dict(raw_stats, utc_timestamp=1494248092.0)},
+      'failures': {}
+    }
+    delta = stats_delta(first_stats, second_stats)
+    self.assertEqual(delta['set']['stats']['set'].keys(), ['192.168.33.13'])
+    mock_fetch.return_value = respond(
+      {'version': 'g2', 'base': 'g1', 'delta': delta})
+    stats, failures = yield source._stats_from_group_async(
+      members, None, None)
+    request_to_leader = mock_fetch.call_args[0][0]
+    self.assertEqual(json.loads(request_to_leader.body),
+                     {'members': members, 'delta_base': 'g1'})
+    self.assertEqual(failures, {})
+    self.assertIs(stats['192.168.33.12'], first_snapshot)
+    self.assertEqual(stats['192.168.33.13'].utc_timestamp, 1494248092.0)
+
+  def test_group_nodes(self):
+    self.assertEqual(
+      cluster_stats.group_nodes(['10.0.0.3', '10.0.0.1', '10.0.0.2'], 2),
+      [['10.0.0.1', '10.0.0.2'], ['10.0.0.3']]
+    )
+
+
 class TestClusterProcessesStatsProducer(testing.AsyncTestCase):
 
   @patch.object(cluster_stats, 'options')
   @patch.object(cluster_stats.appscale_info, 'get_private_ip')
   @patch.object(cluster_stats.cluster_processes_stats, 'ips_getter')
   @patch.object(cluster_stats.httpclient.AsyncHTTPClient, 'fetch')
-  @patch.object(process_stats.ProcessesStatsSource, 'get_current')
+  @patch.object(process_stats.processes_stats_source, 'get_current')
   @testing.gen_test
   def test_verbose_cluster_processes_stats(self, mock_get_current, mock_fetch,
                                            mock_ips_getter, mock_get_private_ip,
@@ -239,7 +430,8 @@ class TestClusterProcessesStatsProducer(testing.AsyncTestCase):
 
     # ASSERTING EXPECTATIONS
     request_to_slave = mock_fetch.call_args[0][0]
-    self.assertEqual(json.loads(request_to_slave.body), {})
+    self.assertEqual(json.loads(request_to_slave.body),
+                     {'delta_base': None})
     self.assertEqual(
       request_to_slave.url,
       'http://192.168.33.11:4378/stats/local/processes'
@@ -262,7 +454,7 @@ class TestClusterProcessesStatsProducer(testing.AsyncTestCase):
   @patch.object(cluster_stats.appscale_info, 'get_private_ip')
   @patch.object(cluster_stats.cluster_processes_stats, 'ips_getter')
   @patch.object(cluster_stats.httpclient.AsyncHTTPClient, 'fetch')
-  @patch.object(process_stats.ProcessesStatsSource, 'get_current')
+  @patch.object(process_stats.processes_stats_source, 'get_current')
   @testing.gen_test
   def test_filtered_cluster_processes_stats(self, mock_get_current, mock_fetch,
                                            mock_ips_getter, mock_get_private_ip,
@@ -308,6 +500,7 @@ class TestClusterProcessesStatsProducer(testing.AsyncTestCase):
       {
         'max_age': 15,
         'include_lists': raw_include_lists,
+        'delta_base': None,
       })
     self.assertEqual(
       request_to_slave.url,
@@ -358,7 +551,7 @@ class TestClusterProxiesStatsProducer(testing.AsyncTestCase):
 
     # ASSERTING EXPECTATIONS
     request_to_lb = mock_fetch.call_args[0][0]
-    self.assertEqual(json.loads(request_to_lb.body), {})
+    self.assertEqual(json.loads(request_to_lb.body), {'delta_base': None})
     self.assertEqual(
       request_to_lb.url, 'http://192.168.33.11:4378/stats/local/proxies'
     )
@@ -416,6 +609,7 @@ class TestClusterProxiesStatsProducer(testing.AsyncTestCase):
       {
         'max_age': 18,
         'include_lists': raw_include_lists,
+        'delta_base': None,
       })
     self.assertEqual(
       request_to_lb.url, 'http://192.168.33.11:4378/stats/local/proxies'
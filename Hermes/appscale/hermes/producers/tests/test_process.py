@@ -1,7 +1,7 @@
 import os
-import unittest
 
-from mock import patch, call
+from mock import MagicMock, patch, call
+from tornado import testing
 
 from appscale.hermes.unified_service_names import ServicesEnum
 from appscale.hermes.producers import process_stats
@@ -61,30 +61,38 @@ System 'appscale-image0'
 """
 
 
-class TestCurrentProcessesStats(unittest.TestCase):
+class TestCurrentProcessesStats(testing.AsyncTestCase):
 
   @patch.object(process_stats.appscale_info, 'get_private_ip')
   @patch.object(process_stats, '_process_stats')
+  @patch.object(process_stats.psutil, 'Process')
   @patch.object(process_stats.subprocess, 'check_output')
-  def test_reading_monit_status(self, mock_check_output, mock_process_stats,
-                                mock_get_private_ip):
+  @testing.gen_test
+  def test_reading_monit_status(self, mock_check_output, mock_process,
+                                mock_process_stats, mock_get_private_ip):
     # Mocking `monit status` output and appscale_info.get_private_ip
     mock_check_output.return_value = MONIT_STATUS
     mock_get_private_ip.return_value = '1.1.1.1'
+    process = MagicMock()
+    process.children.return_value = []
+    mock_process.return_value = process
 
     # Calling method under test
-    snapshot = process_stats.ProcessesStatsSource.get_current()
+    snapshot = yield process_stats.ProcessesStatsSource().get_current()
 
     # Checking expectations
+    mock_process.assert_has_calls([call(8466), call(5045)], any_order=True)
     mock_process_stats.assert_has_calls([
-      call(8466, ServicesEnum.HAPROXY, 'haproxy', '1.1.1.1'),
-      call(5045, ServicesEnum.APPLICATION, 'app___my-25app-20003', '1.1.1.1')
-    ])
+      call(process, [], ServicesEnum.HAPROXY, 'haproxy', '1.1.1.1'),
+      call(process, [], ServicesEnum.APPLICATION, 'app___my-25app-20003',
+           '1.1.1.1')
+    ], any_order=True)
     self.assertIsInstance(snapshot, process_stats.ProcessesStatsSnapshot)
 
   @patch.object(process_stats.appscale_info, 'get_private_ip')
   @patch.object(process_stats.subprocess, 'check_output')
   @patch.object(process_stats.logger, 'warn')
+  @testing.gen_test
   def test_process_stats(self, mock_logging_warn, mock_check_output,
                                mock_get_private_ip):
     # Mocking `monit status` output and appscale_info.get_private_ip
@@ -97,7 +105,8 @@ class TestCurrentProcessesStats(unittest.TestCase):
     mock_get_private_ip.return_value = '10.10.11.12'
 
     # Calling method under test
-    stats_snapshot = process_stats.ProcessesStatsSource.get_current()
+    source = process_stats.ProcessesStatsSource()
+    stats_snapshot = yield source.get_current()
 
     # Verifying outcomes
     self.assertIsInstance(stats_snapshot.utc_timestamp, float)
@@ -123,3 +132,27 @@ class TestCurrentProcessesStats(unittest.TestCase):
     self.assertIsInstance(stats.threads_num, int)
     self.assertIsInstance(stats.children_stats_sum, process_stats.ProcessChildrenSum)
     self.assertIsInstance(stats.children_num, int)
+
+    # Process handles should be kept between samples
+    process = source._processes[os.getpid()]
+    yield source.sample()
+    self.assertIs(source._processes[os.getpid()], process)
+    self.assertNotIn(70000, source._processes)
+
+  @patch.object(process_stats.appscale_info, 'get_private_ip')
+  @patch.object(process_stats.subprocess, 'check_output')
+  @testing.gen_test
+  def test_periodical_sampling(self, mock_check_output, mock_get_private_ip):
+    mock_check_output.return_value = (
+      "Process 'hermes'\n"
+      "  pid {mypid}\n".format(mypid=os.getpid())
+    )
+    mock_get_private_ip.return_value = '10.10.11.12'
+    source = process_stats.ProcessesStatsSource()
+    source.start(interval=60)
+    self.addCleanup(source._sampling_task.stop)
+
+    # The first request waits for the sample started in background
+    stats_snapshot = yield source.get_current()
+    self.assertEqual(len(stats_snapshot.processes_stats), 1)
+    self.assertIs(source.get_current(), stats_snapshot)
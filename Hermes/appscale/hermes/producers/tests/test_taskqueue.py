@@ -70,6 +70,9 @@ class TestTaskqueueStatsSource(testing.AsyncTestCase):
     self.assertEqual(stats_snapshot.recent.total, 33)
     self.assertEqual(stats_snapshot.recent.failed, 8)
     self.assertEqual(stats_snapshot.recent.avg_latency, 83)
+    self.assertEqual(int(stats_snapshot.recent.latency_p50), 39)
+    self.assertEqual(int(stats_snapshot.recent.latency_p95), 206)
+    self.assertEqual(int(stats_snapshot.recent.latency_p99), 980)
     self.assertEqual(stats_snapshot.recent.pb_reqs, 19)
     self.assertEqual(stats_snapshot.recent.rest_reqs, 14)
     self.assertEqual(stats_snapshot.recent.by_pb_method, {
@@ -102,6 +105,7 @@ class TestTaskqueueStatsSource(testing.AsyncTestCase):
     self.assertEqual(tq_17447.recent.total, 13)
     self.assertEqual(tq_17447.recent.failed, 5)
     self.assertEqual(tq_17447.recent.avg_latency, 64)
+    self.assertEqual(int(tq_17447.recent.latency_p99), 206)
     self.assertEqual(tq_17447.recent.pb_reqs, 6)
     self.assertEqual(tq_17447.recent.rest_reqs, 7)
     self.assertEqual(tq_17447.recent.by_pb_method, {
@@ -17,8 +17,10 @@ from appscale.hermes.profile import (
   NodesProfileLog, ProcessesProfileLog, ProxiesProfileLog
 )
 from appscale.hermes.converter import IncludeLists
+from appscale.hermes.delta import RenderedVersions
 from appscale.hermes.handlers import (
-  CurrentStatsHandler, CurrentClusterStatsHandler
+  CurrentStatsHandler, CurrentClusterStatsHandler, GroupStatsHandler,
+  ProfileQueryHandler
 )
 from appscale.hermes.producers.cluster_stats import (
   cluster_nodes_stats, cluster_processes_stats, cluster_proxies_stats,
@@ -28,7 +30,7 @@ from appscale.hermes.producers.cluster_stats import (
 )
 from appscale.hermes.producers.cassandra_stats import CassandraStatsSource
 from appscale.hermes.producers.node_stats import NodeStatsSource
-from appscale.hermes.producers.process_stats import ProcessesStatsSource
+from appscale.hermes.producers.process_stats import processes_stats_source
 from appscale.hermes.producers.proxy_stats import ProxiesStatsSource
 from appscale.hermes.producers.rabbitmq_stats import PushQueueStatsSource
 from appscale.hermes.producers.rabbitmq_stats import RabbitMQStatsSource
@@ -100,12 +102,14 @@ def get_local_stats_api_routes(is_lb_node, is_tq_node, is_db_node):
     handler_class=CurrentStatsHandler,
     init_kwargs={'source': NodeStatsSource,
                  'default_include_lists': DEFAULT_INCLUDE_LISTS,
-                 'cache_container': [None]})
+                 'cache_container': [None],
+                 'versions': RenderedVersions()})
   local_processes_stats_handler = HandlerInfo(
     handler_class=CurrentStatsHandler,
-    init_kwargs={'source': ProcessesStatsSource,
+    init_kwargs={'source': processes_stats_source,
                  'default_include_lists': DEFAULT_INCLUDE_LISTS,
-                 'cache_container': [None]})
+                 'cache_container': [None],
+                 'versions': RenderedVersions()})
 
   if is_lb_node:
     # Only LB nodes provide proxies and service stats
@@ -113,13 +117,15 @@ def get_local_stats_api_routes(is_lb_node, is_tq_node, is_db_node):
       handler_class=CurrentStatsHandler,
       init_kwargs={'source': ProxiesStatsSource,
                    'default_include_lists': DEFAULT_INCLUDE_LISTS,
-                   'cache_container': [None]}
+                   'cache_container': [None],
+                   'versions': RenderedVersions()}
     )
     local_taskqueue_stats_handler = HandlerInfo(
       handler_class=CurrentStatsHandler,
       init_kwargs={'source': TaskqueueStatsSource(),
                    'default_include_lists': DEFAULT_INCLUDE_LISTS,
-                   'cache_container': [None]}
+                   'cache_container': [None],
+                   'versions': RenderedVersions()}
     )
   else:
     # Stub handler for non-LB nodes
@@ -138,13 +144,15 @@ def get_local_stats_api_routes(is_lb_node, is_tq_node, is_db_node):
       handler_class=CurrentStatsHandler,
       init_kwargs={'source': RabbitMQStatsSource,
                    'default_include_lists': DEFAULT_INCLUDE_LISTS,
-                   'cache_container': [None]}
+                   'cache_container': [None],
+                   'versions': RenderedVersions()}
     )
     local_push_queue_stats_handler = HandlerInfo(
       handler_class=CurrentStatsHandler,
       init_kwargs={'source': PushQueueStatsSource,
                    'default_include_lists': DEFAULT_INCLUDE_LISTS,
-                   'cache_container': [None]}
+                   'cache_container': [None],
+                   'versions': RenderedVersions()}
     )
   else:
     # Stub handler for non-TQ nodes
@@ -268,6 +276,49 @@ def get_cluster_stats_api_routes(is_lb):
   ]
 
 
+def get_group_stats_api_routes():
+  """ Creates API handlers for collecting stats of a group of nodes.
+  Any node can be a leader of a group, so these routes are
+  available on every node.
+
+  Returns:
+    A list of route-handler tuples.
+  """
+  sources = [cluster_nodes_stats, cluster_processes_stats,
+             cluster_proxies_stats, cluster_rabbitmq_stats]
+  return [
+    ('/{}'.format(source.group_method_path), GroupStatsHandler,
+     {'source': source, 'default_include_lists': DEFAULT_INCLUDE_LISTS,
+      'versions': RenderedVersions()})
+    for source in sources
+  ]
+
+
+def get_profile_api_routes(profile_store):
+  """ Creates API handler for querying stats profiling series
+  (on master node only). If this node is slave, it creates stub handler.
+
+  Args:
+    profile_store: An instance of TimeSeriesStore or None on slave nodes.
+  Returns:
+    A list of route-handler tuples.
+  """
+  if profile_store:
+    profile_handler = HandlerInfo(
+      handler_class=ProfileQueryHandler,
+      init_kwargs={'store': profile_store}
+    )
+  else:
+    profile_handler = HandlerInfo(
+      handler_class=Respond404Handler,
+      init_kwargs={'reason': 'Only master node keeps stats profile'}
+    )
+  return [
+    ('/stats/profile', profile_handler.handler_class,
+     profile_handler.init_kwargs)
+  ]
+
+
 class ProfilingManager(object):
   """
   This manager watches stats profiling configs in Zookeeper,
@@ -275,13 +326,15 @@ class ProfilingManager(object):
   tasks which writes profile log with proper parameters.
   """
 
-  def __init__(self, zk_client):
+  def __init__(self, zk_client, profile_store):
     """ Initializes instance of ProfilingManager.
     Starts watching profiling configs in zookeeper.
 
     Args:
       zk_client: an instance of KazooClient - started zookeeper client.
+      profile_store: an instance of TimeSeriesStore to write profile log to.
     """
+    self.profile_store = profile_store
     self.nodes_profile_log = None
     self.processes_profile_log = None
     self.proxies_profile_log = None
@@ -326,7 +379,8 @@ class ProfilingManager(object):
     interval = conf["interval"]
     if enabled:
       if not self.nodes_profile_log:
-        self.nodes_profile_log = NodesProfileLog(DEFAULT_INCLUDE_LISTS)
+        self.nodes_profile_log = NodesProfileLog(
+          self.profile_store, DEFAULT_INCLUDE_LISTS)
       if self.nodes_profile_task:
         self.nodes_profile_task.stop()
       self.nodes_profile_task = _configure_profiling(
@@ -357,7 +411,8 @@ class ProfilingManager(object):
     detailed = conf["detailed"]
     if enabled:
       if not self.processes_profile_log:
-        self.processes_profile_log = ProcessesProfileLog(DEFAULT_INCLUDE_LISTS)
+        self.processes_profile_log = ProcessesProfileLog(
+          self.profile_store, DEFAULT_INCLUDE_LISTS)
       self.processes_profile_log.write_detailed_stats = detailed
       if self.processes_profile_task:
         self.processes_profile_task.stop()
@@ -389,7 +444,8 @@ class ProfilingManager(object):
     detailed = conf["detailed"]
     if enabled:
       if not self.proxies_profile_log:
-        self.proxies_profile_log = ProxiesProfileLog(DEFAULT_INCLUDE_LISTS)
+        self.proxies_profile_log = ProxiesProfileLog(
+          self.profile_store, DEFAULT_INCLUDE_LISTS)
       self.proxies_profile_log.write_detailed_stats = detailed
       if self.proxies_profile_task:
         self.proxies_profile_task.stop()
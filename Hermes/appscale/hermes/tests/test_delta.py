@@ -0,0 +1,50 @@
+import unittest
+
+from appscale.hermes.delta import (
+  RenderedVersions, UnknownVersion, apply_stats_delta, stats_delta
+)
+
+
+class TestStatsDelta(unittest.TestCase):
+
+  def test_round_trip(self):
+    old = {
+      'utc_timestamp': 1494248000.0,
+      'processes_stats': [{'pid': 1, 'cpu': {'user': 1.0, 'system': 2.0}},
+                          {'pid': 2, 'cpu': {'user': 3.0, 'system': 4.0}}],
+      'partitions_dict': {'/': {'used': 10}, '/opt': {'used': 20}},
+      'removed': True
+    }
+    new = {
+      'utc_timestamp': 1494248010.0,
+      'processes_stats': [{'pid': 1, 'cpu': {'user': 1.0, 'system': 2.0}},
+                          {'pid': 2, 'cpu': {'user': 3.5, 'system': 4.0}}],
+      'partitions_dict': {'/': {'used': 11}, '/opt': {'used': 20}},
+      'added': [1, 2]
+    }
+    delta = stats_delta(old, new)
+    self.assertEqual(apply_stats_delta(old, delta), new)
+    # Only changed values should be included
+    self.assertEqual(
+      delta['set']['processes_stats']['set'].keys(), ['1'])
+    self.assertEqual(delta['set']['processes_stats']['set']['1']['set'],
+                     {'cpu': {'__delta__': 'dict', 'set': {'user': 3.5},
+                              'del': []}})
+    self.assertEqual(delta['del'], ['removed'])
+    # Old value should stay unchanged
+    self.assertEqual(old['partitions_dict']['/'], {'used': 10})
+
+    # Lists of different length are replaced
+    self.assertEqual(stats_delta([1, 2], [1, 2, 3]), [1, 2, 3])
+
+  def test_rendered_versions(self):
+    versions = RenderedVersions(max_versions=2)
+    self.assertIsNone(versions.latest)
+    first = versions.add({'a': 1, 'b': 2})
+    self.assertEqual(first, versions.add({'b': 2, 'a': 1}))
+    versions.add({'a': 2})
+    third = versions.add({'a': 3})
+    self.assertEqual(versions.latest, third)
+    self.assertEqual(versions.get(third), {'a': 3})
+    with self.assertRaises(UnknownVersion):
+      versions.get(first)
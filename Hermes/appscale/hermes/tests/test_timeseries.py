@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from appscale.hermes.timeseries import (
+  ROLLUP, TimeSeriesStore, UnknownSeries
+)
+
+
+class TestTimeSeriesStore(unittest.TestCase):
+
+  def setUp(self):
+    self.base_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.base_dir)
+    self.store = TimeSeriesStore(self.base_dir)
+    self.addCleanup(self.store.close)
+
+  def test_query_range(self):
+    for timestamp in xrange(1500000000, 1500000100, 10):
+      self.store.append('nodes/10.0.2.15', timestamp,
+                        [('cpu', timestamp % 7), ('ip', '10.0.2.15')])
+
+    columns, rows = self.store.query('nodes/10.0.2.15',
+                                     start=1500000015, end=1500000050)
+    self.assertEqual(columns, ['cpu', 'ip'])
+    self.assertEqual([row[0] for row in rows],
+                     [1500000020, 1500000030, 1500000040, 1500000050])
+    # Non numeric values can't be stored
+    self.assertEqual(rows[0], [1500000020, 1500000020 % 7, None])
+
+    self.assertEqual(self.store.list_series(), ['nodes/10.0.2.15'])
+    with self.assertRaises(UnknownSeries):
+      self.store.query('nodes/10.0.2.16')
+
+  def test_new_columns(self):
+    self.store.append('processes/summary-cpu-time', 1500000000,
+                      {'taskqueue': 1.5})
+    self.store.append('processes/summary-cpu-time', 1500000010,
+                      {'taskqueue': 2.5, 'hermes': 0.5})
+    self.store.flush()
+
+    # Columns should be read from disk by a new instance
+    columns, rows = TimeSeriesStore(self.base_dir).query(
+      'processes/summary-cpu-time')
+    self.assertEqual(columns, ['taskqueue', 'hermes'])
+    self.assertEqual(rows, [[1500000000, 1.5, None],
+                            [1500000010, 2.5, 0.5]])
+
+  def test_rollup(self):
+    for minute in xrange(10):
+      self.store.append('nodes/10.0.2.15', 1500000000 + minute * 60,
+                        {'cpu': minute})
+    # Rollup row is written when the next interval starts
+    self.store.append('nodes/10.0.2.15', 1500003000, {'cpu': 1})
+
+    _, rows = self.store.query('nodes/10.0.2.15', kind=ROLLUP)
+    self.assertEqual(rows, [[1500000000, 2.0], [1500000300, 7.0]])
+
+  def test_rollup_after_restart(self):
+    for minute in xrange(7):
+      self.store.append('nodes/10.0.2.15', 1500000000 + minute * 60,
+                        {'cpu': minute})
+    self.store.close()
+
+    # Rows of the unfinished interval should be read back from raw segments
+    store = TimeSeriesStore(self.base_dir)
+    self.addCleanup(store.close)
+    for minute in xrange(7, 10):
+      store.append('nodes/10.0.2.15', 1500000000 + minute * 60,
+                   {'cpu': minute})
+    store.append('nodes/10.0.2.15', 1500003000, {'cpu': 1})
+
+    _, rows = store.query('nodes/10.0.2.15', kind=ROLLUP)
+    self.assertEqual(rows, [[1500000000, 2.0], [1500000300, 7.0]])
+
+  def test_rows_written_on_flush(self):
+    for series_num in xrange(3):
+      self.store.append('processes/{}'.format(series_num), 1500000000,
+                        {'cpu': series_num})
+
+    # Rows are only written to segment files when the store is flushed
+    segment_path = os.path.join(self.base_dir, 'processes/1',
+                                'raw-20170714-w2.bin')
+    self.assertFalse(os.path.exists(segment_path))
+    self.store.flush()
+    self.assertEqual(os.path.getsize(segment_path), 16)
+    _, rows = self.store.query('processes/1')
+    self.assertEqual(rows, [[1500000000, 1.0]])
@@ -0,0 +1,318 @@
+""" A compact store for numeric time series written by stats profiling.
+
+Each series is a directory containing:
+  columns.json - a list of column names. Columns are only ever appended, so
+    a row with N values always refers to the first N columns.
+  raw-<YYYYMMDD>-w<width>.bin - fixed-width rows of little-endian doubles
+    (utc_timestamp followed by <width> - 1 values) appended as they arrive.
+  rollup-<YYYYMMDD>-w<width>.bin - rows with the same layout holding average
+    values for every ROLLUP_INTERVAL seconds.
+A new segment is started when the day or the number of columns changes.
+Values that are missing or not numeric are stored as NaN.
+"""
+import collections
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import time
+
+from appscale.hermes import helper
+
+logger = logging.getLogger(__name__)
+
+RAW = 'raw'
+ROLLUP = 'rollup'
+
+SEGMENT_NAME_RE = re.compile(r'^(raw|rollup)-(\d{8})-w(\d+)\.bin$')
+
+NAN = float('nan')
+
+
+class UnknownSeries(KeyError):
+  pass
+
+
+class TimeSeriesStore(object):
+  """ Appends rows to series segment files and reads time ranges back. """
+
+  # The number of seconds which are averaged into one rollup row.
+  ROLLUP_INTERVAL = 5 * 60
+
+  # The number of rows kept in memory before they are written to segments.
+  # Rows are normally written by flush once per profiling cycle.
+  MAX_PENDING_ROWS = 100000
+
+  # How far back raw rows are read to restore a rollup interval
+  # which was not finished before the store was restarted.
+  MAX_ROLLUP_RESTORE_AGE = 24 * 60 * 60
+
+  def __init__(self, base_dir):
+    """ Initializes an instance of TimeSeriesStore.
+
+    Args:
+      base_dir: A string path to the directory containing all series.
+    """
+    self._base_dir = base_dir
+    self._columns = {}  # {series: [column names]}
+    # Rows are grouped by segment, so every segment file is opened once
+    # per flush no matter how many series there are
+    self._pending = collections.OrderedDict()  # {path: [packed rows]}
+    self._pending_rows = 0
+    self._rollups = {}  # {series: [bucket start, sums, counts]}
+    helper.ensure_directory(base_dir)
+
+  def append(self, series, timestamp, values):
+    """ Adds a row to a series.
+
+    Args:
+      series: A string name of series (e.g. 'nodes/10.0.2.15').
+      timestamp: A unix timestamp of the row.
+      values: A dict or list of (column, value) pairs.
+    """
+    if isinstance(values, dict):
+      values = values.items()
+    columns = self._get_columns(series)
+    positions = {column: position for position, column in enumerate(columns)}
+    new_columns = [column for column, _ in values if column not in positions]
+    if new_columns:
+      columns.extend(new_columns)
+      positions.update(
+        (column, position) for position, column in enumerate(columns))
+      self._save_columns(series, columns)
+
+    row = [NAN] * len(columns)
+    for column, value in values:
+      row[positions[column]] = _to_number(value)
+
+    if series not in self._rollups:
+      self._restore_rollup(series, timestamp)
+    self._write_row(series, RAW, timestamp, row)
+    self._add_to_rollup(series, timestamp, row)
+    if self._pending_rows >= self.MAX_PENDING_ROWS:
+      self.flush()
+
+  def flush(self):
+    """ Writes appended rows to segment files. """
+    pending, self._pending = self._pending, collections.OrderedDict()
+    self._pending_rows = 0
+    for segment_path, packed_rows in pending.iteritems():
+      with open(segment_path, 'ab') as segment_file:
+        segment_file.write(''.join(packed_rows))
+
+  def close(self):
+    """ Writes rows which haven't been flushed yet. """
+    self.flush()
+
+  def list_series(self):
+    """ Lists all series in the store.
+
+    Returns:
+      A sorted list of series names.
+    """
+    series_names = []
+    for dir_path, _, file_names in os.walk(self._base_dir):
+      if 'columns.json' in file_names:
+        series_names.append(os.path.relpath(dir_path, self._base_dir))
+    return sorted(series_names)
+
+  def query(self, series, start=None, end=None, kind=RAW):
+    """ Reads rows of a series in a time range.
+
+    Args:
+      series: A string name of series.
+      start: A unix timestamp of the first row to include.
+      end: A unix timestamp of the last row to include.
+      kind: RAW or ROLLUP.
+    Returns:
+      A tuple (columns, rows). Every row is a list starting with
+      a timestamp, missing values are represented as None.
+    Raises:
+      UnknownSeries if the series doesn't exist.
+    """
+    series_dir = self._series_dir(series)
+    if not os.path.isfile(os.path.join(series_dir, 'columns.json')):
+      raise UnknownSeries(series)
+    columns = self._get_columns(series)
+    self.flush()
+
+    rows = self._read_rows(series, kind, start, end)
+
+    # Pad rows written before new columns were added
+    for row in rows:
+      row.extend([None] * (len(columns) + 1 - len(row)))
+    return list(columns), rows
+
+  def _series_dir(self, series):
+    return os.path.join(self._base_dir, series)
+
+  def _read_rows(self, series, kind, start, end):
+    """ Reads rows of a series in a time range from segment files.
+
+    Args:
+      series: A string name of series.
+      kind: RAW or ROLLUP.
+      start: A unix timestamp of the first row to include or None.
+      end: A unix timestamp of the last row to include or None.
+    Returns:
+      A list of rows, missing values are represented as None.
+    """
+    series_dir = self._series_dir(series)
+    if not os.path.isdir(series_dir):
+      return []
+
+    start_day = _day_of(start) if start is not None else None
+    end_day = _day_of(end) if end is not None else None
+    segments = []
+    for file_name in os.listdir(series_dir):
+      match = SEGMENT_NAME_RE.match(file_name)
+      if not match or match.group(1) != kind:
+        continue
+      day, width = match.group(2), int(match.group(3))
+      if start_day and day < start_day or end_day and day > end_day:
+        continue
+      segments.append((day, width, os.path.join(series_dir, file_name)))
+
+    rows = []
+    for _, width, segment_path in sorted(segments):
+      rows.extend(_read_segment(segment_path, width, start, end))
+    return rows
+
+  def _get_columns(self, series):
+    columns = self._columns.get(series)
+    if columns is None:
+      columns_path = os.path.join(self._series_dir(series), 'columns.json')
+      if os.path.isfile(columns_path):
+        with open(columns_path) as columns_file:
+          columns = json.load(columns_file)
+      else:
+        columns = []
+      self._columns[series] = columns
+    return columns
+
+  def _save_columns(self, series, columns):
+    series_dir = self._series_dir(series)
+    helper.ensure_directory(series_dir)
+    columns_path = os.path.join(series_dir, 'columns.json')
+    with open('{}.new'.format(columns_path), 'w') as columns_file:
+      json.dump(columns, columns_file)
+    os.rename('{}.new'.format(columns_path), columns_path)
+
+  def _write_row(self, series, kind, timestamp, row):
+    width = len(row) + 1
+    file_name = '{kind}-{day}-w{width}.bin'.format(
+      kind=kind, day=_day_of(timestamp), width=width)
+    segment_path = os.path.join(self._series_dir(series), file_name)
+    self._pending.setdefault(segment_path, []).append(
+      _row_struct(width).pack(timestamp, *row))
+    self._pending_rows += 1
+
+  def _restore_rollup(self, series, timestamp):
+    """ Rebuilds the rollup interval of a series which was in progress
+    when the store was restarted. Raw rows which haven't been rolled up
+    yet are read back from segment files.
+
+    Args:
+      series: A string name of series.
+      timestamp: A unix timestamp of the first row appended after restart.
+    """
+    since = timestamp - self.MAX_ROLLUP_RESTORE_AGE
+    rollup_rows = self._read_rows(series, ROLLUP, since, timestamp)
+    if rollup_rows:
+      since = rollup_rows[-1][0] + self.ROLLUP_INTERVAL
+    for row in self._read_rows(series, RAW, since, timestamp):
+      if row[0] >= timestamp:
+        break
+      self._add_to_rollup(series, row[0], [
+        NAN if value is None else value for value in row[1:]])
+
+  def _add_to_rollup(self, series, timestamp, row):
+    bucket = timestamp - timestamp % self.ROLLUP_INTERVAL
+    rollup = self._rollups.get(series)
+    if rollup and rollup[0] != bucket:
+      self._write_rollup(series, rollup)
+      rollup = None
+    if rollup is None:
+      rollup = self._rollups[series] = [bucket, [], []]
+
+    sums, counts = rollup[1], rollup[2]
+    if len(sums) < len(row):
+      sums.extend([0.0] * (len(row) - len(sums)))
+      counts.extend([0] * (len(row) - len(counts)))
+    for position, value in enumerate(row):
+      if not math.isnan(value):
+        sums[position] += value
+        counts[position] += 1
+
+  def _write_rollup(self, series, rollup):
+    bucket, sums, counts = rollup
+    averages = [total / count if count else NAN
+                for total, count in zip(sums, counts)]
+    self._write_row(series, ROLLUP, bucket, averages)
+
+
+_structs = {}
+
+
+def _row_struct(width):
+  """ Returns a Struct for rows with the specified number of doubles. """
+  row_struct = _structs.get(width)
+  if row_struct is None:
+    row_struct = _structs[width] = struct.Struct('<{}d'.format(width))
+  return row_struct
+
+
+def _read_segment(segment_path, width, start, end):
+  """ Reads rows of a single segment using binary search to find the first
+  row in the time range.
+
+  Args:
+    segment_path: A string path to the segment file.
+    width: An integer number of doubles in a row.
+    start: A unix timestamp or None.
+    end: A unix timestamp or None.
+  Returns:
+    A list of rows.
+  """
+  row_struct = _row_struct(width)
+  size = os.path.getsize(segment_path)
+  rows_count = size // row_struct.size
+  if not rows_count:
+    return []
+
+  with open(segment_path, 'rb') as segment_file:
+    segment = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+      left, right = 0, rows_count
+      if start is not None:
+        while left < right:
+          middle = (left + right) // 2
+          timestamp = row_struct.unpack_from(segment,
+                                             middle * row_struct.size)[0]
+          if timestamp < start:
+            left = middle + 1
+          else:
+            right = middle
+
+      rows = []
+      for row_number in xrange(left, rows_count):
+        row = row_struct.unpack_from(segment, row_number * row_struct.size)
+        if end is not None and row[0] > end:
+          break
+        rows.append([None if math.isnan(value) else value for value in row])
+      return rows
+    finally:
+      segment.close()
+
+
+def _day_of(timestamp):
+  return time.strftime('%Y%m%d', time.gmtime(timestamp))
+
+
+def _to_number(value):
+  if isinstance(value, (bool, int, long, float)):
+    return float(value)
+  return NAN
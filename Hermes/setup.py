@@ -16,6 +16,7 @@ setup(
     'tornado',
     'psutil==5.1.3',
     'attrs>=18.1.0',
+    'futures',
     'mock',
   ],
   test_suite='appscale.hermes',
@@ -1,10 +1,13 @@
 
+import bisect
 import capnp  # pylint: disable=unused-import
 import logging_capnp
+import mmap
 import os
 import re
 import struct
 import time
+import zlib
 
 from cStringIO import StringIO
 from twisted.internet import protocol
@@ -13,10 +16,28 @@ from twisted.python import log
 MAX_LOG_FILE_SIZE = 1024 * 1024 * 1024
 
 _I_SIZE = struct.calcsize('I')
+_I_STRUCT = struct.Struct('I')
 _qI_SIZE = struct.calcsize('qI')
 _PAGE_SIZE = 1000
 _ONE_BINARY = struct.pack('I', 1)
 
+_MIN_TIME = -2 ** 63
+_MAX_TIME = 2 ** 63 - 1
+_MIN_LEVEL = -2 ** 7
+_MAX_LEVEL = 2 ** 7 - 1
+
+# Versions are summarized with one bit per version hash. The highest bit is
+# reserved for records without a version.
+_NO_VERSION_BIT = 1 << 63
+_ALL_VERSIONS = 2 ** 64 - 1
+
+# Stop searching if a query runs for longer than this many seconds.
+_SEARCH_TIMEOUT = 25
+
+# Request ID index entries consist of a request ID and a record position.
+_REQUEST_ID_SIZE = 10
+_INDEX_ENTRY_SIZE = _REQUEST_ID_SIZE + _I_SIZE
+
 def readLogRecord(handle, parse=False):
   buf = handle.read(_I_SIZE)
   if not buf:
@@ -25,12 +46,119 @@ def readLogRecord(handle, parse=False):
   buf = handle.read(length)
   return (buf, logging_capnp.RequestLog.from_bytes(buf)) if parse else buf
 
+def mapFile(handle):
+  """ Maps a file opened for reading into memory. Empty files cannot be
+  mapped, so an empty string is returned for them instead. """
+  size = os.fstat(handle.fileno()).st_size
+  if not size:
+    return ''
+  return mmap.mmap(handle.fileno(), size, access=mmap.ACCESS_READ)
+
 def calculateOffset(log_file_id, position):
   return struct.pack('HI', log_file_id, position)
 
 def parseOffset(offset):
   return struct.unpack('HI', offset)
 
+def versionBit(versionId):
+  if not versionId:
+    return _NO_VERSION_BIT
+  return 1 << (zlib.crc32(versionId.split('.', 1)[0]) % 63)
+
+def versionMask(versionIds):
+  mask = _NO_VERSION_BIT
+  for versionId in versionIds:
+    mask |= versionBit(versionId)
+  return mask
+
+def recordMatches(record, query, versionIds):
+  if query.minimumLogLevel:
+    include = False
+    for appLog in record.appLogs:
+      if appLog.level >= query.minimumLogLevel:
+        include = True
+        break
+    if not include:
+      return False
+  if record.versionId and not record.versionId.split('.', 1)[0] in versionIds:
+    return False
+  if query.startTime and query.startTime > record.startTime:
+    return False
+  if query.endTime and query.endTime < record.endTime:
+    return False
+  return True
+
+class PageSummary(object):
+  """ Summarizes the records in a page of a log file so that searches can
+  skip pages that cannot contain matching records. """
+  _STRUCT = struct.Struct('<qqqQIb')
+  SIZE = _STRUCT.size
+
+  __slots__ = ['minStartTime', 'maxStartTime', 'minEndTime', 'versionMask',
+               'position', 'maxLevel']
+
+  def __init__(self, position, minStartTime=_MAX_TIME, maxStartTime=_MIN_TIME,
+               minEndTime=_MAX_TIME, versionMask=0, maxLevel=_MIN_LEVEL):
+    self.position = position
+    self.minStartTime = minStartTime
+    self.maxStartTime = maxStartTime
+    self.minEndTime = minEndTime
+    self.versionMask = versionMask
+    self.maxLevel = maxLevel
+
+  @classmethod
+  def unknown(cls, position):
+    # Used for pages that were not summarized, so it matches every query.
+    return cls(position, _MIN_TIME, _MAX_TIME, _MIN_TIME, _ALL_VERSIONS,
+               _MAX_LEVEL)
+
+  @classmethod
+  def unpack(cls, buf, offset=0):
+    minStartTime, maxStartTime, minEndTime, versionMask, position, maxLevel = \
+      cls._STRUCT.unpack_from(buf, offset)
+    return cls(position, minStartTime, maxStartTime, minEndTime, versionMask,
+               maxLevel)
+
+  def pack(self):
+    return self._STRUCT.pack(self.minStartTime, self.maxStartTime,
+                             self.minEndTime, self.versionMask, self.position,
+                             self.maxLevel)
+
+  def add(self, record):
+    self.minStartTime = min(self.minStartTime, record.startTime)
+    self.maxStartTime = max(self.maxStartTime, record.startTime)
+    self.minEndTime = min(self.minEndTime, record.endTime)
+    self.versionMask |= versionBit(record.versionId)
+    for appLog in record.appLogs:
+      self.maxLevel = max(self.maxLevel, appLog.level)
+
+  def matches(self, minimumLogLevel, queryVersionMask):
+    if minimumLogLevel and self.maxLevel < minimumLogLevel:
+      return False
+    return bool(self.versionMask & queryVersionMask)
+
+def pageBounds(pages):
+  """ Computes the arrays that searches bisect to find the pages that can
+  contain records in a time range.
+
+  Returns:
+    A tuple containing the running maximum of each page's latest start time
+    and the minimum end time of each page and all the pages after it. Both
+    are sorted even though individual pages overlap.
+  """
+  maxStartTimes = []
+  maxStartTime = _MIN_TIME
+  for page in pages:
+    maxStartTime = max(maxStartTime, page.maxStartTime)
+    maxStartTimes.append(maxStartTime)
+  minEndTimes = []
+  minEndTime = _MAX_TIME
+  for page in reversed(pages):
+    minEndTime = min(minEndTime, page.minEndTime)
+    minEndTimes.append(minEndTime)
+  minEndTimes.reverse()
+  return maxStartTimes, minEndTimes
+
 class AppLogFile(object):
   MODE_SEARCH = 1
   MODE_WRITE = 2
@@ -41,25 +169,46 @@ class AppLogFile(object):
     self._filename = os.path.join(root_path, 'logservice_%s.%s.log' % (app_id, log_file_id))
     self._requestIdIndexFilename = '%s.ridx' % self._filename
     self._pageIndexFilename = '%s.pidx' % self._filename
+    self._summaryIndexFilename = '%s.sidx' % self._filename
+    # Page summaries in file order. The writer keeps the summary of the page
+    # being filled as the last entry. Search files load them when needed.
+    self._pages = None
+    self._pageBounds = None
+    # Search files do not change, so they are mapped into memory when first
+    # needed and records are decoded from the mapping without copying them.
+    self._map = None
+    self._requestIdIndexMap = None
     if mode == AppLogFile.MODE_WRITE:
       self._handle = open(self._filename, 'ab')
       self._pageIndexHandle = open(self._pageIndexFilename, 'ab')
       self._requestIdIndexHandle = open(self._requestIdIndexFilename, 'ab')
+      self._summaryIndexHandle = open(self._summaryIndexFilename, 'ab')
+      self._pages = []
     else:
       self._handle = open(self._filename, 'rb')
       self._pageIndexHandle = open(self._pageIndexFilename, 'rb')
       self._requestIdIndexHandle = open(self._requestIdIndexFilename, 'rb')
+      self._summaryIndexHandle = None
     self._indexSize = self._requestIdIndexHandle.tell() / 14
 
   def close(self):
+    if self.mode == AppLogFile.MODE_WRITE and self._pages:
+      self._summaryIndexHandle.write(self._pages[-1].pack())
+    for fileMap in (self._map, self._requestIdIndexMap):
+      if isinstance(fileMap, mmap.mmap):
+        fileMap.close()
     self._handle.close()
     self._pageIndexHandle.close()
     self._requestIdIndexHandle.close()
+    if self._summaryIndexHandle:
+      self._summaryIndexHandle.close()
 
   def delete(self):
     os.unlink(self._filename)
     os.unlink(self._requestIdIndexFilename)
     os.unlink(self._pageIndexFilename)
+    if os.path.exists(self._summaryIndexFilename):
+      os.unlink(self._summaryIndexFilename)
 
   def write(self, buf):
     if self.mode != AppLogFile.MODE_WRITE:
@@ -73,25 +222,99 @@ class AppLogFile(object):
     # Index the new logline
     if requestLog.requestId:
       self._requestIdIndexHandle.write('%s%s' % (requestLog.requestId, struct.pack('I', position)))
-    if self._indexSize % _PAGE_SIZE == 0:
+    if self._indexSize % _PAGE_SIZE == 0 or not self._pages:
+      # The previous page is complete, so its summary will not change.
+      if self._pages:
+        self._summaryIndexHandle.write(self._pages[-1].pack())
+        self._summaryIndexHandle.flush()
+      self._pages.append(PageSummary(position))
       self._pageIndexHandle.write(struct.pack('qI', requestLog.endTime, position))
       self._pageIndexHandle.flush()
       self._handle.flush()
       self._requestIdIndexHandle.flush()
+    self._pages[-1].add(requestLog)
     self._indexSize += 1
     return position, requestLog
 
-  def get(self, requestIds):
+  def pages(self):
+    if self._pages is not None:
+      return self._pages
+    self._pageIndexHandle.seek(0)
+    positions = self._pageIndexHandle.read()
+    summaries = ''
+    if os.path.exists(self._summaryIndexFilename):
+      with open(self._summaryIndexFilename, 'rb') as fh:
+        summaries = fh.read()
+    pages = []
+    for pos in xrange(0, len(positions) - _qI_SIZE + 1, _qI_SIZE):
+      _, position = struct.unpack('qI', positions[pos:pos+_qI_SIZE])
+      offset = len(pages) * PageSummary.SIZE
+      if offset + PageSummary.SIZE <= len(summaries):
+        pages.append(PageSummary.unpack(summaries, offset))
+      else:
+        # Files written before summaries existed, or whose writer stopped
+        # unexpectedly, are missing some summaries.
+        pages.append(PageSummary.unknown(position))
+    self._pages = pages
+    return pages
+
+  def searchPages(self, startTime, endTime):
+    """ Finds the pages that can contain records in a time range.
+
+    Args:
+      startTime: The earliest start time to include or 0 for no limit.
+      endTime: The latest end time to include or 0 for no limit.
+    Yields:
+      Tuples containing a PageSummary and the position where the page ends
+      (-1 for the last page), starting with the newest page.
+    """
+    pages = self.pages()
     if self.mode == AppLogFile.MODE_WRITE:
-      self._requestIdIndexHandle.flush()
-      self._handle.flush()
-      index_handle = open(self._requestIdIndexFilename, 'rb')
-      handle = open(self._filename, 'rb')
+      maxStartTimes, minEndTimes = pageBounds(pages)
     else:
-      index_handle = self._requestIdIndexHandle
-      handle = self._handle
+      if self._pageBounds is None:
+        self._pageBounds = pageBounds(pages)
+      maxStartTimes, minEndTimes = self._pageBounds
+    # Pages before the first index only have records that start too early,
+    # and pages from the last index onwards only have records that end too
+    # late.
+    first = bisect.bisect_left(maxStartTimes, startTime) if startTime else 0
+    last = bisect.bisect_right(minEndTimes, endTime) if endTime else len(pages)
+    for index in xrange(last - 1, first - 1, -1):
+      end_position = pages[index + 1].position if index + 1 < len(pages) else -1
+      yield pages[index], end_position
+
+  def get(self, requestIds):
+    if self.mode == AppLogFile.MODE_SEARCH:
+      return self._getMapped(requestIds)
+    return self._getRead(requestIds)
+
+  def _getMapped(self, requestIds):
+    if self._requestIdIndexMap is None:
+      self._requestIdIndexMap = mapFile(self._requestIdIndexHandle)
+    index = self._requestIdIndexMap
+    data = self._dataMap()
+    # Most requested IDs are not in a given file, so the index is walked
+    # once instead of being searched for each ID.
+    wanted = set(requestIds)
+    for i in xrange(0, len(index) - _INDEX_ENTRY_SIZE + 1, _INDEX_ENTRY_SIZE):
+      key = index[i:i + _REQUEST_ID_SIZE]
+      if key not in wanted:
+        continue
+      wanted.remove(key)
+      requestIds.remove(key)
+      position, = _I_STRUCT.unpack_from(index, i + _REQUEST_ID_SIZE)
+      length, = _I_STRUCT.unpack_from(data, position)
+      yield key, buffer(data, position + _I_SIZE, length)
+      if not wanted:
+        break
+
+  def _getRead(self, requestIds):
+    self._requestIdIndexHandle.flush()
+    self._handle.flush()
+    index_handle = open(self._requestIdIndexFilename, 'rb')
+    handle = open(self._filename, 'rb')
     try:
-      index_handle.seek(0)
       while True:
         buf = index_handle.read(14000)
         if not buf:
@@ -113,27 +336,45 @@ class AppLogFile(object):
           if not requestIds:
             break
     finally:
-      if self.mode == AppLogFile.MODE_WRITE:
-        handle.close()
-        index_handle.close()
-
-  def iterpages(self):
-    if self.mode == AppLogFile.MODE_WRITE:
-      self._pageIndexHandle.flush()
-      with open(self._pageIndexFilename, 'rb') as fh:
-        pages = fh.read()
-    else:
-      self._pageIndexHandle.seek(0)
-      pages = self._pageIndexHandle.read()
-    for pos in xrange(len(pages)-_qI_SIZE, -1, -_qI_SIZE):
-      yield struct.unpack('qI', pages[pos:pos+_qI_SIZE])
+      handle.close()
+      index_handle.close()
 
   def iterrecords(self, start_position, end_position):
-    if self.mode == AppLogFile.MODE_WRITE:
-      self._handle.flush()
-      handle = open(self._filename, 'rb')
-    else:
-      handle = self._handle
+    """ Decodes the records between two positions.
+
+    Args:
+      start_position: The position of the first record.
+      end_position: The position where the records end or -1 for the end
+        of the file.
+    Returns:
+      An iterator of tuples containing the encoded record and the decoded
+      record. Search files return buffers that share memory with the file
+      mapping, so only the records that are kept need to be copied.
+    """
+    if self.mode == AppLogFile.MODE_SEARCH:
+      return self._iterMappedRecords(start_position, end_position)
+    return self._iterReadRecords(start_position, end_position)
+
+  def _dataMap(self):
+    if self._map is None:
+      self._map = mapFile(self._handle)
+    return self._map
+
+  def _iterMappedRecords(self, start_position, end_position):
+    data = self._dataMap()
+    if end_position == -1:
+      end_position = len(data)
+    pos = start_position
+    while pos + _I_SIZE <= end_position:
+      length, = _I_STRUCT.unpack_from(data, pos)
+      pos += _I_SIZE
+      buf = buffer(data, pos, length)
+      pos += length
+      yield buf, logging_capnp.RequestLog.from_bytes(buf)
+
+  def _iterReadRecords(self, start_position, end_position):
+    self._handle.flush()
+    handle = open(self._filename, 'rb')
     try:
       handle.seek(start_position)
       if end_position != -1:
@@ -141,8 +382,7 @@ class AppLogFile(object):
       else:
         buf = handle.read()
     finally:
-      if self.mode == AppLogFile.MODE_WRITE:
-        handle.close()
+      handle.close()
     pos = 0
     while pos < len(buf):
       buf2 = buf[pos:pos+_I_SIZE]
@@ -204,11 +444,6 @@ class AppRegistry(object):
       for requestId, record in alf.get(lookupRequestIds):
         yield requestId, record
 
-  def iterpages(self):
-    for alf in self.iter():
-      for endTime, position in alf.iterpages():
-         yield endTime, position, alf
-
   def registerFollower(self, protocol, query):
     self._followers[protocol] = query
 
@@ -290,53 +525,33 @@ class Protocol(protocol.Protocol):
   def processActionQuerySearch(self, query):
     results = list()
     versionIds = list(query.versionIds)
+    queryVersionMask = versionMask(versionIds)
     if query.offset:
       query_log_file_id, query_position = parseOffset(query.offset)
-    oldestRecord = None
     start = time.time()
-    previousALF = None
-    previousPosition = -1
-    for endTime, position, alf in self.app_registry.iterpages():
-      if query.endTime and query.endTime < endTime:
+    for alf in self.app_registry.iter():
+      if query.offset and alf.log_file_id > query_log_file_id:
         continue
-      if query.offset:
-        if alf.log_file_id > query_log_file_id:
-          continue
-        if alf.log_file_id == query_log_file_id and position > query_position:
-          continue
-      end_position = previousPosition if alf == previousALF else -1
-      for buf, record in alf.iterrecords(position, end_position):
-        if not oldestRecord or oldestRecord.startTime > record.startTime:
-          oldestRecord = record
-        if query.endTime and query.endTime < endTime:
-          break
-        if query.offset:
-          log_file_id, position = parseOffset(record.offset)
-          if log_file_id == query_log_file_id and position >= query_position:
-            break
-        if query.minimumLogLevel:
-          include = False
-          for appLog in record.appLogs:
-            if appLog.level >= query.minimumLogLevel:
-              include = True
-              break
-          if not include:
+      for page, end_position in alf.searchPages(query.startTime, query.endTime):
+        if query.offset and alf.log_file_id == query_log_file_id:
+          if page.position >= query_position:
             continue
-        if record.versionId and not record.versionId.split('.', 1)[0] in versionIds:
+          if end_position == -1 or end_position > query_position:
+            end_position = query_position
+        if not page.matches(query.minimumLogLevel, queryVersionMask):
           continue
-        if query.startTime and query.startTime > record.startTime:
-          continue
-        results.append((buf, record))
-      if query.startTime and oldestRecord.endTime < query.startTime:
-        break
+        for buf, record in alf.iterrecords(page.position, end_position):
+          if recordMatches(record, query, versionIds):
+            results.append((buf, record))
+        if len(results) >= query.count:
+          break
+        if time.time() - start > _SEARCH_TIMEOUT:
+          break
       if len(results) >= query.count:
         break
-      if results and time.time() - start > 5:
-        break
-      if time.time() - start > 25:
+      if time.time() - start > _SEARCH_TIMEOUT:
+        log.msg("Search timed out with {} result(s)".format(len(results)))
         break
-      previousALF = alf
-      previousPosition = position
     results.sort(key=lambda entry: entry[1].endTime, reverse=query.reverse)
     self.sendQueryResult([b for b, _ in results])
 
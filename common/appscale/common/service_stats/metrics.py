@@ -1,12 +1,42 @@
+import math
+
 from appscale.common.service_stats import matchers
 
+# The number of histogram buckets that each power of two is split into.
+# Values are estimated with up to ~9% relative error.
+DEFAULT_BUCKETS_PER_DOUBLING = 8
+
 
 class Metric(object):
+  # Incremental metrics keep a state that is updated as requests enter and
+  # leave the history instead of scanning all of the requests.
+  incremental = False
+
   def compute(self, requests):
     raise NotImplementedError()
 
+  def initial_state(self):
+    raise NotImplementedError()
+
+  def update_state(self, state, request_info, sign):
+    """ Adds (sign=1) or removes (sign=-1) a request from the metric state.
+
+    Args:
+      state: a metric state.
+      request_info: an object containing request info.
+      sign: 1 or -1.
+    Returns:
+      the new metric state.
+    """
+    raise NotImplementedError()
+
+  def state_result(self, state):
+    raise NotImplementedError()
+
 
 class Avg(Metric):
+  incremental = True
+
   def __init__(self, field):
     self._field_name = field
 
@@ -15,6 +45,20 @@ class Avg(Metric):
       return None
     return sum(getattr(r, self._field_name) for r in requests) / len(requests)
 
+  def initial_state(self):
+    return 0, 0
+
+  def update_state(self, state, request_info, sign):
+    total, count = state
+    value = getattr(request_info, self._field_name)
+    return total + sign * value, count + sign
+
+  def state_result(self, state):
+    total, count = state
+    if not count:
+      return None
+    return total / count
+
 
 class Max(Metric):
   def __init__(self, field):
@@ -37,6 +81,8 @@ class Min(Metric):
 
 
 class CountOf(Metric):
+  incremental = True
+
   def __init__(self, matcher):
     super(CountOf, self).__init__()
     self._matcher = matcher
@@ -46,4 +92,124 @@ class CountOf(Metric):
       return len(requests)
     return sum(1 for request in requests if self._matcher.matches(request))
 
+  def initial_state(self):
+    return 0
+
+  def update_state(self, state, request_info, sign):
+    if self._matcher.matches(request_info):
+      return state + sign
+    return state
+
+  def state_result(self, state):
+    return state
 
+
+class Histogram(Metric):
+  """ Counts values of a field in logarithmic buckets. Histograms can be
+  merged across services (see merge_histograms) and used for estimating
+  percentiles (see histogram_percentile).
+
+  A histogram is rendered as:
+  {
+    "buckets_per_doubling": 8,
+    "counts": [[0, 3], [41, 120], [48, 2]]  # [bucket, count] pairs
+  }
+  Bucket 0 holds values below 1, bucket N holds values in
+  [2 ** ((N-1) / buckets_per_doubling), 2 ** (N / buckets_per_doubling)).
+  """
+  incremental = True
+
+  def __init__(self, field, buckets_per_doubling=DEFAULT_BUCKETS_PER_DOUBLING):
+    self._field_name = field
+    self._buckets_per_doubling = buckets_per_doubling
+
+  def compute(self, requests):
+    state = self.initial_state()
+    for request_info in requests:
+      state = self.update_state(state, request_info, 1)
+    return self.state_result(state)
+
+  def initial_state(self):
+    return {}
+
+  def update_state(self, state, request_info, sign):
+    value = getattr(request_info, self._field_name)
+    if value is None:
+      return state
+    bucket = _bucket_of(value, self._buckets_per_doubling)
+    count = state.get(bucket, 0) + sign
+    if count:
+      state[bucket] = count
+    else:
+      del state[bucket]
+    return state
+
+  def state_result(self, state):
+    return {
+      "buckets_per_doubling": self._buckets_per_doubling,
+      "counts": sorted([bucket, count] for bucket, count in state.items())
+    }
+
+
+def merge_histograms(histograms):
+  """ Combines histograms rendered by Histogram metrics.
+
+  Args:
+    histograms: a list of histogram dictionaries (None items are ignored).
+  Returns:
+    a histogram dictionary or None if there were no histograms.
+  Raises:
+    ValueError if histograms have different buckets.
+  """
+  histograms = [histogram for histogram in histograms if histogram]
+  if not histograms:
+    return None
+
+  buckets_per_doubling = histograms[0]["buckets_per_doubling"]
+  merged = {}
+  for histogram in histograms:
+    if histogram["buckets_per_doubling"] != buckets_per_doubling:
+      raise ValueError("Can't merge histograms with different buckets")
+    for bucket, count in histogram["counts"]:
+      merged[bucket] = merged.get(bucket, 0) + count
+
+  return {
+    "buckets_per_doubling": buckets_per_doubling,
+    "counts": sorted([bucket, count] for bucket, count in merged.items())
+  }
+
+
+def histogram_percentile(histogram, percentile):
+  """ Estimates a percentile of values counted in a histogram.
+
+  Args:
+    histogram: a histogram dictionary.
+    percentile: a number between 0 and 100.
+  Returns:
+    an estimated value or None if the histogram is empty.
+  """
+  if not histogram:
+    return None
+  total = sum(count for _, count in histogram["counts"])
+  if not total:
+    return None
+
+  rank = max(1, int(math.ceil(total * percentile / 100.0)))
+  seen = 0
+  for bucket, count in histogram["counts"]:
+    seen += count
+    if seen >= rank:
+      return _bucket_value(bucket, histogram["buckets_per_doubling"])
+
+
+def _bucket_of(value, buckets_per_doubling):
+  if value < 1:
+    return 0
+  return int(math.floor(math.log(value, 2) * buckets_per_doubling)) + 1
+
+
+def _bucket_value(bucket, buckets_per_doubling):
+  """ Returns the geometric middle of a bucket. """
+  if bucket == 0:
+    return 0
+  return 2 ** ((bucket - 0.5) / buckets_per_doubling)
@@ -1,3 +1,4 @@
+from array import array
 from collections import defaultdict
 import logging
 import time
@@ -159,7 +160,13 @@ class ServiceStats(object):
     # Initialize properties for tracking latest N requests
     self._last_request_no = 0
     self._current_requests = {}  # {request_no: RequestInfo()}
-    self._finished_requests = []  # circular list containing recent N requests
+    # Ring buffer containing recent N requests. End times are also kept in
+    # a separate array so that cursors can be located without touching
+    # request objects.
+    self._finished_requests = [None] * history_size
+    self._end_times = array('d', [0]) * history_size
+    self._oldest_position = 0
+    self._finished_count = 0
 
     # Configure parameters limiting memory usage
     self._history_size = history_size
@@ -174,6 +181,7 @@ class ServiceStats(object):
 
     # Configure metrics for recent requests
     self._metrics_for_recent_config = default_metrics_for_recent
+    self._recent_aggregates = _RecentAggregates(default_metrics_for_recent)
 
   @property
   def service_name(self):
@@ -276,9 +284,7 @@ class ServiceStats(object):
     request_info.end_time = now
     request_info.latency = now - request_info.start_time
     # Add finished request to circular list of finished requests
-    self._finished_requests.append(request_info)
-    if len(self._finished_requests) > self._history_size:
-      self._finished_requests.pop(0)
+    self._add_finished(request_info)
     # Update cumulative counters
     self._increment_counters(self._cumulative_counters_config,
                              self._cumulative_counters, request_info)
@@ -350,17 +356,22 @@ class ServiceStats(object):
     Returns:
       a dictionary containing value of metrics for recent requests.
     """
-    requests = self._get_requests(since=cursor)
+    first_position = self._first_position_since(cursor)
+    requests = _LazyRequests(self, first_position)
     if not metrics_map:
       metrics_map = self._metrics_for_recent_config
-    stats = self._render_recent(metrics_map, requests)
-    if not requests:
+    if first_position == 0 and metrics_map is self._metrics_for_recent_config:
+      # Metrics for the whole history are maintained incrementally
+      stats = self._recent_aggregates.render(requests)
+    else:
+      stats = self._render_recent(metrics_map, requests.get())
+    if first_position == self._finished_count:
       now = _now()
       stats["from"] = now
       stats["to"] = now
     else:
-      stats["from"] = requests[0].end_time
-      stats["to"] = requests[-1].end_time
+      stats["from"] = self._request_at(first_position).end_time
+      stats["to"] = self._request_at(self._finished_count - 1).end_time
     return stats
 
   def _render_recent(self, metrics_config, requests):
@@ -412,26 +423,73 @@ class ServiceStats(object):
           )
     return stats_dict
 
-  def _get_requests(self, since=None):
-    """ Selects requests which were finished since specified timestamp (in ms).
+  def _add_finished(self, request_info):
+    """ Adds a finished request to the ring buffer, replacing the oldest
+    request if the history is full.
 
     Args:
-      since: a unix timestamp in ms.
+      request_info: a finalized request.
+    """
+    if self._history_size < 1:
+      return
+
+    if self._finished_count < self._history_size:
+      position = (self._oldest_position + self._finished_count)
+      position %= self._history_size
+      self._finished_count += 1
+    else:
+      position = self._oldest_position
+      self._recent_aggregates.remove(self._finished_requests[position])
+      self._oldest_position = (position + 1) % self._history_size
+
+    self._finished_requests[position] = request_info
+    self._end_times[position] = request_info.end_time
+    self._recent_aggregates.add(request_info)
+
+  def _request_at(self, position):
+    """ Gets a finished request by its position in the history.
+
+    Args:
+      position: a number of requests finished before it (0 is the oldest).
     Returns:
-      a list of requests finished since specified timestamp.
+      a finalized request.
+    """
+    index = (self._oldest_position + position) % self._history_size
+    return self._finished_requests[index]
+
+  def _first_position_since(self, since):
+    """ Finds the first request which was finished since specified
+    timestamp (in ms).
+
+    Args:
+      since: a unix timestamp in ms or None.
+    Returns:
+      a position in the history (0 is the oldest request).
     """
     if since is None:
-      return self._finished_requests
+      return 0
     # Find the first element newer than 'since' using bisect
-    left, right = 0, len(self._finished_requests)
+    left, right = 0, self._finished_count
     while left < right:
       middle = (left + right) // 2
-      if since <= self._finished_requests[middle].end_time:
+      index = (self._oldest_position + middle) % self._history_size
+      if since <= self._end_times[index]:
         right = middle
       else:
         left = middle + 1
-    result = self._finished_requests[left:]
-    return result
+    return left
+
+  def _get_requests(self, since=None):
+    """ Selects requests which were finished since specified timestamp (in ms).
+
+    Args:
+      since: a unix timestamp in ms.
+    Returns:
+      a list of requests finished since specified timestamp.
+    """
+    first_position = self._first_position_since(since)
+    return [self._request_at(position)
+            for position in range(first_position, self._finished_count)]
 
   def _clean_outdated(self):
     """ Removes old requests which are unlikely to be finished ever as
@@ -451,6 +509,142 @@ class ServiceStats(object):
     self._last_autoclean_time = now
 
 
+class _LazyRequests(object):
+  """ Builds a list of recent requests only if a metric needs it. """
+  def __init__(self, service_stats, first_position):
+    self._service_stats = service_stats
+    self._first_position = first_position
+    self._requests = None
+
+  def get(self):
+    if self._requests is None:
+      stats = self._service_stats
+      self._requests = [stats._request_at(position) for position
+                        in range(self._first_position, stats._finished_count)]
+    return self._requests
+
+
+class _RecentAggregates(object):
+  """ Keeps metrics for all requests in the history up to date as requests
+  are added and removed, so they don't have to be recomputed on every call.
+
+  Metrics which can't be updated incrementally (e.g. Max) are still computed
+  from the requests when stats are rendered.
+  """
+  def __init__(self, metrics_config):
+    self._metrics_config = metrics_config
+    self._root = self._new_node(metrics_config)
+
+  def add(self, request_info):
+    self._update(self._metrics_config, self._root, request_info, 1)
+
+  def remove(self, request_info):
+    self._update(self._metrics_config, self._root, request_info, -1)
+
+  def render(self, requests):
+    """ Renders metrics for all requests in the history.
+
+    Args:
+      requests: a _LazyRequests object for all requests in the history.
+    Returns:
+      a dictionary containing computed metrics.
+    """
+    return self._render(self._metrics_config, self._root, requests.get)
+
+  @staticmethod
+  def _new_node(metrics_config):
+    node = {}
+    for metric_pair in iteritems(metrics_config):
+      if isinstance(metric_pair[0], str):
+        if metric_pair[1].incremental:
+          node[metric_pair[0]] = metric_pair[1].initial_state()
+      else:
+        node[metric_pair[0].name] = {}
+    return node
+
+  def _update(self, metrics_config, node, request_info, sign):
+    for metric_pair in iteritems(metrics_config):
+      if isinstance(metric_pair[0], str):
+        metric = metric_pair[1]
+        if metric.incremental:
+          node[metric_pair[0]] = metric.update_state(
+            node[metric_pair[0]], request_info, sign)
+        continue
+
+      categorizer = metric_pair[0]
+      category = categorizer.category_of(request_info)
+      if category is categorizers.HIDDEN_CATEGORY:
+        continue
+
+      # Each category entry is a [requests_count, state] pair
+      categories = node[categorizer.name]
+      entry = categories.get(category)
+      if entry is None:
+        if isinstance(metric_pair[1], metrics.Metric):
+          state = None
+          if metric_pair[1].incremental:
+            state = metric_pair[1].initial_state()
+        else:
+          state = self._new_node(metric_pair[1])
+        entry = categories[category] = [0, state]
+
+      entry[0] += sign
+      if not entry[0]:
+        del categories[category]
+        continue
+
+      if isinstance(metric_pair[1], metrics.Metric):
+        if metric_pair[1].incremental:
+          entry[1] = metric_pair[1].update_state(entry[1], request_info, sign)
+      else:
+        self._update(metric_pair[1], entry[1], request_info, sign)
+
+  def _render(self, metrics_config, node, get_requests):
+    stats_dict = {}
+    for metric_pair in iteritems(metrics_config):
+      if isinstance(metric_pair[0], str):
+        metric = metric_pair[1]
+        if metric.incremental:
+          stats_dict[metric_pair[0]] = metric.state_result(
+            node[metric_pair[0]])
+        else:
+          stats_dict[metric_pair[0]] = metric.compute(get_requests())
+        continue
+
+      categorizer = metric_pair[0]
+      stats_dict[categorizer.name] = categories_stats = {}
+      for category, entry in iteritems(node[categorizer.name]):
+        get_category_requests = _category_requests_getter(
+          get_requests, categorizer, category)
+        if isinstance(metric_pair[1], metrics.Metric):
+          metric = metric_pair[1]
+          if metric.incremental:
+            categories_stats[category] = metric.state_result(entry[1])
+          else:
+            categories_stats[category] = metric.compute(
+              get_category_requests())
+        else:
+          categories_stats[category] = self._render(
+            metric_pair[1], entry[1], get_category_requests)
+    return stats_dict
+
+
+def _category_requests_getter(get_requests, categorizer, category):
+  """ Creates a function which selects requests of a category when called.
+
+  Args:
+    get_requests: a function returning a list of requests.
+    categorizer: an instance of categorizers.Categorizer.
+    category: a category name.
+  Returns:
+    a function returning a list of requests.
+  """
+  def get_category_requests():
+    return [request_info for request_info in get_requests()
+            if categorizer.category_of(request_info) == category]
+  return get_category_requests
+
+
 def _now():
   """
   Returns:
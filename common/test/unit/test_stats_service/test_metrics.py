@@ -65,6 +65,47 @@ class TestBuiltinMetrics(unittest.TestCase):
     self.assertEqual(post.compute(requests), 3)
 
 
+class TestHistogram(unittest.TestCase):
+
+  def test_percentiles(self):
+    requests = [RequestInfo(latency=latency) for latency in range(1, 101)]
+    histogram = metrics.Histogram("latency").compute(requests)
+    self.assertEqual(sum(count for _, count in histogram["counts"]), 100)
+
+    # Estimates should be within bucket precision
+    for percentile in (50, 95, 99):
+      estimate = metrics.histogram_percentile(histogram, percentile)
+      self.assertLess(abs(estimate - percentile) / percentile, 0.1)
+
+    self.assertIsNone(metrics.histogram_percentile(
+      metrics.Histogram("latency").compute([]), 50))
+
+  def test_incremental(self):
+    histogram = metrics.Histogram("latency")
+    state = histogram.initial_state()
+    for latency in (0, 5, 5, 300):
+      state = histogram.update_state(state, RequestInfo(latency=latency), 1)
+    state = histogram.update_state(state, RequestInfo(latency=300), -1)
+    requests = [RequestInfo(latency=latency) for latency in (0, 5, 5)]
+    self.assertEqual(histogram.state_result(state),
+                     histogram.compute(requests))
+
+  def test_merge(self):
+    fast = metrics.Histogram("latency").compute(
+      [RequestInfo(latency=10) for _ in range(90)])
+    slow = metrics.Histogram("latency").compute(
+      [RequestInfo(latency=1000) for _ in range(10)])
+    merged = metrics.merge_histograms([fast, None, slow])
+    self.assertLess(metrics.histogram_percentile(merged, 90), 11)
+    self.assertGreater(metrics.histogram_percentile(merged, 91), 900)
+    self.assertIsNone(metrics.merge_histograms([None]))
+
+    coarse = metrics.Histogram("latency", buckets_per_doubling=2).compute(
+      [RequestInfo(latency=10)])
+    with self.assertRaises(ValueError):
+      metrics.merge_histograms([fast, coarse])
+
+
 class TestCustomMetric(unittest.TestCase):
 
   class SuccessPercentMetric(metrics.Metric):
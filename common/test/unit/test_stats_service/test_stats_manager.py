@@ -416,6 +416,53 @@ class TestScrollingRecent(unittest.TestCase):
     })
 
 
+class TestRecentAggregates(unittest.TestCase):
+
+  def setUp(self):
+    self.time_patcher = patch.object(stats_manager.time, 'time')
+    self.time_mock = self.time_patcher.start()
+    self.time_mock.return_value = 151550000
+    self.metrics_map = {
+      "all": metrics.CountOf(matchers.ANY),
+      "5xx": metrics.CountOf(matchers.SERVER_ERROR),
+      "avg_latency": metrics.Avg("latency"),
+      "max_latency": metrics.Max("latency"),
+      categorizers.ExactValueCategorizer("by_app", field="app"): {
+        categorizers.StatusCategorizer("by_status"): metrics.CountOf(
+          matchers.ANY),
+        "all": metrics.CountOf(matchers.ANY),
+        "max_latency": metrics.Max("latency")
+      }
+    }
+    self.stats = stats_manager.ServiceStats(
+      "my_service", history_size=50,
+      default_metrics_for_recent=self.metrics_map)
+
+  def tearDown(self):
+    self.time_patcher.stop()
+
+  def test_matches_full_computation(self):
+    # Fill history several times so that requests are evicted
+    for request_num in range(170):
+      start_time = 151550000 + request_num
+      self.time_mock.return_value = start_time
+      request_info = self.stats.start_request(
+        app="app{}".format(request_num % 3 if request_num < 120 else 0))
+      self.time_mock.return_value = start_time + (request_num % 7) * 0.01
+      request_info.finalize(status=500 if request_num % 5 == 0 else 200)
+
+    requests = self.stats._get_requests()
+    self.assertEqual(len(requests), 50)
+    expected = self.stats._render_recent(self.metrics_map, requests)
+    expected["from"] = requests[0].end_time
+    expected["to"] = requests[-1].end_time
+    self.assertEqual(self.stats.get_recent(), expected)
+
+    # Apps that have no requests left in the history are not reported
+    self.assertListEqual(
+      sorted(self.stats.get_recent()["by_app"].keys()), ["app0"])
+
+
 class TestProperties(unittest.TestCase):
 
   def test_service_name(self):